@@ -84,6 +84,49 @@ class OsfStorageFileNode(BaseFileNode):
         # raise Exception('Cannot set materialized path on OSFStorage as it is computed.')
         logger.warn('Cannot set materialized path on OSFStorage because it\'s computed.')
 
+    @classmethod
+    def get_materialized_paths(cls, file_nodes):
+        """Return {pk: materialized path} of several file nodes, computed by one query.
+        """
+        file_nodes = list(file_nodes)
+        if not file_nodes:
+            return {}
+        sql = """
+            WITH RECURSIVE materialized_path_cte(file_id, parent_id, GEN_PATH) AS (
+              SELECT
+                T.id,
+                T.parent_id,
+                T.name :: TEXT AS GEN_PATH
+              FROM %s AS T
+              WHERE T.id IN %s
+              UNION ALL
+              SELECT
+                R.file_id,
+                T.parent_id,
+                (T.name || '/' || R.GEN_PATH) AS GEN_PATH
+              FROM materialized_path_cte AS R
+                JOIN %s AS T ON T.id = R.parent_id
+              WHERE R.parent_id IS NOT NULL
+            )
+            SELECT file_id, gen_path
+            FROM materialized_path_cte AS N
+            WHERE parent_id IS NULL;
+        """
+        table = AsIs(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table, tuple(file_node.pk for file_node in file_nodes), table])
+            paths = dict(cursor.fetchall())
+
+        materialized_paths = {}
+        for file_node in file_nodes:
+            path = paths.get(file_node.pk)
+            if path is None:
+                path = '/'
+            elif not file_node.is_file:
+                path = path + '/'
+            materialized_paths[file_node.pk] = path
+        return materialized_paths
+
     @classmethod
     def get(cls, _id, target):
         return cls.objects.get(_id=_id, target_object_id=target.id, target_content_type=ContentType.objects.get_for_model(target))
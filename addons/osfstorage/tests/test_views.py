@@ -24,21 +24,23 @@ from addons.osfstorage.tests.utils import make_payload
 from framework.auth import signing
 from website.util import rubeus, api_url_for
 from framework.auth import cas
-from api.caching.utils import storage_usage_cache
 
 from osf import features
-from osf.models import Tag, QuickFilesNode
+from osf.models import Tag, QuickFilesNode, NodeStorageUsage
 from osf.models import files as models
 from addons.osfstorage.apps import osf_storage_root
 from addons.osfstorage import utils
 from addons.base.views import make_auth, addon_view_file
 from addons.osfstorage import settings as storage_settings
 from api_tests.utils import create_test_file, create_test_preprint_file
-from api.caching.settings import STORAGE_USAGE_KEY
 
 from osf_tests.factories import ProjectFactory, ApiOAuth2PersonalTokenFactory, PreprintFactory
 from website.files.utils import attach_versions
 
+def get_storage_usage(node):
+    return NodeStorageUsage.objects.filter(node=node).values_list('usage', flat=True).first()
+
+
 def create_record_with_version(path, node_settings, **kwargs):
     version = factories.FileVersionFactory(**kwargs)
     record = node_settings.get_root().append_file(path)
@@ -444,24 +446,23 @@ class TestUploadFileHook(HookTestCase):
     def test_add_file_updates_cache(self):
         name = 'ლ(ಠ益ಠლ).unicode'
         parent = self.node_settings.get_root()
-        key = STORAGE_USAGE_KEY.format(target_id=self.node._id)
-        assert storage_usage_cache.get(key) is None
+        assert get_storage_usage(self.node) is None
 
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=self.make_payload(name=name))
-        assert storage_usage_cache.get(key) == 123
+        assert get_storage_usage(self.node) == 123
 
         # Don't update the cache for duplicate uploads
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=self.make_payload(name=name))
-        assert storage_usage_cache.get(key) == 123
+        assert get_storage_usage(self.node) == 123
 
         # Do update the cache for new versions
         payload = self.make_payload(name=name)
         payload['metadata']['name'] = 'new hash'
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=payload)
-        assert storage_usage_cache.get(key) == 246
+        assert get_storage_usage(self.node) == 246
 
 
 @pytest.mark.django_db
@@ -981,8 +982,6 @@ class TestDeleteHookNode(DeleteHook):
 class TestDeleteHookProjectOnly(DeleteHook):
 
     def test_delete_reduces_cache_size(self):
-        key = STORAGE_USAGE_KEY.format(target_id=self.node._id)
-
         file = create_record_with_version('new file', self.node_settings, size=123)
         assert self.node.storage_usage == 123
 
@@ -992,7 +991,7 @@ class TestDeleteHookProjectOnly(DeleteHook):
         assert_equal(resp.status_code, 200)
         assert_equal(resp.json, {'status': 'success'})
 
-        assert storage_usage_cache.get(key) == 0
+        assert get_storage_usage(self.node) == 0
         assert_is(self.node.storage_usage, 0)
 
 
@@ -1348,8 +1347,7 @@ class TestMoveHookProjectsOnly(TestMoveHook):
                 method='post_json',)
 
         # Cache should stay untouched because net storage usage hasn't changed
-        key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(key) is None
+        assert get_storage_usage(self.project) is None
 
         assert_equal(res.status_code, 200)
 
@@ -1385,11 +1383,9 @@ class TestMoveHookProjectsOnly(TestMoveHook):
                 method='post_json',)
 
         # both caches are updated
-        source_key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(source_key) == 0
+        assert get_storage_usage(self.project) == 0
 
-        destination = STORAGE_USAGE_KEY.format(target_id=other_target._id)
-        assert storage_usage_cache.get(destination) == 123
+        assert get_storage_usage(other_target) == 123
 
         assert_equal(res.status_code, 200)
 
@@ -1460,11 +1456,9 @@ class TestCopyHook(HookTestCase):
                 method='post_json',)
 
         # both caches are updated
-        source_key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(source_key) == 123
+        assert get_storage_usage(self.project) == 123
 
-        destination = STORAGE_USAGE_KEY.format(target_id=other_target._id)
-        assert storage_usage_cache.get(destination) == 123
+        assert get_storage_usage(other_target) == 123
 
         assert_equal(res.status_code, 201)
 
@@ -1,6 +1,6 @@
 from __future__ import unicode_literals
 
-from django.db.models import IntegerField
+from django.db.models import IntegerField, Sum
 from django.db.models.functions import Cast
 from rest_framework import status as http_status
 import logging
@@ -358,7 +358,7 @@ def osfstorage_create_child(file_node, payload, **kwargs):
         new_version = file_node.create_version(user, location, metadata)
 
         if not current_version or not current_version.is_duplicate(new_version):
-            update_storage_usage(file_node.target)
+            update_storage_usage(file_node.target, delta=new_version.size or 0)
 
         version_id = new_version._id
         archive_exists = new_version.archive is not None
@@ -387,6 +387,11 @@ def osfstorage_delete(file_node, payload, target, **kwargs):
     if file_node == OsfStorageFolder.objects.get_root(target=target):
             raise HTTPError(http_status.HTTP_400_BAD_REQUEST)
 
+    # a deleted file releases the size of all its versions, folders are recomputed
+    delta = None
+    if file_node.is_file:
+        delta = -(file_node.versions.aggregate(size=Sum('size'))['size'] or 0)
+
     try:
         file_node.delete(user=user)
 
@@ -397,7 +402,7 @@ def osfstorage_delete(file_node, payload, target, **kwargs):
             'message_long': 'Cannot delete file as it is the primary file of preprint.'
         })
 
-    update_storage_usage(file_node.target)
+    update_storage_usage(file_node.target, delta=delta)
     return {'status': 'success'}
 
 
@@ -31,6 +31,7 @@ from addons.wiki.exceptions import (
 )
 from website.util import api_v2_url
 from website.files.exceptions import VersionNotFoundError
+from website.search import document_cache
 from website import settings
 
 from .exceptions import (
@@ -475,7 +476,9 @@ class WikiPage(GuidMixin, BaseModel):
             raise ValidationError('The home wiki page cannot be deleted.')
         self.deleted = timezone.now()
 
-        Comment.objects.filter(root_target=self.guids.first()).update(root_target=None)
+        comments = Comment.objects.filter(root_target=self.guids.first())
+        document_cache.invalidate_comments(comments)
+        comments.update(root_target=None)
 
         self.node.add_log(
             action=NodeLog.WIKI_DELETED,
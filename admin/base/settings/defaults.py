@@ -353,3 +353,31 @@ TEMPORARY_PATH = '/tmp/'
 
 # Time out for calling copy API in Export/Restore processes
 EACH_FILE_EXPORT_RESTORE_TIME_OUT = 1800
+
+# Number of files whose information is loaded or saved at once when exporting or restoring
+EXPORT_DATA_FILE_INFO_CHUNK_SIZE = 1000
+
+# Number of bytes read at once when streaming a file information JSON
+EXPORT_DATA_FILE_INFO_READ_CHUNK_SIZE = 64 * 1024
+
+# Number of files copied at the same time by an export process
+EXPORT_DATA_COPY_CONCURRENCY = 4
+
+# Copy the export data files inside the storage service when the source storage
+# and the export location are buckets of the same S3 compatible service
+EXPORT_DATA_SERVER_SIDE_COPY = True
+
+# Objects larger than this many bytes are copied in parts of this many bytes
+EXPORT_DATA_MULTIPART_COPY_THRESHOLD = 64 * 1024 * 1024
+EXPORT_DATA_MULTIPART_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Number of files copied at the same time by a restore process
+EXPORT_DATA_RESTORE_CONCURRENCY = 4
+
+# Upper limit of the restore concurrency for some destination providers,
+# e.g. {'s3compatinstitutions': 2}
+EXPORT_DATA_RESTORE_PROVIDER_CONCURRENCY = {}
+
+# An export or restore process that has not copied any file for this many
+# seconds is considered dead and can be resumed
+EXPORT_DATA_RESUME_STALE_TIME = EACH_FILE_EXPORT_RESTORE_TIME_OUT + 600
@@ -1,8 +1,13 @@
 """
 Utility functions and classes
 """
-from osf.models import Subject, NodeLicense, Brand
+import csv
+import io
+import itertools
 
+from osf.models import Subject, NodeLicense, Brand, Guid, OSFUser
+
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.urls import reverse
 from django.core.validators import RegexValidator, _lazy_re_compile
@@ -11,6 +16,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from django.template import loader
 from django.http import HttpResponseBadRequest
+from django.db.models import OuterRef, Subquery
 
 from osf.models.admin_log_entry import (
     update_admin_log,
@@ -162,3 +168,58 @@ def change_embargo_date(registration, user, end_date):
 def render_bad_request_response(request, error_msgs):
     template = loader.get_template('400.html')
     return HttpResponseBadRequest(template.render(request=request, context={'exception': error_msgs}))
+
+
+def annotate_user_guid(queryset):
+    """Annotate an OSFUser queryset with ``guid``, the value of OSFUser._id,
+    so that it can be read without a query per user.
+    """
+    guids = Guid.objects.filter(
+        object_id=OuterRef('pk'),
+        content_type=ContentType.objects.get_for_model(OSFUser),
+    ).order_by('-created').values('_id')[:1]
+    return queryset.annotate(guid=Subquery(guids))
+
+
+class QuerySetRowList(object):
+    """Sequence of formatted rows backed by a queryset.
+
+    Paginator only counts and slices its object list, so a page costs a
+    COUNT and a LIMIT/OFFSET query and only the rows of the page are passed
+    to ``formatter``.
+    """
+    def __init__(self, queryset, formatter):
+        self.queryset = queryset
+        self.formatter = formatter
+
+    def order_by(self, *fields):
+        return QuerySetRowList(self.queryset.order_by(*fields), self.formatter)
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.formatter(row) for row in self.queryset[key]]
+        return self.formatter(self.queryset[key])
+
+    def __iter__(self):
+        # iterator() reads the rows from a server-side cursor
+        for row in self.queryset.iterator():
+            yield self.formatter(row)
+
+
+def iter_csv(rows, header, **fmtparams):
+    """Yield ``header`` and ``rows`` as CSV text, one line at a time, for a
+    StreamingHttpResponse.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, **fmtparams)
+    for row in itertools.chain([header], rows):
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
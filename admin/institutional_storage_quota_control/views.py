@@ -104,13 +104,10 @@ class UserListByInstitutionStorageID(RdmPermissionMixin, UserPassesTestMixin, Qu
 
     def get_userlist(self):
         """ Get user list by institution_id """
-        user_list = []
-        for user in OSFUser.objects.filter(
-                affiliated_institutions=self.institution_id):
-            user_list.append(self.get_user_quota_info(
-                user, UserQuota.CUSTOM_STORAGE)
-            )
-        return user_list
+        return self.get_user_quota_list(
+            OSFUser.objects.filter(affiliated_institutions=self.institution_id),
+            UserQuota.CUSTOM_STORAGE
+        )
 
     def get_institution(self):
         """ Get institution that is not using NII Storage """
@@ -5,8 +5,9 @@ import logging
 from operator import itemgetter
 
 from django.db import connection
-from django.db.models import Q
-from django.http import Http404
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
 from django.core import serializers
 from django.shortcuts import redirect
 from django.forms.models import model_to_dict
@@ -20,13 +21,13 @@ from admin.rdm.utils import RdmPermissionMixin
 
 from admin.base import settings
 from admin.base.forms import ImportFileForm
+from admin.base.utils import QuerySetRowList, annotate_user_guid, iter_csv
 from admin.institutions.forms import InstitutionForm, InstitutionalMetricsAdminRegisterForm
 from django.contrib.auth.models import Group
 from osf.models import Institution, Node, OSFUser, UserQuota, Email
 from website.util import quota
 from addons.osfstorage.models import Region
 from api.base import settings as api_settings
-import csv
 
 logger = logging.getLogger(__name__)
 
@@ -282,21 +283,30 @@ class InstitutionalMetricsAdminRegister(PermissionRequiredMixin, FormView):
 class QuotaUserList(ListView):
     """Base class for UserListByInstitutionID and StatisticalStatusDefaultStorage.
     """
+    # database fields of the user list columns
+    ORDER_BY_FIELDS = {
+        'fullname': 'fullname',
+        'eppn': 'eppn_value',
+        'username': 'username',
+        'ratio': 'quota_ratio',
+        'usage': 'quota_used',
+        'remaining': 'quota_remaining',
+        'quota': 'quota_max',
+    }
 
     def custom_size_abbreviation(self, size, abbr):
         if abbr == 'B':
             return (size / api_settings.BASE_FOR_METRIC_PREFIX, 'KB')
         return size, abbr
 
-    def get_user_quota_info(self, user, storage_type):
-        max_quota, used_quota = quota.get_quota_info(user, storage_type)
+    def format_user_quota_info(self, guid, user, max_quota, used_quota):
         max_quota_bytes = max_quota * api_settings.SIZE_UNIT_GB
         remaining_quota = max_quota_bytes - used_quota
         used_quota_abbr = self.custom_size_abbreviation(*quota.abbreviate_size(used_quota))
         remaining_abbr = self.custom_size_abbreviation(*quota.abbreviate_size(remaining_quota))
         if max_quota == 0:
             return {
-                'id': user.guids.first()._id,
+                'id': guid,
                 'fullname': user.fullname,
                 'eppn': user.eppn or '',
                 'username': user.username,
@@ -311,7 +321,7 @@ class QuotaUserList(ListView):
             }
         else:
             return {
-                'id': user.guids.first()._id,
+                'id': guid,
                 'fullname': user.fullname,
                 'eppn': user.eppn or '',
                 'username': user.username,
@@ -325,10 +335,26 @@ class QuotaUserList(ListView):
                 'quota': max_quota
             }
 
+    def get_user_quota_info(self, user, storage_type):
+        max_quota, used_quota = quota.get_quota_info(user, storage_type)
+        return self.format_user_quota_info(user.guids.first()._id, user, max_quota, used_quota)
+
+    def get_user_quota_list(self, queryset, storage_type):
+        """ Get users' quota info as a list sorted and paginated by the database """
+        def format_row(user):
+            return self.format_user_quota_info(user.guid, user, user.quota_max, user.quota_used)
+
+        queryset = quota.annotate_user_quota(annotate_user_guid(queryset), storage_type)
+        queryset = queryset.annotate(eppn_value=Coalesce('eppn', Value('')))
+        return QuerySetRowList(queryset, format_row)
+
     def get_queryset(self):
         user_list = self.get_userlist()
         order_by = self.get_order_by()
         reverse = self.get_direction() != 'asc'
+        if isinstance(user_list, QuerySetRowList):
+            field = self.ORDER_BY_FIELDS[order_by]
+            return user_list.order_by('-' + field if reverse else field, 'pk')
         user_list.sort(key=itemgetter(order_by), reverse=reverse)
         return user_list
 
@@ -374,34 +400,36 @@ class ExportFileTSV(PermissionRequiredMixin, QuotaUserList):
         if not Institution.objects.filter(id=institution_id, is_deleted=False).exists():
             raise Http404(f'Institution with id "{institution_id}" not found. Please double check.')
 
-        response = HttpResponse(content_type='text/tsv')
-        writer = csv.writer(response, delimiter='\t')
-        writer.writerow(['GUID', 'Username', 'Fullname', 'Ratio (%)', 'Usage (Byte)', 'Remaining (Byte)', 'Quota (Byte)'])
-
-        for user in OSFUser.objects.filter(affiliated_institutions=institution_id):
-            max_quota, used_quota = quota.get_quota_info(user, UserQuota.NII_STORAGE)
-            max_quota_bytes = max_quota * api_settings.SIZE_UNIT_GB
-            remaining_quota = max_quota_bytes - used_quota
-
-            if max_quota == 0:
-                writer.writerow([user.guids.first()._id, user.username,
-                                 user.fullname,
-                                 round(100, 1),
-                                 round(used_quota, 0),
-                                 round(remaining_quota, 0),
-                                 round(max_quota_bytes, 0)])
-            else:
-                writer.writerow([user.guids.first()._id, user.username,
-                                 user.fullname,
-                                 round(float(used_quota) / max_quota_bytes * 100, 1),
-                                 round(used_quota, 0),
-                                 round(remaining_quota, 0),
-                                 round(max_quota_bytes, 0)])
+        users = quota.annotate_user_quota(
+            annotate_user_guid(OSFUser.objects.filter(affiliated_institutions=institution_id)),
+            UserQuota.NII_STORAGE
+        ).order_by('pk')
+        header = ['GUID', 'Username', 'Fullname', 'Ratio (%)', 'Usage (Byte)', 'Remaining (Byte)', 'Quota (Byte)']
+        response = StreamingHttpResponse(
+            iter_csv((self.get_tsv_row(user) for user in users.iterator()), header, delimiter='\t'),
+            content_type='text/tsv'
+        )
         query = 'attachment; filename=user_list_by_institution_{}_export.tsv'.format(
             institution_id)
         response['Content-Disposition'] = query
         return response
 
+    def get_tsv_row(self, user):
+        max_quota = user.quota_max
+        used_quota = user.quota_used
+        max_quota_bytes = max_quota * api_settings.SIZE_UNIT_GB
+        remaining_quota = max_quota_bytes - used_quota
+        if max_quota == 0:
+            ratio = 100
+        else:
+            ratio = float(used_quota) / max_quota_bytes * 100
+        return [user.guid, user.username,
+                user.fullname,
+                round(ratio, 1),
+                round(used_quota, 0),
+                round(remaining_quota, 0),
+                round(max_quota_bytes, 0)]
+
 
 class UserListByInstitutionID(RdmPermissionMixin, UserPassesTestMixin, QuotaUserList):
     """
@@ -439,7 +467,7 @@ class UserListByInstitutionID(RdmPermissionMixin, UserPassesTestMixin, QuotaUser
             raise Http404
 
         if not email and not guid and not name:
-            return [self.get_user_quota_info(user, user_quota_type) for user in queryset]
+            return self.get_user_quota_list(queryset, user_quota_type)
 
         query_email = query_guid = query_name = None
 
@@ -458,11 +486,11 @@ class UserListByInstitutionID(RdmPermissionMixin, UserPassesTestMixin, QuotaUser
                                          Q(family_name__icontains=name))
 
         if query_email is not None and query_email.exists():
-            return [self.get_user_quota_info(user, user_quota_type) for user in query_email]
+            return self.get_user_quota_list(query_email, user_quota_type)
         elif query_guid is not None and query_guid.exists():
-            return [self.get_user_quota_info(user, user_quota_type) for user in query_guid]
+            return self.get_user_quota_list(query_guid, user_quota_type)
         elif query_name is not None and query_name.exists():
-            return [self.get_user_quota_info(user, user_quota_type) for user in query_name]
+            return self.get_user_quota_list(query_name, user_quota_type)
         else:
             return []
 
@@ -541,7 +569,6 @@ class StatisticalStatusDefaultStorage(RdmPermissionMixin, UserPassesTestMixin, Q
 
     def get_userlist(self):
         """ Get list of users' quota info """
-        user_list = []
         institution = self.get_institution()
         if not institution:
             # If institution is not found, redirect to HTTP 404 page
@@ -553,9 +580,8 @@ class StatisticalStatusDefaultStorage(RdmPermissionMixin, UserPassesTestMixin, Q
             # Institution is not using NII storage, redirect to 404 page
             raise Http404
         # Get user quota for each user in the institution
-        for user in OSFUser.objects.filter(affiliated_institutions=institution.id):
-            user_list.append(self.get_user_quota_info(user, user_quota_type))
-        return user_list
+        return self.get_user_quota_list(
+            OSFUser.objects.filter(affiliated_institutions=institution.id), user_quota_type)
 
     def get_institution(self):
         """ Get logged in user's first affiliated institution """
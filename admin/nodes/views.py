@@ -14,7 +14,7 @@ from django.http import HttpResponse
 from django.db.models import Q
 
 from website import search
-from osf.models import NodeLog, Contributor
+from osf.models import NodeLog
 from osf.models.user import OSFUser
 from osf.models.node import Node
 from osf.models.registrations import Registration
@@ -191,12 +191,8 @@ class NodeDeleteView(PermissionRequiredMixin, NodeDeleteBase):
                 )
                 osf_log.save()
 
-            if node.category == 'project':
-                storage_type = node.projectstoragetype.storage_type
-                contributor_ids = Contributor.objects.filter(node=node).values_list('user', flat=True)
-                user_list = OSFUser.objects.filter(id__in=contributor_ids)
-                for user in user_list:
-                    quota.update_user_used_quota(user, storage_type=storage_type)
+            if flag is not None and node.category == 'project':
+                quota.update_node_used_quota(node, removed=(flag == NODE_REMOVED))
 
         except AttributeError:
             return page_not_found(
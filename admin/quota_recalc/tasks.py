@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from admin.quota_recalc import views
+from framework.celery_tasks import app as celery_app
+
+__all__ = [
+    'run_recalculate_quota',
+]
+
+
+@celery_app.task(bind=True, track_started=True)
+def run_recalculate_quota(self, institution_id=None):
+    return views.recalculate_quota_process(self, institution_id=institution_id)
@@ -5,5 +5,7 @@ app_name = 'quota_recalc'
 
 urlpatterns = [
     url(r'^$', views.all_users, name='all_users'),
+    url(r'^institution/(?P<institution_id>[0-9]+)/$', views.institution, name='institution'),
+    url(r'^status/(?P<task_id>[-a-z0-9]+)/$', views.task_status, name='task_status'),
     url(r'^(?P<guid>[a-z0-9]+)/$', views.user, name='user'),
 ]
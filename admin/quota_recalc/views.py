@@ -1,11 +1,19 @@
-from django.http import JsonResponse
+import time
+
+from bulk_update.helper import bulk_update
+from celery.result import AsyncResult
 from django.db import transaction
+from django.db.models import Max, Min
+from django.http import JsonResponse
 
 from addons.osfstorage.models import Region
+from admin.quota_recalc import tasks
 from api.base import settings as api_settings
-from osf.models import OSFUser, UserQuota
+from osf.models import Institution, OSFUser, UserQuota, UserQuotaLedger
 from osf.utils.requests import check_select_for_update
-from website.util.quota import used_quota
+from website.util.quota import used_quota, used_quota_by_users
+
+STATE_PROGRESS = 'PROGRESS'
 
 
 def calculate_quota(user):
@@ -17,6 +25,8 @@ def calculate_quota(user):
 
     with transaction.atomic():
         for storage_type in storage_type_list:
+            # the ledger rows up to here are included in the recalculated value
+            last_id = UserQuotaLedger.objects.aggregate(last_id=Max('id'))['last_id']
             used = used_quota(user._id, storage_type)
             try:
                 if check_select_for_update():
@@ -38,17 +48,142 @@ def calculate_quota(user):
                     max_quota=api_settings.DEFAULT_MAX_QUOTA,
                     used=used,
                 )
+            if last_id is not None:
+                UserQuotaLedger.objects.filter(
+                    user=user,
+                    storage_type=storage_type,
+                    id__lte=last_id,
+                ).delete()
 
-def all_users(request, **kwargs):
-    c = 0
-    for osf_user in OSFUser.objects.exclude(deleted__isnull=False):
-        calculate_quota(osf_user)
-        c += 1
+def get_custom_storage_users(user_ids):
+    """Return the ids of users whose first institution has its own storage,
+    as calculate_quota decides for a single user.
+    """
+    first_institutions = OSFUser.affiliated_institutions.through.objects.filter(
+        osfuser_id__in=user_ids
+    ).order_by().values('osfuser_id').annotate(
+        first_institution_id=Min('institution_id')
+    ).values_list('osfuser_id', 'first_institution_id')
+    region_institutions = set(Institution.objects.filter(
+        _id__in=Region.objects.values('_id')
+    ).values_list('id', flat=True))
+    return {
+        user_id for user_id, institution_id in first_institutions
+        if institution_id in region_institutions
+    }
+
+def calculate_quota_bulk(user_ids):
+    """Recalculate the used quota of a chunk of users with a few GROUP BY
+    queries and write it back with bulk_update/bulk_create.
+    """
+    user_ids = list(user_ids)
+    # the ledger rows up to here are included in the recalculated values
+    last_id = UserQuotaLedger.objects.aggregate(last_id=Max('id'))['last_id']
+    custom_users = get_custom_storage_users(user_ids)
+    used = {
+        UserQuota.NII_STORAGE: used_quota_by_users(user_ids, UserQuota.NII_STORAGE),
+        UserQuota.CUSTOM_STORAGE: used_quota_by_users(list(custom_users), UserQuota.CUSTOM_STORAGE),
+    }
+
+    with transaction.atomic():
+        user_quotas = UserQuota.objects.filter(
+            user_id__in=user_ids,
+            storage_type__in=[UserQuota.NII_STORAGE, UserQuota.CUSTOM_STORAGE],
+        )
+        if check_select_for_update():
+            user_quotas = user_quotas.select_for_update()
+        updated = []
+        existing = set()
+        for user_quota in user_quotas:
+            if user_quota.user_id not in used[user_quota.storage_type]:
+                continue
+            existing.add((user_quota.user_id, user_quota.storage_type))
+            user_quota.used = used[user_quota.storage_type][user_quota.user_id]
+            updated.append(user_quota)
+        bulk_update(updated, update_fields=['used'])
+        UserQuota.objects.bulk_create([
+            UserQuota(
+                user_id=user_id,
+                storage_type=storage_type,
+                max_quota=api_settings.DEFAULT_MAX_QUOTA,
+                used=size,
+            )
+            for storage_type, sizes in used.items()
+            for user_id, size in sizes.items()
+            if (user_id, storage_type) not in existing
+        ])
+        # the recalculated values already include the pending changes
+        for storage_type, sizes in used.items():
+            if last_id is None:
+                break
+            UserQuotaLedger.objects.filter(
+                user_id__in=list(sizes.keys()),
+                storage_type=storage_type,
+                id__lte=last_id,
+            ).delete()
+
+def get_target_users(institution_id=None):
+    users = OSFUser.objects.exclude(deleted__isnull=False)
+    if institution_id is not None:
+        users = users.filter(affiliated_institutions__id=institution_id)
+    return users
+
+def recalculate_quota_process(task, institution_id=None):
+    """Recalculate the used quota of all users, or of the users of one
+    institution, reporting progress in the task state.
+    """
+    user_ids = list(get_target_users(institution_id).order_by('id').values_list('id', flat=True).distinct())
+    total = len(user_ids)
+    chunk_size = api_settings.QUOTA_RECALC_CHUNK_SIZE
+    start = time.time()
+    for index in range(0, total, chunk_size):
+        calculate_quota_bulk(user_ids[index:index + chunk_size])
+        done = min(index + chunk_size, total)
+        elapsed = time.time() - start
+        task.update_state(state=STATE_PROGRESS, meta={
+            'done': done,
+            'total': total,
+            'elapsed': elapsed,
+            'eta': elapsed / done * (total - done),
+        })
+    return {'done': total, 'total': total, 'elapsed': time.time() - start, 'eta': 0}
+
+def start_recalculation(institution_id=None):
+    c = get_target_users(institution_id).distinct().count()
+    task = tasks.run_recalculate_quota.delay(institution_id=institution_id)
     return JsonResponse({
         'status': 'OK',
-        'message': str(c) + ' users\' quota successfully recalculated!'
+        'task_id': task.task_id,
+        'message': str(c) + ' users\' quota recalculation started!'
     })
 
+def all_users(request, **kwargs):
+    return start_recalculation()
+
+def institution(request, institution_id, **kwargs):
+    if not Institution.objects.filter(id=institution_id).exists():
+        return JsonResponse({
+            'status': 'failed',
+            'message': 'Institution not found.'
+        }, status=404)
+    return start_recalculation(institution_id=int(institution_id))
+
+def task_status(request, task_id, **kwargs):
+    task = AsyncResult(task_id)
+    info = task.info if isinstance(task.info, dict) else {}
+    response = {
+        'status': 'OK',
+        'task_id': task_id,
+        'state': task.state,
+        'done': info.get('done', 0),
+        'total': info.get('total'),
+        'eta': info.get('eta'),
+    }
+    if task.failed():
+        response['status'] = 'failed'
+        response['message'] = str(task.info)
+    return JsonResponse(response)
+
 def user(request, guid, **kwargs):
     user = OSFUser.load(guid)
     if user is None:
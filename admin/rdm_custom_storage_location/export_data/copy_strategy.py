@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Copy strategies for the export data files.
+
+By default a file version is copied to the export location by WaterButler,
+which downloads and uploads the whole content through the worker. When the
+source storage and the export location are buckets of the same S3 compatible
+service, the content is copied by the service itself (CopyObject, or a
+multipart copy for large objects) and never leaves the storage.
+"""
+import logging
+import re
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+
+from admin.base import settings as admin_settings
+
+__all__ = [
+    'S3_PROVIDERS',
+    'S3Bucket',
+    'ServerSideCopy',
+    'get_s3_bucket',
+    'get_server_side_copy',
+]
+
+logger = logging.getLogger(__name__)
+
+# storage providers whose files are objects of a S3 compatible bucket
+S3_PROVIDERS = ('s3', 's3compat', 's3compatb3')
+
+
+class S3Bucket(object):
+    """A bucket and the credentials to access it"""
+
+    def __init__(self, provider, bucket, access_key, secret_key, host=None, encrypt_uploads=False):
+        self.provider = provider
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.host = host
+        self.encrypt_uploads = encrypt_uploads
+
+    @property
+    def endpoint_url(self):
+        """URL of the S3 compatible service, None for Amazon S3"""
+        if not self.host:
+            return None
+        port = 443
+        m = re.match(r'^(.+)\:([0-9]+)$', self.host)
+        if m is not None:
+            port = int(m.group(2))
+        return ('https://' if port == 443 else 'http://') + self.host
+
+    def is_same_service(self, other):
+        return self.endpoint_url == other.endpoint_url
+
+    def get_client(self):
+        return boto3.client(
+            's3',
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            endpoint_url=self.endpoint_url,
+        )
+
+
+def get_s3_bucket(waterbutler_credentials, waterbutler_settings):
+    """Return the S3Bucket of a storage, or None if it is not a S3 compatible storage"""
+    storage_settings = (waterbutler_settings or {}).get('storage', {})
+    storage_credentials = (waterbutler_credentials or {}).get('storage', {})
+    provider = storage_settings.get('provider')
+    if provider not in S3_PROVIDERS or not storage_settings.get('bucket'):
+        return None
+    if not storage_credentials.get('access_key') or not storage_credentials.get('secret_key'):
+        return None
+
+    # the export location keeps its upload options in 'folder'
+    folder = storage_settings.get('folder')
+    encrypt_uploads = storage_settings.get('encrypt_uploads', False)
+    if isinstance(folder, dict):
+        encrypt_uploads = folder.get('encrypt_uploads', encrypt_uploads)
+
+    return S3Bucket(
+        provider, storage_settings['bucket'],
+        storage_credentials['access_key'], storage_credentials['secret_key'],
+        host=storage_credentials.get('host'), encrypt_uploads=encrypt_uploads)
+
+
+class ServerSideCopy(object):
+    """Copy objects from the source storage bucket to the export location bucket
+    with requests to the storage service only.
+
+    The client of the export location is used, its credentials must be allowed
+    to read the source bucket; when they are not, the copy fails and the file
+    is copied by WaterButler instead. After the first access denied error the
+    server side copy is not tried again for the rest of the process.
+    """
+
+    def __init__(self, source, destination, client=None):
+        self.source = source
+        self.destination = destination
+        self.client = client or destination.get_client()
+        self.config = TransferConfig(
+            multipart_threshold=admin_settings.EXPORT_DATA_MULTIPART_COPY_THRESHOLD,
+            multipart_chunksize=admin_settings.EXPORT_DATA_MULTIPART_COPY_CHUNK_SIZE,
+        )
+        self.is_access_denied = False
+
+    def get_source_key(self, version_location):
+        """Return (bucket, key) of a file version in the source storage, or None"""
+        if not version_location or not version_location.get('object'):
+            return None
+        provider = version_location.get('provider', version_location.get('service', self.source.provider))
+        if provider not in S3_PROVIDERS:
+            return None
+        return version_location.get('bucket') or self.source.bucket, version_location['object']
+
+    def copy_file_version(self, version_location, destination_path):
+        """Copy a file version to ``destination_path`` in the export location.
+
+        Return False when the version cannot be copied this way.
+        """
+        if self.is_access_denied:
+            return False
+        source_key = self.get_source_key(version_location)
+        if source_key is None:
+            return False
+        source_bucket, key = source_key
+        extra_args = {'ServerSideEncryption': 'AES256'} if self.destination.encrypt_uploads else None
+        try:
+            self.client.copy(
+                {'Bucket': source_bucket, 'Key': key},
+                self.destination.bucket, destination_path.lstrip('/'),
+                ExtraArgs=extra_args, Config=self.config)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('AccessDenied', '403'):
+                # every version of the source bucket would be denied the same way
+                self.is_access_denied = True
+                logger.warning(f'Server side copy from {source_bucket} is denied, use WaterButler instead: {e}')
+            else:
+                logger.warning(f'Server side copy of {source_bucket}/{key} failed: {e}')
+            return False
+        except BotoCoreError as e:
+            logger.warning(f'Server side copy of {source_bucket}/{key} failed: {e}')
+            return False
+        return True
+
+
+def get_server_side_copy(export_data):
+    """Return the ServerSideCopy of an export process, or None if its source storage
+    and its export location are not buckets of the same S3 compatible service"""
+    if not admin_settings.EXPORT_DATA_SERVER_SIDE_COPY:
+        return None
+    source = export_data.source
+    location = export_data.location
+    source_bucket = get_s3_bucket(source.waterbutler_credentials, source.waterbutler_settings)
+    location_bucket = get_s3_bucket(location.waterbutler_credentials, location.waterbutler_settings)
+    if source_bucket is None or location_bucket is None or not source_bucket.is_same_service(location_bucket):
+        return None
+    return ServerSideCopy(source_bucket, location_bucket)
@@ -72,6 +72,8 @@ urlpatterns = [
         export.ExportDataActionView.as_view(), name='export_data_action'),
     url(r'^stop-export/$',
         export.StopExportDataActionView.as_view(), name='stop_export_data_action'),
+    url(r'^resume-export/$',
+        export.ResumeExportDataActionView.as_view(), name='resume_export_data_action'),
     url(r'^check-export/$',
         export.CheckStateExportDataActionView.as_view(), name='check_state_export_data_action'),
     url(r'^check-data/$',
@@ -84,6 +86,8 @@ urlpatterns = [
         restore.RestoreDataActionView.as_view(), name='restore_data_action'),
     url(r'^(?P<export_id>[0-9]+)/stop_restore_export_data/$',
         restore.StopRestoreDataActionView.as_view(), name='stop_restore_data_action'),
+    url(r'^(?P<export_id>[0-9]+)/resume_restore_export_data/$',
+        restore.ResumeRestoreDataActionView.as_view(), name='resume_restore_data_action'),
     url(r'^(?P<export_id>[0-9]+)/task_status/$',
         restore.CheckTaskStatusRestoreDataActionView.as_view(), name='check_task_status_restore_data_action'),
     url(r'^(?P<export_id>[0-9]+)/check_running_restore/$',
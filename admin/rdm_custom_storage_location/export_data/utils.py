@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import codecs
 import inspect  # noqa
 import json  # noqa
 import logging  # noqa
@@ -49,9 +50,12 @@ __all__ = [
     'save_basic_storage_institutions_credentials_common',
     'save_nextcloudinstitutions_credentials',
     'process_data_information',
+    'iter_file_versions',
     'validate_exported_data',
+    'FileInfoReader',
     'write_json_file',
     'check_diff_between_version',
+    'iter_files_ng',
     'count_files_ng_ok',
     'check_for_file_existent_on_export_location',
 ]
@@ -292,14 +296,191 @@ def validate_file_json(file_data, json_schema_file_name):
         return False
 
 
-def process_data_information(list_data):
-    list_data_version = []
+class JSONStreamReader(object):
+    """Pull parser for a JSON document given as an iterable of chunks.
+
+    Only the structure of the outer object and of the arrays walked with
+    items() is kept; each other value is decoded as a whole when value() is
+    called, so memory is bounded by the largest single value instead of the
+    whole document.
+    """
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Append the next chunk to the buffer, return False at the end of the data"""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._text_decoder.decode(b'', final=True)
+        elif isinstance(chunk, bytes):
+            text = self._text_decoder.decode(chunk)
+        else:
+            text = chunk
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            self._pos = self.WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON data')
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f'Expecting one of {chars!r}, got {char!r}')
+        self._pos += 1
+        return char
+
+    def value(self):
+        """Decode the next value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may go on in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def members(self):
+        """Yield the keys of an object; the caller reads each member value
+        with value() or items() before asking for the next key"""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f'Expecting a property name, got {key!r}')
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def items(self):
+        """Yield the elements of an array one at a time"""
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self._expect(',]') == ']':
+                return
+
+
+class FileInfoReader(object):
+    """Read and validate a file information JSON one entry at a time.
+
+    The members written before "files" (institution and folders) are read
+    and validated when the reader is created. The files are validated one
+    by one while iter_files() is consumed, and the rest of the document
+    when it is exhausted. Invalid data raises jsonschema.ValidationError,
+    malformed JSON raises ValueError.
+    """
+
+    def __init__(self, chunks, schema_filename='file-info-schema.json'):
+        schema = from_json(schema_filename)
+        validator_class = jsonschema.validators.validator_for(schema)
+        self._validators = {
+            key: validator_class(sub_schema)
+            for key, sub_schema in schema.get('properties', {}).items()
+        }
+        self._item_validators = {
+            key: validator_class(sub_schema['items'])
+            for key, sub_schema in schema.get('properties', {}).items()
+            if sub_schema.get('type') == 'array' and 'items' in sub_schema
+        }
+        self._required = schema.get('required', [])
+        self._reader = JSONStreamReader(chunks)
+        self._members = self._reader.members()
+        self._keys = set()
+        self._files_consumed = False
+        self.institution = None
+        self.folders = []
+        for key in self._members:
+            self._keys.add(key)
+            if key == 'files':
+                return
+            self._read_member(key)
+        # the document has no files
+        self._files_consumed = True
+        self._check_required()
+
+    def _read_member(self, key):
+        if key in self._item_validators:
+            value = list(self._iter_items(key))
+        else:
+            value = self._reader.value()
+            if key in self._validators:
+                self._validators[key].validate(value)
+        if key == 'institution':
+            self.institution = value
+        elif key == 'folders':
+            self.folders = value
+
+    def _iter_items(self, key):
+        validator = self._item_validators[key]
+        for index, item in enumerate(self._reader.items()):
+            try:
+                validator.validate(item)
+            except jsonschema.ValidationError as e:
+                e.path.extendleft([index, key])
+                raise
+            yield item
+
+    def _check_required(self):
+        missing = [key for key in self._required if key not in self._keys]
+        if missing:
+            raise jsonschema.ValidationError(f'{missing[0]!r} is a required property')
+
+    def iter_files(self):
+        """Yield the validated file entries, can be consumed only once"""
+        if self._files_consumed:
+            return
+        self._files_consumed = True
+        if 'files' in self._item_validators:
+            yield from self._iter_items('files')
+        else:
+            yield from self._reader.items()
+        for key in self._members:
+            self._keys.add(key)
+            self._read_member(key)
+        self._check_required()
+
+
+def iter_file_versions(list_data):
+    """Yield the information of each file version merged with its file"""
     for item in list_data:
         for file_version in item['version']:
             current_data = {**item, **file_version}
             del current_data['version']
-            list_data_version.append(current_data)
-    return list_data_version
+            yield current_data
+
+
+def process_data_information(list_data):
+    return list(iter_file_versions(list_data))
 
 
 def float_or_none(x):
@@ -387,55 +568,58 @@ def check_diff_between_version(list_version_a, list_version_b, parent_key=None,
         return False, '', None
 
 
+def get_file_version_key(file_version):
+    # following properties is not change after the Export/Restore process
+    # use them to identify a file version
+    return (
+        file_version.get('project', {}).get('id'),
+        file_version.get('materialized_path'),
+        file_version.get('identifier'),
+    )
+
+
+def iter_files_ng(exported_file_versions, storage_file_versions, exclude_keys=None):
+    """Compare each exported file version with the storage file version having
+    the same key, yield the NG content of the file version or None when it is OK"""
+    storage_file_versions_index = {}
+    for file_b in storage_file_versions:
+        storage_file_versions_index.setdefault(get_file_version_key(file_b), file_b)
+
+    for file_a in exported_file_versions:
+        key = get_file_version_key(file_a)
+        file_b = storage_file_versions_index.get(key)
+        if file_b is None:
+            message = 'File is not exist'
+        else:
+            is_diff, message, _ = check_diff_between_version([file_a], [file_b], exclude_keys=exclude_keys)
+            if not is_diff:
+                yield None
+                continue
+        project_id_a, materialized_path_a, version_identifier_a = key
+        yield {
+            'project_id': project_id_a,
+            'path': materialized_path_a,
+            'version_id': version_identifier_a,
+            'size': file_a.get('size', 0),
+            'reason': message,
+        }
+
+
 def count_files_ng_ok(exported_file_versions, storage_file_versions, exclude_keys=None):
-    exported_file_versions = sorted(exported_file_versions, key=lambda kv: kv['materialized_path'])
-    storage_file_versions = sorted(storage_file_versions, key=lambda kv: kv['materialized_path'])
     data = {
         'ng': 0,
         'ok': 0,
     }
     list_file_ng = []
     count_files = 0
-    for file_a in exported_file_versions:
-        # following properties is not change after the Export/Restore process
-        # use them to identify a file version
-        version_identifier_a = file_a.get('identifier')
-        materialized_path_a = file_a.get('materialized_path')
-        project_id_a = file_a.get('project', {}).get('id')
-
-        file_b = next((
-            file for file in storage_file_versions if (
-                file.get('materialized_path') == materialized_path_a
-                and file.get('identifier') == version_identifier_a
-                and file.get('project', {}).get('id') == project_id_a
-            )
-        ), None)
-        if file_b:
-            is_diff, message, file_version = check_diff_between_version([file_a], [file_b], exclude_keys=exclude_keys)
-            if not is_diff:
-                data['ok'] += 1
-            else:
-                data['ng'] += 1
-                ng_content = {
-                    'project_id': project_id_a,
-                    'path': materialized_path_a,
-                    'version_id': version_identifier_a,
-                    'size': file_a.get('size', 0),
-                    'reason': message,
-                }
-                list_file_ng.append(ng_content)
-            count_files += 1
+    for ng_content in iter_files_ng(exported_file_versions, storage_file_versions, exclude_keys=exclude_keys):
+        if ng_content is None:
+            data['ok'] += 1
         else:
             data['ng'] += 1
-            ng_content = {
-                'project_id': project_id_a,
-                'path': materialized_path_a,
-                'version_id': version_identifier_a,
-                'size': file_a.get('size', 0),
-                'reason': 'File is not exist',
-            }
             list_file_ng.append(ng_content)
-            count_files += 1
+        count_files += 1
+    list_file_ng.sort(key=lambda kv: kv['path'])
     data['total'] = count_files
     data['list_file_ng'] = list_file_ng
     return data
@@ -444,22 +628,14 @@ def count_files_ng_ok(exported_file_versions, storage_file_versions, exclude_key
 def check_for_file_existent_on_export_location(
         file_info_json, node_id, provider, file_path, location_id,
         cookies, cookie):
-    # Get list file in export storage location
-    file_list = get_files_in_path(node_id, provider, file_path, cookies,
-                                  location_id=location_id, cookie=cookie)
-
-    if not file_list:
-        return None
-
-    attrs = ['name', 'size']
-    storage_file_list = [{attr: file.get('attributes', {}).get(attr) for attr in attrs} for file in file_list]
-    storage_file_dict = {file.get('name'): file for file in storage_file_list}
+    # names of the files in each folder of the export storage location
+    storage_file_names = {}
 
     # get file data saved in file info Json
     file_versions = []
     for file in file_info_json.get('files', []):
         versions = file.get('version', [])
-        file_path = file.get('materialized_path')
+        materialized_path = file.get('materialized_path')
         for version in versions:
             size = version.get('size')
             metadata = version.get('metadata')
@@ -467,18 +643,30 @@ def check_for_file_existent_on_export_location(
             file_name = metadata.get('sha256', metadata.get('md5'))
             version_name = version.get('version_name')
             version_id = version.get('identifier')
+            # the contents reused by an incremental export are in the folder of a previous export
+            stored_in = version.get('stored_in')
+            files_path = f'/{stored_in}/files/' if stored_in else file_path
+            if files_path not in storage_file_names:
+                # Get list file in export storage location
+                file_list = get_files_in_path(node_id, provider, files_path, cookies,
+                                              location_id=location_id, cookie=cookie)
+                storage_file_names[files_path] = {file.get('attributes', {}).get('name') for file in file_list}
             file_versions.append({
-                'path': file_path,
+                'path': materialized_path,
                 'name': file_name,
+                'files_path': files_path,
                 'version_name': version_name,
                 'version_id': version_id,
                 'size': size
             })
 
+    if file_path in storage_file_names and not storage_file_names[file_path]:
+        return None
+
     # compare file_list with file_versions
     list_file_ng = []
     for file in file_versions:
-        if not storage_file_dict.get(file['name']):
+        if file['name'] not in storage_file_names[file['files_path']]:
             ng_content = {
                 'path': file['path'],
                 'size': file['size'],
@@ -766,10 +954,22 @@ def copy_file_from_location_to_destination(
                 destination_node_id, destination_provider, created_folder_path, path, cookies,
                 callback_log=True, base_url=base_url, **kwargs)
             if response_body is not None:
-                created_folder_path = response_body['data']['attributes']['path']
-                created_folder_materialized_path = response_body['data']['attributes']['materialized']
+                folder_info = response_body['data']
+            elif status_code == http_status.HTTP_409_CONFLICT:
+                # the folder has been created by another restore worker at the same time
+                file_list = get_files_in_path(destination_node_id, destination_provider, created_folder_path, cookies,
+                                              base_url=base_url,
+                                              get_file_info=True,
+                                              **kwargs)
+                folder_info = next((item for item in file_list if
+                                    item['attributes']['materialized'] == f'{created_folder_materialized_path}{path}/'),
+                                   None)
+                if folder_info is None:
+                    return None
             else:
                 return None
+            created_folder_path = folder_info['attributes']['path']
+            created_folder_materialized_path = folder_info['attributes']['materialized']
 
     # Call API to copy file from location storage to destination storage
     copy_response_body = copy_file_to_other_storage(export_data, destination_node_id, destination_provider, location_file_path,
@@ -1,15 +1,19 @@
 ﻿# -*- coding: utf-8 -*-
 import copy
 import inspect  # noqa
+import itertools
 import logging
 import os
 import time
 import traceback
+from collections import OrderedDict
+from concurrent import futures
 from celery import states
 from celery.contrib.abortable import AbortableAsyncResult, ABORTED
 from celery.exceptions import Ignore, CeleryError
 from celery.result import AsyncResult
 from django.db import IntegrityError, transaction
+from django.db.models import Max
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from rest_framework import authentication as drf_authentication
@@ -21,8 +25,10 @@ from rest_framework.views import APIView
 from requests.exceptions import ReadTimeout, ConnectionError
 
 from addons.osfstorage.models import Region
+from admin.base import settings as admin_settings
 from admin.rdm_custom_storage_location import tasks
-from osf.models import Institution, ExportDataLocation, ExportData
+from admin.rdm_custom_storage_location.export_data import copy_strategy
+from osf.models import Institution, ExportDataLocation, ExportData, ExportDataJournal
 from website.util import inspect_info  # noqa
 from .location import ExportStorageLocationViewBaseView
 from ..utils import write_json_file
@@ -35,6 +41,7 @@ TASK_NO_WORKING_STATES = [
     states.IGNORED,
     states.REJECTED,
 ]
+EXPORT_DATA_RESUMABLE = [ExportData.STATUS_RUNNING, ExportData.STATUS_ERROR]
 MSG_EXPORT_DENY_PERM_INST = f'Permission denied for this institution'
 MSG_EXPORT_DENY_PERM_STORAGE = f'Permission denied for this storage'
 MSG_EXPORT_DENY_PERM_LOCATION = f'Permission denied for this export storage location'
@@ -43,6 +50,7 @@ MSG_EXPORT_ABORTED = f'The export data process is aborted'
 MSG_EXPORT_REMOVED = f'The export data process is removed'
 MSG_EXPORT_UNSTOPPABLE = f'Cannot stop this export process'
 MSG_EXPORT_UNABORTABLE = f'Cannot abort this export process'
+MSG_EXPORT_UNRESUMABLE = f'Cannot resume this export process'
 MSG_EXPORT_DENY_PERM = f'Permission denied for this export process'
 MSG_EXPORT_COMPLETED = f'The data export process is successfully completed'
 MSG_EXPORT_STOPPED = f'The data export process is successfully stopped'
@@ -174,8 +182,10 @@ class ExportDataActionView(ExportDataBaseActionView):
         # create a new task
         cookies = request.COOKIES
         cookie = request.user.get_or_create_cookie().decode()
+        # an incremental export reuses the contents exported to this location before
+        is_incremental = str(request.data.get('is_incremental', '')).lower() in ('1', 'true', 'on')
         task = tasks.run_export_data_process.delay(
-            cookies, export_data.id, location.id, source_storage.id, cookie=cookie)
+            cookies, export_data.id, location.id, source_storage.id, cookie=cookie, is_incremental=is_incremental)
         # try to replace by the exporting task
         export_data_set = ExportData.objects.filter(pk=export_data.id)
         export_data_set.update(
@@ -226,6 +236,10 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
     logger.debug('----{}:{}::{} from {}:{}::{}'.format(*inspect_info(inspect.currentframe(), inspect.stack())))
     _start_time = time.time()
     task_id = task.request.id
+    # a resumed process finds the folders and files created by the previous one
+    is_resume = kwargs.pop('is_resume', False)
+    is_incremental = kwargs.pop('is_incremental', False)
+    created_status = [201, 409] if is_resume else [201]
     try:
         # [Important] check process status before each step
         _prev_time = check_export_data_process_status(
@@ -243,9 +257,19 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
         _prev_time = check_export_data_process_status(
             _prev_time, task_id, export_data_id, location_id, source_id)
 
-        # extract file information
+        # extract file information to the temporary file
         _step_start_time = time.time()
-        export_data_json, file_info_json = export_data.extract_file_information_json_from_source_storage()
+        temp_file_path = export_data.export_data_temp_file_path
+        file_versions = []
+
+        def collect_file_versions(file_info):
+            file_versions.extend(export_data.get_source_file_versions_min({'files': [file_info]}))
+            return file_info
+
+        with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
+            export_data_json = export_data.write_file_information_json(temp_file, collect_file_versions)
+        if export_data_json is None:
+            raise ExportDataTaskException(MSG_EXPORT_NOT_EXIST_INPUT)
         logger.info(f'Extracted file information.'
                     f' ({time.time() - _step_start_time}s)')
 
@@ -257,22 +281,17 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
         logger.debug(f'creating export data process folder')
         _step_start_time = time.time()
         response = export_data.create_export_data_folder(cookies, **kwargs)
-        if not task.is_aborted() and response.status_code != 201:
+        if not task.is_aborted() and response.status_code not in created_status:
             raise ExportDataTaskException(MSG_EXPORT_FAILED_UPLOAD_TO_LOCATION)
         logger.info(f'Created \'{export_data.export_data_folder_path}\' folder path.'
                     f' ({time.time() - _step_start_time}s)')
 
-        # temporary file
-        temp_file_path = export_data.export_data_temp_file_path
-        logger.debug(f'created temporary file')
-
         if task.is_aborted():  # check before each steps
             raise ExportDataTaskException(MSG_EXPORT_ABORTED)
         # create files' information file
         logger.debug(f'creating files information file')
-        write_json_file(file_info_json, temp_file_path)
         response = export_data.upload_file_info_full_data_file(cookies, temp_file_path, **kwargs)
-        if not task.is_aborted() and response.status_code not in [201, 204]:
+        if not task.is_aborted() and response.status_code not in created_status + [204]:
             raise ExportDataTaskException(MSG_EXPORT_FAILED_UPLOAD_TO_LOCATION)
         logger.debug(f'created files information file')
 
@@ -286,7 +305,7 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
         logger.debug(f'creating files folder')
         _step_start_time = time.time()
         response = export_data.create_export_data_files_folder(cookies, **kwargs)
-        if not task.is_aborted() and response.status_code != 201:
+        if not task.is_aborted() and response.status_code not in created_status:
             raise ExportDataTaskException(MSG_EXPORT_FAILED_UPLOAD_TO_LOCATION)
         logger.info(f'Created \'{export_data.export_data_files_folder_path}\' folder path.'
                     f' ({time.time() - _step_start_time}s)')
@@ -295,61 +314,16 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
         _prev_time = check_export_data_process_status(
             _prev_time, task_id, export_data_id, location_id, source_id)
 
-        logger.debug(f'prepare list of file versions data to upload')
-        _step_start_time = time.time()
-        file_versions = export_data.get_source_file_versions_min(file_info_json)
         _length = len(file_versions)
-        logger.info(f'There is {_length} file versions needed to upload to the export storage destination.'
-                    f' ({time.time() - _step_start_time}s)')
+        logger.info(f'There is {_length} file versions needed to upload to the export storage destination.')
 
         # upload file versions
         logger.debug(f'upload file versions')
         _step_start_time = time.time()
-        # cached the filename in hash value
-        created_filename_list = []
-        files_versions_not_found = {}
-        for index, file in enumerate(file_versions):
-            project_id, provider, file_path, version, file_name, file_id = file
-            logger.debug(f'[{1 + index}/{_length}] file: '
-                         f'projects/{project_id}/providers/{provider}/files/{file_id}/versions/{version}/'
-                         f'?hash={file_name}&path={file_path}')
-
-            # prevent uploading duplicate file_name in hash value
-            if file_name in created_filename_list:
-                logger.debug(f'Ignore uploaded file')
-                continue
-
-            # [Important] check process status before each step
-            _prev_time = check_export_data_process_status(
-                _prev_time, task_id, export_data_id, location_id, source_id)
-
-            _up_file_start_time = time.time()
-            kwargs.update({'version': version})
-            # copy data file from source storage to location storage
-
-            try:
-                response = export_data.copy_export_data_file_to_location(
-                    cookies, project_id, provider, file_path, file_name, **kwargs)
-                # 201: created -> update cache list
-                if response.status_code == 201:
-                    created_filename_list.append(file_name)
-                    logger.debug(f'Upload file successfully.'
-                                 f' ({time.time() - _up_file_start_time}s)')
-                else:
-                    if file_id not in files_versions_not_found:
-                        files_versions_not_found[file_id] = [version]
-                    else:
-                        files_versions_not_found[file_id].append(version)
-                    logger.debug(f'File upload failed.'
-                                 f' ({time.time() - _up_file_start_time}s)')
-                    continue
-            except (ReadTimeout, ConnectionError):
-                logger.error(f'Timeout exception occurs. Add file_id to list failed files. file_id: {file_id}')
-                if file_id not in files_versions_not_found:
-                    files_versions_not_found[file_id] = [version]
-                else:
-                    files_versions_not_found[file_id].append(version)
-                continue
+        _prev_time = copy_export_data_files(
+            task, cookies, export_data, file_versions, _prev_time, location_id, source_id,
+            is_incremental=is_incremental, **kwargs)
+        files_versions_not_found = get_failed_file_versions(export_data)
         logger.info(f'Have gone through the entire list of file versions.'
                     f' ({time.time() - _step_start_time}s)')
 
@@ -357,29 +331,40 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
         _prev_time = check_export_data_process_status(
             _prev_time, task_id, export_data_id, location_id, source_id)
 
-        # Separate the failed file list from the file_info_json
-        logger.debug('Separate the failed file list from the file_info_json')
-        _step_start_time = time.time()
-        files = file_info_json.get('files', [])
-        files_not_found, sub_size, sub_files_numb = separate_failed_files(files, files_versions_not_found)
-        export_data_json['size'] -= sub_size
-        export_data_json['files_numb'] -= sub_files_numb
-        logger.info(f'Separated the failed file list from the file_info_json.')
-        logger.info(f'Uploaded {_length - sub_files_numb}/{_length} file versions.'
-                    f' Failed {sub_files_numb} file versions.'
-                    f' ({time.time() - _step_start_time}s)')
-
-        # [Important] check process status before each step
-        _prev_time = check_export_data_process_status(
-            _prev_time, task_id, export_data_id, location_id, source_id)
-
-        # temporary file
-        # temp_file_path = export_data.export_data_temp_file_path
-
-        # create files' information JSON file
+        # create files' information JSON file without the failed file versions
         logger.debug(f'creating files information JSON file')
         _step_start_time = time.time()
-        write_json_file(file_info_json, temp_file_path)
+        # files added after the extraction are not exported
+        exported_versions = {(file_id, version) for _, _, _, version, _, file_id, _ in file_versions}
+        stored_in_folders = get_stored_in_folders(export_data)
+        files_not_found = []
+
+        def separate_failed_file_versions(file_info):
+            file_id = file_info['id']
+            file_info['version'] = [
+                version for version in file_info['version']
+                if (file_id, version['identifier']) in exported_versions
+            ]
+            if not file_info['version']:
+                return None
+            # the contents reused from previous exports are in their folders
+            for version in file_info['version']:
+                metadata = version.get('metadata', {})
+                stored_in = stored_in_folders.get(metadata.get('sha256', metadata.get('md5')))
+                if stored_in:
+                    version['stored_in'] = stored_in
+            files = [file_info]
+            failed_files, _, _ = separate_failed_files(files, {file_id: files_versions_not_found.get(file_id, [])})
+            files_not_found.extend(failed_files)
+            return files[0] if files else None
+
+        with open(temp_file_path, 'w', encoding='utf-8') as temp_file:
+            export_data_json = export_data.write_file_information_json(temp_file, separate_failed_file_versions)
+        if export_data_json is None:
+            raise ExportDataTaskException(MSG_EXPORT_NOT_EXIST_INPUT)
+        sub_files_numb = sum(len(file.get('version', [])) for file in files_not_found)
+        logger.info(f'Uploaded {_length - sub_files_numb}/{_length} file versions.'
+                    f' Failed {sub_files_numb} file versions.')
         response = export_data.upload_file_info_file(cookies, temp_file_path, **kwargs)
         if not task.is_aborted() and response.status_code not in [201, 204]:
             raise ExportDataTaskException(MSG_EXPORT_FAILED_UPLOAD_TO_LOCATION)
@@ -444,6 +429,172 @@ def export_data_process(task, cookies, export_data_id, location_id, source_id, *
             task, cookies, export_data_id, location_id, source_id, **kwargs)
 
 
+def group_file_versions_by_hash(file_versions):
+    """Return {file_name: [file version, ...]} in the order of ``file_versions``.
+
+    All the file versions of a group have the same content, only one of them is copied.
+    """
+    groups = OrderedDict()
+    for file in file_versions:
+        file_name = file[4]
+        groups.setdefault(file_name or '', []).append(file)
+    return groups
+
+
+def get_exported_objects(export_data, file_names):
+    """Return {file_name: id of the export data whose folder holds it} of the contents
+    already copied to the same location by the completed export processes"""
+    exported = {}
+    file_names = [file_name for file_name in file_names if file_name]
+    chunk_size = admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE
+    for start in range(0, len(file_names), chunk_size):
+        journal = ExportDataJournal.objects.filter(
+            export_data__location_id=export_data.location_id,
+            export_data__status=ExportData.STATUS_COMPLETED,
+            export_data__is_deleted=False,
+            status=ExportDataJournal.STATUS_DONE,
+            file_name__in=file_names[start:start + chunk_size],
+        ).exclude(export_data=export_data).values_list('file_name', 'export_data_id', 'stored_in_id')
+        for file_name, export_data_id, stored_in_id in journal.iterator():
+            exported.setdefault(file_name, stored_in_id or export_data_id)
+    return exported
+
+
+def prepare_export_data_journal(export_data, file_names, is_incremental=False):
+    """Add the missing journal entries and return the set of file names already copied.
+
+    With ``is_incremental``, the contents already exported to the same location
+    are not copied again, their entries refer to the export data holding them.
+    """
+    copied = set()
+    journaled = set()
+    journal = ExportDataJournal.objects.filter(export_data=export_data).values_list('file_name', 'status')
+    for file_name, journal_status in journal.iterator():
+        journaled.add(file_name)
+        if journal_status == ExportDataJournal.STATUS_DONE:
+            copied.add(file_name)
+    file_names = [file_name for file_name in file_names if file_name not in journaled]
+    exported = get_exported_objects(export_data, file_names) if is_incremental else {}
+    ExportDataJournal.objects.bulk_create([
+        ExportDataJournal(
+            export_data=export_data, file_name=file_name,
+            status=ExportDataJournal.STATUS_DONE if file_name in exported else ExportDataJournal.STATUS_PENDING,
+            stored_in_id=exported.get(file_name))
+        for file_name in file_names
+    ], batch_size=1000)
+    copied.update(exported)
+    return copied
+
+
+def get_stored_in_folders(export_data):
+    """Return {file_name: export data folder name} of the contents reused from previous exports"""
+    folders = {}
+    folder_names = {}
+    journal = ExportDataJournal.objects.filter(
+        export_data=export_data, stored_in__isnull=False).values_list('file_name', 'stored_in_id')
+    for file_name, stored_in_id in journal.iterator():
+        if stored_in_id not in folder_names:
+            folder_names[stored_in_id] = ExportData.objects.get(pk=stored_in_id).export_data_folder_name
+        folders[file_name] = folder_names[stored_in_id]
+    return folders
+
+
+def copy_export_data_file_versions(export_data, cookies, file_versions, server_side_copy=None, **kwargs):
+    """Copy the first file version of ``file_versions`` that can be copied.
+
+    The version is copied by the storage service when ``server_side_copy`` is
+    given and the version is in the same service, otherwise by WaterButler.
+    Run in a worker thread, so it must not query the database.
+    Return (is_copied, failures), failures is the list of [file_id, version] that failed.
+    """
+    failures = []
+    for project_id, provider, file_path, version, file_name, file_id, location in file_versions:
+        _up_file_start_time = time.time()
+        if server_side_copy is not None and server_side_copy.copy_file_version(
+                location, export_data.get_data_file_file_path(file_name)):
+            logger.debug(f'Copy file in the storage successfully.'
+                         f' ({time.time() - _up_file_start_time}s)')
+            return True, failures
+        try:
+            response = export_data.copy_export_data_file_to_location(
+                cookies, project_id, provider, file_path, file_name, **dict(kwargs, version=version))
+        except (ReadTimeout, ConnectionError):
+            logger.error(f'Timeout exception occurs. Add file_id to list failed files. file_id: {file_id}')
+            failures.append([file_id, version])
+            continue
+        # 201: created
+        if response.status_code == 201:
+            logger.debug(f'Upload file successfully.'
+                         f' ({time.time() - _up_file_start_time}s)')
+            return True, failures
+        failures.append([file_id, version])
+        logger.debug(f'File upload failed.'
+                     f' ({time.time() - _up_file_start_time}s)')
+    return False, failures
+
+
+def copy_export_data_files(task, cookies, export_data, file_versions, _prev_time, location_id, source_id,
+                           is_incremental=False, **kwargs):
+    """Copy file versions to the export storage location, EXPORT_DATA_COPY_CONCURRENCY at a time.
+
+    Each copied content is checkpointed in the journal, the contents already
+    copied by a previous run of this export process are skipped, as well as the
+    contents of the previous exports to the same location for an incremental export.
+    """
+    task_id = task.request.id
+    groups = group_file_versions_by_hash(file_versions)
+    copied = prepare_export_data_journal(export_data, groups.keys(), is_incremental=is_incremental)
+    _length = len(groups)
+    logger.info(f'{len(copied)}/{_length} file contents are already uploaded.')
+    pending = (
+        (index, file_name, versions)
+        for index, (file_name, versions) in enumerate(groups.items(), 1) if file_name not in copied
+    )
+
+    # load related objects before starting the worker threads
+    export_data.source, export_data.location
+    server_side_copy = copy_strategy.get_server_side_copy(export_data)
+    if server_side_copy is not None:
+        logger.info(f'File contents are copied inside the {server_side_copy.destination.provider} storage service.')
+
+    concurrency = max(1, admin_settings.EXPORT_DATA_COPY_CONCURRENCY)
+    running = {}
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for index, file_name, versions in itertools.islice(pending, concurrency - len(running)):
+                logger.debug(f'[{index}/{_length}] file: {file_name}')
+                future = executor.submit(
+                    copy_export_data_file_versions, export_data, cookies, versions,
+                    server_side_copy=server_side_copy, **kwargs)
+                running[future] = file_name
+            if not running:
+                break
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                file_name = running.pop(future)
+                is_copied, failures = future.result()
+                ExportDataJournal.objects.filter(export_data=export_data, file_name=file_name).update(
+                    status=ExportDataJournal.STATUS_DONE if is_copied else ExportDataJournal.STATUS_FAILED,
+                    failures=failures,
+                    modified=timezone.now(),
+                )
+
+            # [Important] check process status before each step
+            _prev_time = check_export_data_process_status(
+                _prev_time, task_id, export_data.id, location_id, source_id)
+    return _prev_time
+
+
+def get_failed_file_versions(export_data):
+    """Return {file_id: [version, ...]} of the file versions that could not be copied"""
+    files_versions_not_found = {}
+    journal = ExportDataJournal.objects.filter(export_data=export_data).exclude(failures=[]).order_by('id')
+    for failures in journal.values_list('failures', flat=True).iterator():
+        for file_id, version in failures:
+            files_versions_not_found.setdefault(file_id, []).append(version)
+    return files_versions_not_found
+
+
 def separate_failed_files(files, files_versions_not_found):
     files_not_found = []
     for file_id, ver_ids in files_versions_not_found.items():
@@ -547,6 +698,68 @@ class StopExportDataActionView(ExportDataBaseActionView):
         }, status=status.HTTP_200_OK)
 
 
+def get_export_data_last_activity(export_data):
+    """Return the last time the export process saved its progress"""
+    last_copy = ExportDataJournal.objects.filter(export_data=export_data).aggregate(last=Max('modified'))['last']
+    return max(export_data.modified, last_copy) if last_copy else export_data.modified
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class ResumeExportDataActionView(ExportDataBaseActionView):
+
+    def post(self, request, **kwargs):
+        input_set = self.extract_input(request)
+        if isinstance(input_set, Response):
+            return input_set
+        institution, source_storage, location = input_set
+
+        task_id = request.data.get('task_id')
+
+        # get corresponding export data record
+        export_data_set = ExportData.objects.filter(source=source_storage, location=location, task_id=task_id)
+        if not task_id or not export_data_set.exists():
+            return Response({
+                'task_id': task_id,
+                'message': MSG_EXPORT_NOT_EXIST_INPUT
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        export_data = export_data_set.first()
+        export_data_task = AbortableAsyncResult(task_id)
+        # a running process can only be resumed when its worker is gone
+        is_stale = (timezone.now() - get_export_data_last_activity(export_data)).total_seconds() \
+            > admin_settings.EXPORT_DATA_RESUME_STALE_TIME
+        if (export_data.status not in EXPORT_DATA_RESUMABLE
+                or (export_data_task.state not in TASK_NO_WORKING_STATES and not is_stale)):
+            return Response({
+                'task_id': task_id,
+                'task_state': export_data_task.state,
+                'status': export_data.status,
+                'message': MSG_EXPORT_UNRESUMABLE
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if export_data_task.state not in TASK_NO_WORKING_STATES:
+            # stop the stale process before the new one copies the same files;
+            # an aborted process would roll back the export it shares
+            export_data_task.revoke(terminate=True)
+
+        # continue the export process from its journal
+        cookie = request.user.get_or_create_cookie().decode()
+        cookies = request.COOKIES
+        task = tasks.run_export_data_process.delay(
+            cookies, export_data.id, location.id, source_storage.id, cookie=cookie, is_resume=True)
+
+        # try to replace by the resuming task
+        export_data_set.update(task_id=task.task_id)
+        export_data = ExportData.objects.get(pk=export_data.id)
+
+        return Response({
+            'task_id': task.task_id,
+            'task_state': task.state,
+            'result': get_task_result(task.result),
+            'status': export_data.status,
+        }, status=status.HTTP_200_OK)
+
+
 def export_data_rollback_process(task, cookies, export_data_id, location_id, source_id, **kwargs):
     logger.debug('----{}:{}::{} from {}:{}::{}'.format(*inspect_info(inspect.currentframe(), inspect.stack())))
     _start_time = time.time()
@@ -597,6 +810,8 @@ def export_data_rollback_process(task, cookies, export_data_id, location_id, sou
             _msg = MSG_EXPORT_STOPPED
             logger.info(f'Deleted \'{export_data.export_data_folder_path}\' folder path.'
                         f' ({time.time() - _step_start_time}s)')
+            # the copied files are gone, a resumed process has to copy them again
+            ExportDataJournal.objects.filter(export_data_id=export_data_id).delete()
 
         if is_rollback:
             # ExportData.STATUS_ERROR is expected
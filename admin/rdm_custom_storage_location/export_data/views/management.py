@@ -4,6 +4,7 @@ import datetime
 import inspect  # noqa
 import logging
 
+import jsonschema
 from django.db import transaction
 from django.http import HttpResponse, Http404, JsonResponse
 from django.shortcuts import render, redirect
@@ -12,14 +13,17 @@ from django.views import View
 from django.urls import reverse
 from django.views.generic import ListView
 
+from admin.base import settings as admin_settings
 from admin.rdm.utils import RdmPermissionMixin
 from admin.rdm_custom_storage_location.export_data.utils import (
+    FileInfoReader,
     process_data_information,
+    iter_file_versions,
     validate_exported_data,
     count_files_ng_ok,
     check_for_file_existent_on_export_location,
 )
-from osf.models import ExportData, Institution, ExportDataLocation, ExportDataRestore
+from osf.models import ExportData, ExportDataJournal, Institution, ExportDataLocation, ExportDataRestore
 from website.util import inspect_info  # noqa
 from .location import ExportStorageLocationViewBaseView
 from addons.osfstorage.models import Region
@@ -380,7 +384,15 @@ class DeleteExportDataView(ExportStorageLocationViewBaseView, View):
         # Delete export data
         check_delete_permanently = True if request.POST.get('delete_permanently') == 'on' else False
         if check_delete_permanently:
-            for item in ExportData.objects.filter(id__in=list_export_data_delete, is_deleted=True):
+            # the newest first, as incremental exports use the files of older ones
+            items = ExportData.objects.filter(id__in=list_export_data_delete, is_deleted=True)
+            item_ids = [item.id for item in items]
+            # nothing is deleted if the files of one of them are still used,
+            # ExportDataJournal.stored_in does not protect them
+            if ExportDataJournal.objects.filter(stored_in__in=item_ids).exclude(export_data__in=item_ids).exists():
+                message = 'The export data files are used by other export data.'
+                return render_bad_request_response(request=request, error_msgs=message)
+            for item in sorted(items, key=lambda export_data: export_data.process_start, reverse=True):
                 response = item.delete_export_data_folder(cookies, cookie=cookie)
                 if response.status_code == 204:
                     item.delete()
@@ -650,9 +662,9 @@ class CheckExportData(RdmPermissionMixin, UserPassesTestMixin, View):
 
             # Get data from current source storage
             _, storage_file_info = self.export_data.extract_file_information_json_from_source_storage()
-            exported_file_versions = process_data_information(exported_file_info['files'])
-            storage_file_versions = process_data_information(storage_file_info['files'])
-            exclude_keys = []
+            exported_file_versions = iter_file_versions(exported_file_info['files'])
+            storage_file_versions = iter_file_versions(storage_file_info['files'])
+            exclude_keys = ['stored_in']
             data = count_files_ng_ok(exported_file_versions, storage_file_versions, exclude_keys=exclude_keys)
 
             # check file exist in Export location storage
@@ -663,8 +675,9 @@ class CheckExportData(RdmPermissionMixin, UserPassesTestMixin, View):
             file_list = check_for_file_existent_on_export_location(
                 exported_file_info, node_id, provider, file_path, location_id, cookies, cookie)
             file_fails_list = data.get('list_file_ng') + file_list
+            ng_paths = {d['path'] for d in data.get('list_file_ng')}
             for file in file_list:
-                if not any(d['path'] == file['path'] for d in data.get('list_file_ng')):
+                if file['path'] not in ng_paths:
                     data['ng'] += 1
                     data['ok'] -= 1
             data['list_file_ng'] = file_fails_list
@@ -749,25 +762,26 @@ class CheckRestoreData(RdmPermissionMixin, UserPassesTestMixin, View):
         restore_data.save()
 
         try:
-            # get file information exported
+            # get file information exported, read and validated one file at a time
             response = restore_data.export.read_file_info_from_location(cookies, cookie=cookie)
             if response.status_code != 200:
                 message = 'Cannot connect to the export data storage location.'
                 return JsonResponse({'message': message}, status=400)
-            exported_file_info = response.json()
-            check = validate_exported_data(exported_file_info)
-            if not check:
-                message = 'The export data files are corrupted.'
-                return JsonResponse({'message': message}, status=400)
+            exported_file_info = FileInfoReader(
+                response.iter_content(chunk_size=admin_settings.EXPORT_DATA_FILE_INFO_READ_CHUNK_SIZE))
 
             # Get data from current destination storage
-            _, storage_file_info = restore_data.extract_file_information_json_from_destination_storage()
-            exported_file_versions = process_data_information(exported_file_info['files'])
-            storage_file_versions = process_data_information(storage_file_info['files'])
-            exclude_keys = ['location']
+            storage_file_nodes = restore_data.get_destination_file_nodes(restore_data.get_destination_institution())
+            exported_file_versions = iter_file_versions(exported_file_info.iter_files())
+            storage_file_versions = iter_file_versions(restore_data.iter_file_information(storage_file_nodes))
+            exclude_keys = ['location', 'stored_in']
             data = count_files_ng_ok(exported_file_versions, storage_file_versions, exclude_keys=exclude_keys)
 
             return JsonResponse(data, status=200)
+        except (ValueError, jsonschema.ValidationError) as e:
+            logger.error(f'Invalid file information: {e}')
+            message = 'The export data files are corrupted.'
+            return JsonResponse({'message': message}, status=400)
         except Exception:
             message = 'Cannot connect to the export data storage location.'
             return JsonResponse({'message': message}, status=400)
@@ -2,14 +2,18 @@
 from __future__ import absolute_import
 
 import inspect  # noqa
+import itertools
 import json
 import logging
+from collections import OrderedDict
+from concurrent import futures
 from functools import partial
 
+import jsonschema
 from celery.states import PENDING
 from celery.contrib.abortable import AbortableAsyncResult, ABORTED
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Max, Q
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from rest_framework import authentication as drf_authentication
@@ -18,11 +22,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from addons.osfstorage.models import Region, NodeSettings
+from admin.base import settings as admin_settings
 from admin.rdm.utils import RdmPermissionMixin
 from admin.rdm_custom_storage_location import tasks
 from admin.rdm_custom_storage_location.export_data import utils
 from admin.rdm_custom_storage_location.export_data.views import export
-from osf.models import ExportData, ExportDataRestore, BaseFileNode, Tag, RdmFileTimestamptokenVerifyResult, Institution, OSFUser, FileVersion, AbstractNode, \
+from osf.models import ExportData, ExportDataRestore, ExportDataRestoreJournal, BaseFileNode, Tag, RdmFileTimestamptokenVerifyResult, Institution, OSFUser, FileVersion, AbstractNode, \
     ProjectStorageType, UserQuota
 from framework.transactions.handlers import no_auto_transaction
 from website.util.quota import update_user_used_quota
@@ -113,15 +118,17 @@ class RestoreDataActionView(RdmPermissionMixin, UserPassesTestMixin, APIView):
                 return Response({'message': result.get('message')}, status=status.HTTP_400_BAD_REQUEST)
 
         # Start restore data task and return task id
-        source_storage_guid = self.export_data.source.guid
-        institution = Institution.load(source_storage_guid)
-        projects = institution.nodes.filter(type='osf.node', is_deleted=False)
-        projects__ids = []
-        for project in projects:
-            projects__ids.append(project._id)
+        projects__ids = get_institution_project_ids(self.export_data)
         return prepare_for_restore_export_data_process(cookies, self.export_id,
                                                         self.destination_id, projects__ids, creator, cookie=cookie)
 
+
+def get_institution_project_ids(export_data):
+    source_storage_guid = export_data.source.guid
+    institution = Institution.load(source_storage_guid)
+    projects = institution.nodes.filter(type='osf.node', is_deleted=False)
+    return [project._id for project in projects]
+
 def check_before_restore_export_data(cookies, export_id, destination_id, **kwargs):
     check_export_data = ExportData.objects.filter(id=export_id, is_deleted=False)
     # Check export file data: /export_{process_start}/export_data_{institution_guid}_{process_start}.json
@@ -147,9 +154,10 @@ def check_before_restore_export_data(cookies, export_id, destination_id, **kwarg
         return {'open_dialog': False, 'message': f'Cannot connect to the export data storage location'}
 
     # Get file info file: /export_{process_start}/file_info_{institution_guid}_{process_start}.json
+    # only the folders written before the files are read
     try:
-        export_data_json = read_file_info_and_check_schema(export_data=export_data, cookies=cookies, **kwargs)
-        export_data_folders = export_data_json.get('folders', [])
+        file_info_reader = read_file_info_stream_and_check_schema(export_data=export_data, cookies=cookies, **kwargs)
+        export_data_folders = file_info_reader.folders
     except Exception as e:
         logger.error(f'Exception: {e}')
         export_data.status = pre_status
@@ -217,6 +225,7 @@ def prepare_for_restore_export_data_process(cookies, export_id, destination_id,
 
 
 def restore_export_data_process(task, cookies, export_id, export_data_restore_id, list_project_id, **kwargs):
+    is_resume = kwargs.pop('is_resume', False)
     current_process_step = 0
     try:
         update_restore_process_state(task, current_process_step)
@@ -227,11 +236,13 @@ def restore_export_data_process(task, cookies, export_id, export_data_restore_id
 
         # Get file which have same information between export data and database
         # File info file: /export_{process_start}/file_info_{institution_guid}_{process_start}.json
-        export_data_json = read_file_info_and_check_schema(export_data=export_data, cookies=cookies, **kwargs)
-        export_data_files = export_data_json.get('files', [])
-        export_data_folders = export_data_json.get('folders', [])
+        # Files are read and validated one at a time while they are copied
+        file_info_reader = read_file_info_stream_and_check_schema(export_data=export_data, cookies=cookies, **kwargs)
+        export_data_folders = file_info_reader.folders
+        export_data_files = iter_file_info_files(file_info_reader)
+        first_file = next(export_data_files, None)
 
-        if len(export_data_files) == 0:
+        if first_file is None:
             export_data_restore.update(process_end=timezone.make_naive(timezone.now(), timezone.utc),
                                        status=ExportData.STATUS_COMPLETED)
             return {'message': 'Restore data successfully.'}
@@ -242,7 +253,9 @@ def restore_export_data_process(task, cookies, export_id, export_data_restore_id
 
         destination_region = export_data_restore.destination
         destination_provider = destination_region.provider_name
-        if utils.is_add_on_storage(destination_provider):
+        # the files were already moved to the backup folder by the interrupted run
+        is_resume = is_resume and ExportDataRestoreJournal.objects.filter(export_data_restore=export_data_restore).exists()
+        if utils.is_add_on_storage(destination_provider) and not is_resume:
             # Move all existing files/folders in destination to backup_{process_start} folder
             for project_id in list_project_id:
                 move_all_files_to_backup_folder(task, current_process_step, project_id, export_data_restore, cookies, **kwargs)
@@ -257,7 +270,7 @@ def restore_export_data_process(task, cookies, export_id, export_data_restore_id
         # Download files from export data, then upload files to destination. Returns list of created file node in DB
         list_created_file_nodes, list_file_restore_fail = copy_files_from_export_data_to_destination(
             task, current_process_step,
-            export_data_files, export_data_restore,
+            itertools.chain([first_file], export_data_files), export_data_restore,
             cookies, **kwargs)
 
         check_if_restore_process_stopped(task, current_process_step)
@@ -275,8 +288,8 @@ def restore_export_data_process(task, cookies, export_id, export_data_restore_id
         current_process_step = 4
         update_restore_process_state(task, current_process_step)
         institution_guid = ''
-        if export_data_json and 'institution' in export_data_json:
-            institution_guid = export_data_json.get('institution').get('guid')
+        if file_info_reader.institution:
+            institution_guid = file_info_reader.institution.get('guid')
         return {'message': 'Restore data successfully.', 'list_file_restore_fail': list_file_restore_fail,
                 'file_name_restore_fail': 'failed_files_restore_{}_{}.csv'.format(institution_guid, export_data.process_start_timestamp)}
     except Exception as e:
@@ -431,10 +444,49 @@ class StopRestoreDataActionView(RdmPermissionMixin, UserPassesTestMixin, APIView
         return Response({'task_id': process.task_id}, status=status.HTTP_200_OK)
 
 
+def get_restore_last_activity(export_data_restore):
+    """Return the last time the restore process saved its progress"""
+    last_copy = ExportDataRestoreJournal.objects.filter(
+        export_data_restore=export_data_restore).aggregate(last=Max('modified'))['last']
+    return max(export_data_restore.modified, last_copy) if last_copy else export_data_restore.modified
+
+
+@no_auto_transaction
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class ResumeRestoreDataActionView(StopRestoreDataActionView):
+
+    def post(self, request, *args, **kwargs):
+        cookie = request.user.get_or_create_cookie().decode()
+        cookies = request.COOKIES
+
+        task = AbortableAsyncResult(self.task_id)
+        # a running process can only be resumed when its worker is gone
+        is_stale = (timezone.now() - get_restore_last_activity(self.export_data_restore)).total_seconds() \
+            > admin_settings.EXPORT_DATA_RESUME_STALE_TIME
+        if (self.export_data_restore.status != ExportData.STATUS_RUNNING
+                or (task.state not in export.TASK_NO_WORKING_STATES and not is_stale)):
+            return Response({'message': f'Cannot resume restore process at this time.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if task.state not in export.TASK_NO_WORKING_STATES:
+            # stop the stale process before the new one restores the same files
+            task.revoke(terminate=True)
+
+        # continue the restore process from its journal
+        export_data = self.export_data_restore.export
+        process = tasks.run_restore_export_data_process.delay(
+            cookies, export_data.id, self.export_data_restore.pk, get_institution_project_ids(export_data),
+            cookie=cookie, is_resume=True)
+        self.export_data_restore.update(task_id=process.task_id)
+        return Response({'task_id': process.task_id}, status=status.HTTP_200_OK)
+
+
 def restore_export_data_rollback_process(task, cookies, export_id,
                                           export_data_restore_id, process_step, **kwargs):
     export_data_restore = ExportDataRestore.objects.get(pk=export_data_restore_id)
     export_data_restore.update(task_id=task.request.id)
+    # the restored files are rolled back, nothing is left to resume
+    ExportDataRestoreJournal.objects.filter(export_data_restore=export_data_restore).delete()
 
     destination_provider = export_data_restore.destination.provider_name
     if process_step == 0 or not utils.is_add_on_storage(destination_provider):
@@ -447,16 +499,15 @@ def restore_export_data_rollback_process(task, cookies, export_id,
         with transaction.atomic():
             export_data = ExportData.objects.filter(id=export_id, is_deleted=False)[0]
             # File info file: /export_{process_start}/file_info_{institution_guid}_{process_start}.json
-            file_info_json = read_file_info_and_check_schema(export_data, cookies, **kwargs)
-            if file_info_json is None:
-                raise ProcessError(f'Cannot get file information list')
-            file_info_files = file_info_json.get('files', [])
+            # only the first file is read
+            file_info_reader = read_file_info_stream_and_check_schema(export_data, cookies, **kwargs)
+            first_file = next(iter_file_info_files(file_info_reader), None)
 
-            if len(file_info_files) == 0:
+            if first_file is None:
                 export_data_restore.update(process_end=timezone.make_naive(timezone.now(), timezone.utc),
                                            status=ExportData.STATUS_STOPPED)
                 return {'message': 'Stop restore data successfully.'}
-            destination_first_project_id = file_info_files[0].get('project', {}).get('id')
+            destination_first_project_id = first_file.get('project', {}).get('id')
 
             location_id = export_data.location.id
             # Delete files, except the backup folder.
@@ -550,13 +601,24 @@ def add_timestamp_to_file_node(file_node, project_id, timestamp):
         verify_data = RdmFileTimestamptokenVerifyResult.objects.get(
             file_id=file_node._id)
     except RdmFileTimestamptokenVerifyResult.DoesNotExist:
-        verify_data = RdmFileTimestamptokenVerifyResult()
-        verify_data.file_id = file_node._id
-        verify_data.project_id = timestamp.get('project_id', project_id)
-        verify_data.provider = timestamp.get('provider', file_node.provider)
+        verify_data = new_verify_result(file_node, project_id, timestamp)
 
+    update_verify_result(verify_data, file_node, timestamp, timestamp_obj)
+    verify_data.save()
+
+
+def new_verify_result(file_node, project_id, timestamp):
+    verify_data = RdmFileTimestamptokenVerifyResult()
+    verify_data.file_id = file_node._id
+    verify_data.project_id = timestamp.get('project_id', project_id)
+    verify_data.provider = timestamp.get('provider', file_node.provider)
+    return verify_data
+
+
+def update_verify_result(verify_data, file_node, timestamp, timestamp_obj):
     if timestamp_obj:
         verify_data.timestamp_token = timestamp_obj.timestamp_token
+        verify_data.timestamp_proof = timestamp_obj.timestamp_proof
         verify_data.verify_date = timestamp_obj.verify_date
         verify_data.verify_file_modified_at = timestamp_obj.verify_file_modified_at
         verify_data.upload_file_created_at = timestamp_obj.upload_file_created_at
@@ -570,7 +632,65 @@ def add_timestamp_to_file_node(file_node, project_id, timestamp):
     verify_data.upload_file_size = timestamp.get('upload_file_size', None)
     verify_data.verify_file_size = timestamp.get('verify_file_size', None)
     verify_data.verify_user = timestamp.get('verify_user', None)
-    verify_data.save()
+
+
+def add_tags_to_file_nodes(list_created_file_nodes):
+    """Add the tags of the restored file nodes with one query per step instead of per tag"""
+    node_tag_names = {}
+    for item in list_created_file_nodes:
+        node = item.get('node')
+        if node and item.get('file_tags'):
+            node_tag_names.setdefault(node.id, set()).update(item.get('file_tags'))
+    if not node_tag_names:
+        return
+
+    tag_names = set().union(*node_tag_names.values())
+    tag_ids = dict(Tag.all_tags.filter(system=False, name__in=tag_names).values_list('name', 'id'))
+    new_tags = [Tag(name=name) for name in tag_names if name not in tag_ids]
+    Tag.all_tags.bulk_create(new_tags)
+    tag_ids.update((tag.name, tag.id) for tag in new_tags)
+
+    through_model = BaseFileNode.tags.through
+    existing = set(through_model.objects.filter(
+        basefilenode_id__in=node_tag_names.keys(),
+    ).values_list('basefilenode_id', 'tag_id'))
+    through_model.objects.bulk_create([
+        through_model(basefilenode_id=node_id, tag_id=tag_ids[name])
+        for node_id, names in node_tag_names.items()
+        for name in names if (node_id, tag_ids[name]) not in existing
+    ], batch_size=admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE)
+
+
+def add_timestamps_to_file_nodes(list_created_file_nodes):
+    """Add the timestamps of the restored file nodes, the new ones with a single insert"""
+    items = [
+        item for item in list_created_file_nodes
+        if item.get('node') and item.get('project_id') and item.get('file_timestamp')
+    ]
+    if not items:
+        return
+
+    timestamp_ids = [item['file_timestamp'].get('timestamp_id') for item in items]
+    timestamp_objs = RdmFileTimestamptokenVerifyResult.objects.in_bulk(
+        [timestamp_id for timestamp_id in timestamp_ids if timestamp_id is not None])
+    verify_results = {
+        verify_data.file_id: verify_data
+        for verify_data in RdmFileTimestamptokenVerifyResult.objects.filter(
+            file_id__in=[item['node']._id for item in items])
+    }
+    new_verify_results = {}
+    for item in items:
+        node = item['node']
+        timestamp = item['file_timestamp']
+        verify_data = verify_results.get(node._id) or new_verify_results.get(node._id)
+        if verify_data is None:
+            verify_data = new_verify_result(node, item['project_id'], timestamp)
+            new_verify_results[node._id] = verify_data
+        update_verify_result(verify_data, node, timestamp, timestamp_objs.get(timestamp.get('timestamp_id')))
+        if node._id in verify_results:
+            verify_data.save()
+    RdmFileTimestamptokenVerifyResult.objects.bulk_create(
+        new_verify_results.values(), batch_size=admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE)
 
 
 def read_export_data_and_check_schema(export_data, cookies, **kwargs):
@@ -590,24 +710,30 @@ def read_export_data_and_check_schema(export_data, cookies, **kwargs):
     return utils.validate_file_json(response_file_json, 'export-data-schema.json')
 
 
-def read_file_info_and_check_schema(export_data, cookies, **kwargs):
-    # Get file info file: /export_{process_start}/file_info_{institution_guid}_{process_start}.json
+def read_file_info_stream_and_check_schema(export_data, cookies, **kwargs):
+    # Open file info file: /export_{process_start}/file_info_{institution_guid}_{process_start}.json
     try:
         response = export_data.read_file_info_from_location(cookies, **kwargs)
         if response.status_code != status.HTTP_200_OK:
             raise ProcessError(f'Cannot get file information list')
-        response_body = response.content
-        response_file_content = response_body.decode('utf-8')
-        response_file_json = json.loads(response_file_content)
+        chunks = response.iter_content(chunk_size=admin_settings.EXPORT_DATA_FILE_INFO_READ_CHUNK_SIZE)
     except Exception:
         raise ProcessError(f'Cannot get file information list')
 
-    # Validate file info schema
-    is_file_valid = utils.validate_file_json(response_file_json, 'file-info-schema.json')
-    if not is_file_valid:
+    # Validate institution and folders, files are validated by iter_file_info_files
+    try:
+        return utils.FileInfoReader(chunks, schema_filename='file-info-schema.json')
+    except (ValueError, jsonschema.ValidationError) as e:
+        logger.error(f'Invalid file information: {e}')
         raise ProcessError(f'The export data files are corrupted')
 
-    return response_file_json
+
+def iter_file_info_files(file_info_reader):
+    try:
+        yield from file_info_reader.iter_files()
+    except (ValueError, jsonschema.ValidationError) as e:
+        logger.error(f'Invalid file information: {e}')
+        raise ProcessError(f'The export data files are corrupted')
 
 
 def update_region_id(task, current_process_step, destination_region, project_id, list_updated_projects):
@@ -726,9 +852,179 @@ def create_folder_in_destination(task, current_process_step, export_data_folders
         recalculate_user_quota(destination_region)
 
 
+def get_restore_concurrency(destination_region):
+    """Number of files copied at the same time to the destination storage"""
+    concurrency = admin_settings.EXPORT_DATA_RESTORE_CONCURRENCY
+    provider_concurrency = admin_settings.EXPORT_DATA_RESTORE_PROVIDER_CONCURRENCY.get(destination_region.provider_name)
+    if provider_concurrency is not None:
+        concurrency = min(concurrency, provider_concurrency)
+    return max(1, concurrency)
+
+
+def get_restored_file_nodes(export_data_restore):
+    """Return {file_id: file node or None} of the files already restored by this restore process"""
+    journal = ExportDataRestoreJournal.objects.filter(
+        export_data_restore=export_data_restore, status=ExportDataRestoreJournal.STATUS_DONE,
+    ).select_related('file_node')
+    return {entry.file_id: entry.file_node for entry in journal.iterator()}
+
+
+def copy_file_versions_to_destination(export_data, file, destination_provider, destination_base_url,
+                                      is_destination_addon_storage, cookies, **kwargs):
+    """Copy the versions of a file to the destination storage, oldest first.
+
+    Run in a worker thread, so it must not query the database.
+    Return (copied, failures), copied is the list of (version, response body)
+    and failures the list of version ids that could not be copied.
+    """
+    file_materialized_path = file.get('materialized_path')
+    file_versions = file.get('version')
+    file_project_id = file.get('project', {}).get('id')
+
+    # Sort file by version id
+    file_versions.sort(key=lambda k: k.get('identifier', 0))
+
+    copied = []
+    failures = []
+    for index, version in enumerate(file_versions):
+        # Prepare file name and file path for uploading
+        metadata = version.get('metadata', {})
+        file_hash = metadata.get('sha256', metadata.get('md5'))
+        version_id = version.get('identifier')
+        if file_hash is None or version_id is None:
+            # Cannot get path in export data storage, pass this file
+            continue
+
+        # an incremental export refers to the contents exported by a previous export
+        export_data_folder_name = version.get('stored_in') or export_data.export_data_folder_name
+        file_hash_path = f'/{export_data_folder_name}/{ExportData.EXPORT_DATA_FILES_FOLDER}/{file_hash}'
+
+        # If the destination storage is add-on institutional storage:
+        # - for past version files, rename and save each version as filename_{version} in '_version_files' folder
+        # - the latest version is saved as the original
+        if is_destination_addon_storage:
+            is_file_not_latest_version = index < len(file_versions) - 1
+            new_file_path = generate_new_file_path(
+                file_materialized_path=file_materialized_path,
+                version_id=version_id,
+                is_file_not_latest_version=is_file_not_latest_version)
+        else:
+            new_file_path = file_materialized_path
+
+        try:
+            # Copy file from location to destination storage
+            response_body = utils.copy_file_from_location_to_destination(
+                export_data, file_project_id, destination_provider, file_hash_path, new_file_path,
+                cookies, base_url=destination_base_url, **kwargs)
+        except Exception as e:
+            logger.error(f'Download or upload exception: {e}')
+            # Did not download or upload, pass this file
+            continue
+        if response_body is None:
+            failures.append(version_id)
+            continue
+        copied.append((version, response_body))
+    return copied, failures
+
+
+def save_restored_file_versions(file, copied):
+    """Update the file nodes created by the copied versions of a file.
+
+    Return the list of restored file nodes.
+    """
+    file_checkout_id = file.get('checkout_id')
+    file_created = file.get('created_at')
+    file_modified = file.get('modified_at')
+
+    nodes = OrderedDict()
+    for version, response_body in copied:
+        try:
+            version_id = version.get('identifier')
+            response_id = response_body.get('data', {}).get('id')
+            response_file_version_id = response_body.get('data', {}).get('attributes', {}).get('extra', {}).get('version', version_id)
+            if not response_id.startswith('osfstorage'):
+                continue
+            # If id is osfstorage/[_id] then get _id
+            file_path_splits = response_id.split('/')
+            # Check if path is file (/_id)
+            if len(file_path_splits) != 2:
+                continue
+            file_node_id = file_path_splits[1]
+            node = nodes.get(file_node_id)
+            if node is None:
+                node = BaseFileNode.objects.filter(_id=file_node_id).first()
+                if node is None:
+                    continue
+                nodes[file_node_id] = node
+
+            # update creator, created, modified back to the file version
+            file_version = node.get_version(response_file_version_id, required=False)
+
+            if file_version is not None:
+                file_version_created_at = version.get('created_at')
+                file_version_modified_at = version.get('modified_at')
+
+                # Find records of old versions with the same 'created_at' and 'modified_at' values
+                same_file_versions = node.versions.exclude(
+                    identifier=response_file_version_id
+                ).filter(
+                    created=file_version_created_at,
+                    modified=file_version_modified_at
+                )
+
+                if same_file_versions.exists():
+                    # delete duplicate new record
+                    file_version.delete()
+        except Exception as e:
+            logger.error(f'Update restored file exception: {e}')
+            continue
+
+    for node in nodes.values():
+        if file_checkout_id:
+            node.checkout_id = file_checkout_id
+
+        # update created/modified date to basefilenode
+        node.created = file_created
+        node.modified = file_modified
+        # ignore storing the value of `django.utils.timezone.now()` to `modified` field
+        node.save(update_modified=False)
+    return list(nodes.values())
+
+
+def iter_copied_files(files, copy_file, concurrency, check_process):
+    """Yield (file, copy_file(file)) as the copies finish, ``concurrency`` files at a time"""
+    if concurrency == 1:
+        for file in files:
+            check_process()
+            yield file, copy_file(file)
+        return
+
+    files = iter(files)
+    running = {}
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            for file in itertools.islice(files, concurrency - len(running)):
+                check_process()
+                running[executor.submit(copy_file, file)] = file
+            if not running:
+                return
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future.result()
+
+
 def copy_files_from_export_data_to_destination(task, current_process_step,
                                                export_data_files, export_data_restore, cookies, **kwargs):
+    """Copy the files to the destination storage, several files at a time.
+
+    Each restored file is checkpointed in the journal, the files already
+    restored by a previous run of this restore process are not copied again.
+    The tags and timestamps of the created file nodes are added every
+    EXPORT_DATA_FILE_INFO_CHUNK_SIZE nodes, the returned list only holds
+    the created file nodes of the last incomplete chunk.
+    """
     export_data = export_data_restore.export
+    chunk_size = admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE
 
     destination_region = export_data_restore.destination
     destination_provider = INSTITUTIONAL_STORAGE_PROVIDER_NAME
@@ -736,132 +1032,74 @@ def copy_files_from_export_data_to_destination(task, current_process_step,
     is_destination_addon_storage = utils.is_add_on_storage(destination_provider)
 
     list_created_file_nodes = []
-    files_versions_restore_fail = {}
-    for file in export_data_files:
-        check_if_restore_process_stopped(task, current_process_step)
-
-        file_id = file.get('id')
-        file_materialized_path = file.get('materialized_path')
-        file_versions = file.get('version')
-        file_project_id = file.get('project', {}).get('id')
-        file_tags = file.get('tags')
-        file_timestamp = file.get('timestamp', {})
-        file_checkout_id = file.get('checkout_id')
-        file_created = file.get('created_at')
-        file_modified = file.get('modified_at')
-
-        # Sort file by version id
-        file_versions.sort(key=lambda k: k.get('identifier', 0))
-
-        for index, version in enumerate(file_versions):
-            try:
-                check_if_restore_process_stopped(task, current_process_step)
-
-                # Prepare file name and file path for uploading
-                metadata = version.get('metadata', {})
-                file_hash = metadata.get('sha256', metadata.get('md5'))
-                version_id = version.get('identifier')
-                if file_hash is None or version_id is None:
-                    # Cannot get path in export data storage, pass this file
-                    continue
-
-                file_hash_path = f'/{export_data.export_data_folder_name}/{ExportData.EXPORT_DATA_FILES_FOLDER}/{file_hash}'
-
-                # If the destination storage is add-on institutional storage:
-                # - for past version files, rename and save each version as filename_{version} in '_version_files' folder
-                # - the latest version is saved as the original
-                if is_destination_addon_storage:
-                    is_file_not_latest_version = index < len(file_versions) - 1
-                    new_file_path = generate_new_file_path(
-                        file_materialized_path=file_materialized_path,
-                        version_id=version_id,
-                        is_file_not_latest_version=is_file_not_latest_version)
-                else:
-                    new_file_path = file_materialized_path
-
-                # Copy file from location to destination storage
-                response_body = utils.copy_file_from_location_to_destination(
-                    export_data, file_project_id, destination_provider, file_hash_path, new_file_path,
-                    cookies, base_url=destination_base_url, **kwargs)
-                if response_body is None:
-                    if file_id not in files_versions_restore_fail:
-                        files_versions_restore_fail[file_id] = [version_id]
-                    else:
-                        files_versions_restore_fail[file_id].append(version_id)
-                    continue
-
-                response_id = response_body.get('data', {}).get('id')
-                response_file_version_id = response_body.get('data', {}).get('attributes', {}).get('extra', {}).get('version', version_id)
-                if response_id.startswith('osfstorage'):
-                    # If id is osfstorage/[_id] then get _id
-                    file_path_splits = response_id.split('/')
-                    # Check if path is file (/_id)
-                    if len(file_path_splits) == 2:
-                        file_node_id = file_path_splits[1]
-                        node_set = BaseFileNode.objects.filter(_id=file_node_id)
-                        if node_set.exists():
-                            node = node_set.first()
-
-                            # update creator, created, modified back to the file version
-                            file_version = node.get_version(response_file_version_id, required=False)
-
-                            if file_version is not None:
-                                file_version_created_at = version.get('created_at')
-                                file_version_modified_at = version.get('modified_at')
-
-                                # Find records of old versions with the same 'created_at' and 'modified_at' values
-                                same_file_versions = node.versions.exclude(
-                                    identifier=response_file_version_id
-                                ).filter(
-                                    created=file_version_created_at,
-                                    modified=file_version_modified_at
-                                )
-
-                                if same_file_versions.exists():
-                                    # delete duplicate new record
-                                    file_version.delete()
-
-                            if file_checkout_id:
-                                node.checkout_id = file_checkout_id
-
-                            # update created/modified date to basefilenode
-                            node.created = file_created
-                            node.modified = file_modified
-                            # ignore storing the value of `django.utils.timezone.now()` to `modified` field
-                            node.save(update_modified=False)
-
-                            list_created_file_nodes.append({
-                                'node': node,
-                                'file_tags': file_tags,
-                                'file_timestamp': file_timestamp,
-                                'project_id': file_project_id
-                            })
-            except Exception as e:
-                logger.error(f'Download or upload exception: {e}')
-                check_if_restore_process_stopped(task, current_process_step)
-                # Did not download or upload, pass this file
+    list_file_restore_fail = []
+    restored_file_nodes = get_restored_file_nodes(export_data_restore)
+    if restored_file_nodes:
+        logger.info(f'{len(restored_file_nodes)} files are already restored.')
+
+    def add_created_file_nodes(file, nodes):
+        for node in nodes:
+            list_created_file_nodes.append({
+                'node': node,
+                'file_tags': file.get('tags'),
+                'file_timestamp': file.get('timestamp', {}),
+                'project_id': file.get('project', {}).get('id'),
+            })
+        if len(list_created_file_nodes) >= chunk_size:
+            add_tag_and_timestamp_to_database(task, current_process_step, list_created_file_nodes)
+            del list_created_file_nodes[:]
+
+    def iter_files_to_copy():
+        for file in export_data_files:
+            file_id = file.get('id')
+            if file_id in restored_file_nodes:
+                file_node = restored_file_nodes[file_id]
+                add_created_file_nodes(file, [file_node] if file_node else [])
                 continue
+            yield file
+
+    # load related objects before starting the worker threads
+    export_data.source, export_data.location
+
+    copy_file = partial(
+        copy_file_versions_to_destination, export_data,
+        destination_provider=destination_provider,
+        destination_base_url=destination_base_url,
+        is_destination_addon_storage=is_destination_addon_storage,
+        cookies=cookies, **kwargs)
+    check_process = partial(check_if_restore_process_stopped, task, current_process_step)
+    concurrency = get_restore_concurrency(destination_region)
+    for file, (copied, failures) in iter_copied_files(iter_files_to_copy(), copy_file, concurrency, check_process):
+        nodes = save_restored_file_versions(file, copied)
+        add_created_file_nodes(file, nodes)
+        if failures:
+            # Separate the failed versions from the file information
+            files_not_found, _, _ = export.separate_failed_files([file], {file.get('id'): failures})
+            list_file_restore_fail.extend(files_not_found)
+        ExportDataRestoreJournal.objects.update_or_create(
+            export_data_restore=export_data_restore, file_id=file.get('id'),
+            defaults={
+                'status': ExportDataRestoreJournal.STATUS_FAILED if failures else ExportDataRestoreJournal.STATUS_DONE,
+                'file_node': nodes[-1] if nodes else None,
+                'failures': failures,
+            })
+        check_process()
 
-    # Separate the failed file list from the file_info_json
-    list_file_restore_fail, _, _ = export.separate_failed_files(export_data_files, files_versions_restore_fail)
     return list_created_file_nodes, list_file_restore_fail
 
 
 def add_tag_and_timestamp_to_database(task, current_process_step, list_created_file_nodes):
+    chunk_size = admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE
     with transaction.atomic():
-        for item in list_created_file_nodes:
+        for start in range(0, len(list_created_file_nodes), chunk_size):
             check_if_restore_process_stopped(task, current_process_step)
-
-            node = item.get('node')
-            file_tags = item.get('file_tags')
-            file_timestamp = item.get('file_timestamp')
-            project_id = item.get('project_id')
+            chunk = list_created_file_nodes[start:start + chunk_size]
 
             # Add tags to DB
-            add_tags_to_file_node(node, file_tags)
+            add_tags_to_file_nodes(chunk)
 
             # Add timestamp to DB
-            add_timestamp_to_file_node(node, project_id, file_timestamp)
+            add_timestamps_to_file_nodes(chunk)
         check_if_restore_process_stopped(task, current_process_step)
 
 
@@ -17,4 +17,8 @@ urlpatterns = [
         views.TaskStatus.as_view(), name='task_status'),
     url(r'^(?P<institution_id>[0-9]+)/nodes/(?P<guid>[a-z0-9]+)/addtimestamp/download_errors/$',
         views.DownloadErrors.as_view(), name='download_errors'),
+    url(r'^(?P<institution_id>[0-9]+)/nodes/(?P<guid>[a-z0-9]+)/addtimestamp/errors/$',
+        views.TimestampErrorList.as_view(), name='error_list'),
+    url(r'^(?P<institution_id>[0-9]+)/nodes/(?P<guid>[a-z0-9]+)/addtimestamp/export_errors/$',
+        views.ExportErrors.as_view(), name='export_errors'),
 ]
@@ -4,12 +4,14 @@ from __future__ import unicode_literals
 from admin.base import settings
 from admin.rdm.utils import RdmPermissionMixin, get_dummy_institution
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.views.generic import ListView, View, TemplateView
 from osf.models import Institution, Node, AbstractNode, TimestampTask
 from website.util import timestamp
+from api.base import settings as api_settings
 import json
 
 
@@ -95,7 +97,8 @@ class TimeStampAddList(RdmPermissionMixin, UserPassesTestMixin, TemplateView):
         ctx = super(TimeStampAddList, self).get_context_data(**kwargs)
         absNodeData = AbstractNode.objects.get(id=self.kwargs['guid'])
 
-        ctx['init_project_timestamp_error_list'] = timestamp.get_error_list(absNodeData._id)
+        # the errors are loaded page by page from TimestampErrorList
+        ctx['verify_users'] = timestamp.get_error_verify_users(absNodeData._id)
         ctx['project_title'] = absNodeData.title
         ctx['guid'] = self.kwargs['guid']
         ctx['institution_id'] = self.kwargs['institution_id']
@@ -111,7 +114,9 @@ class VerifyTimestamp(RdmPermissionMixin, UserPassesTestMixin, View):
         return self.has_auth(institution_id)
 
     def post(self, request, *args, **kwargs):
-        async_task = timestamp.celery_verify_timestamp_token.delay(self.request.user.id, self.kwargs['guid'])
+        delta = request.POST.get('delta') == 'true'
+        async_task = timestamp.celery_verify_timestamp_token.delay(
+            self.request.user.id, self.kwargs['guid'], delta=delta)
         TimestampTask.objects.update_or_create(
             node=AbstractNode.objects.get(id=self.kwargs['guid']),
             defaults={'task_id': async_task.id, 'requester': self.request.user}
@@ -216,3 +221,56 @@ class DownloadErrors(RdmPermissionMixin, UserPassesTestMixin, View):
             json.dumps({'status': 'OK'}),
             content_type='application/json'
         )
+
+class TimestampErrorList(RdmPermissionMixin, UserPassesTestMixin, View):
+    raise_exception = True
+
+    def test_func(self):
+        """validate user permissions"""
+        institution_id = int(self.kwargs.get('institution_id'))
+        return self.has_auth(institution_id)
+
+    def get(self, request, *args, **kwargs):
+        node = AbstractNode.objects.get(id=self.kwargs['guid'])
+        try:
+            params = timestamp.get_error_filter_params(request.GET)
+            page = int(request.GET.get('page', 1))
+            page_size = int(request.GET.get('page_size', api_settings.TS_ERROR_LIST_PAGE_SIZE))
+        except ValueError:
+            return HttpResponseBadRequest()
+        page_size = max(1, min(page_size, api_settings.MAX_PAGE_SIZE))
+        result = {
+            'provider_list': timestamp.get_error_list(node._id, page=page, page_size=page_size, **params),
+            'page': page,
+            'page_size': page_size,
+            'total': timestamp.count_errors(node._id, **params),
+        }
+        return HttpResponse(
+            json.dumps(result, cls=DjangoJSONEncoder),
+            content_type='application/json'
+        )
+
+class ExportErrors(RdmPermissionMixin, UserPassesTestMixin, View):
+    raise_exception = True
+
+    def test_func(self):
+        """validate user permissions"""
+        institution_id = int(self.kwargs.get('institution_id'))
+        return self.has_auth(institution_id)
+
+    def get(self, request, *args, **kwargs):
+        node = AbstractNode.objects.get(id=self.kwargs['guid'])
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in ('csv', 'json'):
+            return HttpResponseBadRequest()
+        try:
+            params = timestamp.get_error_filter_params(request.GET)
+        except ValueError:
+            return HttpResponseBadRequest()
+        timestamp.add_log_download_errors(node, self.request.user.id, {'file_format': export_format})
+        response = StreamingHttpResponse(
+            timestamp.stream_error_list(node._id, export_format, **params),
+            content_type='text/csv' if export_format == 'csv' else 'application/json'
+        )
+        response['Content-Disposition'] = 'attachment; filename=timestamp_errors_{}.{}'.format(node._id, export_format)
+        return response
@@ -31,6 +31,16 @@ $(function () {
         });
     };
 
+    var btnVerifyDelta_onclick = function () {
+        if ($('#btn-verify').attr('disabled') !== undefined || $('#btn-addtimestamp').attr('disabled') !== undefined) {
+            return false;
+        }
+        timestampCommon.verify({
+            urlVerify: urls.verify,
+            delta: true
+        });
+    };
+
     var btnAddtimestamp_onclick = function () {
         if ($('#btn-verify').attr('disabled') !== undefined || $('#btn-addtimestamp').attr('disabled') !== undefined) {
             return false;
@@ -61,44 +71,41 @@ $(function () {
         }
     };
 
+    // the pages are loaded from the server, the buttons are updated once a page is shown
+    $(document).on('timestampErrorPageLoaded', updatePaginationElements);
+
     $('#first-page').on('click', function () {
         $('.listjs-pagination li').first().click();
-        updatePaginationElements();
     });
 
     $('#previous-page').on('click', function () {
         $('.pagination-prev').click();
-        updatePaginationElements();
     });
 
     $('#next-page').on('click', function () {
         $('.pagination-next').click();
-        updatePaginationElements();
     });
 
     $('#last-page').on('click', function () {
         $('.listjs-pagination li').last().click();
-        updatePaginationElements();
     });
 
     $('#pageLength-10').on('click', function () {
         $('#pageLength').val(10).change();
-        updatePaginationElements();
     });
 
     $('#pageLength-25').on('click', function () {
         $('#pageLength').val(25).change();
-        updatePaginationElements();
     });
 
     $('#pageLength-50').on('click', function () {
         $('#pageLength').val(50).change();
-        updatePaginationElements();
     });
 
     $(document).ready(function () {
-        timestampCommon.init(urls.taskStatusUrl);
+        timestampCommon.init(urls.taskStatusUrl, urls.errorList);
         $('#btn-verify').on('click', btnVerify_onclick).focus();
+        $('#btn-verify-delta').on('click', btnVerifyDelta_onclick);
         $('#btn-addtimestamp').on('click', btnAddtimestamp_onclick).focus();
         $('#btn-cancel').on('click', function () {
             timestampCommon.cancel(urls.cancel);
@@ -106,6 +113,9 @@ $(function () {
         $('#btn-download').on('click', function () {
             timestampCommon.download(urls.downloadErrors);
         });
+        $('#btn-export-all').on('click', function () {
+            timestampCommon.exportAll(urls.exportErrors, 'csv');
+        });
         updatePaginationElements();
     });
 });
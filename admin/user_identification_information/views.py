@@ -1,12 +1,13 @@
-import csv
 from operator import itemgetter
 
 import pytz
-from django.db.models import Q
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.http import Http404
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.views.generic import ListView
 
+from admin.base.utils import QuerySetRowList, annotate_user_guid, iter_csv
 from admin.base.views import GuidView
 from admin.rdm.utils import RdmPermissionMixin
 from admin.user_identification_information.utils import (
@@ -14,13 +15,38 @@ from admin.user_identification_information.utils import (
     get_list_extend_storage
 )
 from api.base import settings as api_settings
-from osf.models import OSFUser, UserQuota, Email
+from osf.models import OSFUser, UserQuota, Email, Institution
 from website.util import quota
 from datetime import datetime
 from django.contrib.auth.mixins import UserPassesTestMixin
 
 
+def annotate_user_identification(queryset):
+    """Annotate an OSFUser queryset with the columns of the user
+    identification list: guid, affiliation, email and the NII storage quota.
+    """
+    affiliations = Institution.objects.filter(
+        osfuser=OuterRef('pk')
+    ).order_by('pk').values('name')[:1]
+    emails = Email.objects.filter(user=OuterRef('pk')).order_by('pk').values('address')[:1]
+    queryset = annotate_user_guid(queryset).annotate(
+        eppn_value=Coalesce('eppn', Value('')),
+        affiliation=Coalesce(Subquery(affiliations), Value('')),
+        email=Coalesce(Subquery(emails), Value('')),
+    )
+    return quota.annotate_user_quota(queryset, UserQuota.NII_STORAGE)
+
+
 class UserIdentificationInformationListView(ListView):
+    # database ordering of the user list columns
+    ORDER_BY_FIELDS = {
+        'fullname': F('fullname'),
+        'eppn': F('eppn_value'),
+        'last_login': F('last_login'),
+        'usage': F('quota_used'),
+        'affiliation': F('affiliation'),
+        'email': F('email'),
+    }
 
     def get_user_quota_info(self, user, storage_type, extend_storage=''):
         _, used_quota = quota.get_quota_info(user, storage_type)
@@ -40,10 +66,47 @@ class UserIdentificationInformationListView(ListView):
             'extended_storage': extend_storage,
         }
 
+    def format_user_info(self, user, dict_users_list):
+        """Build the row of a user annotated by annotate_user_identification."""
+        used_quota = user.quota_used
+        used_quota_abbr = custom_size_abbreviation(*quota.abbreviate_size(used_quota))
+
+        return {
+            'id': user.guid,
+            'fullname': user.fullname,
+            'eppn': user.eppn or '',
+            'affiliation': user.affiliation,
+            'email': user.email,
+            'last_login': user.last_login or pytz.utc.localize(datetime.min),
+            'usage': used_quota,
+            'usage_value': used_quota_abbr[0],
+            'usage_abbr': used_quota_abbr[1],
+            'extended_storage': '\n'.join(dict_users_list.get(user.id, [])),
+        }
+
+    def get_extended_storage_order(self, dict_users_list):
+        """Rank users by their extended storage text, users without extended
+        storage ('') first, so that the database can sort by it.
+        """
+        ranked = sorted(dict_users_list.items(), key=lambda item: '\n'.join(item[1]))
+        return Case(
+            *[When(pk=user_id, then=Value(rank)) for rank, (user_id, _) in enumerate(ranked, 1)],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+
     def get_queryset(self):
         user_list = self.get_user_list()
         order_by = self.get_order_by()
         reverse = self.get_direction() != 'asc'
+        if isinstance(user_list, QuerySetRowList):
+            if order_by == 'extended_storage':
+                field = self.get_extended_storage_order(get_list_extend_storage())
+            else:
+                field = self.ORDER_BY_FIELDS[order_by]
+            # users never logged in sort as datetime.min
+            field = field.desc(nulls_last=True) if reverse else field.asc(nulls_first=True)
+            return user_list.order_by(field, 'pk')
         user_list.sort(key=itemgetter(order_by), reverse=reverse)
         return user_list
 
@@ -78,14 +141,10 @@ class UserIdentificationInformationListView(ListView):
         return super(UserIdentificationInformationListView, self).get_context_data(**kwargs)
 
     def get_list_data(self, queryset, dict_users_list={}):
-        list_data = []
-        for user in queryset:
-            if user.id in dict_users_list:
-                list_data.append(
-                    self.get_user_quota_info(user, UserQuota.NII_STORAGE, '\n'.join(dict_users_list.get(user.id))))
-            else:
-                list_data.append(self.get_user_quota_info(user, UserQuota.NII_STORAGE))
-        return list_data
+        return QuerySetRowList(
+            annotate_user_identification(queryset),
+            lambda user: self.format_user_info(user, dict_users_list)
+        )
 
 
 class UserIdentificationListView(RdmPermissionMixin, UserPassesTestMixin, UserIdentificationInformationListView):
@@ -106,7 +165,7 @@ class UserIdentificationListView(RdmPermissionMixin, UserPassesTestMixin, UserId
         guid = self.request.GET.get('guid')
         name = self.request.GET.get('fullname')
         email = self.request.GET.get('username')
-        queryset = []
+        queryset = OSFUser.objects.none()
         if self.request.user.is_superuser is False:
             institution = self.request.user.affiliated_institutions.first()
             if institution is not None:
@@ -226,7 +285,7 @@ class ExportFileCSVView(RdmPermissionMixin, UserPassesTestMixin, UserIdentificat
 
     def get(self, request, **kwargs):
         time_now = datetime.today().strftime('%Y%m%d%H%M%S')
-        response = HttpResponse(content_type='text/csv')
+        response = StreamingHttpResponse(content_type='text/csv')
         if self.is_super_admin:
             response['Content-Disposition'] = f'attachment;filename=export_user_identification_{time_now}.csv'
         else:
@@ -234,11 +293,7 @@ class ExportFileCSVView(RdmPermissionMixin, UserPassesTestMixin, UserIdentificat
             if institution is not None:
                 response['Content-Disposition'] = f'attachment;filename=export_user_identification_{institution}_{time_now}.csv'
 
-        writer = csv.writer(response)
-        writer.writerow(
-            ['GUID', 'EPPN', 'Fullname', 'Email', 'Affiliation', 'Last login', 'Usage (Byte)', 'Extended storage'])
-        queryset = []
-
+        queryset = OSFUser.objects.none()
         if self.request.user.is_superuser is False:
             institution = self.request.user.affiliated_institutions.first()
             if institution is not None:
@@ -247,17 +302,23 @@ class ExportFileCSVView(RdmPermissionMixin, UserPassesTestMixin, UserIdentificat
             queryset = OSFUser.objects.all().order_by('id')
 
         dict_users_list = get_list_extend_storage()
-        for user in queryset:
-            extend_storage = ''
-            max_quota, used_quota = quota.get_quota_info(user, UserQuota.NII_STORAGE)
-            if user.id in dict_users_list:
-                extend_storage = '\n'.join(dict_users_list.get(user.id))
-            writer.writerow([user.guids.first()._id,
-                             user.eppn,
-                             user.fullname,
-                             user.emails.values_list('address', flat=True)[0] if len(user.emails.values_list('address', flat=True)) > 0 else '',
-                             user.affiliated_institutions.first().name if user.affiliated_institutions.first() else '',
-                             user.last_login,
-                             used_quota,
-                             extend_storage])
+        rows = (
+            self.get_csv_row(user, dict_users_list)
+            for user in annotate_user_identification(queryset).iterator()
+        )
+        response.streaming_content = iter_csv(
+            rows,
+            ['GUID', 'EPPN', 'Fullname', 'Email', 'Affiliation', 'Last login', 'Usage (Byte)', 'Extended storage']
+        )
         return response
+
+    def get_csv_row(self, user, dict_users_list):
+        used_quota = user.quota_used
+        return [user.guid,
+                user.eppn,
+                user.fullname,
+                user.email,
+                user.affiliation,
+                user.last_login,
+                used_quota,
+                '\n'.join(dict_users_list.get(user.id, []))]
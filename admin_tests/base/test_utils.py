@@ -17,7 +17,9 @@ from osf_tests.factories import SubjectFactory, UserFactory, RegistrationFactory
 
 from osf.models import Subject, OSFUser, Collection
 from osf.models.provider import rules_to_subjects
-from admin.base.utils import get_subject_rules, change_embargo_date
+from admin.base.utils import (
+    get_subject_rules, change_embargo_date, annotate_user_guid, iter_csv, QuerySetRowList
+)
 from osf.admin import OSFUserAdmin
 
 
@@ -255,3 +257,31 @@ class TestSchemaUtils:
     def test_from_json__file_not_found(self):
         with pytest.raises(Exception):
             from_json('file-info-schema2.json')
+
+
+class TestQuerySetRowList(AdminTestCase):
+    def setUp(self):
+        super(TestQuerySetRowList, self).setUp()
+        self.users = [UserFactory() for _ in range(3)]
+        queryset = annotate_user_guid(
+            OSFUser.objects.filter(id__in=[user.id for user in self.users])
+        ).order_by('pk')
+        self.rows = QuerySetRowList(queryset, lambda user: {'id': user.guid, 'fullname': user.fullname})
+
+    def test_count(self):
+        assert_equal(self.rows.count(), 3)
+        assert_equal(len(self.rows), 3)
+
+    def test_slice(self):
+        assert_equal(self.rows[1:3], [
+            {'id': user._id, 'fullname': user.fullname} for user in self.users[1:3]
+        ])
+        assert_equal(self.rows[0]['id'], self.users[0]._id)
+
+    def test_order_by(self):
+        rows = self.rows.order_by('-pk')
+        assert_equal([row['id'] for row in rows], [user._id for user in reversed(self.users)])
+
+    def test_iter_csv(self):
+        lines = list(iter_csv(([row['id']] for row in self.rows), ['GUID']))
+        assert_equal(lines, ['GUID\r\n'] + ['{}\r\n'.format(user._id) for user in self.users])
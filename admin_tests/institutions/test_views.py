@@ -24,6 +24,7 @@ from admin_tests.utilities import setup_form_view, setup_user_view, setup_view
 from admin.institutions import views
 from admin.institutions.forms import InstitutionForm
 from admin.base.forms import ImportFileForm
+from admin.base.utils import QuerySetRowList
 
 
 class TestInstitutionList(AdminTestCase):
@@ -1136,7 +1137,7 @@ class TestUserListByInstitutionID(AdminTestCase):
     def test_default_user_list_by_institution_id(self, *args, **kwargs):
 
         res = self.view.get_userlist()
-        nt.assert_is_instance(res, list)
+        nt.assert_is_instance(res, QuerySetRowList)
 
     def test_default_user_list_by_institution_id_not_found(self, *args, **kwargs):
         view = setup_view(self.view,
@@ -1281,7 +1282,7 @@ class TestExportFileTSV(AdminTestCase):
                           institution_id=self.institution.id)
         res = view.get(request)
 
-        result = res.content.decode('utf-8')
+        result = b''.join(res.streaming_content).decode('utf-8')
 
         nt.assert_equal(res.status_code, 200)
         nt.assert_equal(res['content-type'], 'text/tsv')
@@ -1311,7 +1312,7 @@ class TestExportFileTSV(AdminTestCase):
                           institution_id=self.institution.id)
         res = view.get(request)
 
-        result = res.content.decode('utf-8')
+        result = b''.join(res.streaming_content).decode('utf-8')
 
         nt.assert_equal(res.status_code, 200)
         nt.assert_equal(res['content-type'], 'text/tsv')
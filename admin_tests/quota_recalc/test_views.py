@@ -4,10 +4,11 @@ import json
 import mock
 from nose import tools as nt
 
+from addons.osfstorage.models import OsfStorageFileNode
 from admin.quota_recalc import views
 from api.base import settings as api_settings
-from osf.models import UserQuota
-from osf_tests.factories import AuthUserFactory, InstitutionFactory, RegionFactory
+from osf.models import FileInfo, ProjectStorageType, UserQuota, UserQuotaLedger
+from osf_tests.factories import AuthUserFactory, InstitutionFactory, ProjectFactory, RegionFactory
 from tests.base import AdminTestCase
 
 
@@ -138,3 +139,154 @@ class TestCalculateQuota(AdminTestCase):
 
         nt.assert_equal(user_quota[0].used, expected[user_quota[0].storage_type])
         nt.assert_equal(user_quota[1].used, expected[user_quota[1].storage_type])
+
+
+class TestCalculateQuotaBulk(AdminTestCase):
+
+    def setUp(self):
+        super(TestCalculateQuotaBulk, self).setUp()
+        self.user = AuthUserFactory()
+        self.user2 = AuthUserFactory()
+        self.project = ProjectFactory(creator=self.user)
+        self.project2 = ProjectFactory(creator=self.user)
+        for project, name, size in ((self.project, 'file1', 1000), (self.project2, 'file2', 500)):
+            file_node = OsfStorageFileNode.create(
+                target=project,
+                path='/' + name,
+                _id=name,
+                name=name,
+                materialized_path='/' + name
+            )
+            file_node.save()
+            FileInfo.objects.create(file=file_node, file_size=size)
+
+    def test_create_and_update_userquota(self):
+        UserQuota.objects.create(
+            user=self.user,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=200,
+            used=5000
+        )
+        UserQuota.objects.filter(user=self.user2).delete()
+
+        views.calculate_quota_bulk([self.user.id, self.user2.id])
+
+        user_quota = UserQuota.objects.get(user=self.user, storage_type=UserQuota.NII_STORAGE)
+        nt.assert_equal(user_quota.max_quota, 200)
+        nt.assert_equal(user_quota.used, 1500)
+        user_quota2 = UserQuota.objects.get(user=self.user2, storage_type=UserQuota.NII_STORAGE)
+        nt.assert_equal(user_quota2.max_quota, api_settings.DEFAULT_MAX_QUOTA)
+        nt.assert_equal(user_quota2.used, 0)
+        nt.assert_false(UserQuota.objects.filter(storage_type=UserQuota.CUSTOM_STORAGE).exists())
+
+    def test_deleted_project_is_not_counted(self):
+        self.project2.is_deleted = True
+        self.project2.save()
+
+        views.calculate_quota_bulk([self.user.id])
+
+        user_quota = UserQuota.objects.get(user=self.user, storage_type=UserQuota.NII_STORAGE)
+        nt.assert_equal(user_quota.used, 1000)
+
+    def test_custom_storage(self):
+        institution = InstitutionFactory()
+        self.user.affiliated_institutions.add(institution)
+        RegionFactory(_id=institution._id)
+        ProjectStorageType.objects.filter(node=self.project2).update(
+            storage_type=ProjectStorageType.CUSTOM_STORAGE
+        )
+
+        views.calculate_quota_bulk([self.user.id, self.user2.id])
+
+        expected = {
+            UserQuota.NII_STORAGE: 1000,
+            UserQuota.CUSTOM_STORAGE: 500,
+        }
+        user_quota = UserQuota.objects.filter(user=self.user).all()
+        nt.assert_equal(len(user_quota), 2)
+        for q in user_quota:
+            nt.assert_equal(q.used, expected[q.storage_type])
+        nt.assert_equal(UserQuota.objects.filter(user=self.user2).count(), 1)
+
+    def test_discard_ledger(self):
+        UserQuotaLedger.objects.create(
+            user=self.user,
+            storage_type=UserQuota.NII_STORAGE,
+            delta=300,
+            reason=UserQuotaLedger.FILE_ADDED
+        )
+
+        views.calculate_quota_bulk([self.user.id])
+
+        nt.assert_false(UserQuotaLedger.objects.filter(user=self.user).exists())
+        nt.assert_equal(UserQuota.objects.get(user=self.user).used, 1500)
+
+    def test_calculate_quota_discards_ledger(self):
+        UserQuotaLedger.objects.create(
+            user=self.user,
+            storage_type=UserQuota.NII_STORAGE,
+            delta=300,
+            reason=UserQuotaLedger.FILE_ADDED
+        )
+
+        views.calculate_quota(self.user)
+
+        nt.assert_false(UserQuotaLedger.objects.filter(user=self.user).exists())
+        nt.assert_equal(UserQuota.objects.get(user=self.user, storage_type=UserQuota.NII_STORAGE).used, 1500)
+
+    @mock.patch.object(api_settings, 'QUOTA_RECALC_CHUNK_SIZE', 1)
+    def test_recalculate_progress(self):
+        institution = InstitutionFactory()
+        self.user.affiliated_institutions.add(institution)
+        self.user2.affiliated_institutions.add(institution)
+        task = mock.Mock()
+
+        result = views.recalculate_quota_process(task, institution_id=institution.id)
+
+        nt.assert_equal(result['done'], 2)
+        nt.assert_equal(result['total'], 2)
+        nt.assert_equal(task.update_state.call_count, 2)
+        meta = task.update_state.call_args_list[0][1]['meta']
+        nt.assert_equal(meta['done'], 1)
+        nt.assert_equal(meta['total'], 2)
+        nt.assert_equal(UserQuota.objects.get(user=self.user).used, 1500)
+
+
+class TestQuotaRecalcTaskView(AdminTestCase):
+    @staticmethod
+    def get_request(view, **kwargs):
+        return view(RequestFactory().get('/fake_path'), **kwargs)
+
+    def test_institution(self):
+        institution = InstitutionFactory()
+        user = AuthUserFactory()
+        user.affiliated_institutions.add(institution)
+        UserQuota.objects.filter(user=user).delete()
+
+        response = self.get_request(views.institution, institution_id=str(institution.id))
+        res_json = json.loads(response.content)
+        nt.assert_equal(response.status_code, 200)
+        nt.assert_equal(res_json['status'], 'OK')
+        nt.assert_in('task_id', res_json)
+        nt.assert_true('1' in res_json['message'])
+        nt.assert_true(UserQuota.objects.filter(user=user).exists())
+
+    def test_institution_not_found(self):
+        response = self.get_request(views.institution, institution_id='0')
+        res_json = json.loads(response.content)
+        nt.assert_equal(response.status_code, 404)
+        nt.assert_equal(res_json['status'], 'failed')
+
+    @mock.patch('admin.quota_recalc.views.AsyncResult')
+    def test_task_status(self, mock_result):
+        mock_result.return_value.state = views.STATE_PROGRESS
+        mock_result.return_value.info = {'done': 10, 'total': 40, 'elapsed': 2.0, 'eta': 6.0}
+        mock_result.return_value.failed.return_value = False
+
+        response = self.get_request(views.task_status, task_id='task-id')
+        res_json = json.loads(response.content)
+        nt.assert_equal(response.status_code, 200)
+        nt.assert_equal(res_json['state'], views.STATE_PROGRESS)
+        nt.assert_equal(res_json['done'], 10)
+        nt.assert_equal(res_json['total'], 40)
+        nt.assert_equal(res_json['eta'], 6.0)
@@ -0,0 +1,190 @@
+import mock
+import pytest
+from botocore.exceptions import ClientError
+from nose import tools as nt
+
+from admin.base import settings as admin_settings
+from admin.rdm_custom_storage_location.export_data import copy_strategy
+from admin.rdm_custom_storage_location.export_data.views import export
+from osf_tests.factories import (
+    ExportDataFactory,
+    ExportDataLocationFactory,
+    RegionFactory,
+)
+from tests.base import AdminTestCase
+
+S3COMPAT_CREDENTIALS = {
+    'storage': {
+        'access_key': 'access',
+        'secret_key': 'secret',
+        'host': 's3.example.com:9000',
+    },
+}
+REGION_S3COMPAT_SETTINGS = {
+    'storage': {
+        'folder': '',
+        'encrypt_uploads': False,
+        'bucket': 'source-bucket',
+        'provider': 's3compat',
+    },
+}
+LOCATION_S3COMPAT_SETTINGS = {
+    'storage': {
+        'folder': {
+            'encrypt_uploads': True,
+        },
+        'bucket': 'export-bucket',
+        'provider': 's3compat',
+    },
+}
+
+
+class FakeS3Client(object):
+    """In-memory stand-in of a S3 compatible service"""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.extra_args = {}
+
+    def copy(self, CopySource, Bucket, Key, ExtraArgs=None, Config=None):
+        source_key = (CopySource['Bucket'], CopySource['Key'])
+        if source_key not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        self.objects[(Bucket, Key)] = self.objects[source_key]
+        self.extra_args[(Bucket, Key)] = ExtraArgs
+
+
+@pytest.mark.feature_202210
+class TestGetS3Bucket(AdminTestCase):
+
+    def test_region(self):
+        bucket = copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, REGION_S3COMPAT_SETTINGS)
+        nt.assert_equal(bucket.provider, 's3compat')
+        nt.assert_equal(bucket.bucket, 'source-bucket')
+        nt.assert_equal(bucket.endpoint_url, 'http://s3.example.com:9000')
+        nt.assert_false(bucket.encrypt_uploads)
+
+    def test_export_location(self):
+        bucket = copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, LOCATION_S3COMPAT_SETTINGS)
+        nt.assert_equal(bucket.bucket, 'export-bucket')
+        nt.assert_true(bucket.encrypt_uploads)
+
+    def test_amazon_s3(self):
+        credentials = {'storage': {'access_key': 'access', 'secret_key': 'secret'}}
+        settings = {'storage': {'bucket': 'bucket', 'provider': 's3'}}
+        bucket = copy_strategy.get_s3_bucket(credentials, settings)
+        nt.assert_is_none(bucket.endpoint_url)
+
+    def test_not_s3(self):
+        settings = {'storage': {'bucket': 'bucket', 'provider': 'nextcloudinstitutions'}}
+        nt.assert_is_none(copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, settings))
+        nt.assert_is_none(copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, {}))
+        nt.assert_is_none(copy_strategy.get_s3_bucket({}, REGION_S3COMPAT_SETTINGS))
+
+
+@pytest.mark.feature_202210
+class TestServerSideCopy(AdminTestCase):
+
+    def setUp(self):
+        super(TestServerSideCopy, self).setUp()
+        self.client = FakeS3Client({('source-bucket', 'hash1'): b'content'})
+        self.server_side_copy = copy_strategy.ServerSideCopy(
+            copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, REGION_S3COMPAT_SETTINGS),
+            copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, LOCATION_S3COMPAT_SETTINGS),
+            client=self.client)
+
+    def test_copy_file_version(self):
+        is_copied = self.server_side_copy.copy_file_version(
+            {'object': 'hash1', 'provider': 's3compat'}, '/export_1_1/files/hash1')
+        nt.assert_true(is_copied)
+        nt.assert_equal(self.client.objects[('export-bucket', 'export_1_1/files/hash1')], b'content')
+        nt.assert_equal(self.client.extra_args[('export-bucket', 'export_1_1/files/hash1')],
+                        {'ServerSideEncryption': 'AES256'})
+
+    def test_copy_file_version_from_version_bucket(self):
+        self.client.objects[('old-bucket', 'hash2')] = b'old content'
+        is_copied = self.server_side_copy.copy_file_version(
+            {'object': 'hash2', 'bucket': 'old-bucket'}, '/export_1_1/files/hash2')
+        nt.assert_true(is_copied)
+        nt.assert_equal(self.client.objects[('export-bucket', 'export_1_1/files/hash2')], b'old content')
+
+    def test_copy_file_version_missing_object(self):
+        is_copied = self.server_side_copy.copy_file_version({'object': 'missing'}, '/export_1_1/files/missing')
+        nt.assert_false(is_copied)
+
+    def test_copy_file_version_access_denied(self):
+        self.server_side_copy.client = mock.MagicMock()
+        self.server_side_copy.client.copy.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied', 'Message': 'Access Denied'}}, 'CopyObject')
+        nt.assert_false(self.server_side_copy.copy_file_version({'object': 'hash1'}, '/export_1_1/files/hash1'))
+        nt.assert_true(self.server_side_copy.is_access_denied)
+
+        # the server side copy is not tried again
+        nt.assert_false(self.server_side_copy.copy_file_version({'object': 'hash2'}, '/export_1_1/files/hash2'))
+        self.server_side_copy.client.copy.assert_called_once()
+
+    def test_copy_file_version_missing_object_is_tried_again(self):
+        nt.assert_false(self.server_side_copy.copy_file_version({'object': 'missing'}, '/export_1_1/files/missing'))
+        nt.assert_false(self.server_side_copy.is_access_denied)
+        nt.assert_true(self.server_side_copy.copy_file_version({'object': 'hash1'}, '/export_1_1/files/hash1'))
+
+    def test_copy_file_version_not_in_s3(self):
+        self.server_side_copy.client = mock.MagicMock()
+        nt.assert_false(self.server_side_copy.copy_file_version({}, '/export_1_1/files/hash1'))
+        nt.assert_false(self.server_side_copy.copy_file_version(
+            {'object': 'hash1', 'provider': 'filesystem'}, '/export_1_1/files/hash1'))
+        self.server_side_copy.client.copy.assert_not_called()
+
+
+@pytest.mark.feature_202210
+class TestGetServerSideCopy(AdminTestCase):
+
+    def setUp(self):
+        super(TestGetServerSideCopy, self).setUp()
+        self.source = RegionFactory(
+            waterbutler_credentials=S3COMPAT_CREDENTIALS, waterbutler_settings=REGION_S3COMPAT_SETTINGS)
+        self.location = ExportDataLocationFactory(
+            waterbutler_credentials=S3COMPAT_CREDENTIALS, waterbutler_settings=LOCATION_S3COMPAT_SETTINGS)
+        self.export_data = ExportDataFactory(source=self.source, location=self.location)
+
+    @mock.patch.object(copy_strategy.S3Bucket, 'get_client')
+    def test_same_service(self, mock_get_client):
+        server_side_copy = copy_strategy.get_server_side_copy(self.export_data)
+        nt.assert_equal(server_side_copy.source.bucket, 'source-bucket')
+        nt.assert_equal(server_side_copy.destination.bucket, 'export-bucket')
+        nt.assert_equal(server_side_copy.client, mock_get_client.return_value)
+
+    def test_other_service(self):
+        self.location.waterbutler_credentials = dict(
+            S3COMPAT_CREDENTIALS, storage=dict(S3COMPAT_CREDENTIALS['storage'], host='other.example.com'))
+        nt.assert_is_none(copy_strategy.get_server_side_copy(self.export_data))
+
+    def test_not_s3(self):
+        self.export_data.source = RegionFactory()
+        nt.assert_is_none(copy_strategy.get_server_side_copy(self.export_data))
+
+    def test_disabled(self):
+        with mock.patch.object(admin_settings, 'EXPORT_DATA_SERVER_SIDE_COPY', False):
+            nt.assert_is_none(copy_strategy.get_server_side_copy(self.export_data))
+
+    @mock.patch('osf.models.ExportData.copy_export_data_file_to_location')
+    def test_export_falls_back_to_waterbutler(self, mock_copy):
+        mock_copy.return_value.status_code = 201
+        server_side_copy = copy_strategy.ServerSideCopy(
+            copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, REGION_S3COMPAT_SETTINGS),
+            copy_strategy.get_s3_bucket(S3COMPAT_CREDENTIALS, LOCATION_S3COMPAT_SETTINGS),
+            client=FakeS3Client({('source-bucket', 'hash1'): b'content'}))
+        file_versions = [
+            ('prj01', 'osfstorage', '/file1', 1, 'hash1', 1, {'object': 'hash1'}),
+            ('prj01', 'osfstorage', '/file2', 1, 'hash2', 2, {'object': 'hash2'}),
+        ]
+
+        result = export.copy_export_data_file_versions(
+            self.export_data, {}, file_versions[:1], server_side_copy=server_side_copy)
+        nt.assert_equal(result, (True, []))
+        mock_copy.assert_not_called()
+
+        result = export.copy_export_data_file_versions(
+            self.export_data, {}, file_versions[1:], server_side_copy=server_side_copy)
+        nt.assert_equal(result, (True, []))
+        mock_copy.assert_called_once()
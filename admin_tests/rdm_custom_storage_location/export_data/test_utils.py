@@ -1469,6 +1469,35 @@ class TestUtils(AdminTestCase):
         nt.assert_not_in('project', file_info['reason'])
         nt.assert_not_in('" not match', file_info['reason'])
 
+    def test_count_file_ng_ok__list_file_ng_sorted_by_path(self):
+        files_old = [gen_file(i, name=f'file_{i}.txt') for i in [1, 2]]
+        files_new = [gen_file(i, name=f'file_{i}.txt') for i in [3, 2, 1]]
+        data_old = utils.process_data_information(files_old)
+        data_new = utils.process_data_information(files_new)
+        res = utils.count_files_ng_ok(data_new, data_old)
+        nt.assert_equal(res['total'], 3)
+        nt.assert_equal(
+            [file_info['path'] for file_info in res['list_file_ng']],
+            ['/file_1.txt', '/file_2.txt', '/file_3.txt'])
+
+    def test_iter_files_ng(self):
+        files_old = [gen_file(i, version_n=2) for i in [1, 2]]
+        files_new = copy.deepcopy(files_old) + [gen_file(3)]
+        files_new[1]['version'][0]['size'] += 1
+        data_old = utils.process_data_information(files_old)
+        data_new = utils.process_data_information(files_new)
+
+        # the storage versions can be given in any order
+        res = list(utils.iter_files_ng(iter(data_new), reversed(data_old)))
+        nt.assert_equal(len(res), 5)
+        nt.assert_equal(res[:2], [None, None])
+        nt.assert_equal(res[2]['path'], '/file_2.txt')
+        nt.assert_equal(res[2]['version_id'], '2')
+        nt.assert_equal(res[2]['reason'], '"size" not match')
+        nt.assert_is_none(res[3])
+        nt.assert_equal(res[4]['path'], '/file_3.txt')
+        nt.assert_equal(res[4]['reason'], 'File is not exist')
+
 
 @pytest.mark.feature_202210
 class TestUtilsForExportData(AdminTestCase):
@@ -1691,6 +1720,44 @@ class TestUtilsForExportData(AdminTestCase):
         ]
         nt.assert_equal(result, expected_result)
 
+    @patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
+    def test_check_for_file_existent_on_export_location_stored_in(self, mock_get_file_data):
+        folder_files = {
+            '/test/': ['hash1'],
+            '/export_1_1/files/': ['hash2'],
+        }
+
+        def get_file_data(node_id, provider, path, cookies, **kwargs):
+            test_response = requests.Response()
+            test_response.status_code = status.HTTP_200_OK
+            response_body = {'data': [{'id': name, 'attributes': {'name': name}} for name in folder_files[path]]}
+            test_response._content = json.dumps(response_body).encode('utf-8')
+            return test_response
+        mock_get_file_data.side_effect = get_file_data
+
+        file_json = {
+            'files': [
+                {
+                    'materialized_path': '/test_path/file1.txt',
+                    'version': [
+                        {'size': 10, 'identifier': 1, 'metadata': {'sha256': 'hash1'}},
+                        {'size': 20, 'identifier': 2, 'metadata': {'sha256': 'hash2'}, 'stored_in': 'export_1_1'},
+                        {'size': 30, 'identifier': 3, 'metadata': {'sha256': 'hash3'}, 'stored_in': 'export_1_1'},
+                    ]
+                },
+            ]
+        }
+        result = utils.check_for_file_existent_on_export_location(file_json, TEST_PROJECT_ID, TEST_PROVIDER, '/test/', None, None, None)
+        nt.assert_equal(result, [
+            {
+                'path': '/test_path/file1.txt',
+                'size': 30,
+                'version_id': 3,
+                'reason': 'File does not exist on the Export Storage Location',
+            }
+        ])
+        nt.assert_equal(mock_get_file_data.call_count, 2)
+
 
 @pytest.mark.feature_202210
 class TestUtilsForCheckRestoreData(AdminTestCase):
@@ -2770,6 +2837,32 @@ class TestUtilsForRestoreData(AdminTestCase):
         mock_copy_file.assert_not_called()
         nt.assert_equal(response, None)
 
+    @patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_to_other_storage')
+    @patch(f'{EXPORT_DATA_UTIL_PATH}.create_folder')
+    @patch(f'{EXPORT_DATA_UTIL_PATH}.get_files_in_path')
+    def test_copy_file_from_location_to_destination_folder_created_at_the_same_time(
+            self, mock_get_files_in_path, mock_create_folder, mock_copy_file):
+        folder_info = {
+            'attributes': {
+                'path': '/folder_id/',
+                'materialized': '/folder/'
+            }
+        }
+        mock_get_files_in_path.side_effect = [[], [folder_info]]
+        mock_create_folder.return_value = (None, status.HTTP_409_CONFLICT)
+        mock_copy_file.return_value = {}
+
+        response = utils.copy_file_from_location_to_destination(
+            self.export_data, TEST_PROJECT_ID, TEST_PROVIDER,
+            '/folder/file.txt',
+            '/folder/file.txt',
+            None)
+        nt.assert_equal(mock_get_files_in_path.call_count, 2)
+        mock_create_folder.assert_called_once()
+        mock_copy_file.assert_called_once()
+        nt.assert_equal(mock_copy_file.call_args[0][4], '/folder_id/')
+        nt.assert_equal(response, {})
+
     # move_file
     def test_move_file_in_addon_storage(self):
         test_response = requests.Response()
@@ -3671,3 +3764,72 @@ class TestUtilsForRestoreData(AdminTestCase):
         nt.assert_false(utils.is_add_on_storage('osfstorage'))
         nt.assert_false(utils.is_add_on_storage('onedrive'))
         nt.assert_false(utils.is_add_on_storage('googledrive'))
+
+
+def split_chunks(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+@pytest.mark.feature_202210
+class TestFileInfoReader(AdminTestCase):
+    def setUp(self):
+        self.file_info_json = copy.deepcopy(FAKE_DATA)
+        self.data = json.dumps(self.file_info_json, indent=2).encode('utf-8')
+
+    def test_json_stream_reader(self):
+        document = {'a': {'b': [1, 'ü']}, 'items': [1.5, {'c': None}, 12345678901], 'z': 123}
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        # split multi-byte characters and numbers between chunks
+        for chunk_size in [1, 3, 1024]:
+            reader = utils.JSONStreamReader(split_chunks(data, chunk_size))
+            result = {}
+            for key in reader.members():
+                result[key] = list(reader.items()) if key == 'items' else reader.value()
+            nt.assert_equal(result, document)
+
+    def test_json_stream_reader_malformed(self):
+        for data in [b'', b'[]', b'{"a": [1 2]}', b'{1: 2}', b'{"a": [1, 2']:
+            reader = utils.JSONStreamReader([data])
+            with nt.assert_raises(ValueError):
+                for key in reader.members():
+                    list(reader.items())
+
+    def test_file_info_reader(self):
+        reader = utils.FileInfoReader(split_chunks(self.data, 100))
+        nt.assert_equal(reader.institution, self.file_info_json['institution'])
+        nt.assert_equal(list(reader.iter_files()), self.file_info_json['files'])
+        # files can be read only once
+        nt.assert_equal(list(reader.iter_files()), [])
+
+    def test_file_info_reader_folders(self):
+        self.file_info_json['folders'] = [{'path': '/folder/', 'materialized_path': '/folder/', 'name': 'folder'}]
+        reader = utils.FileInfoReader([json.dumps(self.file_info_json).encode('utf-8')])
+        nt.assert_equal(reader.folders, self.file_info_json['folders'])
+
+    def test_file_info_reader_invalid_file(self):
+        self.file_info_json['files'][1]['id'] = 'invalid'
+        reader = utils.FileInfoReader([json.dumps(self.file_info_json).encode('utf-8')])
+        files = reader.iter_files()
+        # the entries before the invalid one are returned
+        nt.assert_equal(next(files), self.file_info_json['files'][0])
+        with nt.assert_raises(ValidationError) as cm:
+            next(files)
+        nt.assert_equal(list(cm.exception.path), ['files', 1, 'id'])
+
+    def test_file_info_reader_invalid_institution(self):
+        self.file_info_json['institution'] = {'id': 'invalid'}
+        with nt.assert_raises(ValidationError):
+            utils.FileInfoReader([json.dumps(self.file_info_json).encode('utf-8')])
+
+    def test_file_info_reader_missing_required_property(self):
+        with nt.assert_raises(ValidationError):
+            utils.FileInfoReader([b'{"institution": {"id": 1, "guid": "vcu", "name": "VCU"}}'])
+
+        reader = utils.FileInfoReader([b'{"files": []}'])
+        with nt.assert_raises(ValidationError):
+            list(reader.iter_files())
+
+    def test_file_info_reader_truncated_data(self):
+        reader = utils.FileInfoReader([self.data[:-100]])
+        with nt.assert_raises(ValueError):
+            list(reader.iter_files())
@@ -1,3 +1,4 @@
+import datetime
 import json
 import logging
 import mock
@@ -10,13 +11,16 @@ from celery.exceptions import Ignore
 from celery.utils.threads import LocalStack
 from django.db import IntegrityError
 from django.test import RequestFactory
+from django.utils import timezone
 from django_celery_results.models import TaskResult
 from nose import tools as nt
+from requests.exceptions import ConnectionError
 from rest_framework import status
 
+from admin.base import settings as admin_settings
 from admin.rdm_custom_storage_location.export_data.views import export
 from framework.celery_tasks import app as celery_app
-from osf.models import ExportData
+from osf.models import ExportData, ExportDataJournal
 from osf_tests.factories import (
     InstitutionFactory,
     ExportDataLocationFactory,
@@ -506,17 +510,17 @@ class TestExportDataProcess(unittest.TestCase):
 
     @pytest.mark.django_db
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.delete_export_data_folder')
-    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.extract_file_information_json_from_source_storage')
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.write_file_information_json')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.objects')
     def test_export_data_process__raise_exception(
             self, mock_export_data,
-            mock_extract_json,
+            mock_write_file_info,
             mock_delete_export_data_folder,
     ):
         mock_export_data.filter.return_value.first.return_value = self.export_data
         mock_export_data.filter.return_value.exists.return_value = True
         mock_export_data.get.return_value = self.export_data
-        mock_extract_json.side_effect = Exception('some error')
+        mock_write_file_info.side_effect = Exception('some error')
         mock_delete_export_data_folder.side_effect = Exception('some os error')
 
         with self.assertRaises(Ignore):
@@ -538,21 +542,21 @@ class TestExportDataProcess(unittest.TestCase):
             nt.assert_not_equal(_task_result.get('traceback'), None)
 
     @pytest.mark.django_db
-    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.extract_file_information_json_from_source_storage')
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.write_file_information_json')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.objects')
     def test_export_data_process__raise_task_aborted(
-            self, mock_export_data, mock_extract_json):
+            self, mock_export_data, mock_write_file_info):
         mock_export_data.filter.return_value.first.return_value = self.export_data
         mock_export_data.filter.return_value.exists.return_value = True
         mock_export_data.get.return_value = self.export_data
-        export_data_json = file_info_json = {}
+        export_data_json = {}
 
         def do_something():
             _task = AbortableAsyncResult(self.task.request.id)
             _task.abort()
-            return export_data_json, file_info_json
+            return export_data_json
 
-        mock_extract_json.side_effect = do_something
+        mock_write_file_info.side_effect = do_something
 
         with self.assertRaises(Ignore):
             export.export_data_process(
@@ -575,11 +579,11 @@ class TestExportDataProcess(unittest.TestCase):
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.delete_export_data_folder')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_files_folder')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_folder')
-    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.extract_file_information_json_from_source_storage')
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.write_file_information_json')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.objects')
     def test_export_data_process__rollback_raise(
             self, mock_export_data,
-            mock_extract_json,
+            mock_write_file_info,
             mock_create_export_data_folder,
             mock_create_export_data_files_folder,
             mock_delete_export_data_folder
@@ -587,8 +591,8 @@ class TestExportDataProcess(unittest.TestCase):
         mock_export_data.filter.return_value.first.return_value = self.export_data
         mock_export_data.filter.return_value.exists.return_value = True
         mock_export_data.get.return_value = self.export_data
-        export_data_json = file_info_json = {}
-        mock_extract_json.return_value = export_data_json, file_info_json
+        export_data_json = {}
+        mock_write_file_info.return_value = export_data_json
         mock_create_export_data_folder.return_value.status_code = status.HTTP_201_CREATED
         mock_create_export_data_files_folder.return_value.status_code = status.HTTP_400_BAD_REQUEST
         mock_delete_export_data_folder.return_value.status_code = status.HTTP_204_NO_CONTENT
@@ -619,11 +623,11 @@ class TestExportDataProcess(unittest.TestCase):
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.get_source_file_versions_min')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_files_folder')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_folder')
-    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.extract_file_information_json_from_source_storage')
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.write_file_information_json')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.objects')
     def test_export_data_process__return_completed(
             self, mock_export_data,
-            mock_extract_json,
+            mock_write_file_info,
             mock_create_export_data_folder,
             mock_create_export_data_files_folder,
             mock_get_source_file_versions_min,
@@ -654,8 +658,7 @@ class TestExportDataProcess(unittest.TestCase):
             'size': 0,
             'file_path': self.export_data.get_file_info_file_path(),
         }
-        file_info_json = {}
-        mock_extract_json.return_value = export_data_json, file_info_json
+        mock_write_file_info.return_value = export_data_json
         mock_create_export_data_folder.return_value.status_code = status.HTTP_201_CREATED
         mock_create_export_data_files_folder.return_value.status_code = status.HTTP_201_CREATED
         file_versions = []
@@ -690,11 +693,11 @@ class TestExportDataProcess(unittest.TestCase):
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.get_source_file_versions_min')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_files_folder')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.create_export_data_folder')
-    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.extract_file_information_json_from_source_storage')
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.write_file_information_json')
     @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.objects')
     def test_export_data_process__connection_timeout(
             self, mock_export_data,
-            mock_extract_json,
+            mock_write_file_info,
             mock_create_export_data_folder,
             mock_create_export_data_files_folder,
             mock_get_source_file_versions_min,
@@ -724,8 +727,7 @@ class TestExportDataProcess(unittest.TestCase):
             'size': 0,
             'file_path': self.export_data.get_file_info_file_path(),
         }
-        file_info_json = {}
-        mock_extract_json.return_value = export_data_json, file_info_json
+        mock_write_file_info.return_value = export_data_json
         mock_create_export_data_folder.return_value.status_code = status.HTTP_201_CREATED
         mock_create_export_data_files_folder.return_value.status_code = status.HTTP_201_CREATED
         file_versions = []
@@ -752,6 +754,140 @@ class TestExportDataProcess(unittest.TestCase):
         ))
 
 
+@pytest.mark.django_db
+class TestCopyExportDataFiles(unittest.TestCase):
+    def setUp(self):
+        super(TestCopyExportDataFiles, self).setUp()
+        self.task = AbortableTask()
+        self.task.request_stack = LocalStack()
+        self.task.request.id = FAKE_TASK_ID
+        self.export_data = ExportDataFactory(status=ExportData.STATUS_RUNNING)
+        self.cookies = 'abcd'
+        # (project_id, provider, file_path, version, file_name, file_id, location)
+        self.file_versions = [
+            ('prj01', 'osfstorage', '/file1', 1, 'hash1', 1, {'object': 'hash1'}),
+            ('prj01', 'osfstorage', '/file1', 2, 'hash2', 1, {'object': 'hash2'}),
+            ('prj01', 'osfstorage', '/file2', 1, 'hash1', 2, {'object': 'hash1'}),
+            ('prj01', 'osfstorage', '/file3', 1, 'hash3', 3, {'object': 'hash3'}),
+        ]
+
+    def copy_files(self):
+        return export.copy_export_data_files(
+            self.task, self.cookies, self.export_data, self.file_versions, time.time(),
+            self.export_data.location.id, self.export_data.source.id,
+        )
+
+    def test_group_file_versions_by_hash(self):
+        groups = export.group_file_versions_by_hash(self.file_versions)
+        nt.assert_equal(list(groups.keys()), ['hash1', 'hash2', 'hash3'])
+        nt.assert_equal(groups['hash1'], [self.file_versions[0], self.file_versions[2]])
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_copy_each_hash_once(self, mock_copy):
+        mock_copy.return_value.status_code = status.HTTP_201_CREATED
+
+        self.copy_files()
+
+        nt.assert_equal(mock_copy.call_count, 3)
+        copied = sorted(call[0][4] for call in mock_copy.call_args_list)
+        nt.assert_equal(copied, ['hash1', 'hash2', 'hash3'])
+        journal = ExportDataJournal.objects.filter(export_data=self.export_data)
+        nt.assert_equal(journal.filter(status=ExportDataJournal.STATUS_DONE).count(), 3)
+        nt.assert_equal(export.get_failed_file_versions(self.export_data), {})
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_resume_skips_copied_hashes(self, mock_copy):
+        mock_copy.return_value.status_code = status.HTTP_201_CREATED
+        ExportDataJournal.objects.create(
+            export_data=self.export_data, file_name='hash1', status=ExportDataJournal.STATUS_DONE)
+        ExportDataJournal.objects.create(
+            export_data=self.export_data, file_name='hash2', status=ExportDataJournal.STATUS_FAILED,
+            failures=[[1, 2]])
+
+        self.copy_files()
+
+        copied = sorted(call[0][4] for call in mock_copy.call_args_list)
+        nt.assert_equal(copied, ['hash2', 'hash3'])
+        nt.assert_equal(export.get_failed_file_versions(self.export_data), {})
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_failed_file_version_falls_back_to_same_hash(self, mock_copy):
+        def copy(cookies, project_id, provider, file_path, file_name, **kwargs):
+            response = mock.MagicMock()
+            response.status_code = status.HTTP_400_BAD_REQUEST if file_path == '/file1' else status.HTTP_201_CREATED
+            return response
+        mock_copy.side_effect = copy
+
+        self.copy_files()
+
+        journal = ExportDataJournal.objects.get(export_data=self.export_data, file_name='hash1')
+        nt.assert_equal(journal.status, ExportDataJournal.STATUS_DONE)
+        nt.assert_equal(journal.failures, [[1, 1]])
+        journal = ExportDataJournal.objects.get(export_data=self.export_data, file_name='hash2')
+        nt.assert_equal(journal.status, ExportDataJournal.STATUS_FAILED)
+        nt.assert_equal(export.get_failed_file_versions(self.export_data), {1: [1, 2]})
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_connection_error_is_a_failure(self, mock_copy):
+        mock_copy.side_effect = ConnectionError('connection error')
+
+        self.copy_files()
+
+        journal = ExportDataJournal.objects.filter(export_data=self.export_data)
+        nt.assert_equal(journal.filter(status=ExportDataJournal.STATUS_FAILED).count(), 3)
+        nt.assert_equal(export.get_failed_file_versions(self.export_data), {1: [1, 2], 2: [1], 3: [1]})
+
+    def create_previous_export(self, **kwargs):
+        params = dict(location=self.export_data.location, status=ExportData.STATUS_COMPLETED)
+        params.update(kwargs)
+        previous = ExportDataFactory(**params)
+        ExportDataJournal.objects.create(
+            export_data=previous, file_name='hash1', status=ExportDataJournal.STATUS_DONE)
+        return previous
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_incremental_reuses_exported_contents(self, mock_copy):
+        mock_copy.return_value.status_code = status.HTTP_201_CREATED
+        previous = self.create_previous_export()
+
+        export.copy_export_data_files(
+            self.task, self.cookies, self.export_data, self.file_versions, time.time(),
+            self.export_data.location.id, self.export_data.source.id, is_incremental=True,
+        )
+
+        copied = sorted(call[0][4] for call in mock_copy.call_args_list)
+        nt.assert_equal(copied, ['hash2', 'hash3'])
+        journal = ExportDataJournal.objects.get(export_data=self.export_data, file_name='hash1')
+        nt.assert_equal(journal.status, ExportDataJournal.STATUS_DONE)
+        nt.assert_equal(journal.stored_in, previous)
+        nt.assert_equal(export.get_stored_in_folders(self.export_data),
+                        {'hash1': previous.export_data_folder_name})
+
+    @mock.patch(f'{EXPORT_DATA_PATH}.ExportData.copy_export_data_file_to_location')
+    def test_incremental_ignores_other_exports(self, mock_copy):
+        mock_copy.return_value.status_code = status.HTTP_201_CREATED
+        self.create_previous_export(location=ExportDataLocationFactory())
+        self.create_previous_export(status=ExportData.STATUS_ERROR)
+        self.create_previous_export(is_deleted=True)
+
+        export.copy_export_data_files(
+            self.task, self.cookies, self.export_data, self.file_versions, time.time(),
+            self.export_data.location.id, self.export_data.source.id, is_incremental=True,
+        )
+
+        nt.assert_equal(mock_copy.call_count, 3)
+        nt.assert_equal(export.get_stored_in_folders(self.export_data), {})
+
+    def test_get_exported_objects_follows_reused_contents(self):
+        first = self.create_previous_export()
+        second = ExportDataFactory(location=self.export_data.location, status=ExportData.STATUS_COMPLETED)
+        ExportDataJournal.objects.create(
+            export_data=second, file_name='hash1', status=ExportDataJournal.STATUS_DONE, stored_in=first)
+
+        exported = export.get_exported_objects(self.export_data, ['hash1', 'hash2'])
+        nt.assert_equal(exported, {'hash1': first.id})
+
+
 class TestExportDataRollbackProcess(unittest.TestCase):
     def setUp(self):
         super(TestExportDataRollbackProcess, self).setUp()
@@ -1562,6 +1698,109 @@ class TestStopExportDataActionView(AdminTestCase):
         nt.assert_equal(response.data.get('status'), export_data.status)
 
 
+class TestResumeExportDataActionView(AdminTestCase):
+    def setUp(self):
+        super(TestResumeExportDataActionView, self).setUp()
+        celery_app.conf.update({
+            'task_always_eager': False,
+            'task_eager_propagates': False,
+        })
+
+        self.institution = InstitutionFactory()
+        self.source = RegionFactory()
+        self.source._id = self.institution._id
+        self.source.save()
+        self.location = ExportDataLocationFactory()
+        self.location.institution_guid = self.institution._id
+        self.location.save()
+
+        self.user = AuthUserFactory()
+        self.user.is_staff = True
+        self.user.affiliated_institutions.add(self.institution)
+        self.user.save()
+
+        self.task = AbortableTask()
+        self.task.request_stack = LocalStack()
+        self.task.request.id = FAKE_TASK_ID
+        self.other_task = AbortableTask()
+        self.other_task.request_stack = LocalStack()
+        self.other_task.request.id = FAKE_TASK_ID[:-1] + '1'
+
+        self.export_data = ExportDataFactory(
+            creator=self.user,
+            source=self.source,
+            location=self.location,
+            task_id=self.task.request.id,
+            status=ExportData.STATUS_RUNNING
+        )
+
+        self.request = RequestFactory().post('export_data', {})
+        self.request.user = self.user
+        self.request.data = {
+            'institution_id': self.institution.id,
+            'source_id': self.source.id,
+            'location_id': self.location.id,
+            'task_id': self.task.request.id,
+        }
+
+        self.view = export.ResumeExportDataActionView()
+        self.view.request = self.request
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post__400_completed(self, mock_async_result):
+        mock_async_result.return_value = {'status': states.SUCCESS, 'result': {}}
+        self.export_data.status = ExportData.STATUS_COMPLETED
+        self.export_data.save()
+
+        response = self.view.post(self.request)
+
+        nt.assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
+        nt.assert_equal(response.data.get('message'), export.MSG_EXPORT_UNRESUMABLE)
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post__400_still_running(self, mock_async_result):
+        mock_async_result.return_value = {'status': states.STARTED, 'result': {}}
+
+        response = self.view.post(self.request)
+
+        nt.assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
+        nt.assert_equal(response.data.get('message'), export.MSG_EXPORT_UNRESUMABLE)
+        nt.assert_equal(response.data.get('task_state'), states.STARTED)
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult.revoke')
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post__200_stale_running(self, mock_async_result, mock_task, mock_revoke):
+        mock_async_result.return_value = {'status': states.STARTED, 'result': {}}
+        mock_task.return_value = AbortableAsyncResult(self.other_task.request.id)
+        stale = timezone.now() - datetime.timedelta(seconds=admin_settings.EXPORT_DATA_RESUME_STALE_TIME + 1)
+        ExportData.objects.filter(pk=self.export_data.pk).update(modified=stale)
+
+        response = self.view.post(self.request)
+
+        nt.assert_equal(response.status_code, status.HTTP_200_OK)
+        mock_revoke.assert_called_once_with(terminate=True)
+        nt.assert_equal(response.data.get('task_id'), self.other_task.request.id)
+        nt.assert_true(mock_task.call_args[1]['is_resume'])
+        self.export_data.refresh_from_db()
+        nt.assert_equal(self.export_data.task_id, self.other_task.request.id)
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult.revoke')
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post__200_failed(self, mock_async_result, mock_task, mock_revoke):
+        mock_async_result.return_value = {'status': states.FAILURE, 'result': {}}
+        mock_task.return_value = AbortableAsyncResult(self.other_task.request.id)
+        self.export_data.status = ExportData.STATUS_ERROR
+        self.export_data.save()
+
+        response = self.view.post(self.request)
+
+        nt.assert_equal(response.status_code, status.HTTP_200_OK)
+        nt.assert_equal(response.data.get('task_id'), self.other_task.request.id)
+        nt.assert_false(mock_revoke.called)
+
+
 class TestCheckStateExportDataActionView(AdminTestCase):
     def setUp(self):
         super(TestCheckStateExportDataActionView, self).setUp()
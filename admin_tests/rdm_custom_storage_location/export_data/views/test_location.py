@@ -7,9 +7,10 @@ from rest_framework import status as http_status
 
 from admin.rdm_custom_storage_location.export_data.views import location
 from admin_tests.utilities import setup_view
-from osf.models import ExportDataLocation
+from osf.models import ExportData, ExportDataJournal, ExportDataLocation
 from osf_tests.factories import (
     AuthUserFactory,
+    ExportDataFactory,
     InstitutionFactory,
 )
 from tests.base import AdminTestCase
@@ -347,6 +348,21 @@ class TestDeleteCredentialsView(AdminTestCase):
 
         nt.assert_equals(result.status_code, 200)
 
+    def test_delete_with_incremental_export(self):
+        export_location = ExportDataLocation.objects.create(institution_guid=self.institution.guid)
+        first = ExportDataFactory(location=export_location)
+        second = ExportDataFactory(location=export_location)
+        ExportDataJournal.objects.create(
+            export_data=second, file_name='hash1', status=ExportDataJournal.STATUS_DONE, stored_in=first)
+        view = setup_view(self.view, self.request, export_location.id)
+        view.institution_guid = self.institution.guid
+        view.storage_location = export_location
+        result = view.delete(self.request, export_location.id)
+
+        nt.assert_equals(result.status_code, 200)
+        nt.assert_false(ExportData.objects.filter(id__in=[first.id, second.id]).exists())
+        nt.assert_false(ExportDataJournal.objects.exists())
+
     def test_delete_exception(self):
         export_location = ExportDataLocation.objects.create()
 
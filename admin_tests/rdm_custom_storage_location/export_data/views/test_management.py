@@ -1,4 +1,5 @@
 import copy
+import datetime
 import json
 import mock
 import pytest
@@ -11,7 +12,7 @@ from nose import tools as nt
 
 from admin.rdm_custom_storage_location.export_data.views import management
 from admin_tests.utilities import setup_view
-from osf.models import ExportData, ExportDataRestore
+from osf.models import ExportData, ExportDataJournal, ExportDataRestore
 from osf_tests.factories import (
     AuthUserFactory,
     InstitutionFactory,
@@ -36,6 +37,9 @@ class FakeRes:
     def json(self):
         return self._content_data
 
+    def iter_content(self, chunk_size=None):
+        return [json.dumps(self._content_data).encode('utf-8')]
+
 
 @pytest.mark.feature_202210
 class TestExportBaseView(AdminTestCase):
@@ -589,7 +593,7 @@ class TestCheckRestoreData(AdminTestCase):
         mock_class.side_effect = side_effect
         mock_export_data = mock.MagicMock()
         mock_request = mock.MagicMock()
-        mock_request.get.return_value = FakeRes(200)
+        mock_request.get.return_value = FakeRes(200, {'institution': {}, 'files': []})
         mock_export_data.filter.return_value.first.return_value = self.export_data
 
         with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.ExportData.objects', mock_export_data):
@@ -601,17 +605,17 @@ class TestCheckRestoreData(AdminTestCase):
                 view.destination_id = self.export_data.source.id
                 res = view.get(request, data_id=self.export_data.id)
                 nt.assert_equals(res.status_code, 400)
+                nt.assert_equal(json.loads(res.content.decode())['message'], 'The export data files are corrupted.')
 
     @mock.patch.object(ExportData, 'get_latest_restored_data_with_destination_id')
-    @mock.patch.object(ExportDataRestore, 'extract_file_information_json_from_destination_storage')
-    def test_check_restore_data__successful(self, mock_extract_file, mock_get_latest_restore):
-        def side_effect_export_data():
-            return '', FAKE_DATA_NEW
-
+    @mock.patch.object(ExportDataRestore, 'get_destination_file_nodes')
+    @mock.patch.object(ExportDataRestore, 'iter_file_information')
+    def test_check_restore_data__successful(self, mock_iter_file_info, mock_get_file_nodes, mock_get_latest_restore):
         def side_effect_export_data_restore(destination_id=100):
             return self.export_data_restore
 
-        mock_extract_file.side_effect = side_effect_export_data
+        mock_iter_file_info.return_value = iter(FAKE_DATA_NEW['files'])
+        mock_get_file_nodes.return_value = None
         mock_get_latest_restore.side_effect = side_effect_export_data_restore
 
         mock_export_data = mock.MagicMock()
@@ -621,9 +625,9 @@ class TestCheckRestoreData(AdminTestCase):
             mock_request = mock.MagicMock()
             mock_request.get.return_value = FakeRes(200)
             with mock.patch('osf.models.export_data.requests', mock_request):
-                mock_validate = mock.MagicMock()
-                mock_validate.return_value = True
-                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.validate_exported_data', mock_validate):
+                mock_file_info_reader = mock.MagicMock()
+                mock_file_info_reader.return_value.iter_files.return_value = iter(FAKE_DATA['files'])
+                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.FileInfoReader', mock_file_info_reader):
                     request = RequestFactory().get('/fake_path')
                     request.user = self.user
                     request.COOKIES = '213919sdasdn823193929'
@@ -642,8 +646,9 @@ class TestCheckRestoreData(AdminTestCase):
         nt.assert_equal(len(content_data['list_file_ng']), content_data['ng'])
 
     @mock.patch.object(ExportData, 'get_latest_restored_data_with_destination_id')
-    @mock.patch.object(ExportDataRestore, 'extract_file_information_json_from_destination_storage')
-    def test_check_restore_data__successful__when_location_change(self, mock_extract_file, mock_get_latest_restore):
+    @mock.patch.object(ExportDataRestore, 'get_destination_file_nodes')
+    @mock.patch.object(ExportDataRestore, 'iter_file_information')
+    def test_check_restore_data__successful__when_location_change(self, mock_iter_file_info, mock_get_file_nodes, mock_get_latest_restore):
         request = RequestFactory().get('/fake_path')
         request.user = self.user
         request.COOKIES = '213919sdasdn823193929'
@@ -655,9 +660,6 @@ class TestCheckRestoreData(AdminTestCase):
         fake_data_json = copy.deepcopy(FAKE_DATA_NEW)
         fake_data_json['files'] = files_old
 
-        def side_effect_export_data():
-            return '', fake_data_json
-
         # simulate the case where the location is changed
         files_new = []
         for file_info in copy.deepcopy(files_old):
@@ -670,12 +672,12 @@ class TestCheckRestoreData(AdminTestCase):
             latest_ver_location['bucket'] = 'grdm-ierae-new',
             file_info['location'] = latest_version['location']
             files_new.append(file_info)
-        fake_data_json['files'] = files_new
 
         def side_effect_export_data_restore(destination_id=100):
             return self.export_data_restore
 
-        mock_extract_file.side_effect = side_effect_export_data
+        mock_iter_file_info.return_value = iter(files_new)
+        mock_get_file_nodes.return_value = None
         mock_get_latest_restore.side_effect = side_effect_export_data_restore
 
         mock_export_data = mock.MagicMock()
@@ -685,9 +687,9 @@ class TestCheckRestoreData(AdminTestCase):
             mock_request = mock.MagicMock()
             mock_request.get.return_value = FakeRes(200, fake_data_json)
             with mock.patch('osf.models.export_data.requests', mock_request):
-                mock_validate = mock.MagicMock()
-                mock_validate.return_value = True
-                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.validate_exported_data', mock_validate):
+                mock_file_info_reader = mock.MagicMock()
+                mock_file_info_reader.return_value.iter_files.return_value = iter(files_old)
+                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.FileInfoReader', mock_file_info_reader):
                     view = management.CheckRestoreData()
                     view = setup_view(view, request, data_id=self.export_data.id)
                     view.export_data = self.export_data
@@ -739,15 +741,14 @@ class TestCheckRestoreData(AdminTestCase):
         nt.assert_equals(res.status_code, 400)
 
     @mock.patch.object(ExportData, 'get_latest_restored_data_with_destination_id')
-    @mock.patch.object(ExportDataRestore, 'extract_file_information_json_from_destination_storage')
-    def test__dispatch_success(self, mock_class_export, mock_class_restore):
-        def side_effect_export_data():
-            return '', FAKE_DATA_NEW
-
+    @mock.patch.object(ExportDataRestore, 'get_destination_file_nodes')
+    @mock.patch.object(ExportDataRestore, 'iter_file_information')
+    def test__dispatch_success(self, mock_iter_file_info, mock_get_file_nodes, mock_class_restore):
         def side_effect_export_data_restore(destination_id=100):
             return self.export_data_restore
 
-        mock_class_export.side_effect = side_effect_export_data
+        mock_iter_file_info.return_value = iter(FAKE_DATA_NEW['files'])
+        mock_get_file_nodes.return_value = None
         mock_class_restore.side_effect = side_effect_export_data_restore
         mock_export_data = mock.MagicMock()
         self.export_data.source._id = 'vcu'
@@ -756,9 +757,9 @@ class TestCheckRestoreData(AdminTestCase):
             mock_request = mock.MagicMock()
             mock_request.get.return_value = FakeRes(200)
             with mock.patch('osf.models.export_data.requests', mock_request):
-                mock_validate = mock.MagicMock()
-                mock_validate.return_value = True
-                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.validate_exported_data', mock_validate):
+                mock_file_info_reader = mock.MagicMock()
+                mock_file_info_reader.return_value.iter_files.return_value = iter(FAKE_DATA['files'])
+                with mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.FileInfoReader', mock_file_info_reader):
                     request = RequestFactory().get('/fake_path')
                     request.user = self.superuser
                     request.COOKIES = '213919sdasdn823193929'
@@ -1029,6 +1030,43 @@ class TestDeleteExportDataView(AdminTestCase):
         res = view.post(request)
         nt.assert_equal(res.status_code, 400)
 
+    @mock.patch('osf.models.export_data.requests')
+    @mock.patch(f'{MANAGEMENT_EXPORT_DATA_PATH}.render_bad_request_response')
+    def test_delete_permanently_files_used(self, mock_render, mock_request):
+        mock_render.return_value = HttpResponseBadRequest(content='fake')
+        mock_request.delete.return_value = JsonResponse({'message': ''}, status=204)
+        unused = ExportDataFactory(is_deleted=True)
+        used = ExportDataFactory(is_deleted=True)
+        ExportDataJournal.objects.create(
+            export_data=self.export_data, file_name='hash1', status=ExportDataJournal.STATUS_DONE, stored_in=used)
+        request = RequestFactory().post('/fake_path')
+        request.user = self.user
+        request.COOKIES = '213919sdasdn823193929'
+        request.POST = {'list_id_export_data': f'{unused.id}#{used.id}#', 'delete_permanently': 'on'}
+        view = setup_view(self.view, request)
+        res = view.post(request)
+        nt.assert_equal(res.status_code, 400)
+        nt.assert_false(mock_request.delete.called)
+        nt.assert_equal(ExportData.objects.filter(id__in=[unused.id, used.id]).count(), 2)
+
+    @mock.patch('osf.models.export_data.requests')
+    def test_delete_permanently_with_incremental(self, mock_request):
+        mock_request.delete.return_value = JsonResponse({'message': ''}, status=204)
+        previous = ExportDataFactory(
+            is_deleted=True, process_start=self.export_data.process_start - datetime.timedelta(days=1))
+        self.export_data.is_deleted = True
+        self.export_data.save()
+        ExportDataJournal.objects.create(
+            export_data=self.export_data, file_name='hash1', status=ExportDataJournal.STATUS_DONE, stored_in=previous)
+        request = RequestFactory().post('/fake_path')
+        request.user = self.user
+        request.COOKIES = '213919sdasdn823193929'
+        request.POST = {'list_id_export_data': f'{previous.id}#{self.export_data.id}#', 'delete_permanently': 'on'}
+        view = setup_view(self.view, request)
+        res = view.post(request)
+        nt.assert_equal(res.status_code, 302)
+        nt.assert_false(ExportData.objects.filter(id__in=[previous.id, self.export_data.id]).exists())
+
     def test_delete_not_permanently(self):
         request = RequestFactory().post('/fake_path')
         request.user = self.user
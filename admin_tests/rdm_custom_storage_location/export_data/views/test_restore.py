@@ -1,3 +1,5 @@
+import datetime
+import io
 import json
 
 import mock
@@ -7,15 +9,18 @@ from celery import states
 from celery.contrib.abortable import AbortableTask, AbortableAsyncResult
 from celery.utils.threads import LocalStack
 from django.db import IntegrityError
+from django.utils import timezone
+from jsonschema import ValidationError
 from nose import tools as nt
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIRequestFactory
 
+from admin.base import settings as admin_settings
 from admin.rdm_custom_storage_location.export_data.views import restore
 from admin.rdm_custom_storage_location.export_data.views.restore import ProcessError
 from framework.celery_tasks import app as celery_app
-from osf.models import RdmFileTimestamptokenVerifyResult, ExportData, ExportDataRestore, FileVersion
+from osf.models import RdmFileTimestamptokenVerifyResult, ExportData, ExportDataRestore, ExportDataRestoreJournal, FileVersion, Tag
 from osf_tests.factories import (
     AuthUserFactory,
     ExportDataFactory,
@@ -39,6 +44,14 @@ EXPORT_DATA_UTIL_PATH = 'admin.rdm_custom_storage_location.export_data.utils'
 EXPORT_DATA_TASK_PATH = 'admin.rdm_custom_storage_location.tasks'
 
 
+def get_mock_file_info_reader(folders, files):
+    mock_reader = mock.MagicMock()
+    mock_reader.institution = {'id': 1, 'guid': 'vcu', 'name': 'VCU'}
+    mock_reader.folders = folders
+    mock_reader.iter_files.return_value = iter(files)
+    return mock_reader
+
+
 # Test cases for initializing ProcessError
 @pytest.mark.feature_202210
 def test_init_process_error():
@@ -563,9 +576,14 @@ class TestRestoreDataFunction(AdminTestCase):
         self.bulk_mount_data_restore = ExportDataRestoreFactory.create(destination=bulkmount_region)
         self.user = UserFactory()
 
+        # copy the files in the test thread, the worker threads do not see the test transaction
+        concurrency_patcher = mock.patch.object(admin_settings, 'EXPORT_DATA_RESTORE_CONCURRENCY', 1)
+        concurrency_patcher.start()
+        self.addCleanup(concurrency_patcher.stop)
+
     # check_before_restore_export_data
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_export_data_and_check_schema')
     def test_check_before_restore_export_data_empty_destination_storage(self, mock_read_export_data, mock_read_file_info, mock_utils_get_file_data):
         test_response = requests.Response()
@@ -573,7 +591,7 @@ class TestRestoreDataFunction(AdminTestCase):
         test_response._content = json.dumps({'data': []}).encode('utf-8')
 
         mock_read_export_data.return_value = True
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [])
         mock_utils_get_file_data.return_value = test_response
 
         result = self.view.check_before_restore_export_data(None, self.export_data.id,
@@ -584,7 +602,7 @@ class TestRestoreDataFunction(AdminTestCase):
         nt.assert_equal(result, {'open_dialog': False})
 
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_export_data_and_check_schema')
     def test_check_before_restore_export_data_bulk_mount_destination_storage(self, mock_read_export_data, mock_read_file_info, mock_utils_get_file_data):
         test_response = requests.Response()
@@ -592,7 +610,7 @@ class TestRestoreDataFunction(AdminTestCase):
         test_response._content = json.dumps({'data': []}).encode('utf-8')
 
         mock_read_export_data.return_value = True
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}], 'files': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [{'project': {'id': self.project_id}}])
         mock_utils_get_file_data.return_value = test_response
 
         result = self.view.check_before_restore_export_data(None, self.export_data.id,
@@ -626,9 +644,9 @@ class TestRestoreDataFunction(AdminTestCase):
     def test_check_before_restore_export_data_error_at_file_info(self, mock_read_export_data):
         mock_read_export_data.return_value = True
         mock_read_file_info = mock.MagicMock()
-        mock_read_file_info.return_value = {}
+        mock_read_file_info.return_value = get_mock_file_info_reader([], [])
 
-        with mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema', mock_read_file_info):
+        with mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema', mock_read_file_info):
             result = self.view.check_before_restore_export_data(None, self.export_data.id,
                                                                 self.addon_data_restore.destination.id)
             mock_read_export_data.assert_called()
@@ -639,9 +657,9 @@ class TestRestoreDataFunction(AdminTestCase):
     def test_check_before_restore_export_data_no_destination_region_found(self, mock_read_export_data):
         mock_read_export_data.return_value = True
         mock_read_file_info = mock.MagicMock()
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [])
 
-        with mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema', mock_read_file_info):
+        with mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema', mock_read_file_info):
             result = self.view.check_before_restore_export_data(None, self.export_data.id, -1)
             mock_read_export_data.assert_called()
             mock_read_file_info.assert_called()
@@ -649,7 +667,7 @@ class TestRestoreDataFunction(AdminTestCase):
                             {'open_dialog': False, 'message': f'Failed to get destination storage information'})
 
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_export_data_and_check_schema')
     def test_check_before_restore_export_data_error_at_check_destination_storage(self, mock_read_export_data, mock_read_file_info,
                                                                                  mock_utils_get_file_data):
@@ -659,7 +677,7 @@ class TestRestoreDataFunction(AdminTestCase):
             {'message': f'Mock test bad request when check destination storage'}).encode('utf-8')
 
         mock_read_export_data.return_value = True
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [])
         mock_utils_get_file_data.return_value = test_response
 
         result = self.view.check_before_restore_export_data(None, self.export_data.id,
@@ -670,7 +688,7 @@ class TestRestoreDataFunction(AdminTestCase):
         nt.assert_equal(result, {'open_dialog': False, 'message': f'Cannot connect to destination storage'})
 
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_export_data_and_check_schema')
     def test_check_before_restore_export_data_not_empty_destination_storage(self, mock_read_export_data, mock_read_file_info, mock_utils_get_file_data):
         test_response = requests.Response()
@@ -678,7 +696,7 @@ class TestRestoreDataFunction(AdminTestCase):
         test_response._content = json.dumps({'data': [{}]}).encode('utf-8')
 
         mock_read_export_data.return_value = True
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [])
         mock_utils_get_file_data.return_value = test_response
 
         result = self.view.check_before_restore_export_data(None, self.export_data.id,
@@ -689,12 +707,12 @@ class TestRestoreDataFunction(AdminTestCase):
         nt.assert_equal(result, {'open_dialog': True})
 
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.get_file_data')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_export_data_and_check_schema')
     def test_check_before_restore_export_data_exception_at_check_destination_storage(self, mock_read_export_data, mock_read_file_info,
                                                                                      mock_utils_get_file_data):
         mock_read_export_data.return_value = True
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': self.project_id}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': self.project_id}}], [])
         mock_utils_get_file_data.side_effect = Exception('Mock test exception at check destination storage')
 
         result = self.view.check_before_restore_export_data(None, self.export_data.id,
@@ -737,14 +755,14 @@ class TestRestoreDataFunction(AdminTestCase):
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_process(self, mock_read_file_info, mock_check_process, mock_move_to_backup, mock_copy_to_destination,
                                          mock_add_tag_and_timestamp, mock_create_folder_path):
         task = AbortableTask()
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_check_process.return_value = None
         mock_move_to_backup.return_value = None
         mock_copy_to_destination.return_value = [{}, []]
@@ -757,6 +775,33 @@ class TestRestoreDataFunction(AdminTestCase):
         mock_check_process.assert_called()
         mock_move_to_backup.assert_called()
         mock_copy_to_destination.assert_called()
+        nt.assert_equal(list(mock_copy_to_destination.call_args[0][2]), [{'project': {'id': 1}}])
+        mock_add_tag_and_timestamp.assert_called()
+
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.create_folder_in_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tag_and_timestamp_to_database')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
+    def test_restore_export_data_process_resume(self, mock_read_file_info, mock_check_process, mock_move_to_backup,
+                                                mock_copy_to_destination, mock_add_tag_and_timestamp, mock_create_folder_path):
+        task = AbortableTask()
+        task.request_stack = LocalStack()
+        task.request.id = FAKE_TASK_ID
+        ExportDataRestoreJournal.objects.create(
+            export_data_restore=self.addon_data_restore, file_id=1, status=ExportDataRestoreJournal.STATUS_DONE)
+
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
+        mock_copy_to_destination.return_value = [{}, []]
+
+        self.view.restore_export_data_process(task, {}, self.addon_data_restore.export.id,
+                                              self.addon_data_restore.id, ['vcu'], is_resume=True)
+        # the files were moved to the backup folder by the interrupted process
+        mock_move_to_backup.assert_not_called()
+        mock_create_folder_path.assert_called()
+        mock_copy_to_destination.assert_called()
+        nt.assert_not_in('is_resume', mock_copy_to_destination.call_args[1])
         mock_add_tag_and_timestamp.assert_called()
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.create_folder_in_destination')
@@ -764,14 +809,14 @@ class TestRestoreDataFunction(AdminTestCase):
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_process_empty_file_info_list(self, mock_read_file_info, mock_check_process, mock_move_to_backup,
                                                               mock_copy_to_destination, mock_add_tag_and_timestamp, mock_create_folder_path):
         task = AbortableTask()
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {}
+        mock_read_file_info.return_value = get_mock_file_info_reader([], [])
         mock_check_process.return_value = None
         mock_move_to_backup.return_value = None
         mock_copy_to_destination.return_value = [{}]
@@ -791,7 +836,7 @@ class TestRestoreDataFunction(AdminTestCase):
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_process_bulk_mount_storage(
             self, mock_read_file_info, mock_check_process, mock_move_to_backup, mock_copy_to_destination,
             mock_add_tag_and_timestamp, mock_create_folder_path):
@@ -799,7 +844,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_check_process.return_value = None
         mock_move_to_backup.return_value = None
         mock_copy_to_destination.return_value = [{}, []]
@@ -819,7 +864,7 @@ class TestRestoreDataFunction(AdminTestCase):
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_process_abort_exception(self, mock_read_file_info, mock_check_process, mock_move_to_backup, mock_copy_to_destination,
                                                          mock_add_tag_and_timestamp, mock_create_folder_path):
         task = AbortableTask()
@@ -831,7 +876,7 @@ class TestRestoreDataFunction(AdminTestCase):
             task_result.abort()
             raise ProcessError(f'Mock test abort process')
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_check_process.side_effect = mock_callback_test_check_process_abort
         mock_move_to_backup.return_value = None
         mock_copy_to_destination.return_value = [{}]
@@ -852,14 +897,14 @@ class TestRestoreDataFunction(AdminTestCase):
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.copy_files_from_export_data_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_to_backup_folder')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_process_other_exception(self, mock_read_file_info, mock_check_process, mock_move_to_backup, mock_copy_to_destination,
                                                          mock_add_tag_and_timestamp, mock_create_folder_path):
         task = AbortableTask()
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_check_process.return_value = None
         mock_move_to_backup.return_value = None
         mock_create_folder_path.return_value = None
@@ -1001,55 +1046,48 @@ class TestRestoreDataFunction(AdminTestCase):
                 mock_validate_file_json.assert_called_once()
                 nt.assert_equal(result, False)
 
-    # read_file_info_and_check_schema
-    def test_read_file_info_and_check_schema_read_error(self):
+    # read_file_info_stream_and_check_schema
+    def test_read_file_info_stream_and_check_schema_read_error(self):
         test_response = requests.Response()
         test_response.status_code = status.HTTP_400_BAD_REQUEST
-        test_response._content = json.dumps({}).encode('utf-8')
 
         mock_read_file_info = mock.MagicMock()
         mock_read_file_info.return_value = test_response
         with mock.patch.object(ExportData, 'read_file_info_from_location', mock_read_file_info):
             with nt.assert_raises(ProcessError):
-                result = self.view.read_file_info_and_check_schema(ExportData(), {})
-                nt.assert_is_none(result)
+                self.view.read_file_info_stream_and_check_schema(ExportData(), {})
 
-    def test_read_file_info_and_check_schema_read_exception(self):
-        mock_read_file_info = mock.MagicMock()
-        mock_read_file_info.side_effect = ValueError('Mock test fail to read file info')
-        with mock.patch.object(ExportData, 'read_file_info_from_location', mock_read_file_info):
-            with nt.assert_raises(ProcessError):
-                result = self.view.read_file_info_and_check_schema(ExportData(), {})
-                nt.assert_is_none(result)
-
-    def test_read_file_info_and_check_schema_invalid_file(self):
+    def test_read_file_info_stream_and_check_schema_invalid_file(self):
         test_response = requests.Response()
         test_response.status_code = status.HTTP_200_OK
-        test_response._content = json.dumps({}).encode('utf-8')
+        test_response.raw = io.BytesIO(json.dumps({'institution': {}, 'files': []}).encode('utf-8'))
 
         mock_read_file_info = mock.MagicMock()
         mock_read_file_info.return_value = test_response
-        mock_validate_file_json = mock.MagicMock()
-        mock_validate_file_json.return_value = False
         with mock.patch.object(ExportData, 'read_file_info_from_location', mock_read_file_info):
-            with mock.patch(f'{EXPORT_DATA_UTIL_PATH}.validate_file_json', mock_validate_file_json):
-                with nt.assert_raises(ProcessError):
-                    result = self.view.read_file_info_and_check_schema(ExportData(), {})
-                    nt.assert_is_none(result)
+            with nt.assert_raises(ProcessError):
+                self.view.read_file_info_stream_and_check_schema(ExportData(), {})
 
-    def test_read_file_info_and_check_schema_valid_file(self):
+    def test_read_file_info_stream_and_check_schema_valid_file(self):
+        institution = {'id': 1, 'guid': 'vcu', 'name': 'VCU'}
         test_response = requests.Response()
         test_response.status_code = status.HTTP_200_OK
-        test_response._content = json.dumps({}).encode('utf-8')
+        test_response.raw = io.BytesIO(json.dumps({'institution': institution, 'folders': [], 'files': []}).encode('utf-8'))
 
         mock_read_file_info = mock.MagicMock()
         mock_read_file_info.return_value = test_response
-        mock_validate_file_json = mock.MagicMock()
-        mock_validate_file_json.return_value = True
         with mock.patch.object(ExportData, 'read_file_info_from_location', mock_read_file_info):
-            with mock.patch(f'{EXPORT_DATA_UTIL_PATH}.validate_file_json', mock_validate_file_json):
-                result = self.view.read_file_info_and_check_schema(ExportData(), {})
-                nt.assert_equal(result, {})
+            result = self.view.read_file_info_stream_and_check_schema(ExportData(), {})
+            nt.assert_equal(result.institution, institution)
+            nt.assert_equal(result.folders, [])
+            nt.assert_equal(list(self.view.iter_file_info_files(result)), [])
+
+    # iter_file_info_files
+    def test_iter_file_info_files_invalid_file(self):
+        mock_reader = mock.MagicMock()
+        mock_reader.iter_files.side_effect = ValidationError('Mock test invalid file')
+        with nt.assert_raises(ProcessError):
+            list(self.view.iter_file_info_files(mock_reader))
 
     # update_region_id
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
@@ -1226,16 +1264,11 @@ class TestRestoreDataFunction(AdminTestCase):
             mock_copy.assert_called()
             nt.assert_equal(result[0], [])
 
-    @mock.patch('osf.models.BaseFileNode')
-    @mock.patch('osf.models.BaseFileNode.objects')
-    @mock.patch('osf.models.FileVersion.objects')
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.generate_new_file_path')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
     def test_copy_files_from_export_data_to_destination_osfstorage(self, mock_check_progress,
-                                                                   mock_generate_new_file_path, mock_copy,
-                                                                   mock_file_version, mock_file_node,
-                                                                   mock_base_file_node):
+                                                                   mock_generate_new_file_path, mock_copy):
         def create_node(*args, **kwargs):
             OsfStorageFileFactory.create(_id='fake_id')
             return {
@@ -1250,12 +1283,6 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        user = AuthUserFactory.create(username='fake_user')
-        file_version = FileVersionFactory.create(creator=user, identifier='1')
-        mock_base_file_node.get_version.return_value = file_version
-        mock_file_node.filter.return_value.update.return_value = {}
-        mock_file_version.filter.return_value.update.return_value = {}
-
         mock_is_add_on = mock.MagicMock()
         mock_is_add_on.return_value = False
         mock_check_progress.return_value = None
@@ -1271,9 +1298,138 @@ class TestRestoreDataFunction(AdminTestCase):
             mock_generate_new_file_path.assert_not_called()
             mock_copy.assert_called()
             nt.assert_equal(len(result), 2)
+            nt.assert_equal(len(result[0]), 1)
+            nt.assert_equal(result[0][0].get('node')._id, 'fake_id')
             nt.assert_equal(result[0][0].get('file_tags'), ['hello', 'world'])
             nt.assert_equal(result[0][0].get('file_timestamp'), {})
             nt.assert_equal(result[0][0].get('project_id'), 'pmockt')
+            journal = ExportDataRestoreJournal.objects.get(export_data_restore=self.bulk_mount_data_restore)
+            nt.assert_equal(journal.file_id, 995)
+            nt.assert_equal(journal.status, ExportDataRestoreJournal.STATUS_DONE)
+            nt.assert_equal(journal.file_node, result[0][0].get('node'))
+
+    @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
+    def test_copy_files_from_export_data_to_destination_skip_restored_files(self, mock_check_progress, mock_copy):
+        file_node = OsfStorageFileFactory.create()
+        ExportDataRestoreJournal.objects.create(
+            export_data_restore=self.bulk_mount_data_restore, file_id=995,
+            status=ExportDataRestoreJournal.STATUS_DONE, file_node=file_node)
+
+        task = AbortableTask()
+        task.request_stack = LocalStack()
+        task.request.id = FAKE_TASK_ID
+
+        result = self.view.copy_files_from_export_data_to_destination(task, 1, self.test_export_data_files,
+                                                                      self.bulk_mount_data_restore, None)
+        mock_copy.assert_not_called()
+        nt.assert_equal(len(result[0]), 1)
+        nt.assert_equal(result[0][0].get('node'), file_node)
+        nt.assert_equal(result[0][0].get('file_tags'), ['hello', 'world'])
+        nt.assert_equal(result[1], [])
+
+    @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
+    def test_copy_files_from_export_data_to_destination_retry_failed_files(self, mock_check_progress, mock_copy):
+        ExportDataRestoreJournal.objects.create(
+            export_data_restore=self.addon_data_restore, file_id=995,
+            status=ExportDataRestoreJournal.STATUS_FAILED, failures=['1'])
+        mock_copy.return_value = {
+            'data': {
+                'id': 'nextcloudinstitutions/fake_id'
+            }
+        }
+
+        task = AbortableTask()
+        task.request_stack = LocalStack()
+        task.request.id = FAKE_TASK_ID
+
+        with mock.patch(f'{EXPORT_DATA_UTIL_PATH}.is_add_on_storage', return_value=True):
+            result = self.view.copy_files_from_export_data_to_destination(task, 1, self.test_export_data_files,
+                                                                          self.addon_data_restore, None)
+        mock_copy.assert_called_once()
+        nt.assert_equal(result[1], [])
+        journal = ExportDataRestoreJournal.objects.get(export_data_restore=self.addon_data_restore)
+        nt.assert_equal(journal.status, ExportDataRestoreJournal.STATUS_DONE)
+        nt.assert_equal(journal.failures, [])
+
+    @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
+    def test_copy_files_from_export_data_to_destination_concurrently(self, mock_check_progress, mock_copy):
+        files = []
+        for file_id in range(1, 6):
+            file = json.loads(json.dumps(self.test_export_data_files[0]))
+            file['id'] = file_id
+            file['materialized_path'] = f'/file{file_id}.txt'
+            files.append(file)
+        mock_copy.side_effect = lambda *args, **kwargs: None if args[4] == '/file3.txt' else {
+            'data': {
+                'id': 'nextcloudinstitutions/fake_id'
+            }
+        }
+
+        task = AbortableTask()
+        task.request_stack = LocalStack()
+        task.request.id = FAKE_TASK_ID
+
+        with mock.patch.object(admin_settings, 'EXPORT_DATA_RESTORE_CONCURRENCY', 3), \
+                mock.patch(f'{EXPORT_DATA_UTIL_PATH}.is_add_on_storage', return_value=True), \
+                mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.generate_new_file_path', side_effect=lambda **kwargs: kwargs['file_materialized_path']):
+            result = self.view.copy_files_from_export_data_to_destination(task, 1, files,
+                                                                          self.addon_data_restore, None)
+        nt.assert_equal(mock_copy.call_count, 5)
+        nt.assert_equal([file['id'] for file in result[1]], [3])
+        journal = ExportDataRestoreJournal.objects.filter(export_data_restore=self.addon_data_restore)
+        nt.assert_equal(
+            dict(journal.values_list('file_id', 'status')),
+            {
+                1: ExportDataRestoreJournal.STATUS_DONE,
+                2: ExportDataRestoreJournal.STATUS_DONE,
+                3: ExportDataRestoreJournal.STATUS_FAILED,
+                4: ExportDataRestoreJournal.STATUS_DONE,
+                5: ExportDataRestoreJournal.STATUS_DONE,
+            })
+
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tag_and_timestamp_to_database')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.save_restored_file_versions')
+    @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
+    def test_copy_files_from_export_data_to_destination_add_tags_by_chunk(self, mock_check_progress, mock_copy,
+                                                                          mock_save_versions, mock_add_tag_and_timestamp):
+        files = []
+        for file_id in range(1, 6):
+            file = json.loads(json.dumps(self.test_export_data_files[0]))
+            file['id'] = file_id
+            files.append(file)
+        mock_copy.return_value = {
+            'data': {
+                'id': 'osfstorage/fake_id'
+            }
+        }
+        mock_save_versions.side_effect = lambda file, copied: [OsfStorageFileFactory.create()]
+        chunk_sizes = []
+        mock_add_tag_and_timestamp.side_effect = lambda task, step, nodes: chunk_sizes.append(len(nodes))
+
+        task = AbortableTask()
+        task.request_stack = LocalStack()
+        task.request.id = FAKE_TASK_ID
+
+        with mock.patch.object(admin_settings, 'EXPORT_DATA_FILE_INFO_CHUNK_SIZE', 2):
+            result = self.view.copy_files_from_export_data_to_destination(task, 1, files,
+                                                                          self.bulk_mount_data_restore, None)
+        # the tags and timestamps are added during the copy, the last incomplete chunk is returned
+        nt.assert_equal(chunk_sizes, [2, 2])
+        nt.assert_equal(len(result[0]), 1)
+        nt.assert_equal(result[0][0].get('file_tags'), ['hello', 'world'])
+
+    # get_restore_concurrency
+    def test_get_restore_concurrency(self):
+        region = self.addon_data_restore.destination
+        with mock.patch.object(admin_settings, 'EXPORT_DATA_RESTORE_CONCURRENCY', 4):
+            nt.assert_equal(self.view.get_restore_concurrency(region), 4)
+            with mock.patch.object(admin_settings, 'EXPORT_DATA_RESTORE_PROVIDER_CONCURRENCY',
+                                   {region.provider_name: 2}):
+                nt.assert_equal(self.view.get_restore_concurrency(region), 2)
 
     @mock.patch(f'{EXPORT_DATA_UTIL_PATH}.copy_file_from_location_to_destination')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.generate_new_file_path')
@@ -1527,8 +1683,8 @@ class TestRestoreDataFunction(AdminTestCase):
                 nt.assert_equal(result, None)
 
     # add_tag_and_timestamp_to_database
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_timestamp_to_file_node')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tags_to_file_node')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_timestamps_to_file_nodes')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tags_to_file_nodes')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
     def test_add_tag_and_timestamp_to_database(self, mock_check_process, mock_add_tags, mock_add_timestamp):
         task = AbortableTask()
@@ -1553,13 +1709,15 @@ class TestRestoreDataFunction(AdminTestCase):
         mock_add_tags.return_value = None
         mock_add_timestamp.return_value = None
 
-        self.view.add_tag_and_timestamp_to_database(task, 1, list_file_nodes)
+        with mock.patch.object(admin_settings, 'EXPORT_DATA_FILE_INFO_CHUNK_SIZE', 1):
+            self.view.add_tag_and_timestamp_to_database(task, 1, list_file_nodes)
         nt.assert_equal(mock_check_process.call_count, 3)
         nt.assert_equal(mock_add_tags.call_count, 2)
         nt.assert_equal(mock_add_timestamp.call_count, 2)
+        mock_add_tags.assert_called_with(list_file_nodes[1:])
 
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_timestamp_to_file_node')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tags_to_file_node')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_timestamps_to_file_nodes')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.add_tags_to_file_nodes')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.check_if_restore_process_stopped')
     def test_add_tag_and_timestamp_to_database_empty_nodes(self, mock_check_process, mock_add_tags, mock_add_timestamp):
         task = AbortableTask()
@@ -1575,10 +1733,47 @@ class TestRestoreDataFunction(AdminTestCase):
         mock_add_tags.assert_not_called()
         mock_add_timestamp.assert_not_called()
 
+    # add_tags_to_file_nodes
+    def test_add_tags_to_file_nodes(self):
+        node = OsfStorageFileFactory.create()
+        other_node = OsfStorageFileFactory.create()
+        node.tags.add(Tag.all_tags.create(name='hello'))
+        list_file_nodes = [
+            {'node': node, 'file_tags': ['hello', 'world']},
+            {'node': other_node, 'file_tags': ['world']},
+            {'node': None, 'file_tags': ['none']},
+        ]
+
+        self.view.add_tags_to_file_nodes(list_file_nodes)
+        nt.assert_equal(set(node.tags.values_list('name', flat=True)), {'hello', 'world'})
+        nt.assert_equal(list(other_node.tags.values_list('name', flat=True)), ['world'])
+        nt.assert_false(Tag.all_tags.filter(name='none').exists())
+
+    # add_timestamps_to_file_nodes
+    def test_add_timestamps_to_file_nodes(self):
+        node = OsfStorageFileFactory.create()
+        other_node = OsfStorageFileFactory.create()
+        RdmFileTimestamptokenVerifyResult.objects.create(file_id=node._id, project_id=self.project_id)
+        source = RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id='source', project_id=self.project_id, timestamp_token=b'token')
+        list_file_nodes = [
+            {'node': node, 'project_id': self.project_id, 'file_timestamp': {'verify_user': 1}},
+            {'node': other_node, 'project_id': self.project_id,
+             'file_timestamp': {'timestamp_id': source.id, 'verify_user': 2}},
+            {'node': other_node, 'project_id': None, 'file_timestamp': {'verify_user': 3}},
+        ]
+
+        self.view.add_timestamps_to_file_nodes(list_file_nodes)
+        verify_data = RdmFileTimestamptokenVerifyResult.objects.get(file_id=node._id)
+        nt.assert_equal(verify_data.verify_user, 1)
+        verify_data = RdmFileTimestamptokenVerifyResult.objects.get(file_id=other_node._id)
+        nt.assert_equal(verify_data.verify_user, 2)
+        nt.assert_equal(bytes(verify_data.timestamp_token), b'token')
+
     # restore_export_data_rollback_process
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_bulk_mount_storage(self, mock_read_file_info,
                                                                      mock_delete_all_files,
                                                                      mock_move_all_files):
@@ -1597,7 +1792,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_nothing_to_rollback(self, mock_read_file_info,
                                                                       mock_delete_all_files,
                                                                       mock_move_all_files):
@@ -1616,7 +1811,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_fail_to_get_file_info(self, mock_read_file_info,
                                                                         mock_delete_all_files,
                                                                         mock_move_all_files):
@@ -1624,7 +1819,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = None
+        mock_read_file_info.side_effect = ProcessError('Cannot get file information list')
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -1639,7 +1834,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_empty_file_info(self, mock_read_file_info,
                                                                   mock_delete_all_files,
                                                                   mock_move_all_files):
@@ -1647,7 +1842,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {}
+        mock_read_file_info.return_value = get_mock_file_info_reader([], [])
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -1661,7 +1856,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_delete_all_files_then_move_from_backup(self, mock_read_file_info,
                                                                                          mock_delete_all_files,
                                                                                          mock_move_all_files):
@@ -1669,7 +1864,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -1683,7 +1878,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_move_from_backup(self, mock_read_file_info,
                                                                    mock_delete_all_files,
                                                                    mock_move_all_files):
@@ -1691,7 +1886,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -1705,7 +1900,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_invalid_process_step(self, mock_read_file_info,
                                                                        mock_delete_all_files,
                                                                        mock_move_all_files):
@@ -1713,7 +1908,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -1727,7 +1922,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_exception(self, mock_read_file_info,
                                                             mock_delete_all_files,
                                                             mock_move_all_files):
@@ -1735,7 +1930,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_delete_all_files.side_effect = ConnectionError('Mock test exception while deleting all files')
         mock_move_all_files.return_value = None
 
@@ -1750,7 +1945,7 @@ class TestRestoreDataFunction(AdminTestCase):
 
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.move_all_files_from_backup_folder_to_root')
     @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.delete_all_files_except_backup_folder')
-    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_and_check_schema')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.read_file_info_stream_and_check_schema')
     def test_restore_export_data_rollback_process_invalid_export_data_restore(self, mock_read_file_info,
                                                                               mock_delete_all_files,
                                                                               mock_move_all_files):
@@ -1758,7 +1953,7 @@ class TestRestoreDataFunction(AdminTestCase):
         task.request_stack = LocalStack()
         task.request.id = FAKE_TASK_ID
 
-        mock_read_file_info.return_value = {'folders': [{'project': {'id': 1}}], 'files': [{'project': {'id': 1}}]}
+        mock_read_file_info.return_value = get_mock_file_info_reader([{'project': {'id': 1}}], [{'project': {'id': 1}}])
         mock_delete_all_files.return_value = None
         mock_move_all_files.return_value = None
 
@@ -2180,6 +2375,83 @@ class TestStopRestoreDataActionView(AdminTestCase):
         nt.assert_equal(view.test_func(), False)
 
 
+# Test cases for ResumeRestoreDataActionView
+@pytest.mark.feature_202210
+class TestResumeRestoreDataActionView(AdminTestCase):
+    def setUp(self):
+        celery_app.conf.update({
+            'task_always_eager': False,
+            'task_eager_propagates': False,
+        })
+        self.export_data_restore = ExportDataRestoreFactory.create(task_id=FAKE_TASK_ID,
+                                                                   status=ExportData.STATUS_RUNNING)
+        self.new_task_id = '00000000-0000-0000-0000-000000000001'
+        self.request = APIRequestFactory().post('resume_restore_export_data', {
+            'task_id': FAKE_TASK_ID,
+            'destination_id': self.export_data_restore.destination.id,
+        })
+        self.request.user = AuthUserFactory()
+        self.view = restore.ResumeRestoreDataActionView()
+        self.view.export_data_restore = self.export_data_restore
+        self.view.task_id = FAKE_TASK_ID
+
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_restore_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post_still_running(self, mock_async_result, mock_restore_process):
+        mock_async_result.return_value = {'status': states.STARTED, 'result': {}}
+        ExportDataRestoreJournal.objects.create(
+            export_data_restore=self.export_data_restore, file_id=1, status=ExportDataRestoreJournal.STATUS_DONE)
+
+        response = self.view.post(self.request)
+        mock_restore_process.assert_not_called()
+        nt.assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_restore_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post_stopped(self, mock_async_result, mock_restore_process):
+        mock_async_result.return_value = {'status': states.FAILURE, 'result': {}}
+        self.export_data_restore.update(status=ExportData.STATUS_STOPPED)
+
+        response = self.view.post(self.request)
+        mock_restore_process.assert_not_called()
+        nt.assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult.revoke')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.get_institution_project_ids')
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_restore_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post_stale_running(self, mock_async_result, mock_restore_process, mock_project_ids, mock_revoke):
+        mock_async_result.return_value = {'status': states.STARTED, 'result': {}}
+        mock_restore_process.return_value = AbortableAsyncResult(self.new_task_id)
+        mock_project_ids.return_value = ['vcu']
+        stale = timezone.now() - datetime.timedelta(seconds=admin_settings.EXPORT_DATA_RESUME_STALE_TIME + 1)
+        ExportDataRestore.objects.filter(pk=self.export_data_restore.pk).update(modified=stale)
+        self.export_data_restore.refresh_from_db()
+
+        response = self.view.post(self.request)
+        nt.assert_equal(response.status_code, status.HTTP_200_OK)
+        nt.assert_equal(response.data, {'task_id': self.new_task_id})
+        nt.assert_equal(mock_restore_process.call_args[0][2:], (self.export_data_restore.pk, ['vcu']))
+        mock_revoke.assert_called_once_with(terminate=True)
+        nt.assert_true(mock_restore_process.call_args[1]['is_resume'])
+        self.export_data_restore.refresh_from_db()
+        nt.assert_equal(self.export_data_restore.task_id, self.new_task_id)
+
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult.revoke')
+    @mock.patch(f'{RESTORE_EXPORT_DATA_PATH}.get_institution_project_ids')
+    @mock.patch(f'{EXPORT_DATA_TASK_PATH}.run_restore_export_data_process.delay')
+    @mock.patch('celery.contrib.abortable.AbortableAsyncResult._get_task_meta')
+    def test_post_failed_task(self, mock_async_result, mock_restore_process, mock_project_ids, mock_revoke):
+        mock_async_result.return_value = {'status': states.FAILURE, 'result': {}}
+        mock_restore_process.return_value = AbortableAsyncResult(self.new_task_id)
+        mock_project_ids.return_value = []
+
+        response = self.view.post(self.request)
+        nt.assert_equal(response.status_code, status.HTTP_200_OK)
+        nt.assert_equal(response.data, {'task_id': self.new_task_id})
+        mock_revoke.assert_not_called()
+
+
 # Test cases for CheckRunningRestoreActionView
 @pytest.mark.feature_202210
 class TestCheckRunningRestoreActionView(AdminTestCase):
@@ -135,21 +135,31 @@ class TestTimeStampAddList(AdminTestCase):
         self.view.kwargs['guid'] = self.private_project1.id
         res = self.view.get_context_data()
         nt.assert_is_instance(res, dict)
+        nt.assert_is_instance(res['view'], views.TimeStampAddList)
+        # the errors are loaded page by page
+        nt.assert_not_in('osfstorage_test_file2.status_3', str(res))
+        nt.assert_in(self.project_user._id, [user_id for user_id, label in res['verify_users']])
+
+    def test_error_list(self):
+        request = RequestFactory().get('/timestampadd/', {'page': 1, 'page_size': 10})
+        view = setup_user_view(views.TimestampErrorList(), request, user=self.user)
+        view.kwargs = {'institution_id': self.project_institution.id, 'guid': self.private_project1.id}
+        res = json.loads(view.get(request).content.decode())
+        nt.assert_equal(res['total'], 3)
 
         nt.assert_not_in('osfstorage_test_file1.status_1', str(res))
         nt.assert_in('osfstorage_test_file2.status_3', str(res))
         nt.assert_in('osfstorage_test_file3.status_3', str(res))
         nt.assert_in('s3_test_file1.status_3', str(res))
-        nt.assert_is_instance(res['view'], views.TimeStampAddList)
 
         # test the presence of file creator information added to
         # website/utils/timestamp.py:get_error_list if the provider is osfstorage
-        osfstorage_error_list = list(filter(lambda x: x['provider'] == 'osfstorage', res['init_project_timestamp_error_list']))[0]['error_list']
+        osfstorage_error_list = list(filter(lambda x: x['provider'] == 'osfstorage', res['provider_list']))[0]['error_list']
         nt.assert_in(u'freddiemercury', osfstorage_error_list[0]['creator_email'])
         nt.assert_in(u'Freddie Mercury', osfstorage_error_list[0]['creator_name'])
         nt.assert_not_equal(u'', osfstorage_error_list[0]['creator_id'])
 
-        other_error_list = list(filter(lambda x: x['provider'] != 'osfstorage', res['init_project_timestamp_error_list']))[0]['error_list']
+        other_error_list = list(filter(lambda x: x['provider'] != 'osfstorage', res['provider_list']))[0]['error_list']
         nt.assert_in(u'freddiemercury', other_error_list[0]['creator_email'])
         nt.assert_in(u'Freddie Mercury', other_error_list[0]['creator_name'])
         nt.assert_not_equal(u'', other_error_list[0]['creator_id'])
@@ -271,13 +281,16 @@ class TestAddTimestampData(AdminTestCase):
 
         res_timestampaddlist = self.view.get_context_data()
         nt.assert_is_instance(res_timestampaddlist, dict)
+        nt.assert_is_instance(res_timestampaddlist['view'], views.TimeStampAddList)
 
         ## check TimestampError(TimestampVerifyResult.inspection_result_statu != 1) in response
-        nt.assert_not_in('osfstorage_test_file1.status_1', str(res_timestampaddlist))
-        nt.assert_in('osfstorage_test_file2.status_3', str(res_timestampaddlist))
-        nt.assert_in('osfstorage_test_file3.status_3', str(res_timestampaddlist))
-        nt.assert_in('s3_test_file1.status_3', str(res_timestampaddlist))
-        nt.assert_is_instance(res_timestampaddlist['view'], views.TimeStampAddList)
+        view_error_list = setup_user_view(views.TimestampErrorList(), self.request, user=self.user)
+        view_error_list.kwargs = dict(self.view.kwargs)
+        res_error_list = view_error_list.get(self.request).content.decode()
+        nt.assert_not_in('osfstorage_test_file1.status_1', res_error_list)
+        nt.assert_in('osfstorage_test_file2.status_3', res_error_list)
+        nt.assert_in('osfstorage_test_file3.status_3', res_error_list)
+        nt.assert_in('s3_test_file1.status_3', res_error_list)
 
         ## AddTimestampData.post
         file_node = BaseFileNode.objects.get(name='osfstorage_test_file3.status_3')
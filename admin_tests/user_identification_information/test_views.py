@@ -9,6 +9,7 @@ from nose import tools as nt
 
 from addons.github.tests.factories import GitHubNodeSettingsFactory, GitHubAccountFactory
 from addons.s3.tests.factories import (S3UserSettingsFactory, S3NodeSettingsFactory, S3AccountFactory, )
+from admin.base.utils import QuerySetRowList
 from admin.user_identification_information import views
 from admin_tests.utilities import setup_view, setup_log_view, setup_user_view
 from osf.models import UserQuota
@@ -73,7 +74,7 @@ class TestUserIdentificationInformationListView(AdminTestCase):
         view = views.UserIdentificationListView()
         view = setup_view(view, self.request)
         results = view.get_user_list()
-        nt.assert_is_instance(results, list)
+        nt.assert_is_instance(results, QuerySetRowList)
 
     @mock.patch('admin.user_identification_information.views.UserIdentificationInformationListView.get_queryset')
     def test_get_queryset_mock_get_queryset(self, mock_method):
@@ -211,7 +212,7 @@ class TestUserIdentificationListView(AdminTestCase):
         view = setup_view(view, self.request)
         results = view.get_user_list()
 
-        nt.assert_is_instance(results, list)
+        nt.assert_is_instance(results, QuerySetRowList)
 
     def test_get_userlist_permission_denied(self):
         self.request.user = self.admin_user
@@ -4,6 +4,7 @@ from nose import tools as nt
 
 from addons.github.tests.factories import GitHubNodeSettingsFactory, GitHubAccountFactory
 from addons.s3.tests.factories import (S3NodeSettingsFactory, S3AccountFactory, )
+from admin.base.utils import QuerySetRowList
 from admin.user_identification_information_admin import views
 from admin_tests.utilities import setup_view, setup_log_view
 from osf_tests.factories import (
@@ -77,7 +78,7 @@ class TestUserIdentificationListView(AdminTestCase):
         view = setup_view(view, self.request)
         results = view.get_user_list()
 
-        nt.assert_is_instance(results, list)
+        nt.assert_is_instance(results, QuerySetRowList)
 
     def test__permission_anonymous(self):
         self.request.user = self.anon
@@ -318,8 +318,39 @@ ANONYMOUS_USER_NAME = None
 # If set to True, automated tests with extra queries will fail.
 NPLUSONE_RAISE = False
 
-# Timestamp - number of requests to send to cloud storages per minute
+# Timestamp - number of requests to send to cloud storages per minute, 0 for no limit
 TS_REQUESTS_PER_MIN = 30
+# Timestamp - number of files processed concurrently by a bulk add/verify task
+TS_WORKER_COUNT = 4
+# Timestamp - retries and initial backoff (seconds) for a file that failed
+TS_RETRY_COUNT = 3
+TS_RETRY_BACKOFF = 2
+# Timestamp - name of the token bucket shared by all workers and hosts
+TS_RATE_LIMIT_BUCKET = 'tsa'
+# Timestamp - add timestamps of uploaded files from a queue drained by celery
+# workers instead of inside the WaterButler callback
+TS_QUEUE_ENABLED = True
+TS_QUEUE_BATCH_SIZE = 100
+TS_QUEUE_MAX_ATTEMPTS = 5
+# seconds before a failed queued file is retried, doubled at each attempt
+TS_QUEUE_RETRY_DELAY = 60
+# seconds after which a queued file claimed by a worker that did not finish is retried
+TS_QUEUE_CLAIM_TIMEOUT = 10 * 60
+# Timestamp - timestamp queued and bulk added files in batches, with a single
+# TSA request for the root of a Merkle tree over the hashes of the files
+TS_BATCH_MODE = False
+TS_BATCH_SIZE = 1000
+
+# Timestamp error list: default page size, and the number of rows whose
+# users are loaded together while listing or exporting errors
+TS_ERROR_LIST_PAGE_SIZE = 100
+TS_ERROR_LIST_CHUNK_SIZE = 500
+
+# File inventory of verify runs: threads listing folders of external
+# providers, and how many listings of one provider may run at a time
+TS_INVENTORY_WORKER_COUNT = 8
+TS_INVENTORY_PROVIDER_DEFAULT_LIMIT = 4
+TS_INVENTORY_PROVIDER_LIMITS = {}
 
 # salt used for generating hashids
 HASHIDS_SALT = 'pinkhimalayan'
@@ -336,6 +367,7 @@ ELASTICSEARCH_METRICS_DATE_FORMAT = '%Y'
 
 WAFFLE_CACHE_NAME = 'waffle_cache'
 STORAGE_USAGE_CACHE_NAME = 'storage_usage'
+SEARCH_UPDATE_QUEUE_CACHE_NAME = 'search_update_queue'
 
 
 CACHES = {
@@ -349,6 +381,11 @@ CACHES = {
     WAFFLE_CACHE_NAME: {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     },
+    # flag debouncing the flushes of website.search.update_queue
+    SEARCH_UPDATE_QUEUE_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_search_update_queue_cache_table',
+    },
 }
 
 SLOAN_ID_COOKIE_NAME = 'sloan_id'
@@ -461,10 +498,34 @@ TIME_STAMP_AUTHORITY_URL = 'http://eswg.jnsa.org/freetsa'
 ERROR_HTTP_STATUS = [400, 401, 402, 403, 500, 502, 503, 504]
 REQUEST_TIME_OUT = 5
 RETRY_COUNT = 3
+# TSAs tried, in order, when TIME_STAMP_AUTHORITY_URL does not answer
+TIME_STAMP_AUTHORITY_FALLBACK_URLS = []
+# keep-alive connections kept per TSA
+TSA_POOL_SIZE = 10
+# (connect, read) timeout of a TSA request in seconds
+TSA_TIMEOUT = (3.05, 30)
+# retries of a TSA request on connection errors, before trying the next TSA
+TSA_ENDPOINT_RETRIES = 1
+# a TSA is skipped for TSA_BREAKER_RESET seconds after
+# TSA_BREAKER_THRESHOLD consecutive failures
+TSA_BREAKER_THRESHOLD = 5
+TSA_BREAKER_RESET = 60
+# upper bounds in seconds of the TSA latency histogram buckets
+TSA_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
 
 # UPKI flag
 USE_UPKI = False
 
+# Timestamp engine: 'download' saves each file into a temporary directory and
+# lets openssl hash it, 'stream' hashes the WaterButler response in-process.
+TIMESTAMP_ENGINE_DOWNLOAD = 'download'
+TIMESTAMP_ENGINE_STREAM = 'stream'
+TIMESTAMP_ENGINE = TIMESTAMP_ENGINE_DOWNLOAD
+# Per-institution override of TIMESTAMP_ENGINE, keyed by Institution._id
+TIMESTAMP_ENGINE_BY_INSTITUTION = {}
+TIMESTAMP_STREAM_HASH_TYPE = 'sha512'
+TIMESTAMP_STREAM_CHUNK_SIZE = 1024 * 1024
+
 #uPKI operation commands
 UPKI_TIMESTAMP_URL = ''
 UPKI_CREATE_TIMESTAMP = ''  # {0}=target, {1}=out
@@ -493,6 +554,8 @@ TIME_STAMP_STORAGE_DISCONNECTED = 8
 TIME_STAMP_STORAGE_DISCONNECTED_MSG = 'Error: storage disconnected.'
 TIME_STAMP_STORAGE_NOT_ACCESSIBLE = 9
 TIME_STAMP_STORAGE_NOT_ACCESSIBLE_MSG = 'Error: storage service connection error occurred.'
+TIME_STAMP_TOKEN_PENDING = 10
+TIME_STAMP_TOKEN_PENDING_MSG = 'Pending: timestamp has not been added yet.'
 
 # Quota settings
 DEFAULT_MAX_QUOTA = 100
@@ -500,3 +563,11 @@ WARNING_THRESHOLD = 0.9
 BASE_FOR_METRIC_PREFIX = 1000
 SIZE_UNIT_GB = BASE_FOR_METRIC_PREFIX ** 3
 NII_STORAGE_REGION_ID = 1
+# Quota changes are appended to UserQuotaLedger and folded into
+# UserQuota.used by a periodic task. When False they are folded in
+# right away by the request that made them.
+QUOTA_LEDGER_DEFERRED = True
+# Number of ledger rows folded into UserQuota per transaction
+QUOTA_LEDGER_COMPACT_BATCH_SIZE = 10000
+# Number of users recalculated per query by the bulk quota recalculation
+QUOTA_RECALC_CHUNK_SIZE = 1000
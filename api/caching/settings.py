@@ -2,3 +2,5 @@ NEVER_TIMEOUT = None  # for django caches setting None as a timeout value means
 FIVE_MIN_TIMEOUT = 60 * 5
 
 STORAGE_USAGE_KEY = 'storage_usage:{target_id}'
+
+SEARCH_UPDATE_FLUSH_KEY = 'search_update_flush'
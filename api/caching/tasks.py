@@ -1,14 +1,14 @@
 from future.moves.urllib.parse import urlparse
-from django.db import connection
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
 
 import requests
 import logging
 
 from django.apps import apps
-from api.caching.utils import storage_usage_cache
 from framework.postcommit_tasks.handlers import enqueue_postcommit_task
 
-from api.caching import settings as cache_settings
 from framework.celery_tasks import app
 from website import settings
 
@@ -102,40 +102,91 @@ def ban_url(instance):
                     ))
 
 
+STORAGE_USAGE_SQL = """
+    SELECT sum(version.size) FROM osf_basefileversionsthrough AS obfnv
+    LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
+    LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
+    LEFT JOIN django_content_type type on file.target_content_type_id = type.id
+    WHERE file.provider = 'osfstorage'
+    AND type.model = 'abstractnode'
+    AND file.deleted_on IS NULL
+    AND file.target_object_id=%s
+"""
+
+
+def compute_storage_usage(target_id):
+    with connection.cursor() as cursor:
+        cursor.execute(STORAGE_USAGE_SQL, [target_id])
+        result = cursor.fetchone()
+    return int(result[0]) if result[0] else 0
+
+
+def _recompute_storage_usage(target_id, dirtied):
+    """Store the recomputed usage of a dirty counter.
+
+    The row is only written if it was not dirtied again since ``dirtied`` was
+    read, otherwise a concurrent change could be lost; it then stays dirty for
+    the next run.
+    """
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    usage = compute_storage_usage(target_id)
+    return NodeStorageUsage.objects.filter(node_id=target_id, dirtied=dirtied).update(
+        usage=usage, dirtied=None, modified=timezone.now())
+
+
 @app.task(max_retries=5, default_retry_delay=10)
-def update_storage_usage_cache(target_id, target_guid, per_page=500000):
+def update_storage_usage_cache(target_id, target_guid):
     if not settings.ENABLE_STORAGE_USAGE_CACHE:
         return
-    sql = """
-        SELECT count(size), sum(size) from
-        (SELECT size FROM osf_basefileversionsthrough AS obfnv
-        LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
-        LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
-        LEFT JOIN django_content_type type on file.target_content_type_id = type.id
-        WHERE file.provider = 'osfstorage'
-        AND type.model = 'abstractnode'
-        AND file.deleted_on IS NULL
-        AND file.target_object_id=%s
-        ORDER BY version.id
-        LIMIT %s OFFSET %s) file_page
-    """
-    count = per_page
-    offset = 0
-    storage_usage_total = 0
-    with connection.cursor() as cursor:
-        while count:
-            cursor.execute(sql, [target_id, per_page, offset])
-            result = cursor.fetchall()
-            storage_usage_total += int(result[0][1]) if result[0][1] else 0
-            count = int(result[0][0]) if result[0][0] else 0
-            offset += count
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    dirtied = NodeStorageUsage.objects.filter(node_id=target_id).values_list('dirtied', flat=True).first()
+    if dirtied is not None:
+        _recompute_storage_usage(target_id, dirtied)
 
-    key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target_guid)
-    storage_usage_cache.set(key, storage_usage_total, cache_settings.FIVE_MIN_TIMEOUT)
 
-
-def update_storage_usage(target):
+@app.task(ignore_results=True)
+def reconcile_storage_usage(batch_size=None):
+    """Recompute the counters that could not be updated incrementally.
+    """
+    if not settings.ENABLE_STORAGE_USAGE_CACHE:
+        return
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    batch_size = batch_size or settings.STORAGE_USAGE_RECONCILE_BATCH_SIZE
+    dirty = NodeStorageUsage.objects.filter(dirtied__isnull=False).order_by('dirtied')
+    done = 0
+    for target_id, dirtied in dirty.values_list('node_id', 'dirtied')[:batch_size]:
+        done += _recompute_storage_usage(target_id, dirtied)
+    logger.info('Reconciled storage usage of {} nodes'.format(done))
+
+
+def mark_storage_usage_dirty(target):
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    now = timezone.now()
+    updated = NodeStorageUsage.objects.filter(node_id=target.id).update(dirtied=now, modified=now)
+    if not updated:
+        try:
+            with transaction.atomic():
+                NodeStorageUsage.objects.create(node_id=target.id, dirtied=now)
+        except IntegrityError:
+            NodeStorageUsage.objects.filter(node_id=target.id).update(dirtied=now, modified=now)
+    enqueue_postcommit_task(update_storage_usage_cache, (target.id, target._id,), {}, celery=True)
+
+
+def update_storage_usage(target, delta=None):
+    """Apply a change of ``delta`` bytes to the storage usage of ``target``.
+
+    Without a delta, or when the counter is not clean, the counter is marked
+    dirty and recomputed in the background.
+    """
     Preprint = apps.get_model('osf.preprint')
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
 
-    if settings.ENABLE_STORAGE_USAGE_CACHE and not isinstance(target, Preprint) and not target.is_quickfiles:
-        enqueue_postcommit_task(update_storage_usage_cache, (target.id, target._id,), {}, celery=True)
+    if not settings.ENABLE_STORAGE_USAGE_CACHE or isinstance(target, Preprint) or target.is_quickfiles:
+        return
+    if delta is not None:
+        updated = NodeStorageUsage.objects.filter(
+            node_id=target.id, dirtied__isnull=True, usage__isnull=False,
+        ).update(usage=F('usage') + delta, modified=timezone.now())
+        if updated:
+            return
+    mark_storage_usage_dirty(target)
@@ -2,3 +2,4 @@ from django.core.cache import caches
 from django.conf import settings
 
 storage_usage_cache = caches[settings.STORAGE_USAGE_CACHE_NAME]
+search_update_queue_cache = caches[settings.SEARCH_UPDATE_QUEUE_CACHE_NAME]
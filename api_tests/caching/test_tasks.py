@@ -0,0 +1,94 @@
+from __future__ import unicode_literals
+
+import pytest
+
+from api.caching.tasks import (
+    _recompute_storage_usage,
+    compute_storage_usage,
+    reconcile_storage_usage,
+    update_storage_usage,
+    update_storage_usage_cache,
+)
+from api_tests.utils import create_test_file
+from osf.models import NodeStorageUsage
+from osf_tests.factories import AuthUserFactory, ProjectFactory
+
+
+@pytest.fixture()
+def user():
+    return AuthUserFactory()
+
+@pytest.fixture()
+def node(user):
+    return ProjectFactory(creator=user)
+
+@pytest.fixture()
+def counter(node):
+    return NodeStorageUsage.objects.create(node=node, usage=1337)
+
+
+@pytest.mark.django_db
+class TestStorageUsage:
+
+    def test_compute_storage_usage(self, node, user):
+        assert compute_storage_usage(node.id) == 0
+        create_test_file(node, user, filename='one', size=1337)
+        create_test_file(node, user, filename='two', size=42)
+        assert compute_storage_usage(node.id) == 1379
+
+    def test_delta_is_applied_to_clean_counter(self, node, counter):
+        update_storage_usage(node, delta=42)
+        counter.refresh_from_db()
+        assert counter.usage == 1379
+        assert counter.dirtied is None
+
+    def test_delta_marks_missing_counter_dirty(self, node):
+        update_storage_usage(node, delta=42)
+        counter = NodeStorageUsage.objects.get(node=node)
+        assert counter.usage is None
+        assert counter.dirtied is not None
+
+    def test_delta_marks_dirty_counter_dirty_again(self, node, counter):
+        update_storage_usage(node)
+        counter.refresh_from_db()
+        dirtied = counter.dirtied
+
+        update_storage_usage(node, delta=42)
+        counter.refresh_from_db()
+        assert counter.usage == 1337
+        assert counter.dirtied > dirtied
+
+    def test_recompute_skips_counter_dirtied_again(self, node, user, counter):
+        create_test_file(node, user, size=10)
+        update_storage_usage(node)
+        counter.refresh_from_db()
+        dirtied = counter.dirtied
+
+        # another file event while the usage is being recomputed
+        update_storage_usage(node)
+        assert _recompute_storage_usage(node.id, dirtied) == 0
+        counter.refresh_from_db()
+        assert counter.usage == 1337
+        assert counter.dirtied > dirtied
+
+        update_storage_usage_cache(node.id, node._id)
+        counter.refresh_from_db()
+        assert counter.usage == 10
+        assert counter.dirtied is None
+
+    def test_reconcile_only_touches_dirty_counters(self, node, user, counter):
+        create_test_file(node, user, size=10)
+        other = ProjectFactory(creator=user)
+        create_test_file(other, user, size=20)
+        update_storage_usage(other)
+
+        reconcile_storage_usage()
+
+        counter.refresh_from_db()
+        assert counter.usage == 1337
+        other_counter = NodeStorageUsage.objects.get(node=other)
+        assert other_counter.usage == 20
+        assert other_counter.dirtied is None
+
+    def test_storage_usage_reads_counter(self, node, counter):
+        assert node.storage_usage == 1337
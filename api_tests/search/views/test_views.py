@@ -20,6 +20,9 @@ from website import settings
 from website.search import elastic_search
 from website.search import search
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 SCHEMA_VERSION = 2
 
 
@@ -363,7 +363,7 @@ class TestMove():
         res = app.post_json(move_url, signed_payload)
         assert res.status_code == 200
 
-        assert node.storage_usage is None
+        assert node.storage_usage == 0
         assert node_two.storage_usage == 1337
 
 
@@ -7,6 +7,7 @@ import responses
 import pytest
 from faker import Factory
 from website import settings as website_settings
+from api.base import settings as api_settings
 
 from framework.celery_tasks import app as celery_app
 
@@ -61,6 +62,8 @@ def override_settings():
     website_settings.BCRYPT_LOG_ROUNDS = 1
     # Make sure we don't accidentally send any emails
     website_settings.SENDGRID_API_KEY = None
+    # Add timestamps in the calling thread and transaction
+    api_settings.TS_WORKER_COUNT = 1
     # Set this here instead of in SILENT_LOGGERS, in case developers
     # call setLevel in local.py
     logging.getLogger('website.mails.mails').setLevel(logging.CRITICAL)
@@ -130,6 +133,29 @@ def _test_speedups_disable(request, settings, _test_speedups):
         patcher.start()
 
 
+# Work deferred to celery in production, done in the calling request or
+# transaction for the tests with the mark
+_SYNC_SETTINGS = {
+    'disable_timestamp_queue': (api_settings, 'TS_QUEUE_ENABLED', False),
+    'disable_quota_ledger_deferral': (api_settings, 'QUOTA_LEDGER_DEFERRED', False),
+    'disable_search_update_queue': (website_settings, 'ENABLE_SEARCH_UPDATE_QUEUE', False),
+}
+
+@pytest.fixture(autouse=True)
+def _sync_settings(request):
+    patchers = []
+    for mark, (module, name, value) in _SYNC_SETTINGS.items():
+        if not request.node.get_closest_marker(mark):
+            continue
+        patchers.append(mock.patch.object(module, name, value))
+        patchers[-1].start()
+
+    yield
+
+    for patcher in patchers:
+        patcher.stop()
+
+
 @pytest.fixture(scope='function')
 def es6_client():
     return connections.get_connection()
@@ -0,0 +1,14 @@
+"""
+Print the depth and lag of the search update queue as JSON, for monitoring.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from website.search import update_queue
+
+
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(update_queue.get_stats()))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0240_rdmfiletimestamptokenverifyresult_timestamp_proof'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rdmfiletimestamptokenverifyresult',
+            name='verify_file_hash',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
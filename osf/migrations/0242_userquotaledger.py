@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0241_rdmfiletimestamptokenverifyresult_verify_file_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserQuotaLedger',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('storage_type', models.IntegerField(choices=[(1, 'NII Storage'), (2, 'Custom Storage')], default=1)),
+                ('delta', models.BigIntegerField()),
+                ('reason', models.CharField(choices=[('file_added', 'File added'), ('file_modified', 'File modified'), ('file_removed', 'File removed'), ('file_moved', 'File moved'), ('node_removed', 'Node removed'), ('node_restored', 'Node restored')], max_length=32)),
+                ('file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='osf.BaseFileNode')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='userquotaledger',
+            index_together=set([('user', 'storage_type')]),
+        ),
+    ]
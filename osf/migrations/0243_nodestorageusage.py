@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0242_userquotaledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeStorageUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('usage', models.BigIntegerField(blank=True, null=True)),
+                ('dirtied', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('node', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='storage_usage_counter', to='osf.AbstractNode')),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import osf.utils.datetime_aware_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0243_nodestorageusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportDataJournal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('file_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('failures', osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONField(blank=True, default=list, encoder=osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONEncoder)),
+                ('export_data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal', to='osf.ExportData')),
+            ],
+            options={
+                'db_table': 'osf_export_data_journal',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='exportdatajournal',
+            unique_together=set([('export_data', 'file_name')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import osf.utils.datetime_aware_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0244_exportdatajournal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportDataRestoreJournal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('file_id', models.IntegerField()),
+                ('status', models.CharField(choices=[('done', 'Done'), ('failed', 'Failed')], max_length=16)),
+                ('failures', osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONField(blank=True, default=list, encoder=osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONEncoder)),
+                ('export_data_restore', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='journal', to='osf.ExportDataRestore')),
+                ('file_node', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='osf.BaseFileNode')),
+            ],
+            options={
+                'db_table': 'osf_export_data_restore_journal',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='exportdatarestorejournal',
+            unique_together=set([('export_data_restore', 'file_id')]),
+        ),
+    ]
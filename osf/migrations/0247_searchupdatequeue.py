@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django_extensions.db.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0246_exportdatajournal_stored_in'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchUpdateQueue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('category', models.CharField(choices=[('node', 'Node document'), ('wiki', 'Wiki page document'), ('contributors', 'Contributors of the nodes of a user')], max_length=16)),
+                ('target_id', models.CharField(max_length=255)),
+                ('index', models.CharField(blank=True, default='', max_length=255)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchupdatequeue',
+            unique_together=set([('category', 'target_id', 'index')]),
+        ),
+    ]
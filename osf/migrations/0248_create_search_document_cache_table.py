@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('osf', '0247_searchupdatequeue'),
+    ]
+    operations = [
+        migrations.RunSQL([
+            """
+            CREATE TABLE "{0}" (
+                "cache_key" varchar(255) NOT NULL PRIMARY KEY,
+                "value" text NOT NULL,
+                "expires" timestamp with time zone NOT NULL
+            );
+            CREATE INDEX "{0}_expires" ON "{0}" ("expires");
+            """.format('osf_search_document_cache_table')
+        ], [
+            """DROP TABLE "{}"; """.format('osf_search_document_cache_table')
+        ])
+    ]
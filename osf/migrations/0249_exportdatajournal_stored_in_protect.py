@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0248_create_search_document_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportdatajournal',
+            name='stored_in',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='osf.ExportData'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0249_exportdatajournal_stored_in_protect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchupdatequeue',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0251_create_search_update_queue_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocumentPart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node_id', models.IntegerField()),
+                ('part', models.CharField(max_length=16)),
+                ('value', models.BinaryField(blank=True, null=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='searchdocumentpart',
+            index_together=set([('node_id', 'part', 'id')]),
+        ),
+        # replaced by SearchDocumentPart
+        migrations.RunSQL(
+            """DROP TABLE "osf_search_document_cache_table"; """,
+            """
+            CREATE TABLE "osf_search_document_cache_table" (
+                "cache_key" varchar(255) NOT NULL PRIMARY KEY,
+                "value" text NOT NULL,
+                "expires" timestamp with time zone NOT NULL
+            );
+            CREATE INDEX "osf_search_document_cache_table_expires" ON "osf_search_document_cache_table" ("expires");
+            """
+        ),
+    ]
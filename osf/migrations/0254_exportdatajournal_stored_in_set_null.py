@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0253_timestampqueue_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportdatajournal',
+            name='stored_in',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='osf.ExportData'),
+        ),
+    ]
@@ -58,12 +58,17 @@ from osf.models.rdm_statistics import RdmStatistics  # noqa
 from osf.models.rdm_file_timestamptoken_verify_result import RdmFileTimestamptokenVerifyResult  # noqa
 from osf.models.rdm_user_key import RdmUserKey  # noqa
 from osf.models.rdm_timestamp_grant_pattern import RdmTimestampGrantPattern  # noqa
-from osf.models.timestamp_task import TimestampTask  # noqa
+from osf.models.timestamp_task import TimestampTask, TimestampTokenBucket, TimestampQueue  # noqa
+from osf.models.search_update_queue import SearchUpdateQueue  # noqa
+from osf.models.search_document_part import SearchDocumentPart  # noqa
 from osf.models.fileinfo import FileInfo  # noqa
-from osf.models.user_quota import UserQuota  # noqa
+from osf.models.user_quota import UserQuota, UserQuotaLedger  # noqa
+from osf.models.node_storage_usage import NodeStorageUsage  # noqa
 from osf.models.project_storage_type import ProjectStorageType  # noqa
 from osf.models.region_external_account import RegionExternalAccount  # noqa
 from osf.models.institution_entitlement import InstitutionEntitlement  # noqa
 from osf.models.export_data_location import ExportDataLocation  # noqa
 from osf.models.export_data import ExportData  # noqa
+from osf.models.export_data_journal import ExportDataJournal  # noqa
 from osf.models.export_data_restore import ExportDataRestore  # noqa
+from osf.models.export_data_restore_journal import ExportDataRestoreJournal  # noqa
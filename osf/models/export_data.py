@@ -1,9 +1,11 @@
 from __future__ import unicode_literals
 
+import json
 import logging
 import os.path
 
 import requests
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models import DateTimeField, Q
 
@@ -18,6 +20,7 @@ from osf.models import (
     RdmFileTimestamptokenVerifyResult,
     FileVersion,
     AbstractNode,
+    Guid,
 )
 from admin.base import settings as admin_settings
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
@@ -106,22 +109,20 @@ class ExportData(base.BaseModel):
 
     __str__ = __repr__
 
-    def extract_file_information_json_from_source_storage(self):
+    def get_source_institution(self):
         # Get region guid == institution guid
         source_storage_guid = self.source.guid
         # Get Institution by guid
-        institution = Institution.load(source_storage_guid)
-
-        if not institution:
-            return None
+        return Institution.load(source_storage_guid)
 
+    def get_export_data_json(self, institution):
         institution_json = {
             'id': institution.id,
             'guid': institution.guid,
             'name': institution.name,
         }
 
-        export_data_json = {
+        return {
             'institution': institution_json,
             'process_start': self.process_start.strftime('%Y-%m-%d %H:%M:%S'),
             'process_end': self.process_end.strftime('%Y-%m-%d %H:%M:%S') if self.process_end else None,
@@ -135,10 +136,8 @@ class ExportData(base.BaseModel):
             'file_path': self.get_file_info_file_path(),
         }
 
-        file_info_json = {
-            'institution': institution_json,
-        }
-
+    def get_source_nodes(self, institution):
+        """Return (project ids, folder nodes, file nodes) to export from the source storage"""
         # If source institutional storage is the same as default storage, also get default storage for export
         if self.source.has_same_settings_as_default_region and self.source.id != 1:
             # get list FileVersion linked to source storage, default storage
@@ -161,7 +160,6 @@ class ExportData(base.BaseModel):
         # Combine two project lists and remove duplicates if have
         projects = projects.union(institution_users_projects)
         projects__ids = projects.values_list('id', flat=True)
-        source_project_ids = set()
 
         # get folder nodes
         base_folder_nodes = BaseFileNode.objects.filter(
@@ -172,22 +170,6 @@ class ExportData(base.BaseModel):
             # exclude deleted folders
             Q(deleted__isnull=False) | Q(deleted_on__isnull=False) | Q(deleted_by_id__isnull=False),
         )
-        folders = []
-        for folder in base_folder_nodes:
-            folder_info = {
-                'path': folder.path,
-                'materialized_path': folder.materialized_path,
-                'project': {}
-            }
-            # project
-            project = folder.target
-            source_project_ids.add(project.id)
-            project_info = {
-                'id': project._id,
-                'name': project.title,
-            }
-            folder_info['project'] = project_info
-            folders.append(folder_info)
 
         # get base_file_nodes
         base_file_nodes = BaseFileNode.objects.filter(
@@ -198,92 +180,205 @@ class ExportData(base.BaseModel):
             Q(deleted__isnull=False) | Q(deleted_on__isnull=False) | Q(deleted_by_id__isnull=False),
         )
 
-        total_size = 0
-        total_file = 0
-        files = []
-        # get file information
-        for file in base_file_nodes:
-            file_info = {
-                'id': file.id,
-                'path': file.path,
-                'materialized_path': file.materialized_path,
-                'name': file.name,
-                'provider': file.provider,
-                'created_at': str(file.created),
-                'modified_at': str(file.modified),
-                'project': {},
-                'tags': [],
-                'version': [],
-                'size': 0,
-                'location': {},
-                'timestamp': {},
-                'checkout_id': file.checkout_id or None,
-            }
+        return projects__ids, base_folder_nodes, base_file_nodes
+
+    @staticmethod
+    def iter_chunks(queryset, chunk_size):
+        """Yield lists of objects of ``queryset`` in id order, one query per chunk"""
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
+
+    @staticmethod
+    def get_projects_info(project_ids):
+        """Return {project id: project info} with one query for the guids and one for the titles"""
+        content_type = ContentType.objects.get_for_model(AbstractNode)
+        # the newest guid is the _id of a node
+        guids = dict(Guid.objects.filter(
+            content_type=content_type, object_id__in=project_ids,
+        ).order_by('object_id', '-created').distinct('object_id').values_list('object_id', '_id'))
+        titles = AbstractNode.objects.filter(id__in=project_ids).values_list('id', 'title')
+        return {
+            project_id: {
+                'id': guids.get(project_id),
+                'name': title,
+            } for project_id, title in titles
+        }
 
-            # project
-            project = file.target
-            source_project_ids.add(project.id)
-            project_info = {
-                'id': project._id,
-                'name': project.title,
-            }
-            file_info['project'] = project_info
+    def iter_folder_information(self, base_folder_nodes, chunk_size=None):
+        chunk_size = chunk_size or admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE
+        for folders in self.iter_chunks(base_folder_nodes, chunk_size):
+            projects = self.get_projects_info({folder.target_object_id for folder in folders})
+            for folder in folders:
+                yield {
+                    'path': folder.path,
+                    'materialized_path': folder.materialized_path,
+                    'project': projects[folder.target_object_id],
+                }
+
+    def iter_file_information(self, base_file_nodes, chunk_size=None):
+        """Yield the information of each file node.
+
+        The projects, tags, timestamps and versions of a chunk of files are
+        loaded with one query each, so the number of queries does not grow
+        with the number of files.
+        """
+        chunk_size = chunk_size or admin_settings.EXPORT_DATA_FILE_INFO_CHUNK_SIZE
+        for files in self.iter_chunks(base_file_nodes, chunk_size):
+            file_ids = [file.id for file in files]
+            projects = self.get_projects_info({file.target_object_id for file in files})
 
             # file's tags
-            if not file._state.adding:
-                tags = list(file.tags.filter(system=False).values_list('name', flat=True))
-                file_info['tags'] = tags
+            tags = {}
+            file_tags = BaseFileNode.tags.through.objects.filter(
+                basefilenode_id__in=file_ids, tag__system=False,
+            ).order_by('tag__name').values_list('basefilenode_id', 'tag__name')
+            for file_id, tag_name in file_tags:
+                tags.setdefault(file_id, []).append(tag_name)
 
             # timestamp by project_id and file_id
-            timestamp = RdmFileTimestamptokenVerifyResult.objects.filter(
-                project_id=file.target._id, file_id=file._id).first()
-            if timestamp:
-                timestamp_info = {
-                    'timestamp_id': timestamp.id,
-                    'inspection_result_status': timestamp.inspection_result_status,
-                    'provider': timestamp.provider,
-                    'upload_file_modified_user': timestamp.upload_file_modified_user,
-                    'project_id': timestamp.project_id,
-                    'path': timestamp.path,
-                    'key_file_name': timestamp.key_file_name,
-                    'upload_file_created_user': timestamp.upload_file_created_user,
-                    'upload_file_size': timestamp.upload_file_size,
-                    'verify_file_size': timestamp.verify_file_size,
-                    'verify_user': timestamp.verify_user,
-                }
-                file_info['timestamp'] = timestamp_info
+            timestamps = {
+                (timestamp.project_id, timestamp.file_id): timestamp
+                for timestamp in RdmFileTimestamptokenVerifyResult.objects.filter(
+                    file_id__in=[file._id for file in files])
+            }
 
             # file versions
-            file_versions = file.versions.order_by('-created')
-            file_versions_info = []
-            for version in file_versions:
-                file_version_thru = version.get_basefilenode_version(file)
-                version_info = {
-                    'identifier': version.identifier,
-                    'created_at': str(version.created),
-                    'modified_at': str(version.modified),
-                    'size': version.size,
-                    'version_name': file_version_thru.version_name if file_version_thru else file.name,
-                    'contributor': version.creator.username,
-                    'metadata': version.metadata,
-                    'location': version.location,
+            versions = {}
+            file_versions_thru = BaseFileVersionsThrough.objects.filter(
+                basefilenode_id__in=file_ids,
+            ).select_related('fileversion__creator').order_by('-fileversion__created')
+            for file_version_thru in file_versions_thru:
+                versions.setdefault(file_version_thru.basefilenode_id, []).append(file_version_thru)
+
+            for file in files:
+                project_info = projects[file.target_object_id]
+                file_info = {
+                    'id': file.id,
+                    'path': file.path,
+                    'materialized_path': file.materialized_path,
+                    'name': file.name,
+                    'provider': file.provider,
+                    'created_at': str(file.created),
+                    'modified_at': str(file.modified),
+                    'project': project_info,
+                    'tags': tags.get(file.id, []),
+                    'version': [],
+                    'size': 0,
+                    'location': {},
+                    'timestamp': {},
+                    'checkout_id': file.checkout_id or None,
                 }
-                file_versions_info.append(version_info)
-                total_file += 1
-                total_size += version.size
 
-            file_info['version'] = file_versions_info
-            file_info['size'] = file_versions_info[0]['size']
-            file_info['location'] = file_versions_info[0]['location']
-            files.append(file_info)
+                timestamp = timestamps.get((project_info['id'], file._id))
+                if timestamp:
+                    timestamp_info = {
+                        'timestamp_id': timestamp.id,
+                        'inspection_result_status': timestamp.inspection_result_status,
+                        'provider': timestamp.provider,
+                        'upload_file_modified_user': timestamp.upload_file_modified_user,
+                        'project_id': timestamp.project_id,
+                        'path': timestamp.path,
+                        'key_file_name': timestamp.key_file_name,
+                        'upload_file_created_user': timestamp.upload_file_created_user,
+                        'upload_file_size': timestamp.upload_file_size,
+                        'verify_file_size': timestamp.verify_file_size,
+                        'verify_user': timestamp.verify_user,
+                    }
+                    file_info['timestamp'] = timestamp_info
+
+                file_versions_info = []
+                for file_version_thru in versions.get(file.id, []):
+                    version = file_version_thru.fileversion
+                    version_info = {
+                        'identifier': version.identifier,
+                        'created_at': str(version.created),
+                        'modified_at': str(version.modified),
+                        'size': version.size,
+                        'version_name': file_version_thru.version_name,
+                        'contributor': version.creator.username,
+                        'metadata': version.metadata,
+                        'location': version.location,
+                    }
+                    file_versions_info.append(version_info)
+
+                file_info['version'] = file_versions_info
+                file_info['size'] = file_versions_info[0]['size']
+                file_info['location'] = file_versions_info[0]['location']
+                yield file_info
+
+    def write_file_information_json(self, stream, file_filter=None):
+        """Write the file information document of the source storage to ``stream``.
+
+        Files are written one at a time, so memory use does not depend on the
+        number of files. ``file_filter`` is called with each file information
+        and returns the file information to write, or None to leave it out.
+        Return the export data information, with the number and size of the
+        file versions written; or None if the institution does not exist.
+        """
+        institution = self.get_source_institution()
+        if not institution:
+            return None
+
+        export_data_json = self.get_export_data_json(institution)
+        projects__ids, base_folder_nodes, base_file_nodes = self.get_source_nodes(institution)
+
+        stream.write('{"institution": ')
+        stream.write(json.dumps(export_data_json['institution'], ensure_ascii=False))
 
-        file_info_json['folders'] = folders
-        file_info_json['files'] = files
+        stream.write(', "folders": [')
+        for index, folder_info in enumerate(self.iter_folder_information(base_folder_nodes)):
+            if index:
+                stream.write(', ')
+            stream.write(json.dumps(folder_info, ensure_ascii=False))
+
+        stream.write('], "files": [')
+        total_size = 0
+        total_file = 0
+        is_first = True
+        for file_info in self.iter_file_information(base_file_nodes):
+            if file_filter:
+                file_info = file_filter(file_info)
+                if file_info is None:
+                    continue
+            if not is_first:
+                stream.write(', ')
+            is_first = False
+            stream.write(json.dumps(file_info, ensure_ascii=False))
+            for version in file_info['version']:
+                total_file += 1
+                total_size += version['size']
+        stream.write(']}')
 
         export_data_json['files_numb'] = total_file
         export_data_json['size'] = total_size
         export_data_json['projects_numb'] = len(projects__ids)
 
+        return export_data_json
+
+    def extract_file_information_json_from_source_storage(self):
+        institution = self.get_source_institution()
+        if not institution:
+            return None
+
+        export_data_json = self.get_export_data_json(institution)
+        projects__ids, base_folder_nodes, base_file_nodes = self.get_source_nodes(institution)
+
+        file_info_json = {
+            'institution': export_data_json['institution'],
+            'folders': list(self.iter_folder_information(base_folder_nodes)),
+            'files': list(self.iter_file_information(base_file_nodes)),
+        }
+
+        export_data_json['files_numb'] = sum(len(file['version']) for file in file_info_json['files'])
+        export_data_json['size'] = sum(
+            version['size'] for file in file_info_json['files'] for version in file['version'])
+        export_data_json['projects_numb'] = len(projects__ids)
+
         return export_data_json, file_info_json
 
     def get_source_file_versions_min(self, file_info_json):
@@ -299,7 +394,8 @@ class ExportData(base.BaseModel):
                 metadata = version.get('metadata')
                 # get metadata.get('sha256', metadata.get('md5', metadata.get('sha512', metadata.get('sha1', metadata.get('name')))))
                 file_name = metadata.get('sha256', metadata.get('md5'))
-                file_versions.append((project_id, provider, file_path, identifier, file_name, file_id,))
+                location = version.get('location') or {}
+                file_versions.append((project_id, provider, file_path, identifier, file_name, file_id, location,))
 
         return file_versions
 
@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+
+from django.db import models
+
+from osf.models import base, ExportData
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+
+__all__ = [
+    'ExportDataJournal',
+]
+
+
+class ExportDataJournal(base.BaseModel):
+    """Checkpoint of one exported object (named by its hash) of an export process.
+
+    An export process that is resumed skips the objects which are already done.
+    ``failures`` lists the [file_id, version] pairs that could not be copied.
+    ``stored_in`` is the previous export process whose files folder holds the
+    object when an incremental export reuses it instead of copying it. It is
+    not a PROTECT foreign key, which would also block the cascades deleting
+    both export data; DeleteExportDataView checks the references instead.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, STATUS_PENDING.title()),
+        (STATUS_DONE, STATUS_DONE.title()),
+        (STATUS_FAILED, STATUS_FAILED.title()),
+    )
+
+    export_data = models.ForeignKey(ExportData, related_name='journal', on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=16, default=STATUS_PENDING)
+    failures = DateTimeAwareJSONField(default=list, blank=True)
+    stored_in = models.ForeignKey(ExportData, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        db_table = 'osf_export_data_journal'
+        unique_together = ('export_data', 'file_name')
+
+    def __repr__(self):
+        return f'"({self.export_data_id}-{self.file_name})[{self.status}]"'
+
+    __str__ = __repr__
@@ -46,12 +46,7 @@ class ExportDataRestore(base.BaseModel):
     __str__ = __repr__
 
     def extract_file_information_json_from_destination_storage(self):
-        # Get region guid == institution guid
-        destination_storage_guid = self.destination.guid
-
-        # Get Institution by guid
-        institution = Institution.load(destination_storage_guid)
-
+        institution = self.get_destination_institution()
         if not institution:
             return None
 
@@ -79,6 +74,21 @@ class ExportDataRestore(base.BaseModel):
             'institution': institution_json,
         }
 
+        files = list(self.iter_file_information(self.get_destination_file_nodes(institution)))
+        file_info_json['files'] = files
+
+        export_data_json['files_numb'] = sum(len(file['version']) for file in files)
+        export_data_json['size'] = sum(version['size'] for file in files for version in file['version'])
+        export_data_json['projects_numb'] = len({file['project']['id'] for file in files})
+
+        return export_data_json, file_info_json
+
+    def get_destination_institution(self):
+        # Get region guid == institution guid
+        return Institution.load(self.destination.guid)
+
+    def get_destination_file_nodes(self, institution):
+        """Return the file nodes restored to the destination storage"""
         # get list FileVersion linked to destination storage
         file_versions = self.destination.fileversion_set.all()
 
@@ -93,10 +103,9 @@ class ExportDataRestore(base.BaseModel):
         # Combine two project lists and remove duplicates if have
         projects = projects.union(institution_users_projects)
         projects__ids = projects.values_list('id', flat=True)
-        destination_project_ids = set()
 
         # get base_file_nodes
-        base_file_nodes = BaseFileNode.objects.filter(
+        return BaseFileNode.objects.filter(
             id__in=base_file_nodes__ids,
             target_object_id__in=projects__ids,
         ).exclude(
@@ -104,11 +113,10 @@ class ExportDataRestore(base.BaseModel):
             Q(deleted__isnull=False) | Q(deleted_on__isnull=False) | Q(deleted_by_id__isnull=False),
         )
 
-        total_size = 0
-        total_file = 0
-        files = []
-        # get file information
-        for file in base_file_nodes:
+    def iter_file_information(self, base_file_nodes):
+        """Yield the information of each file node, as in the file information
+        JSON, without loading all the file nodes at once."""
+        for file in base_file_nodes.iterator():
             file_info = {
                 'id': file.id,
                 'path': file.path,
@@ -128,7 +136,6 @@ class ExportDataRestore(base.BaseModel):
 
             # project
             project = file.target
-            destination_project_ids.add(project.id)
             project_info = {
                 'id': project._id,
                 'name': project.title,
@@ -175,21 +182,11 @@ class ExportDataRestore(base.BaseModel):
                     'location': version.location,
                 }
                 file_versions_info.append(version_info)
-                total_file += 1
-                total_size += version.size
 
             file_info['version'] = file_versions_info
             file_info['size'] = file_versions_info[0]['size']
             file_info['location'] = file_versions_info[0]['location']
-            files.append(file_info)
-
-        file_info_json['files'] = files
-
-        export_data_json['files_numb'] = total_file
-        export_data_json['size'] = total_size
-        export_data_json['projects_numb'] = len(destination_project_ids)
-
-        return export_data_json, file_info_json
+            yield file_info
 
     @property
     def process_start_timestamp(self):
@@ -0,0 +1,41 @@
+from __future__ import unicode_literals
+
+from django.db import models
+
+from osf.models import base, BaseFileNode, ExportDataRestore
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+
+__all__ = [
+    'ExportDataRestoreJournal',
+]
+
+
+class ExportDataRestoreJournal(base.BaseModel):
+    """Checkpoint of one restored file (by its id in the file information) of a restore process.
+
+    A restore process that is resumed skips the files which are already done.
+    ``file_node`` is the restored file node, ``failures`` lists the versions
+    that could not be copied.
+    """
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_DONE, STATUS_DONE.title()),
+        (STATUS_FAILED, STATUS_FAILED.title()),
+    )
+
+    export_data_restore = models.ForeignKey(ExportDataRestore, related_name='journal', on_delete=models.CASCADE)
+    file_id = models.IntegerField()
+    status = models.CharField(choices=STATUS_CHOICES, max_length=16)
+    file_node = models.ForeignKey(BaseFileNode, null=True, blank=True, on_delete=models.SET_NULL)
+    failures = DateTimeAwareJSONField(default=list, blank=True)
+
+    class Meta:
+        db_table = 'osf_export_data_restore_journal'
+        unique_together = ('export_data_restore', 'file_id')
+
+    def __repr__(self):
+        return f'"({self.export_data_restore_id}-{self.file_id})[{self.status}]"'
+
+    __str__ = __repr__
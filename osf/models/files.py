@@ -26,6 +26,7 @@ from osf.utils.fields import NonNaiveDateTimeField
 from api.base.utils import waterbutler_api_url_for
 from website.files import utils
 from website.files.exceptions import VersionNotFoundError
+from website.search import document_cache
 from website.util import api_v2_url, web_url_for, api_url_for
 
 __all__ = (
@@ -466,7 +467,9 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
             guid = self.guids.first()
             if guid:
                 Comment = apps.get_model('osf.Comment')
-                Comment.objects.filter(root_target=guid).update(root_target=None)
+                comments = Comment.objects.filter(root_target=guid)
+                document_cache.invalidate_comments(comments)
+                comments.update(root_target=None)
 
         if save:
             self.save()
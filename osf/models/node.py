@@ -82,8 +82,6 @@ from website.util.metrics import OsfSourceTags, CampaignSourceTags
 from website.util import api_url_for, api_v2_url, web_url_for
 from .base import BaseModel, GuidMixin, GuidMixinQuerySet
 from api.caching.tasks import update_storage_usage
-from api.caching import settings as cache_settings
-from api.caching.utils import storage_usage_cache
 from api.share.utils import update_share
 
 
@@ -2425,14 +2423,13 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
 
     @property
     def storage_usage(self):
-        key = cache_settings.STORAGE_USAGE_KEY.format(target_id=self._id)
-
-        storage_usage_total = storage_usage_cache.get(key)
-        if storage_usage_total:
-            return storage_usage_total
-        else:
-            update_storage_usage(self)  # sets cache
-            return storage_usage_cache.get(key)
+        NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+        counter = NodeStorageUsage.objects.filter(node_id=self.id).values_list('usage', flat=True)
+        usage = counter.first()
+        if usage is None and not counter.exists():
+            update_storage_usage(self)  # creates the counter
+            usage = counter.first()
+        return usage
 
     # Overrides ContributorMixin
     # TODO: Deprecate this when we emberize contributors management for nodes
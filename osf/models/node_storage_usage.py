@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from django.db import models
+
+from osf.models.base import BaseModel
+
+
+class NodeStorageUsage(BaseModel):
+    """Bytes stored in osfstorage by a node, kept up to date by file events.
+
+    ``usage`` is None until it has been computed once. A row with ``dirtied``
+    set could not be updated incrementally and is recomputed by
+    api.caching.tasks.reconcile_storage_usage.
+    """
+    node = models.OneToOneField('AbstractNode', related_name='storage_usage_counter', on_delete=models.CASCADE)
+    usage = models.BigIntegerField(null=True, blank=True)
+    dirtied = models.DateTimeField(null=True, blank=True, db_index=True)
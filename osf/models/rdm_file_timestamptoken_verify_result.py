@@ -1,5 +1,6 @@
 from django.db import models
 from osf.models.base import BaseModel, ObjectIDMixin
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
 
 class RdmFileTimestamptokenVerifyResult(ObjectIDMixin, BaseModel):
@@ -12,6 +13,8 @@ class RdmFileTimestamptokenVerifyResult(ObjectIDMixin, BaseModel):
     provider = models.CharField(max_length=25, null=True, blank=True)
     path = models.TextField(null=True, blank=True)
     timestamp_token = models.BinaryField(null=True, blank=True)
+    # inclusion proof when timestamp_token covers the root of a Merkle tree
+    timestamp_proof = DateTimeAwareJSONField(null=True, blank=True)
     inspection_result_status = models.IntegerField(default=0)
     upload_file_created_user = models.IntegerField(null=True, blank=True)
     upload_file_created_at = models.DateTimeField(null=True, blank=True)
@@ -23,3 +26,5 @@ class RdmFileTimestamptokenVerifyResult(ObjectIDMixin, BaseModel):
     verify_file_created_at = models.DateTimeField(null=True, blank=True)
     verify_file_modified_at = models.DateTimeField(null=True, blank=True)
     verify_file_size = models.BigIntegerField(null=True, blank=True)
+    # hash reported by the storage when the file was last verified
+    verify_file_hash = models.TextField(null=True, blank=True)
@@ -0,0 +1,21 @@
+from django.db import models
+
+
+class SearchDocumentPart(models.Model):
+    """A part of the search document of a node, see website.search.document_cache.
+
+    A change to the data of a part adds a row; the last row of a (node_id,
+    part) is the current one, and ``value`` is empty until the part is built.
+    The older rows and the rows past ``expires`` are removed by
+    sweep_search_document_parts.
+    """
+    node_id = models.IntegerField()
+    part = models.CharField(max_length=16)
+    # pickled value of the part
+    value = models.BinaryField(null=True, blank=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        index_together = (
+            ('node_id', 'part', 'id'),
+        )
@@ -0,0 +1,34 @@
+from django.db import models
+
+from osf.models.base import BaseModel
+
+
+class SearchUpdateQueue(BaseModel):
+    """Search documents waiting for an update, drained in bulk by celery workers.
+
+    There is one row per (category, target_id, index): repeated updates of a
+    document before it is flushed only touch ``modified``, while ``created``
+    keeps the time of the oldest update waiting. A row is removed once a flush
+    has updated its document; ``claimed`` is the time the flush took it.
+    """
+    CATEGORY_NODE = 'node'
+    CATEGORY_WIKI = 'wiki'
+    CATEGORY_CONTRIBUTORS = 'contributors'
+
+    CATEGORY_CHOICES = (
+        (CATEGORY_NODE, 'Node document'),
+        (CATEGORY_WIKI, 'Wiki page document'),
+        (CATEGORY_CONTRIBUTORS, 'Contributors of the nodes of a user'),
+    )
+
+    category = models.CharField(max_length=16, choices=CATEGORY_CHOICES)
+    # guid of the node or of the wiki page, id of the user
+    target_id = models.CharField(max_length=255)
+    # empty for the default index
+    index = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    claimed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('category', 'target_id', 'index')
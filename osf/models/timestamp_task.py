@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from osf.models.base import BaseModel, ObjectIDMixin
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
 
 class TimestampTask(ObjectIDMixin, BaseModel):
@@ -7,3 +9,50 @@ class TimestampTask(ObjectIDMixin, BaseModel):
     node = models.OneToOneField('Node', on_delete=models.CASCADE)
     task_id = models.CharField(max_length=80)
     requester = models.ForeignKey('OSFUser', on_delete=models.CASCADE)
+
+
+class TimestampTokenBucket(BaseModel):
+    """Token bucket limiting the requests sent to the TSA by all workers."""
+    name = models.CharField(max_length=80, unique=True)
+    tokens = models.FloatField(default=0)
+    last_refill = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def acquire(cls, name, rate, capacity):
+        """Take a token from the bucket ``name`` refilled with ``rate`` tokens
+        per second, or unlimited if ``rate`` is 0. Returns 0 if taken,
+        otherwise the seconds to wait.
+        """
+        if rate <= 0:
+            return 0
+        with transaction.atomic():
+            cls.objects.get_or_create(name=name, defaults={'tokens': capacity})
+            bucket = cls.objects.select_for_update().get(name=name)
+            now = timezone.now()
+            elapsed = max(0, (now - bucket.last_refill).total_seconds())
+            tokens = min(capacity, bucket.tokens + elapsed * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            bucket.tokens = tokens
+            bucket.last_refill = now
+            bucket.save(update_fields=['tokens', 'last_refill', 'modified'])
+        return wait
+
+
+class TimestampQueue(BaseModel):
+    """File versions waiting for a timestamp, drained by celery workers."""
+    node = models.ForeignKey('AbstractNode', on_delete=models.CASCADE)
+    user = models.ForeignKey('OSFUser', on_delete=models.CASCADE)
+    file_id = models.CharField(max_length=24, db_index=True)
+    provider = models.CharField(max_length=25)
+    version = models.CharField(max_length=255, blank=True, default='')
+    hash_type = models.CharField(max_length=16, blank=True, default='')
+    hash_value = models.CharField(max_length=128, blank=True, default='')
+    file_info = DateTimeAwareJSONField(default=dict)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # the row is not processed before, see website.util.timestamp._claim_timestamp_queue
+    next_attempt_at = models.DateTimeField(default=timezone.now)
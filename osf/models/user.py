@@ -1720,6 +1720,29 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
         """Returns number of "shared projects" (projects that both users are contributors or group members for)"""
         return self._projects_in_common_query(other_user).count()
 
+    def n_projects_in_common_by_user(self, other_users):
+        """Returns {user id: number of "shared projects"} of several users, counted by one grouped query.
+        Users without shared projects are not in the result.
+        """
+        from django.contrib.auth.models import Permission
+        from osf.models import NodeGroupObjectPermission
+        from osf.utils.permissions import READ_NODE
+
+        user_ids = [user.id for user in other_users]
+        if not user_ids:
+            return {}
+        permission_id = Permission.objects.get(codename=READ_NODE).id
+        own_nodes = NodeGroupObjectPermission.objects.filter(
+            group__user__id=self.id, permission_id=permission_id).values('content_object_id')
+        counts = NodeGroupObjectPermission.objects.filter(
+            group__user__id__in=user_ids,
+            permission_id=permission_id,
+            content_object_id__in=own_nodes,
+            content_object__is_deleted=False,
+            content_object__type__in=['osf.node', 'osf.registration'],
+        ).values('group__user__id').annotate(n_projects=Count('content_object_id', distinct=True))
+        return {count['group__user__id']: count['n_projects'] for count in counts}
+
     def add_unclaimed_record(self, claim_origin, referrer, given_name, email=None):
         """Add a new project entry in the unclaimed records dictionary.
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.db import models
 
+from osf.models.base import BaseModel
 from osf.models.storage import StorageType
 
 
@@ -11,3 +12,39 @@ class UserQuota(StorageType):
         default=StorageType.NII_STORAGE)
     max_quota = models.IntegerField(default=100)
     used = models.BigIntegerField(default=0)
+
+
+class UserQuotaLedger(BaseModel):
+    """Signed change of a user's used quota that is not yet in UserQuota.used.
+
+    Rows are only appended by file events and are folded into UserQuota by
+    website.util.quota.compact_quota_ledger.
+    """
+    FILE_ADDED = 'file_added'
+    FILE_MODIFIED = 'file_modified'
+    FILE_REMOVED = 'file_removed'
+    FILE_MOVED = 'file_moved'
+    NODE_REMOVED = 'node_removed'
+    NODE_RESTORED = 'node_restored'
+
+    REASON_CHOICES = (
+        (FILE_ADDED, 'File added'),
+        (FILE_MODIFIED, 'File modified'),
+        (FILE_REMOVED, 'File removed'),
+        (FILE_MOVED, 'File moved'),
+        (NODE_REMOVED, 'Node removed'),
+        (NODE_RESTORED, 'Node restored'),
+    )
+
+    user = models.ForeignKey('OSFUser', on_delete=models.CASCADE)
+    storage_type = models.IntegerField(
+        choices=StorageType.STORAGE_TYPE_CHOICES,
+        default=StorageType.NII_STORAGE)
+    delta = models.BigIntegerField()
+    reason = models.CharField(max_length=32, choices=REASON_CHOICES)
+    file = models.ForeignKey('osf.BaseFileNode', null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        index_together = (
+            ('user', 'storage_type'),
+        )
@@ -2,6 +2,9 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import mock
+import os
+import shutil
+import tempfile
 import time
 import unittest
 import logging
@@ -10,12 +13,15 @@ import functools
 from nose.tools import *  # noqa: F403
 import pytest
 
+from django.utils import timezone
+
 from framework.auth.core import Auth
 
 from website import settings
 import website.search.search as search
-from website.search import elastic_search
+from website.search import document_cache, elastic_search, update_queue
 from website.search.util import build_query
+from website.search_migration import migrate as search_migration
 from website.search_migration.migrate import migrate
 from osf.models import (
     Retraction,
@@ -24,6 +30,8 @@ from osf.models import (
     Tag,
     Preprint,
     QuickFilesNode,
+    SearchDocumentPart,
+    SearchUpdateQueue,
 )
 from addons.wiki.models import WikiPage
 from addons.osfstorage.models import OsfStorageFile
@@ -35,6 +43,9 @@ from tests.base import OsfTestCase
 from tests.test_features import requires_search
 from tests.utils import run_celery_tasks
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 
 TEST_INDEX = 'test'
 
@@ -1403,6 +1414,41 @@ class TestSearchMigration(OsfTestCase):
         res = self.es.search(index=settings.ELASTIC_INDEX, doc_type='collectionSubmission', search_type='count', body=count_query)
         assert res['hits']['total'] == 2
 
+    def test_migration_resumes_from_checkpoint(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        checkpoint = os.path.join(tmp_dir, 'checkpoint.json')
+
+        with mock.patch.object(search_migration, 'migrate_comments', side_effect=RuntimeError):
+            with assert_raises(RuntimeError):
+                migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, checkpoint=checkpoint)
+        progress = search_migration.MigrationCheckpoint(checkpoint)
+        assert_equal(progress.index, settings.ELASTIC_INDEX + '_v1')
+        assert_true(progress.is_step_done('nodes'))
+        assert_false(progress.is_step_done('comments'))
+
+        with mock.patch.object(search_migration, 'migrate_nodes') as mock_migrate_nodes:
+            migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, checkpoint=checkpoint)
+        assert_false(mock_migrate_nodes.called)
+        var = self.es.indices.get_aliases()
+        assert_equal(list(var[settings.ELASTIC_INDEX + '_v1']['aliases'].keys())[0], settings.ELASTIC_INDEX)
+        assert_false(os.path.exists(checkpoint))
+
+    def test_sql_migrate_skips_migrated_ranges(self):
+        checkpoint = search_migration.MigrationCheckpoint()
+        checkpoint.mark_range_done('users', (0, 10))
+        with mock.patch.object(search_migration, 'migrate_id_range',
+                               side_effect=lambda task: (task[2], 1)) as mock_migrate_id_range:
+            total = search_migration.sql_migrate(
+                settings.ELASTIC_INDEX, 'SQL', 25, 10, checkpoint=checkpoint, step='users')
+        assert_equal([call[0][0][2] for call in mock_migrate_id_range.call_args_list], [(10, 20), (20, 30), (30, 40)])
+        assert_equal(total, 3)
+        assert_equal(checkpoint.done_ranges('users'), {(0, 10), (10, 20), (20, 30), (30, 40)})
+
+    def test_get_id_ranges(self):
+        assert_equal(search_migration.get_id_ranges(5, 10), [(0, 10), (10, 20)])
+        assert_equal(search_migration.get_id_ranges(10, 10), [(0, 10), (10, 20), (20, 30)])
+
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
 class TestSearchFiles(OsfTestCase):
@@ -1544,3 +1590,273 @@ class TestSearchFiles(OsfTestCase):
 
         find = query_file('GreenLight.mp3')['results']
         assert_equal(len(find), 0)
+
+
+class TestFormatResults(OsfTestCase):
+
+    def setUp(self):
+        super(TestFormatResults, self).setUp()
+        self.user = factories.UserFactory(fullname='Sam Cooke')
+        self.parent = factories.ProjectFactory(creator=self.user, is_public=True, title='Night Beat')
+        self.folder = self.parent.get_addon('osfstorage').get_root().append_folder('Tracks')
+        self.file_count = 0
+
+    def user_result(self, user):
+        return {'category': 'user', 'id': user._id}
+
+    def component_result(self, component):
+        return {
+            'category': 'component',
+            'id': component._id,
+            'parent_id': self.parent._id,
+            'creator_id': self.user._id,
+            'modifier_id': component.creator._id,
+            'contributors': [],
+            'url': component.url,
+            'title': component.title,
+            'tags': [],
+            'is_registration': False,
+            'is_retracted': False,
+            'is_pending_retraction': False,
+            'embargo_end_date': None,
+            'is_pending_embargo': False,
+            'description': '',
+            'wikis': [],
+        }
+
+    def file_result(self, file_node):
+        return {
+            'category': 'file',
+            'id': file_node._id,
+            'parent_id': self.parent._id,
+            'creator_id': self.user._id,
+            'modifier_id': None,
+        }
+
+    def make_results(self, count):
+        results = []
+        for _ in range(count):
+            user = factories.UserFactory()
+            component = factories.NodeFactory(creator=user, parent=self.parent)
+            file_node = self.folder.append_file('Track {}.mp3'.format(self.file_count))
+            self.file_count += 1
+            results.extend([self.user_result(user), self.component_result(component), self.file_result(file_node)])
+        return results
+
+    def count_queries(self, results):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            elastic_search.format_results(results)
+        return len(queries)
+
+    def test_format_results(self):
+        results = elastic_search.format_results(self.make_results(1))
+        assert_equal(len(results), 3)
+        assert_equal(results[0]['url'], '/profile/' + results[0]['id'])
+        assert_equal(results[1]['parent_title'], 'Night Beat')
+        assert_equal(results[1]['creator_name'], 'Sam Cooke')
+        assert_true(results[1]['is_component'])
+        assert_equal(results[2]['creator_name'], 'Sam Cooke')
+        assert_equal(results[2]['modifier_name'], '')
+        assert_equal(results[2]['parent_url'], self.parent.url)
+        file_path = elastic_search.get_file_path(results[2]['id'])
+        assert_true(file_path.endswith('/Tracks/Track 0.mp3'))
+        assert_equal(results[2]['folder_name'], file_path[:-len('/Track 0.mp3')])
+
+    def test_queries_do_not_grow_with_results(self):
+        assert_equal(self.count_queries(self.make_results(1)), self.count_queries(self.make_results(5)))
+
+    def test_private_parent(self):
+        self.parent.is_public = False
+        self.parent.save()
+        component = factories.NodeFactory(creator=self.user, parent=self.parent)
+        result = elastic_search.format_results([self.component_result(component)])[0]
+        assert_false(result['is_component'])
+        assert_is_none(result['parent_title'])
+
+    def test_set_last_comment(self):
+        replier = factories.UserFactory(fullname='Otis Redding')
+        comment = factories.CommentFactory(node=self.parent, user=self.user)
+        reply = factories.CommentFactory(node=self.parent, user=replier, target=comment.guids.first())
+        hits = [
+            {'_source': {'highlight': {
+                'comments.{}'.format(comment.id): ['first'],
+                'comments.{}'.format(reply.id): ['reply'],
+            }}},
+            {'_source': {'highlight': {'title': ['Night Beat']}}},
+            {'_source': {'highlight': {'comments.0': ['removed']}}},
+        ]
+        hits = elastic_search.set_last_comment(hits)
+        last_comment = hits[0]['_source']['comment']
+        assert_equal(last_comment['text'], 'reply')
+        assert_equal(last_comment['user_name'], 'Otis Redding')
+        assert_equal(last_comment['replyto_user_id'], self.user._id)
+        assert_equal(last_comment['replyto_user_name'], 'Sam Cooke')
+        assert_is_none(hits[1]['_source']['comment'])
+        assert_is_none(hits[2]['_source']['comment'])
+
+
+class TestSearchDocumentCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestSearchDocumentCache, self).setUp()
+        self.user = factories.UserFactory()
+        self.node = factories.ProjectFactory(creator=self.user, is_public=True)
+
+    def test_get_parts(self):
+        builders = {
+            document_cache.PART_TAGS: mock.Mock(return_value=['tag']),
+            document_cache.PART_COMMENTS: mock.Mock(return_value={}),
+        }
+        expected = {document_cache.PART_TAGS: ['tag'], document_cache.PART_COMMENTS: {}}
+        assert_equal(document_cache.get_parts(self.node.id, builders), expected)
+        assert_equal(document_cache.get_parts(self.node.id, builders), expected)
+        assert_equal(builders[document_cache.PART_TAGS].call_count, 1)
+
+        document_cache.invalidate([self.node.id], document_cache.PART_TAGS)
+        builders[document_cache.PART_TAGS].return_value = ['new tag']
+        assert_equal(document_cache.get_parts(self.node.id, builders)[document_cache.PART_TAGS], ['new tag'])
+        assert_equal(builders[document_cache.PART_TAGS].call_count, 2)
+        assert_equal(builders[document_cache.PART_COMMENTS].call_count, 1)
+
+    def test_get_parts_disabled(self):
+        build = mock.Mock(return_value=['tag'])
+        with mock.patch.object(settings, 'ENABLE_SEARCH_DOCUMENT_CACHE', False):
+            document_cache.get_parts(self.node.id, {document_cache.PART_TAGS: build})
+            document_cache.get_parts(self.node.id, {document_cache.PART_TAGS: build})
+        assert_equal(build.call_count, 2)
+        assert_false(SearchDocumentPart.objects.exists())
+
+    def test_sweep_keeps_current_parts(self):
+        build = mock.Mock(return_value=['tag'])
+        document_cache.get_parts(self.node.id, {document_cache.PART_TAGS: build})
+        document_cache.invalidate([self.node.id], document_cache.PART_TAGS)
+        document_cache.get_parts(self.node.id, {document_cache.PART_TAGS: build})
+        assert_greater(SearchDocumentPart.objects.filter(node_id=self.node.id).count(), 1)
+
+        document_cache.sweep_search_document_parts()
+        assert_equal(SearchDocumentPart.objects.filter(node_id=self.node.id).count(), 1)
+        assert_equal(document_cache.get_parts(self.node.id, {document_cache.PART_TAGS: build}),
+                     {document_cache.PART_TAGS: ['tag']})
+        assert_equal(build.call_count, 2)
+
+        with mock.patch.object(settings, 'SEARCH_DOCUMENT_CACHE_TIMEOUT', -1):
+            document_cache.invalidate([self.node.id], document_cache.PART_TAGS)
+        document_cache.sweep_search_document_parts()
+        assert_false(SearchDocumentPart.objects.filter(node_id=self.node.id).exists())
+
+    def test_comment_rebuilds_comments_only(self):
+        elastic_search.serialize_node(self.node, 'project')
+        with mock.patch.object(elastic_search, 'comments_to_doc', wraps=elastic_search.comments_to_doc) as mock_comments, \
+                mock.patch.object(elastic_search, 'serialize_node_contributors',
+                                  wraps=elastic_search.serialize_node_contributors) as mock_contributors:
+            elastic_search.serialize_node(self.node, 'project')
+            assert_equal(mock_comments.call_count, 0)
+
+            comment = factories.CommentFactory(node=self.node, user=self.user, content='Hello')
+            document = elastic_search.serialize_node(self.node, 'project')
+            assert_equal(mock_comments.call_count, 1)
+            assert_equal(mock_contributors.call_count, 0)
+        assert_equal(document['comments'], {comment.id: 'Hello'})
+
+    def test_wiki_delete_rebuilds_comments(self):
+        wiki_page = WikiPage.objects.create_for_node(self.node, 'Page', 'Hello', Auth(self.user))
+        factories.CommentFactory(node=self.node, user=self.user, target=wiki_page.guids.first())
+        elastic_search.serialize_node(self.node, 'project')
+        with mock.patch.object(elastic_search, 'comments_to_doc', wraps=elastic_search.comments_to_doc) as mock_comments:
+            # the comments of the page are updated without being saved
+            wiki_page.delete(Auth(self.user))
+            elastic_search.serialize_node(self.node, 'project')
+            assert_equal(mock_comments.call_count, 1)
+
+    def test_tags_and_contributors_changes(self):
+        contributor = factories.UserFactory()
+        elastic_search.serialize_node(self.node, 'project')
+
+        self.node.add_tag('Memphis', auth=Auth(self.user))
+        self.node.add_contributor(contributor, auth=Auth(self.user), visible=True, save=True)
+        document = elastic_search.serialize_node(self.node, 'project')
+        assert_equal(document['tags'], ['Memphis'])
+        assert_equal([c['id'] for c in document['contributors']], [self.user._id, contributor._id])
+
+        self.node.move_contributor(contributor, Auth(self.user), 0, save=True)
+        document = elastic_search.serialize_node(self.node, 'project')
+        assert_equal([c['id'] for c in document['contributors']], [contributor._id, self.user._id])
+
+
+class TestSearchUpdateQueue(OsfTestCase):
+
+    def setUp(self):
+        super(TestSearchUpdateQueue, self).setUp()
+        self.user = factories.UserFactory()
+        self.node = factories.ProjectFactory(creator=self.user, is_public=True)
+        # the celery tasks are eager, flush only when told to
+        patcher = mock.patch.object(update_queue, 'schedule_flush')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_merges_updates_of_a_document(self):
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        update_queue.enqueue(update_queue.CATEGORY_CONTRIBUTORS, self.user.id)
+        assert_equal(SearchUpdateQueue.objects.count(), 2)
+        assert_equal(update_queue.get_stats()['depth'], 2)
+
+    def test_update_node_is_queued(self):
+        with mock.patch.object(settings, 'USE_CELERY', True), \
+                mock.patch.object(settings, 'ENABLE_SEARCH_UPDATE_QUEUE', True), \
+                mock.patch.object(search.search_engine, 'update_node_async') as mock_update_node_async:
+            search.update_node(self.node)
+            search.update_node(self.node)
+        assert_false(mock_update_node_async.s.called)
+        entry = SearchUpdateQueue.objects.get()
+        assert_equal((entry.category, entry.target_id), (update_queue.CATEGORY_NODE, self.node._id))
+
+    def test_flush_sends_one_bulk_update(self):
+        wiki_page = WikiPage.objects.create_for_node(self.node, 'Page', 'Hello', Auth(self.user))
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        update_queue.enqueue(update_queue.CATEGORY_WIKI, wiki_page._id)
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        update_queue.enqueue(update_queue.CATEGORY_CONTRIBUTORS, self.user.id)
+        with mock.patch.object(search, 'bulk_update_queued') as mock_bulk_update_queued:
+            update_queue.flush_search_update_queue()
+        mock_bulk_update_queued.assert_called_once_with(
+            {self.node._id}, {wiki_page._id}, [self.user.id], index=None)
+        assert_equal(update_queue.get_stats(), {'depth': 0, 'lag': 0})
+
+    def test_flush_puts_back_failed_updates(self):
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        with mock.patch.object(search, 'bulk_update_queued', side_effect=RuntimeError('unavailable')), \
+                mock.patch.object(settings, 'SEARCH_UPDATE_QUEUE_MAX_ATTEMPTS', 2):
+            update_queue.flush_search_update_queue()
+            entry = SearchUpdateQueue.objects.get()
+            assert_equal(entry.attempts, 1)
+            assert_equal(entry.last_error, 'unavailable')
+
+            update_queue.flush_search_update_queue()
+            assert_false(SearchUpdateQueue.objects.exists())
+
+    def test_flush_keeps_rows_until_updated(self):
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        claimed, entries = update_queue.claim_batch(timezone.now())
+        assert_equal(len(entries), 1)
+        # a flush killed before updating the documents loses nothing
+        entry = SearchUpdateQueue.objects.get()
+        assert_equal(entry.claimed, claimed)
+        assert_equal(update_queue.claim_batch(timezone.now())[1], [])
+
+        with mock.patch.object(settings, 'SEARCH_UPDATE_QUEUE_CLAIM_TIMEOUT', 0):
+            claimed, entries = update_queue.claim_batch(timezone.now())
+        assert_equal([entry.target_id for entry in entries], [self.node._id])
+        update_queue.complete(entries, claimed)
+        assert_false(SearchUpdateQueue.objects.exists())
+
+    def test_flush_keeps_rows_queued_again(self):
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        claimed, entries = update_queue.claim_batch(timezone.now())
+        update_queue.enqueue(update_queue.CATEGORY_NODE, self.node._id)
+        update_queue.complete(entries, claimed)
+        entry = SearchUpdateQueue.objects.get()
+        assert_is_none(entry.claimed)
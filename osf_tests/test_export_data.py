@@ -1,11 +1,15 @@
 import copy
+import io
+import json
 from datetime import datetime
 
 import mock
 import pytest
 from addons.osfstorage.tests.factories import FileVersionFactory
+from django.db import connection
 from django.http import JsonResponse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from nose import tools as nt
 
 from addons.osfstorage.models import Region
@@ -283,6 +287,51 @@ class TestExportData(TestCase):
         self.file1.deleted_by_id = None
         self.file1.save()
 
+    def test_write_file_information_json(self):
+        export_data_json, file_info_json = self.export_data.extract_file_information_json_from_source_storage()
+        stream = io.StringIO()
+
+        result = self.export_data.write_file_information_json(stream)
+
+        nt.assert_equal(result, export_data_json)
+        nt.assert_equal(json.loads(stream.getvalue()), file_info_json)
+
+    def test_write_file_information_json__file_filter(self):
+        stream = io.StringIO()
+
+        result = self.export_data.write_file_information_json(stream, lambda file_info: None)
+
+        nt.assert_equal(result['files_numb'], 0)
+        nt.assert_equal(result['size'], 0)
+        nt.assert_equal(json.loads(stream.getvalue())['files'], [])
+
+    def test_write_file_information_json__not_institution(self):
+        export_data = ExportDataFactory()
+        nt.assert_is_none(export_data.write_file_information_json(io.StringIO()))
+
+    def test_iter_file_information__queries_do_not_grow_with_files(self):
+        institution = self.export_data.get_source_institution()
+        _, _, base_file_nodes = self.export_data.get_source_nodes(institution)
+        with CaptureQueriesContext(connection) as queries:
+            nt.assert_equal(len(list(self.export_data.iter_file_information(base_file_nodes))), 1)
+
+        target = AbstractNode(id=self.file1.target_object_id)
+        for file_id in [100001, 100002]:
+            file = OsfStorageFileFactory.create(id=file_id, name=f'file{file_id}.txt', target=target)
+            BaseFileVersionsThroughFactory.create(
+                version_name=file.name,
+                basefilenode=file,
+                fileversion=FileVersionFactory(region=self.inst_region, size=3)
+            )
+            file.tags.add(TagFactory(name=f'tag{file_id}', system=False))
+            RdmFileTimestamptokenVerifyResultFactory(project_id=self.file1.target._id, file_id=file._id)
+
+        with self.assertNumQueries(len(queries)):
+            files = list(self.export_data.iter_file_information(base_file_nodes))
+        nt.assert_equal(len(files), 3)
+        nt.assert_equal(files[1]['tags'], ['tag100001'])
+        nt.assert_not_equal(files[2]['timestamp'], {})
+
     def test_process_start_timestamp(self):
         nt.assert_equal(self.export_data.process_start_timestamp, self.export_data.process_start.strftime('%s'))
 
@@ -142,6 +142,16 @@ class TestExportDataRestore(TestCase):
         nt.assert_equal(file_info_first_file.get('location'), test_file_info_file.get('location'))
         nt.assert_equal(file_info_first_file.get('timestamp'), test_file_info_file.get('timestamp'))
 
+    def test_iter_file_information(self):
+        institution = self.data_restore.get_destination_institution()
+        file_nodes = self.data_restore.get_destination_file_nodes(institution)
+
+        result = self.data_restore.iter_file_information(file_nodes)
+
+        nt.assert_not_is_instance(result, list)
+        _, file_info_json = self.data_restore.extract_file_information_json_from_destination_storage()
+        nt.assert_equal(list(result), file_info_json['files'])
+
     def test_extract_file_information_json_from_destination_storage__02_with_tags(self):
         # Add tags to file info JSON and test DB
         test_file_info_json = copy.deepcopy(self.file_info_json)
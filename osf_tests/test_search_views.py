@@ -9,6 +9,9 @@ from tests.base import OsfTestCase
 from website.util import api_url_for
 from website.views import find_bookmark_collection
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
@@ -1198,6 +1198,34 @@ class TestProjectsInCommon:
         assert user.n_projects_in_common(user2) == 1
         assert user.n_projects_in_common(user3) == 1
 
+    def test_n_projects_in_common_by_user(self, user, auth):
+        user2 = UserFactory()
+        user3 = UserFactory()
+        user4 = UserFactory()
+        project = NodeFactory(creator=user)
+        project.add_contributor(contributor=user2, auth=auth)
+        project.save()
+        other_project = NodeFactory(creator=user)
+        other_project.add_contributor(contributor=user2, auth=auth)
+        other_project.save()
+        deleted_project = NodeFactory(creator=user)
+        deleted_project.add_contributor(contributor=user2, auth=auth)
+        deleted_project.is_deleted = True
+        deleted_project.save()
+        # projects of user3 only are not counted
+        NodeFactory(creator=user3)
+
+        group = OSFGroupFactory(name='Platform', creator=user)
+        group.make_member(user3)
+        project.add_osf_group(group)
+        project.save()
+
+        counts = user.n_projects_in_common_by_user([user2, user3, user4])
+        assert counts == {user2.id: 2, user3.id: 1}
+        assert counts[user2.id] == user.n_projects_in_common(user2)
+        assert counts[user3.id] == user.n_projects_in_common(user3)
+        assert user.n_projects_in_common_by_user([]) == {}
+
 
 class TestCookieMethods:
 
@@ -239,8 +239,12 @@ def celery_beat(ctx, level='debug', schedule=None):
     ctx.run(bin_prefix(cmd), pty=True)
 
 @task
-def migrate_search(ctx, delete=True, remove=False, remove_all=False, index=None):
-    """Migrate the search-enabled models."""
+def migrate_search(ctx, delete=True, remove=False, remove_all=False, index=None, workers=1, checkpoint=None):
+    """Migrate the search-enabled models.
+
+    Examples:
+        inv migrate_search --workers 4 --checkpoint /tmp/migrate_search.json
+    """
     from website.app import init_app
     init_app(routes=False, set_backends=False)
     from website.search_migration.migrate import migrate
@@ -251,7 +255,7 @@ def migrate_search(ctx, delete=True, remove=False, remove_all=False, index=None)
     for logger in SILENT_LOGGERS:
         logging.getLogger(logger).setLevel(logging.ERROR)
 
-    migrate(delete, remove=remove, remove_all=remove_all, index=index)
+    migrate(delete, remove=remove, remove_all=remove_all, index=index, workers=workers, checkpoint=checkpoint)
 
 @task
 def rebuild_search(ctx):
@@ -14,6 +14,9 @@ from osf_tests.factories import AuthUserFactory, InstitutionFactory, ProjectFact
 from osf_tests.test_elastic_search import retry_assertion
 import time
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
 class TestContributorSearch(OsfTestCase):
@@ -32,6 +32,9 @@ from website.search.util import (quote_query_string, convert_query_string,
                                  NORMALIZED_FIELDS)
 from website.search_migration.migrate import migrate
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 ENABLE_DEBUG = False
 
 def build_query(query_string):
@@ -23,6 +23,7 @@ from admin_tests.utilities import setup_form_view, setup_user_view, setup_view
 from admin.institutions import views
 from admin.institutions.forms import InstitutionForm
 from admin.base.forms import ImportFileForm
+from admin.base.utils import QuerySetRowList
 
 
 @pytest.mark.skip('Clone test case from tests/test_quota.py for making coverage')
@@ -256,7 +257,7 @@ class TestUserListByInstitutionID(AdminTestCase):
     def test_default_user_list_by_institution_id(self, *args, **kwargs):
 
         res = self.view.get_userlist()
-        nt.assert_is_instance(res, list)
+        nt.assert_is_instance(res, QuerySetRowList)
 
     def test_search_email_by_institution_id(self):
         request = RequestFactory().get(
@@ -370,7 +371,7 @@ class TestExportFileTSV(AdminTestCase):
                           institution_id=self.institution.id)
         res = view.get(request)
 
-        result = res.content.decode('utf-8')
+        result = b''.join(res.streaming_content).decode('utf-8')
 
         nt.assert_equal(res.status_code, 200)
         nt.assert_equal(res['content-type'], 'text/tsv')
@@ -8,6 +8,9 @@ from website.search_migration.migrate import migrate
 import time
 import pytest
 
+# the search documents are updated in the request
+pytestmark = pytest.mark.disable_search_update_queue
+
 
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
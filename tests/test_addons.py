@@ -306,6 +306,7 @@ class TestAddonAuth(OsfTestCase):
         assert_equal(res.status_code, 401)
 
 
+@pytest.mark.disable_timestamp_queue
 class TestAddonLogs(OsfTestCase):
 
     def setUp(self):
@@ -1019,6 +1020,7 @@ class TestAddonLogs(OsfTestCase):
         assert_equal(self.node.logs.count(), nlogs + 1)
         assert('urls' not in self.node.logs.filter(action='osf_storage_file_added')[0].params)
 
+@pytest.mark.disable_timestamp_queue
 class TestAddonLogsDifferentProvider(OsfTestCase):
 
     def setUp(self):
@@ -9,7 +9,8 @@ from api.base import settings as api_settings
 from framework.auth import signing
 from tests.base import OsfTestCase
 from osf.models import (
-    FileLog, FileInfo, TrashedFileNode, TrashedFolder, UserQuota, ProjectStorageType, BaseFileNode
+    FileLog, FileInfo, TrashedFileNode, TrashedFolder, UserQuota, UserQuotaLedger, ProjectStorageType, BaseFileNode,
+    OSFUser
 )
 from osf_tests.factories import (
     AuthUserFactory, ProjectFactory, UserFactory, InstitutionFactory, RegionFactory
@@ -17,6 +18,9 @@ from osf_tests.factories import (
 from osf.utils.requests import check_select_for_update
 from website.util import web_url_for, quota
 
+# the used quota is updated in the request
+pytestmark = pytest.mark.disable_quota_ledger_deferral
+
 
 @pytest.mark.enable_implicit_clean
 @pytest.mark.enable_quickfiles_creation
@@ -1533,6 +1537,331 @@ class TestUpdateUserUsedQuota(OsfTestCase):
         assert_equal(user_quota.used, 1000)
 
 
+@pytest.mark.enable_implicit_clean
+@pytest.mark.enable_quickfiles_creation
+class TestQuotaLedger(OsfTestCase):
+    def setUp(self):
+        super(TestQuotaLedger, self).setUp()
+        self.user = UserFactory()
+        self.project_creator = UserFactory()
+        self.node = ProjectFactory(creator=self.project_creator)
+        self.file = OsfStorageFileNode.create(
+            target=self.node,
+            path='/testfile',
+            _id='testfile',
+            name='testfile',
+            materialized_path='/testfile'
+        )
+        self.file.save()
+
+    def _add_file(self, size):
+        quota.update_used_quota(
+            self=None,
+            target=self.node,
+            user=self.user,
+            event_type=FileLog.FILE_ADDED,
+            payload={
+                'provider': 'osfstorage',
+                'metadata': {
+                    'provider': 'osfstorage',
+                    'name': 'testfile',
+                    'materialized': '/filename',
+                    'path': '/' + self.file._id,
+                    'kind': 'file',
+                    'size': size,
+                    'created_utc': '',
+                    'modified_utc': '',
+                    'extra': {'version': '1'}
+                }
+            }
+        )
+
+    @mock.patch.object(api_settings, 'QUOTA_LEDGER_DEFERRED', True)
+    def test_deferred_add_file(self):
+        UserQuota.objects.create(
+            user=self.project_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=5000
+        )
+        self._add_file(1000)
+
+        entry = UserQuotaLedger.objects.get(user=self.project_creator)
+        assert_equal(entry.delta, 1000)
+        assert_equal(entry.reason, UserQuotaLedger.FILE_ADDED)
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 5000)
+        assert_equal(
+            quota.get_quota_info(self.project_creator, UserQuota.NII_STORAGE),
+            (api_settings.DEFAULT_MAX_QUOTA, 6000)
+        )
+
+        assert_equal(quota.compact_quota_ledger(), 1)
+        assert_false(UserQuotaLedger.objects.exists())
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 6000)
+
+    @mock.patch.object(api_settings, 'QUOTA_LEDGER_DEFERRED', True)
+    def test_compact_one_update_per_user(self):
+        for delta in (1000, 2000, -500):
+            quota.record_quota_delta(
+                self.project_creator, UserQuota.NII_STORAGE, delta, UserQuotaLedger.FILE_MODIFIED)
+        quota.record_quota_delta(
+            self.user, UserQuota.CUSTOM_STORAGE, 300, UserQuotaLedger.FILE_ADDED)
+
+        assert_equal(quota.compact_quota_ledger(), 4)
+        assert_equal(
+            UserQuota.objects.get(user=self.project_creator, storage_type=UserQuota.NII_STORAGE).used,
+            2500
+        )
+        assert_equal(
+            UserQuota.objects.get(user=self.user, storage_type=UserQuota.CUSTOM_STORAGE).used,
+            300
+        )
+
+    @mock.patch.object(api_settings, 'QUOTA_LEDGER_DEFERRED', True)
+    def test_compact_does_not_go_below_zero(self):
+        UserQuota.objects.create(
+            user=self.project_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=1000
+        )
+        quota.record_quota_delta(
+            self.project_creator, UserQuota.NII_STORAGE, -1500, UserQuotaLedger.FILE_REMOVED)
+        quota.record_quota_delta(
+            self.user, UserQuota.NII_STORAGE, -1500, UserQuotaLedger.FILE_REMOVED)
+
+        quota.compact_quota_ledger()
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 0)
+        assert_false(UserQuota.objects.filter(user=self.user).exists())
+
+    @mock.patch.object(api_settings, 'QUOTA_LEDGER_DEFERRED', True)
+    @mock.patch('website.util.quota.used_quota')
+    def test_recalculate_discards_ledger(self, mock_used):
+        mock_used.return_value = 700
+        quota.record_quota_delta(
+            self.project_creator, UserQuota.NII_STORAGE, 1000, UserQuotaLedger.FILE_ADDED)
+
+        quota.update_user_used_quota(self.project_creator, storage_type=UserQuota.NII_STORAGE)
+        assert_false(UserQuotaLedger.objects.filter(user=self.project_creator).exists())
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 700)
+
+    @mock.patch.object(api_settings, 'QUOTA_LEDGER_DEFERRED', True)
+    @mock.patch('website.util.quota.used_quota')
+    def test_recalculate_keeps_later_ledger(self, mock_used):
+        quota.record_quota_delta(
+            self.project_creator, UserQuota.NII_STORAGE, 1000, UserQuotaLedger.FILE_ADDED)
+
+        def recorded_while_reading(user_id, storage_type):
+            # a file added after the recalculation started
+            quota.record_quota_delta(
+                self.project_creator, UserQuota.NII_STORAGE, 300, UserQuotaLedger.FILE_ADDED)
+            return 700
+        mock_used.side_effect = recorded_while_reading
+
+        quota.update_user_used_quota(self.project_creator, storage_type=UserQuota.NII_STORAGE)
+        assert_equal(quota.pending_quota_delta(self.project_creator, UserQuota.NII_STORAGE), 300)
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 700)
+
+    def test_node_deleted(self):
+        FileInfo.objects.create(file=self.file, file_size=1000)
+        UserQuota.objects.create(
+            user=self.project_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=1500
+        )
+
+        quota.node_deleted(self.node)
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 500)
+
+        quota.update_node_used_quota(self.node, removed=False)
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 1500)
+
+    def test_move_file_to_other_creator(self):
+        FileInfo.objects.create(file=self.file, file_size=1000)
+        UserQuota.objects.create(
+            user=self.project_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=1000
+        )
+        source_node = ProjectFactory(creator=self.user)
+        UserQuota.objects.create(
+            user=self.user,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=3000
+        )
+
+        quota.update_used_quota(
+            self=None,
+            target=self.node,
+            user=self.user,
+            event_type=FileLog.FILE_MOVED,
+            payload={
+                'source': {
+                    'provider': 'osfstorage',
+                    'nid': source_node._id,
+                    'path': '/' + self.file._id,
+                    'kind': 'file',
+                },
+                'destination': {
+                    'provider': 'osfstorage',
+                    'nid': self.node._id,
+                    'path': '/' + self.file._id,
+                    'kind': 'file',
+                }
+            }
+        )
+
+        assert_equal(UserQuota.objects.get(user=self.user).used, 2000)
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 2000)
+
+
+class TestAnnotateUserQuota(OsfTestCase):
+    def setUp(self):
+        super(TestAnnotateUserQuota, self).setUp()
+        self.user = UserFactory()
+        self.user_without_quota = UserFactory()
+        UserQuota.objects.create(
+            user=self.user,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=100,
+            used=5 * api_settings.SIZE_UNIT_GB
+        )
+
+    def _annotated(self, user):
+        return quota.annotate_user_quota(OSFUser.objects.filter(id=user.id)).get()
+
+    def test_values(self):
+        user = self._annotated(self.user)
+        used = 5 * api_settings.SIZE_UNIT_GB
+        assert_equal(user.quota_max, 100)
+        assert_equal(user.quota_used, used)
+        assert_equal(user.quota_remaining, 100 * api_settings.SIZE_UNIT_GB - used)
+        assert_almost_equal(user.quota_ratio, 5.0)
+        assert_equal(quota.get_quota_info(self.user), (user.quota_max, user.quota_used))
+
+    def test_user_without_quota(self):
+        node = ProjectFactory(creator=self.user_without_quota)
+        file_node = OsfStorageFileNode.create(target=node, name='file0')
+        file_node.save()
+        FileInfo.objects.create(file=file_node, file_size=500)
+
+        user = self._annotated(self.user_without_quota)
+        assert_equal(user.quota_max, api_settings.DEFAULT_MAX_QUOTA)
+        assert_equal(user.quota_used, 500)
+        # listing the users does not write
+        assert_false(UserQuota.objects.filter(user=self.user_without_quota).exists())
+        assert_equal(quota.get_quota_info(self.user_without_quota), (user.quota_max, user.quota_used))
+
+    def test_user_without_quota_or_files(self):
+        user = self._annotated(self.user_without_quota)
+        assert_equal(user.quota_used, 0)
+        assert_equal(user.quota_ratio, 0.0)
+
+    def test_sort_by_usage(self):
+        node = ProjectFactory(creator=self.user_without_quota)
+        file_node = OsfStorageFileNode.create(target=node, name='file0')
+        file_node.save()
+        FileInfo.objects.create(file=file_node, file_size=10 * api_settings.SIZE_UNIT_GB)
+
+        users = quota.annotate_user_quota(
+            OSFUser.objects.filter(id__in=[self.user.id, self.user_without_quota.id])
+        ).order_by('-quota_used')
+        assert_equal([user.id for user in users], [self.user_without_quota.id, self.user.id])
+
+
+@pytest.mark.enable_implicit_clean
+@pytest.mark.enable_quickfiles_creation
+class TestRemoveSubtreeQuota(OsfTestCase):
+    def setUp(self):
+        super(TestRemoveSubtreeQuota, self).setUp()
+        self.user = UserFactory()
+        self.project_creator = UserFactory()
+        self.node = ProjectFactory(creator=self.project_creator)
+        UserQuota.objects.create(
+            user=self.project_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=10000
+        )
+
+    def _trashed_file(self, node, name, parent, size=None):
+        file_node = TrashedFileNode.create(
+            target=node,
+            name=name,
+            parent_id=parent.id if parent else None,
+            deleted_on=datetime.datetime.now(),
+            deleted_by=self.user
+        )
+        file_node.provider = 'osfstorage'
+        file_node.save()
+        if size is not None:
+            FileInfo.objects.create(file=file_node, file_size=size)
+        return file_node
+
+    def test_nested_folders(self):
+        root = TrashedFolder(
+            target=self.node,
+            name='root',
+            deleted_on=datetime.datetime.now(),
+            deleted_by=self.user
+        )
+        root.save()
+        parent = root
+        for depth in range(5):
+            self._trashed_file(self.node, 'file{}'.format(depth), parent, size=100)
+            child = TrashedFolder(
+                target=self.node,
+                name='folder{}'.format(depth),
+                parent_id=parent.id,
+                deleted_on=datetime.datetime.now(),
+                deleted_by=self.user
+            )
+            child.save()
+            parent = child
+
+        quota.remove_subtree_quota([root.id])
+
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 9500)
+        assert_false(FileInfo.objects.exclude(file_size=0).exists())
+
+    def test_several_projects(self):
+        other_creator = UserFactory()
+        other_node = ProjectFactory(creator=other_creator)
+        UserQuota.objects.create(
+            user=other_creator,
+            storage_type=UserQuota.NII_STORAGE,
+            max_quota=api_settings.DEFAULT_MAX_QUOTA,
+            used=3000
+        )
+        file1 = self._trashed_file(self.node, 'file1', None, size=1000)
+        file2 = self._trashed_file(other_node, 'file2', None, size=2000)
+
+        quota.remove_subtree_quota([file1.id, file2.id])
+
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 9000)
+        assert_equal(UserQuota.objects.get(user=other_creator).used, 1000)
+
+    @mock.patch('website.util.quota.logging')
+    def test_file_without_fileinfo(self, mock_logging):
+        folder = TrashedFolder(
+            target=self.node,
+            name='folder',
+            deleted_on=datetime.datetime.now(),
+            deleted_by=self.user
+        )
+        folder.save()
+        self._trashed_file(self.node, 'file1', folder, size=1000)
+        self._trashed_file(self.node, 'file2', folder)
+
+        quota.remove_subtree_quota([folder.id])
+
+        assert_equal(UserQuota.objects.get(user=self.project_creator).used, 9000)
+        mock_logging.error.assert_called_with('FileInfo not found, cannot update used quota!')
+
+
 class TestQuotaApiWaterbutler(OsfTestCase):
     def setUp(self):
         super(TestQuotaApiWaterbutler, self).setUp()
@@ -1,22 +1,32 @@
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
+import json
 import mock
 import os
 import pytz
 import shutil
+import threading
+import time
 from addons.osfstorage import settings as osfstorage_settings
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from api.base import settings as api_settings
 from framework.auth import Auth
+from django.db import connection
+from django.utils import timezone
 from nose import tools as nt
-from osf.models import RdmUserKey, RdmFileTimestamptokenVerifyResult, Guid
-from osf_tests.factories import ProjectFactory, AuthUserFactory
+from osf.models import RdmUserKey, RdmFileTimestamptokenVerifyResult, Guid, TimestampTokenBucket, TimestampQueue
+from osf_tests.factories import ProjectFactory, AuthUserFactory, InstitutionFactory
 from tests.base import ApiTestCase, OsfTestCase
 from website.util import timestamp
+from website.util import merkle
+from website.util import rfc3161
+from website.util import tsa_client
 import tempfile
 from website.util.timestamp import (
     AddTimestamp, TimeStampTokenVerifyCheck,
     userkey_generation, userkey_generation_check,
-    OSFAbortableAsyncResult
+    OSFAbortableAsyncResult, StreamedHashInfo
 )
 
 
@@ -646,3 +656,807 @@ class TestOSFAbortableResult(OsfTestCase):
         nt.assert_true(task.ready())
         mock_logger.error.assert_any_call('Failed to get task status! Exception message:')
         mock_logger.error.assert_any_call(msg)
+
+
+def make_timestamp_response(digest, hash_type='sha512', status=0):
+    # TimeStampResp with just enough of a token to hold a MessageImprint
+    message_imprint = rfc3161.encode_sequence(
+        rfc3161.encode_sequence(rfc3161.encode_oid(rfc3161.HASH_TYPE_OIDS[hash_type])),
+        rfc3161._tlv(rfc3161.TAG_OCTET_STRING, digest),
+    )
+    tst_info = rfc3161.encode_sequence(
+        rfc3161.encode_integer(1), rfc3161.encode_oid('1.2.3.4.1'), message_imprint)
+    signed_data = rfc3161.encode_sequence(
+        rfc3161.encode_integer(3),
+        rfc3161._tlv(rfc3161.TAG_SET, b''),
+        rfc3161.encode_sequence(
+            rfc3161.encode_oid('1.2.840.113549.1.9.16.1.4'),
+            rfc3161._tlv(rfc3161.TAG_CONTEXT_0, rfc3161._tlv(rfc3161.TAG_OCTET_STRING, tst_info)),
+        ),
+    )
+    token = rfc3161.encode_sequence(
+        rfc3161.encode_oid('1.2.840.113549.1.7.2'),
+        rfc3161._tlv(rfc3161.TAG_CONTEXT_0, signed_data),
+    )
+    return rfc3161.encode_sequence(
+        rfc3161.encode_sequence(rfc3161.encode_integer(status)), token)
+
+
+class TestRFC3161(OsfTestCase):
+
+    def test_build_request(self):
+        digest = hashlib.sha512(b'test').digest()
+        request = rfc3161.build_request(digest, nonce=1)
+        nt.assert_equal(request[0], rfc3161.TAG_SEQUENCE)
+        nt.assert_in(digest, request)
+        nt.assert_in(rfc3161.encode_oid(rfc3161.HASH_TYPE_OIDS['sha512']), request)
+        nt.assert_true(request.endswith(b'\x01\x01\xff'))
+
+    def test_build_request_unknown_hash_type(self):
+        with nt.assert_raises(rfc3161.RFC3161Error):
+            rfc3161.build_request(b'', hash_type='md5')
+
+    def test_encode_oid_roundtrip(self):
+        oid = rfc3161.HASH_TYPE_OIDS['sha256']
+        nt.assert_equal(rfc3161.decode_oid(rfc3161.encode_oid(oid)[2:]), oid)
+
+    def test_parse_response(self):
+        digest = hashlib.sha512(b'test').digest()
+        status, token = rfc3161.parse_response(make_timestamp_response(digest))
+        nt.assert_equal(status, rfc3161.PKI_STATUS_GRANTED)
+        nt.assert_equal(token[0], rfc3161.TAG_SEQUENCE)
+
+    def test_parse_response_rejected(self):
+        response = rfc3161.encode_sequence(
+            rfc3161.encode_sequence(rfc3161.encode_integer(2)))
+        nt.assert_equal(rfc3161.parse_response(response), (2, None))
+        with nt.assert_raises(rfc3161.RFC3161Error):
+            rfc3161.get_message_imprint(response)
+
+    def test_parse_response_truncated(self):
+        digest = hashlib.sha512(b'test').digest()
+        with nt.assert_raises(rfc3161.RFC3161Error):
+            rfc3161.parse_response(make_timestamp_response(digest)[:-10])
+
+    def test_get_message_imprint(self):
+        digest = hashlib.sha256(b'test').digest()
+        response = make_timestamp_response(digest, hash_type='sha256')
+        nt.assert_equal(rfc3161.get_message_imprint(response), ('sha256', digest))
+
+
+class TestStreamingTimestampEngine(OsfTestCase):
+    def setUp(self):
+        super(TestStreamingTimestampEngine, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+        self.file_node = create_test_file(node=self.node, user=self.user, filename='stream_file')
+        self.file_data = {
+            'file_id': self.file_node._id,
+            'file_name': 'stream_file',
+            'file_path': '/stream_file',
+            'size': 1337,
+            'created': None,
+            'modified': None,
+            'version': '',
+            'provider': 'osfstorage'
+        }
+
+    def test_get_timestamp_engine_default(self):
+        nt.assert_equal(timestamp.get_timestamp_engine(self.node), api_settings.TIMESTAMP_ENGINE)
+
+    def test_get_timestamp_engine_by_institution(self):
+        institution = InstitutionFactory()
+        self.node.affiliated_institutions.add(institution)
+        engines = {institution._id: api_settings.TIMESTAMP_ENGINE_STREAM}
+        with mock.patch.object(api_settings, 'TIMESTAMP_ENGINE_BY_INSTITUTION', engines):
+            nt.assert_equal(timestamp.get_timestamp_engine(self.node), api_settings.TIMESTAMP_ENGINE_STREAM)
+
+    @mock.patch('website.util.timestamp.userkey_generation_check', return_value=True)
+    @mock.patch('website.util.timestamp.get_timestamp_engine', return_value=api_settings.TIMESTAMP_ENGINE_STREAM)
+    @mock.patch('website.util.waterbutler.get_node_info', return_value={'data': []})
+    @mock.patch('website.util.waterbutler.download_file')
+    @mock.patch('website.util.waterbutler.get_file_digest')
+    @mock.patch('website.util.timestamp.AddTimestampStream.add_timestamp')
+    def test_add_token_streams_without_download(self, mock_add, mock_digest, mock_download, *args):
+        digest = hashlib.sha512(b'stream').digest()
+        mock_digest.return_value = digest
+        mock_add.return_value = {'verify_result': api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS}
+
+        timestamp.add_token(self.user.id, self.node, self.file_data)
+
+        nt.assert_false(mock_download.called)
+        ext_info = mock_add.call_args[0][3]
+        nt.assert_is_instance(ext_info, StreamedHashInfo)
+        nt.assert_equal(ext_info.hash_value, digest.hex())
+
+    @mock.patch('website.util.timestamp.userkey_generation_check', return_value=True)
+    @mock.patch('website.util.timestamp.get_timestamp_engine', return_value=api_settings.TIMESTAMP_ENGINE_STREAM)
+    @mock.patch('website.util.waterbutler.get_file_digest', return_value=None)
+    def test_check_file_timestamp_file_gone(self, *args):
+        RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id=self.file_node._id, project_id=self.node._id, provider='osfstorage',
+            inspection_result_status=api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS)
+
+        nt.assert_is_none(timestamp.check_file_timestamp(self.user.id, self.node, self.file_data))
+        result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(result.inspection_result_status, api_settings.FILE_NOT_FOUND)
+
+    def test_verify_stream_detects_modified_file(self):
+        verify_result = RdmFileTimestamptokenVerifyResult(
+            provider='osfstorage',
+            timestamp_token=make_timestamp_response(hashlib.sha512(b'original').digest()))
+        stream_info = StreamedHashInfo('sha512', hashlib.sha512(b'modified').digest())
+
+        verify_result, _, ret = timestamp.TimeStampTokenVerifyCheckStream._verify(
+            None, stream_info, self.user._id, self.node._id, verify_result)
+        nt.assert_equal(ret, api_settings.TIME_STAMP_TOKEN_CHECK_NG)
+        nt.assert_equal(verify_result.inspection_result_status, api_settings.TIME_STAMP_TOKEN_CHECK_NG)
+
+
+class TestTimestampPipeline(OsfTestCase):
+    def setUp(self):
+        super(TestTimestampPipeline, self).setUp()
+        self.task = mock.Mock()
+        self.task.is_aborted.return_value = False
+        self.items = [{'file_id': str(i)} for i in range(10)]
+
+    @mock.patch.object(api_settings, 'TS_WORKER_COUNT', 4)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline(self, mock_acquire):
+        processed = []
+        done = timestamp.run_timestamp_pipeline(self.task, self.items, processed.append)
+
+        nt.assert_equal(done, 10)
+        nt.assert_equal(sorted(processed, key=lambda item: int(item['file_id'])), self.items)
+        nt.assert_equal(mock_acquire.call_count, 10)
+        self.task.update_state.assert_called_with(state='PROGRESS', meta={'progress': 100})
+
+    @mock.patch.object(api_settings, 'TS_WORKER_COUNT', 1)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline_inline(self, mock_acquire):
+        processed = []
+        threads = []
+        depth = len(connection.atomic_blocks)
+
+        def func(item):
+            processed.append(item)
+            threads.append((threading.current_thread(), len(connection.atomic_blocks)))
+        done = timestamp.run_timestamp_pipeline(self.task, self.items, func)
+
+        nt.assert_equal(done, 10)
+        nt.assert_equal(processed, self.items)
+        # the items are processed in order in the calling thread and transaction
+        nt.assert_equal(set(threads), {(threading.current_thread(), depth)})
+        self.task.update_state.assert_called_with(state='PROGRESS', meta={'progress': 100})
+
+    @mock.patch.object(api_settings, 'TS_WORKER_COUNT', 1)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline_inline_aborted(self, mock_acquire):
+        self.task.is_aborted.side_effect = [False, False, True]
+        func = mock.Mock()
+        done = timestamp.run_timestamp_pipeline(self.task, self.items, func)
+
+        nt.assert_equal(done, 2)
+        nt.assert_equal(func.call_count, 2)
+
+    @mock.patch.object(api_settings, 'TS_RETRY_BACKOFF', 0)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline_retry(self, mock_acquire):
+        func = mock.Mock(side_effect=[Exception('TSA error'), 'ok'])
+        done = timestamp.run_timestamp_pipeline(self.task, self.items[:1], func)
+
+        nt.assert_equal(done, 1)
+        nt.assert_equal(func.call_count, 2)
+
+    @mock.patch.object(api_settings, 'TS_RETRY_BACKOFF', 0)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline_gives_up(self, mock_acquire):
+        func = mock.Mock(side_effect=Exception('TSA error'))
+        done = timestamp.run_timestamp_pipeline(self.task, self.items[:1], func)
+
+        nt.assert_equal(done, 1)
+        nt.assert_equal(func.call_count, api_settings.TS_RETRY_COUNT + 1)
+
+    @mock.patch.object(api_settings, 'TS_WORKER_COUNT', 2)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_run_timestamp_pipeline_aborted(self, mock_acquire):
+        self.task.is_aborted.return_value = True
+
+        def func(item):
+            time.sleep(1.5)
+        done = timestamp.run_timestamp_pipeline(self.task, self.items, func)
+
+        nt.assert_less(done, len(self.items))
+
+    def test_token_bucket_acquire(self):
+        nt.assert_equal(TimestampTokenBucket.acquire('test', 1.0, 2), 0)
+        nt.assert_equal(TimestampTokenBucket.acquire('test', 1.0, 2), 0)
+        nt.assert_greater(TimestampTokenBucket.acquire('test', 1.0, 2), 0)
+        nt.assert_equal(TimestampTokenBucket.objects.filter(name='test').count(), 1)
+
+    def test_token_bucket_acquire_unlimited(self):
+        for _ in range(3):
+            nt.assert_equal(TimestampTokenBucket.acquire('test', 0, 1), 0)
+        nt.assert_false(TimestampTokenBucket.objects.filter(name='test').exists())
+
+    @mock.patch.object(api_settings, 'TS_REQUESTS_PER_MIN', 0)
+    @mock.patch('website.util.timestamp.time.sleep')
+    def test_acquire_tsa_token_unlimited(self, mock_sleep):
+        for _ in range(api_settings.TS_WORKER_COUNT + 2):
+            timestamp.acquire_tsa_token()
+        nt.assert_false(mock_sleep.called)
+
+
+class TestTimestampQueue(OsfTestCase):
+    def setUp(self):
+        super(TestTimestampQueue, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+        self.file_node = create_test_file(node=self.node, user=self.user, filename='queued_file')
+        self.metadata = {
+            'provider': 'osfstorage',
+            'path': self.file_node._id,
+            'name': 'queued_file',
+            'materialized': '/queued_file',
+            'size': 1337,
+            'created_utc': '',
+            'modified_utc': '',
+            'kind': 'file',
+            'extra': {
+                'version': '1',
+                'hashes': {'sha256': 'abc'},
+            }
+        }
+
+    @mock.patch('website.util.timestamp.add_token')
+    def test_file_created_or_updated_enqueues(self, mock_add_token):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        nt.assert_false(mock_add_token.called)
+        verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(verify_result.inspection_result_status, api_settings.TIME_STAMP_TOKEN_PENDING)
+        nt.assert_equal(verify_result.upload_file_created_user, self.user.id)
+        nt.assert_equal(verify_result.upload_file_size, 1337)
+        item = TimestampQueue.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(item.hash_type, 'sha256')
+        nt.assert_equal(item.hash_value, 'abc')
+        nt.assert_equal(item.file_info['file_path'], '/queued_file')
+
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.add_token')
+    def test_process_timestamp_queue_item(self, mock_add_token, mock_acquire):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        nt.assert_true(timestamp.process_timestamp_queue_item())
+        nt.assert_equal(mock_add_token.call_count, 1)
+        nt.assert_false(TimestampQueue.objects.exists())
+        nt.assert_false(timestamp.process_timestamp_queue_item())
+
+    @mock.patch('website.util.timestamp.add_token')
+    def test_process_timestamp_queue_item_token_outside_transaction(self, mock_add_token):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+        depth = len(connection.atomic_blocks)
+        depths = []
+        with mock.patch('website.util.timestamp.acquire_tsa_token',
+                        side_effect=lambda: depths.append(len(connection.atomic_blocks))):
+            nt.assert_true(timestamp.process_timestamp_queue_item())
+        # the bucket is not locked during the item transaction
+        nt.assert_equal(depths, [depth])
+        nt.assert_equal(mock_add_token.call_count, 1)
+
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.add_token')
+    def test_process_timestamp_queue_item_newer_version(self, mock_add_token, mock_acquire):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, False)
+
+        timestamp.celery_process_timestamp_queue()
+        nt.assert_equal(mock_add_token.call_count, 1)
+        nt.assert_false(TimestampQueue.objects.exists())
+
+    @mock.patch.object(api_settings, 'TS_QUEUE_MAX_ATTEMPTS', 1)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.add_token', side_effect=Exception('TSA error'))
+    def test_process_timestamp_queue_item_failed(self, mock_add_token, mock_acquire):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        nt.assert_true(timestamp.process_timestamp_queue_item())
+        item = TimestampQueue.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(item.attempts, 1)
+        nt.assert_equal(item.last_error, 'TSA error')
+        verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(verify_result.inspection_result_status, api_settings.TIME_STAMP_TOKEN_NO_DATA)
+        nt.assert_false(timestamp.process_timestamp_queue_item())
+
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.add_token', side_effect=Exception('TSA error'))
+    def test_process_timestamp_queue_item_retry_later(self, mock_add_token, mock_acquire):
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        nt.assert_true(timestamp.process_timestamp_queue_item())
+        item = TimestampQueue.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(item.attempts, 1)
+        nt.assert_greater(item.next_attempt_at, timezone.now())
+        # the failed file is not retried before its next attempt is due
+        nt.assert_false(timestamp.process_timestamp_queue_item())
+        nt.assert_equal(mock_add_token.call_count, 1)
+        nt.assert_equal(mock_acquire.call_count, 1)
+
+        TimestampQueue.objects.filter(id=item.id).update(next_attempt_at=timezone.now())
+        nt.assert_true(timestamp.process_timestamp_queue_item())
+        nt.assert_equal(mock_add_token.call_count, 2)
+
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    def test_process_timestamp_queue_item_empty(self, mock_acquire):
+        nt.assert_false(timestamp.process_timestamp_queue_item())
+        nt.assert_false(mock_acquire.called)
+
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.AddTimestampStream.add_timestamp')
+    @mock.patch('website.util.timestamp.add_token')
+    def test_process_timestamp_queue_item_queued_hash(self, mock_add_token, mock_add_timestamp, mock_acquire):
+        digest = hashlib.sha512(b'queued_file').digest()
+        self.metadata['extra']['hashes'] = {'sha512': digest.hex()}
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        nt.assert_true(timestamp.process_timestamp_queue_item())
+        # the file is not downloaded again
+        nt.assert_false(mock_add_token.called)
+        nt.assert_equal(mock_add_timestamp.call_count, 1)
+        nt.assert_equal(mock_add_timestamp.call_args[0][3].digest, digest)
+        nt.assert_false(TimestampQueue.objects.exists())
+
+    @mock.patch.object(api_settings, 'TS_BATCH_MODE', True)
+    @mock.patch('website.util.timestamp.TimeStampTokenVerifyCheckHash._verify')
+    @mock.patch('website.util.timestamp.userkey_generation_check', return_value=True)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.tsa_client.post', side_effect=tsa_client.TSAUnavailable('no TSA endpoint answered'))
+    def test_process_timestamp_queue_batch_tsa_failure(self, mock_post, mock_acquire, mock_check, mock_verify):
+        RdmUserKey.objects.create(
+            guid=self.user.id, key_name='test_pub.pem',
+            key_kind=api_settings.PUBLIC_KEY_VALUE, created_time=datetime.datetime.now(pytz.utc))
+        digest = hashlib.sha512(b'queued_file').digest()
+        self.metadata['extra']['hashes'] = {'sha512': digest.hex()}
+        timestamp.file_created_or_updated(self.node, self.metadata, self.user.id, True)
+
+        timestamp.process_timestamp_queue_batch()
+        # the file stays queued for the next run
+        item = TimestampQueue.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(item.attempts, 1)
+        nt.assert_equal(item.last_error, 'no TSA endpoint answered')
+        verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=self.file_node._id)
+        nt.assert_equal(verify_result.inspection_result_status, api_settings.TIME_STAMP_TOKEN_PENDING)
+        # and is not retried before its next attempt is due
+        nt.assert_false(timestamp.process_timestamp_queue_batch())
+        nt.assert_equal(mock_post.call_count, 1)
+
+        TimestampQueue.objects.filter(id=item.id).update(next_attempt_at=timezone.now())
+        root, _ = merkle.build_tree([digest])
+        mock_post.side_effect = None
+        mock_post.return_value = make_timestamp_response(root)
+        mock_verify.side_effect = verify_success
+        timestamp.process_timestamp_queue_batch()
+        nt.assert_false(TimestampQueue.objects.exists())
+        verify_result.refresh_from_db()
+        nt.assert_equal(verify_result.inspection_result_status, api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS)
+
+
+def verify_success(tmp_dir, ext_info, user_guid, project_id, verify_result):
+    ret = api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS
+    verify_result.inspection_result_status = ret
+    return verify_result, api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS_MSG, ret
+
+
+class TestMerkleBatchTimestamp(OsfTestCase):
+    def setUp(self):
+        super(TestMerkleBatchTimestamp, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+        RdmUserKey.objects.create(
+            guid=self.user.id, key_name='test_pub.pem',
+            key_kind=api_settings.PUBLIC_KEY_VALUE, created_time=datetime.datetime.now(pytz.utc))
+        self.entries = []
+        for i in range(3):
+            file_node = create_test_file(node=self.node, user=self.user, filename='batch_file{}'.format(i))
+            file_info = {
+                'file_id': file_node._id,
+                'file_name': file_node.name,
+                'file_path': '/' + file_node.name,
+                'size': 1337,
+                'created': None,
+                'modified': None,
+                'version': '',
+                'provider': 'osfstorage'
+            }
+            digest = hashlib.sha512(file_node.name.encode()).digest()
+            self.entries.append((self.user, self.node, file_info, StreamedHashInfo('sha512', digest)))
+
+    def test_build_tree(self):
+        digests = [hashlib.sha512(str(i).encode()).digest() for i in range(7)]
+        root, proofs = merkle.build_tree(digests)
+        for digest, proof in zip(digests, proofs):
+            nt.assert_equal(merkle.root_from_proof(digest, proof), root)
+        nt.assert_not_equal(merkle.root_from_proof(digests[1], proofs[0]), root)
+
+    def test_build_tree_single(self):
+        digest = hashlib.sha512(b'single').digest()
+        root, proofs = merkle.build_tree([digest])
+        nt.assert_equal(proofs, [[]])
+        nt.assert_equal(merkle.root_from_proof(digest, []), root)
+
+    @mock.patch('website.util.timestamp.TimeStampTokenVerifyCheckHash._verify')
+    @mock.patch('website.util.timestamp.AddTimestampStream._generate_timestamp')
+    def test_add_timestamp_batch(self, mock_generate, mock_verify):
+        root, _ = merkle.build_tree([entry[3].digest for entry in self.entries])
+        token = make_timestamp_response(root)
+        mock_generate.return_value = token
+
+        mock_verify.side_effect = verify_success
+
+        results = timestamp.add_timestamp_batch(self.entries)
+
+        nt.assert_equal(mock_generate.call_count, 1)
+        nt.assert_equal(mock_verify.call_count, 1)
+        nt.assert_equal(mock_verify.call_args[0][1].digest, root)
+        nt.assert_equal([r['verify_result'] for r in results], [api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS] * 3)
+        for _, _, file_info, stream_info in self.entries:
+            verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=file_info['file_id'])
+            nt.assert_equal(bytes(verify_result.timestamp_token), token)
+            proof = verify_result.timestamp_proof
+            nt.assert_equal(merkle.root_from_proof(stream_info.digest, proof['path'], proof['hash_type']), root)
+
+    @mock.patch.object(api_settings, 'TS_RETRY_BACKOFF', 0)
+    @mock.patch('website.util.timestamp.acquire_tsa_token')
+    @mock.patch('website.util.timestamp.TimeStampTokenVerifyCheckHash._verify', side_effect=verify_success)
+    @mock.patch('website.util.tsa_client.post')
+    def test_pipeline_retries_tsa_failure(self, mock_post, mock_verify, mock_acquire):
+        user, node, file_info, stream_info = self.entries[0]
+        token = make_timestamp_response(stream_info.digest)
+        mock_post.side_effect = [tsa_client.TSAUnavailable('no TSA endpoint answered'), token]
+        task = mock.Mock()
+        task.is_aborted.return_value = False
+
+        timestamp.run_timestamp_pipeline(task, [file_info], lambda data: timestamp.AddTimestampStream.add_timestamp(
+            user._id, data, node._id, stream_info, raise_errors=True))
+
+        nt.assert_equal(mock_post.call_count, 2)
+        verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=file_info['file_id'])
+        nt.assert_equal(bytes(verify_result.timestamp_token), token)
+
+    @mock.patch('website.util.tsa_client.post', side_effect=tsa_client.TSAUnavailable('no TSA endpoint answered'))
+    def test_add_timestamp_batch_tsa_failure(self, mock_post):
+        with nt.assert_raises(tsa_client.TSAError):
+            timestamp.add_timestamp_batch(self.entries, raise_errors=True)
+        nt.assert_false(RdmFileTimestamptokenVerifyResult.objects.exists())
+
+    @mock.patch('website.util.timestamp.AddTimestampStream._generate_timestamp')
+    def test_verify_merkle_modified_file(self, mock_generate):
+        root, _ = merkle.build_tree([entry[3].digest for entry in self.entries])
+        mock_generate.return_value = make_timestamp_response(root)
+        with mock.patch('website.util.timestamp.TimeStampTokenVerifyCheckHash._verify', side_effect=verify_success):
+            timestamp.add_timestamp_batch(self.entries)
+
+        file_info = self.entries[0][2]
+        verify_result = RdmFileTimestamptokenVerifyResult.objects.get(file_id=file_info['file_id'])
+        modified = StreamedHashInfo('sha512', hashlib.sha512(b'modified').digest())
+        verify_result, _, ret = timestamp.TimeStampTokenVerifyCheckMerkle._verify(
+            None, modified, self.user._id, self.node._id, verify_result)
+        nt.assert_equal(ret, api_settings.TIME_STAMP_TOKEN_CHECK_NG)
+
+    @mock.patch('website.util.timestamp.userkey_generation_check', return_value=True)
+    @mock.patch('website.util.timestamp.TimeStampTokenVerifyCheckMerkle.timestamp_check')
+    @mock.patch('website.util.waterbutler.get_file_digest')
+    def test_check_file_timestamp_uses_proof(self, mock_digest, mock_check, *args):
+        file_info = self.entries[0][2]
+        RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id=file_info['file_id'], project_id=self.node._id, provider='osfstorage',
+            timestamp_proof={'hash_type': 'sha512', 'path': []})
+        mock_digest.return_value = self.entries[0][3].digest
+
+        timestamp.check_file_timestamp(self.user.id, self.node, file_info)
+        stream_info = mock_check.call_args[0][0]
+        nt.assert_equal(stream_info.digest, self.entries[0][3].digest)
+
+
+class TestTimestampErrorList(OsfTestCase):
+    def setUp(self):
+        super(TestTimestampErrorList, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+        self.institution = InstitutionFactory()
+        self.user.affiliated_institutions.add(self.institution)
+        self.verify_user = AuthUserFactory()
+        self.files = []
+        for i in range(4):
+            file_node = create_test_file(node=self.node, user=self.user, filename='error_file{}'.format(i))
+            RdmFileTimestamptokenVerifyResult.objects.create(
+                file_id=file_node._id, project_id=self.node._id,
+                provider='osfstorage', path='/error_file{}'.format(i),
+                inspection_result_status=api_settings.TIME_STAMP_TOKEN_CHECK_NG,
+                verify_user=self.verify_user.id,
+                verify_date=datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=pytz.utc))
+            self.files.append(file_node)
+        RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id='success_file', project_id=self.node._id,
+            provider='osfstorage', path='/success_file',
+            inspection_result_status=api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS)
+        RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id='missing_file', project_id=self.node._id,
+            provider='s3', path='/missing_file',
+            inspection_result_status=api_settings.FILE_NOT_EXISTS,
+            upload_file_created_user=self.verify_user.id)
+
+    def test_get_error_list(self):
+        provider_list = timestamp.get_error_list(self.node._id)
+        nt.assert_equal([p['provider'] for p in provider_list], ['osfstorage', 's3'])
+        osfstorage_errors = provider_list[0]['error_list']
+        nt.assert_equal([e['file_path'] for e in osfstorage_errors], ['/error_file{}'.format(i) for i in range(4)])
+
+        error_info = osfstorage_errors[0]
+        # the creator comes from the latest file version
+        nt.assert_equal(error_info['creator_id'], self.user._id)
+        nt.assert_equal(error_info['creator_email'], self.user.username)
+        nt.assert_equal(error_info['organization_id'], self.institution._id)
+        nt.assert_equal(error_info['file_version'], 1)
+        nt.assert_equal(error_info['verify_user_id'], self.verify_user._id.upper())
+        nt.assert_equal(error_info['verify_date'], '2020/01/02 03:04:05 UTC')
+        nt.assert_equal(error_info['file_size_on_upload'], '')
+
+        missing_info = provider_list[1]['error_list'][0]
+        nt.assert_equal(missing_info['creator_id'], self.verify_user._id)
+        nt.assert_equal(missing_info['file_version'], '')
+        nt.assert_equal(missing_info['verify_user_id'], '')
+
+    def test_get_error_list_page(self):
+        provider_list = timestamp.get_error_list(self.node._id, page=2, page_size=2, sort='-path')
+        nt.assert_equal(len(provider_list), 1)
+        nt.assert_equal([e['file_path'] for e in provider_list[0]['error_list']], ['/error_file1', '/error_file0'])
+        nt.assert_equal(timestamp.count_errors(self.node._id), 5)
+        nt.assert_equal(timestamp.count_errors(self.node._id, provider='s3'), 1)
+
+    def test_get_error_list_filters(self):
+        other_user = AuthUserFactory()
+        nt.assert_equal(timestamp.count_errors(self.node._id, verify_user=self.verify_user._id), 5)
+        # the results never verified are kept
+        nt.assert_equal(timestamp.count_errors(self.node._id, verify_user=other_user._id), 1)
+        nt.assert_equal(timestamp.count_errors(self.node._id, start_date=datetime.date(2020, 1, 3)), 1)
+        nt.assert_equal(timestamp.count_errors(self.node._id, end_date=datetime.date(2020, 1, 2)), 5)
+
+        params = timestamp.get_error_filter_params({
+            'verify_user': self.verify_user._id.upper(),
+            'start_date': '2020-01-02',
+            'sort': '-provider',
+        })
+        nt.assert_equal(params['start_date'], datetime.date(2020, 1, 2))
+        provider_list = timestamp.get_error_list(self.node._id, page=1, page_size=10, **params)
+        nt.assert_equal([p['provider'] for p in provider_list], ['s3', 'osfstorage'])
+        nt.assert_equal(timestamp.count_errors(self.node._id, **params), 5)
+        with nt.assert_raises(ValueError):
+            timestamp.get_error_filter_params({'start_date': '2020/01/02'})
+
+    def test_get_error_list_sort_by_verify_user(self):
+        provider_list = timestamp.get_error_list(self.node._id, sort='verify_user')
+        nt.assert_equal([p['provider'] for p in provider_list], ['osfstorage', 's3'])
+        nt.assert_equal(len(provider_list[0]['error_list']), 4)
+
+    def test_get_error_verify_users(self):
+        nt.assert_equal(timestamp.get_error_verify_users(self.node._id), [
+            (self.verify_user._id, u'{} ({})'.format(self.verify_user.fullname, self.verify_user._id.upper()))
+        ])
+
+    def test_get_error_list_query_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # warm up the content type cache used by the guid prefetch
+        timestamp.get_error_list(self.node._id)
+        with CaptureQueriesContext(connection) as few:
+            timestamp.get_error_list(self.node._id, page=1, page_size=2)
+        with CaptureQueriesContext(connection) as many:
+            timestamp.get_error_list(self.node._id)
+        nt.assert_equal(len(few.captured_queries), len(many.captured_queries))
+
+    def test_stream_error_list(self):
+        lines = ''.join(timestamp.stream_error_list(self.node._id, 'csv')).splitlines()
+        nt.assert_equal(lines[0].split(','), timestamp.ERROR_INFO_FIELDS)
+        nt.assert_equal(len(lines), 6)
+
+        data = json.loads(''.join(timestamp.stream_error_list(self.node._id, 'json', provider='s3')))
+        nt.assert_equal([e['file_id'] for e in data], ['missing_file'])
+        nt.assert_equal(''.join(timestamp.stream_error_list('none', 'json')), '[]')
+
+
+class TestTimestampInventory(OsfTestCase):
+    def setUp(self):
+        super(TestTimestampInventory, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+
+    def test_get_osfstorage_file_list(self):
+        root = self.node.get_addon('osfstorage').get_root()
+        create_test_file(node=self.node, user=self.user, filename='top.txt')
+        folder = root.append_folder('folder')
+        nested = folder.append_file('nested.txt')
+        nested.create_version(self.user, {
+            'object': '06d80f',
+            'service': 'cloud',
+            osfstorage_settings.WATERBUTLER_RESOURCE: 'osf',
+        }, {'size': 42, 'contentType': 'text/plain'}).save()
+        trashed = create_test_file(node=self.node, user=self.user, filename='trashed.txt')
+        trashed.delete()
+
+        file_list = timestamp.get_osfstorage_file_list(self.node)
+        nt.assert_equal([f['file_path'] for f in file_list], ['/folder/nested.txt', '/top.txt'])
+        nt.assert_equal(file_list[0]['file_id'], nested._id)
+        nt.assert_equal(file_list[0]['size'], 42)
+        nt.assert_equal(file_list[0]['version'], 1)
+        nt.assert_is_not_none(file_list[0]['created'])
+
+    @mock.patch('website.util.waterbutler.get_node_info')
+    def test_crawl_provider_file_lists(self, mock_node_info):
+        listings = {
+            ('s3', '/'): {'data': [
+                {'attributes': {'kind': 'folder', 'path': '/dir/', 'materialized': '/dir/'}},
+                {'attributes': {'kind': 'file', 'path': '/a.txt', 'materialized': '/a.txt', 'name': 'a.txt', 'size': 1}},
+            ]},
+            ('s3', '/dir/'): {'data': [
+                {'attributes': {'kind': 'file', 'path': '/dir/b.txt', 'materialized': '/dir/b.txt', 'name': 'b.txt', 'size': 2}},
+            ]},
+        }
+        mock_node_info.side_effect = lambda cookie, pid, provider, path: listings.get((provider, path))
+
+        file_lists = timestamp.crawl_provider_file_lists('cookie', self.node, ['s3', 'github'])
+        nt.assert_equal([f['file_path'] for f in file_lists['s3']], ['/a.txt', '/dir/b.txt'])
+        nt.assert_equal(file_lists['s3'][1]['size'], 2)
+        # the root of github could not be listed
+        nt.assert_is_none(file_lists['github'])
+
+
+class TestDeltaVerify(OsfTestCase):
+    def setUp(self):
+        super(TestDeltaVerify, self).setUp()
+        self.node = ProjectFactory()
+        self.user = self.node.creator
+        self.file_info = {
+            'file_id': 'delta_file',
+            'file_path': '/delta_file',
+            'provider': 's3',
+            'size': 10,
+            'modified': '2020-01-02T03:04:05+00:00',
+            'hash': 'abc',
+        }
+        self.verify_result = RdmFileTimestamptokenVerifyResult.objects.create(
+            file_id='delta_file', project_id=self.node._id, provider='s3', path='/delta_file',
+            inspection_result_status=api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS,
+            verify_date=datetime.datetime(2020, 1, 3, tzinfo=pytz.utc),
+            verify_file_size=10,
+            verify_file_modified_at=datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=pytz.utc),
+            verify_file_hash='abc')
+
+    def test_unchanged(self):
+        nt.assert_true(timestamp.is_unchanged_since_verify(self.file_info, self.verify_result))
+
+    def test_changed(self):
+        for key, value in [('hash', 'def'), ('size', 11), ('modified', '2020-01-02T03:04:06+00:00')]:
+            file_info = dict(self.file_info, **{key: value})
+            nt.assert_false(timestamp.is_unchanged_since_verify(file_info, self.verify_result))
+
+    def test_without_hash(self):
+        file_info = dict(self.file_info, hash=None)
+        nt.assert_true(timestamp.is_unchanged_since_verify(file_info, self.verify_result))
+        file_info['modified'] = None
+        nt.assert_false(timestamp.is_unchanged_since_verify(file_info, self.verify_result))
+
+    def test_not_verified_status(self):
+        self.verify_result.inspection_result_status = api_settings.FILE_NOT_FOUND
+        nt.assert_false(timestamp.is_unchanged_since_verify(self.file_info, self.verify_result))
+        nt.assert_false(timestamp.is_unchanged_since_verify(self.file_info, None))
+
+    @mock.patch('website.util.timestamp.add_log_verify_all')
+    @mock.patch('website.util.timestamp.check_file_timestamp')
+    @mock.patch('website.util.timestamp.get_full_list')
+    def test_celery_verify_delta(self, mock_full_list, mock_check, mock_log):
+        new_file = dict(self.file_info, file_id='new_file', file_path='/new_file')
+        mock_full_list.return_value = [{
+            'provider': 's3',
+            'provider_file_list': [dict(self.file_info), new_file],
+        }]
+        timestamp.celery_verify_timestamp_token.delay(self.user.id, self.node.id, delta=True)
+        nt.assert_equal([c[0][2]['file_id'] for c in mock_check.call_args_list], ['new_file'])
+
+        mock_check.reset_mock()
+        timestamp.celery_verify_timestamp_token.delay(self.user.id, self.node.id)
+        nt.assert_equal(mock_check.call_count, 2)
+
+
+class StubTSAHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(body)
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/timestamp-reply')
+        self.end_headers()
+        self.wfile.write(self.server.response)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTSAClient(OsfTestCase):
+    def setUp(self):
+        super(TestTSAClient, self).setUp()
+        self.servers = [self.start_stub(200), self.start_stub(200)]
+
+    def tearDown(self):
+        super(TestTSAClient, self).tearDown()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def start_stub(self, status):
+        server = HTTPServer(('127.0.0.1', 0), StubTSAHandler)
+        server.status = status
+        server.response = make_timestamp_response(hashlib.sha512(b'stub').digest())
+        server.requests = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def make_client(self, **kwargs):
+        urls = ['http://127.0.0.1:{}/'.format(server.server_address[1]) for server in self.servers]
+        return tsa_client.TSAClient(urls, timeout=5, **kwargs)
+
+    def test_post(self):
+        client = self.make_client()
+        ts_request = rfc3161.build_request(hashlib.sha512(b'stub').digest())
+        nt.assert_equal(client.post(ts_request), self.servers[0].response)
+        nt.assert_equal(self.servers[0].requests, [ts_request])
+        metrics = client.metrics()
+        nt.assert_equal(metrics[0]['requests'], 1)
+        nt.assert_equal(sum(metrics[0]['latency_histogram']), 1)
+
+    def test_failover_and_breaker(self):
+        self.servers[0].status = 503
+        client = self.make_client(breaker_threshold=2, breaker_reset=60)
+        for _ in range(3):
+            nt.assert_equal(client.post(b'request'), self.servers[1].response)
+        # the breaker of the first TSA opened after two failures
+        nt.assert_equal(len(self.servers[0].requests), 2)
+        nt.assert_equal(len(self.servers[1].requests), 3)
+        metrics = client.metrics()
+        nt.assert_equal(metrics[0]['state'], tsa_client.BREAKER_OPEN)
+        nt.assert_equal(metrics[0]['errors'], {'http_503': 2})
+
+    def test_half_open(self):
+        self.servers[0].status = 503
+        client = self.make_client(breaker_threshold=1, breaker_reset=0)
+        client.post(b'request')
+        nt.assert_equal(client.metrics()[0]['state'], tsa_client.BREAKER_OPEN)
+        self.servers[0].status = 200
+        client.post(b'request')
+        nt.assert_equal(client.metrics()[0]['state'], tsa_client.BREAKER_CLOSED)
+        nt.assert_equal(len(self.servers[0].requests), 2)
+
+    def test_half_open_unexpected_error(self):
+        self.servers[0].status = 503
+        client = self.make_client(breaker_threshold=1, breaker_reset=0)
+        client.post(b'request')
+        with mock.patch.object(client.session, 'post', side_effect=ValueError('unexpected')):
+            with nt.assert_raises(ValueError):
+                client.post(b'request')
+        # the failed trial does not keep the endpoint closed to the next requests
+        self.servers[0].status = 200
+        client.post(b'request')
+        nt.assert_equal(client.metrics()[0]['state'], tsa_client.BREAKER_CLOSED)
+        nt.assert_equal(len(self.servers[0].requests), 2)
+
+    def test_unavailable(self):
+        for server in self.servers:
+            server.status = 500
+        client = self.make_client(breaker_threshold=1, breaker_reset=60)
+        with nt.assert_raises(tsa_client.TSAUnavailable):
+            client.post(b'request')
+        with nt.assert_raises(tsa_client.TSAUnavailable):
+            client.post(b'request')
+        nt.assert_equal([len(server.requests) for server in self.servers], [1, 1])
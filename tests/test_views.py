@@ -6027,14 +6027,19 @@ class TestTimestampView(OsfTestCase):
         assert_equal(res.status_code, 200)
         assert_false(TimestampTask.objects.filter(node=self.project).exists())
 
+        ## the errors are loaded page by page by the page
+        res = self.app.get(self.project.api_url + 'timestamp/errors/', auth=self.user.auth)
+        assert_equal(res.status_code, 200)
         ## check TimestampError(TimestampVerifyResult.inspection_result_statu != 1) in response
         assert 'osfstorage_test_file1.status_1' not in res
         assert 'osfstorage_test_file2.status_3' in res
         assert 'osfstorage_test_file3.status_3' in res
         assert 's3_test_file1.status_3' in res
 
-        assert 'class="creator_name" value="Freddie Mercury' in res
-        assert 'class="creator_email" value="freddiemercury' in res
+        error_list = [e for p in res.json['provider_list'] for e in p['error_list']]
+        assert 'Freddie Mercury' in [e['creator_name'] for e in error_list]
+        assert any(e['creator_email'].startswith('freddiemercury') for e in error_list)
+        assert_equal(res.json['total'], len(error_list))
 
     @mock.patch('website.project.views.node.find_bookmark_collection')
     def test_timestamp_no_verify_user(self, mock_collection):
@@ -6045,11 +6050,15 @@ class TestTimestampView(OsfTestCase):
             verify_user=None,
             verify_date=None
         )
-        res = self.app.get(self.project.url + 'timestamp/', auth=self.user.auth)
+        res = self.app.get(self.project.api_url + 'timestamp/errors/', auth=self.user.auth)
         assert_equal(res.status_code, 200)
 
-        assert 'osfstorage_test_file2.status_3' in res
-        assert 'Unknown' in res
+        error_info = [
+            e for p in res.json['provider_list'] for e in p['error_list']
+            if e['file_path'] == '/osfstorage_test_file2.status_3'
+        ][0]
+        assert_equal(error_info['verify_user_id'], '')
+        assert_equal(error_info['verify_date'], '')
 
     @mock.patch('addons.osfstorage.models.OsfStorageFile._hashes',
                 new_callable=mock.PropertyMock)
@@ -6065,7 +6074,7 @@ class TestTimestampView(OsfTestCase):
         mock_ready.return_value = True
         mock_hashes.return_value = None
 
-        url_timestamp = self.project.url + 'timestamp/'
+        url_timestamp = self.project.api_url + 'timestamp/errors/'
         res = self.app.get(url_timestamp, auth=self.user.auth)
         assert_equal(res.status_code, 200)
 
@@ -1,19 +1,25 @@
+import functools
 import hashlib
 from future.moves.urllib.parse import urlencode
 
+GRAVATAR_URL_CACHE_SIZE = 10000
+
 # Adapted from https://github.com/zzzsochi/Flask-Gravatar/blob/master/flaskext/gravatar.py
 def gravatar(user, use_ssl=False, d=None, r=None, size=None):
+    # user can be a User instance or a username string
+    username = user.username if hasattr(user, 'username') else user
+    return gravatar_url(str(username), use_ssl=use_ssl, r=r, size=size)
+
+# the URL only depends on the username, keep the ones of the users seen recently
+@functools.lru_cache(maxsize=GRAVATAR_URL_CACHE_SIZE)
+def gravatar_url(username, use_ssl=False, r=None, size=None):
 
     if use_ssl:
         base_url = 'https://secure.gravatar.com/avatar/'
     else:
         base_url = 'http://www.gravatar.com/avatar/'
 
-    # user can be a User instance or a username string
-    username = user.username if hasattr(user, 'username') else user
-    hash_code = hashlib.md5(str(username).encode()).hexdigest()
-
-    url = base_url + '?'
+    hash_code = hashlib.md5(username.encode()).hexdigest()
 
     # Order of query params matters, due to a quirk with gravatar
     params = [
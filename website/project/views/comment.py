@@ -16,6 +16,7 @@ from website.notifications.emails import notify, notify_mentions
 from website.project.decorators import must_be_contributor_or_public
 from osf.models import Node
 from website.project.signals import comment_added, mention_added
+from website.search import document_cache
 
 
 @file_updated.connect
@@ -100,6 +101,7 @@ def find_and_create_file_from_metadata(children, source, destination, destinatio
 
 
 def update_comment_node(root_target_id, source_node, destination_node):
+    document_cache.invalidate([source_node.id, destination_node.id], document_cache.PART_COMMENTS)
     Comment.objects.filter(root_target___id=root_target_id).update(node=destination_node)
     source_node.save()
     destination_node.save()
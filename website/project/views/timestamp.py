@@ -3,12 +3,15 @@
 Timestamp views.
 """
 import logging
-from flask import request
+from flask import request, Response, stream_with_context
+from rest_framework import status as http_status
+from framework.exceptions import HTTPError
 from website.util import rubeus
 from website.project.decorators import must_be_contributor_or_public
 from website.project.views.node import _view_project
 from website.util import timestamp
 from website import settings
+from api.base import settings as api_settings
 from osf.models import TimestampTask
 
 logger = logging.getLogger(__name__)
@@ -20,7 +23,8 @@ def get_init_timestamp_error_data_list(auth, node, **kwargs):
     ctx = _view_project(node, auth, primary=True)
     ctx.update(rubeus.collect_addon_assets(node))
     pid = kwargs.get('pid')
-    ctx['provider_list'] = timestamp.get_error_list(pid)
+    # the rows are loaded page by page from get_timestamp_error_list
+    ctx['verify_users'] = timestamp.get_error_verify_users(pid)
     ctx['project_title'] = node.title
     ctx['guid'] = pid
     ctx['web_api_url'] = settings.DOMAIN + node.api_url
@@ -29,7 +33,8 @@ def get_init_timestamp_error_data_list(auth, node, **kwargs):
 
 @must_be_contributor_or_public
 def verify_timestamp_token(auth, node, **kwargs):
-    async_task = timestamp.celery_verify_timestamp_token.delay(auth.user.id, node.id)
+    delta = request.values.get('delta') == 'true'
+    async_task = timestamp.celery_verify_timestamp_token.delay(auth.user.id, node.id, delta=delta)
     TimestampTask.objects.update_or_create(
         node=node,
         defaults={'task_id': async_task.id, 'requester': auth.user}
@@ -52,6 +57,43 @@ def download_errors(auth, node, **kwargs):
     timestamp.add_log_download_errors(node, auth.user.id, request.json)
     return {'status': 'OK'}
 
+@must_be_contributor_or_public
+def get_timestamp_error_list(auth, node, **kwargs):
+    """get one page of the timestamp error list
+    """
+    try:
+        params = timestamp.get_error_filter_params(request.args)
+        page = int(request.args.get('page', 1))
+        page_size = int(request.args.get('page_size', api_settings.TS_ERROR_LIST_PAGE_SIZE))
+    except ValueError:
+        raise HTTPError(http_status.HTTP_400_BAD_REQUEST)
+    page_size = max(1, min(page_size, api_settings.MAX_PAGE_SIZE))
+    return {
+        'provider_list': timestamp.get_error_list(node._id, page=page, page_size=page_size, **params),
+        'page': page,
+        'page_size': page_size,
+        'total': timestamp.count_errors(node._id, **params),
+    }
+
+@must_be_contributor_or_public
+def export_timestamp_errors(auth, node, **kwargs):
+    """stream the timestamp error list as CSV or JSON
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'json'):
+        raise HTTPError(http_status.HTTP_400_BAD_REQUEST)
+    try:
+        params = timestamp.get_error_filter_params(request.args)
+    except ValueError:
+        raise HTTPError(http_status.HTTP_400_BAD_REQUEST)
+    timestamp.add_log_download_errors(node, auth.user.id, {'file_format': export_format})
+    response = Response(
+        stream_with_context(timestamp.stream_error_list(node._id, export_format, **params)),
+        mimetype='text/csv' if export_format == 'csv' else 'application/json',
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename=timestamp_errors_{}.{}'.format(node._id, export_format)
+    return response
+
 @must_be_contributor_or_public
 def cancel_task(auth, node, **kwargs):
     return timestamp.cancel_celery_task(node)
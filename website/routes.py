@@ -1977,6 +1977,24 @@ def make_url_map(app):
             project_views.timestamp.download_errors,
             json_renderer,
         ),
+        Rule(
+            [
+                '/project/<pid>/timestamp/errors/',
+                '/project/<pid>/node/<nid>/timestamp/errors/',
+            ],
+            'get',
+            project_views.timestamp.get_timestamp_error_list,
+            json_renderer,
+        ),
+        Rule(
+            [
+                '/project/<pid>/timestamp/errors/export/',
+                '/project/<pid>/node/<nid>/timestamp/errors/export/',
+            ],
+            'get',
+            project_views.timestamp.export_timestamp_errors,
+            json_renderer,
+        ),
 
         # Quota management
         Rule(
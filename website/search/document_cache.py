@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Cache of the parts of the node search documents.
+
+Rendering the wiki texts and collecting the comments, contributors and tags
+is most of the cost of serializing a node, while a node is reindexed on
+almost every save. Each part is kept in the last SearchDocumentPart row of
+the (node, part); the model changes affecting a part add a new row for it
+(see website.search.listeners), so the next serialization rebuilds that part
+only.
+"""
+import logging
+import pickle
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.utils import timezone
+
+from framework.celery_tasks import app as celery_app
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+PART_WIKIS = 'wikis'
+PART_COMMENTS = 'comments'
+PART_CONTRIBUTORS = 'contributors'
+PART_TAGS = 'tags'
+
+PARTS = (PART_WIKIS, PART_COMMENTS, PART_CONTRIBUTORS, PART_TAGS)
+
+# the rows replaced by a newer one and the expired rows
+SWEEP_SQL = """
+    DELETE FROM {table} AS part
+    WHERE part.expires < %s OR EXISTS (
+        SELECT 1 FROM {table} AS newer
+        WHERE newer.node_id = part.node_id AND newer.part = part.part AND newer.id > part.id
+    )
+"""
+
+
+def _part_model():
+    return apps.get_model('osf.SearchDocumentPart')
+
+
+def _expires():
+    return timezone.now() + timedelta(seconds=settings.SEARCH_DOCUMENT_CACHE_TIMEOUT)
+
+
+def _add_rows(node_ids, parts):
+    SearchDocumentPart = _part_model()
+    return SearchDocumentPart.objects.bulk_create([
+        SearchDocumentPart(node_id=node_id, part=part, expires=_expires())
+        for node_id in node_ids
+        for part in parts
+    ])
+
+
+def get_parts(node_id, builders):
+    """Return {part: value} of a node, calling ``builders[part]()`` for the parts not cached.
+
+    :param int node_id: primary key of the node
+    :param dict builders: {part: function returning the value of the part}
+    """
+    if not settings.ENABLE_SEARCH_DOCUMENT_CACHE:
+        return {part: build() for part, build in builders.items()}
+
+    SearchDocumentPart = _part_model()
+    rows = {
+        row.part: row
+        for row in SearchDocumentPart.objects.filter(
+            node_id=node_id,
+            part__in=list(builders),
+        ).order_by('part', '-id').distinct('part')
+    }
+    missing = [part for part in builders if part not in rows]
+    if missing:
+        # added before the data is read, so that a change made meanwhile adds a newer row
+        rows.update({row.part: row for row in _add_rows([node_id], missing)})
+
+    parts = {}
+    built = []
+    for part, build in builders.items():
+        row = rows[part]
+        if row.value is not None:
+            parts[part] = pickle.loads(bytes(row.value))
+            continue
+        parts[part] = build()
+        built.append(part)
+        SearchDocumentPart.objects.filter(id=row.id).update(
+            value=pickle.dumps(parts[part], pickle.HIGHEST_PROTOCOL),
+            expires=_expires(),
+        )
+    if built:
+        logger.debug('Search document parts rebuilt: node={}, parts={}'.format(node_id, built))
+    return parts
+
+
+def invalidate(node_ids, *parts):
+    """Add new rows for ``parts`` of the nodes, their cached values are not used anymore.
+
+    The rows are added again when the transaction is committed, so that a part
+    rebuilt meanwhile from the data before the change is not kept. Only rows
+    are inserted, the transactions changing the same node never wait for
+    each other.
+    """
+    if not settings.ENABLE_SEARCH_DOCUMENT_CACHE:
+        return
+    node_ids = [node_id for node_id in node_ids if node_id is not None]
+    if not node_ids or not parts:
+        return
+
+    def add_rows():
+        _add_rows(node_ids, parts)
+
+    add_rows()
+    if connection.in_atomic_block:
+        transaction.on_commit(add_rows)
+
+
+def invalidate_comments(comments):
+    """Invalidate the comments part of the nodes of ``comments``, a Comment
+    queryset about to be changed with update(), which sends no post_save.
+    """
+    invalidate(set(comments.values_list('node_id', flat=True)), PART_COMMENTS)
+
+
+@celery_app.task(ignore_result=True)
+def sweep_search_document_parts():
+    with connection.cursor() as cursor:
+        cursor.execute(SWEEP_SQL.format(table=_part_model()._meta.db_table), [timezone.now()])
+        count = cursor.rowcount
+    logger.info('Search document parts swept: {}'.format(count))
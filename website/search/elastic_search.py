@@ -28,6 +28,7 @@ from osf.models import QuickFilesNode
 from osf.models import Preprint
 from osf.models import SpamStatus
 from osf.models import Guid
+from osf.models.base import GuidMixinQuerySet
 from addons.wiki.models import WikiPage
 from osf.models import CollectionSubmission
 from osf.models import Comment
@@ -35,6 +36,7 @@ from osf.utils.sanitize import unescape_entities
 from website import settings
 from website.filters import profile_image_url
 from osf.models.licenses import serialize_node_license_record
+from website.search import document_cache
 from website.search import exceptions
 from website.search.util import (
     build_query, clean_splitters,
@@ -427,20 +429,49 @@ def merge_highlight(hits):
         hit['_source']['highlight'] = merged_highlight
     return hits
 
+def load_comments(comment_ids):
+    """Return {id: comment} of the comments and {id: comment} of the comments they reply to"""
+    comments = {}
+    if comment_ids:
+        queryset = Comment.objects.filter(id__in=comment_ids).select_related('target').include('user__guids')
+        comments = {c.id: c for c in queryset}
+    comment_type_id = ContentType.objects.get_for_model(Comment).id
+    replyto_ids = {
+        c.target.object_id for c in comments.values()
+        if c.target is not None and c.target.content_type_id == comment_type_id
+    }
+    replyto_comments = {}
+    if replyto_ids:
+        queryset = Comment.objects.filter(id__in=replyto_ids).include('user__guids')
+        replyto_comments = {c.id: c for c in queryset}
+    return comments, replyto_comments
+
 def set_last_comment(hits):
+    # highlighted comments of each hit
+    hit_comments = []
     for hit in hits:
-        s = hit['_source']
-        highlight = s['highlight']
-        last_comment = None
-        last_text = None
-        for key, value in highlight.items():
+        highlighted = {}
+        for key, value in hit['_source']['highlight'].items():
             if not key.startswith('comments.'):
                 continue
             try:
                 comment_id = int(key.split('.')[1])
             except Exception:
                 continue  # unexpected type, ignore
-            c = Comment.objects.get(id=comment_id)
+            highlighted[comment_id] = value
+        hit_comments.append(highlighted)
+    comments, replyto_comments = load_comments(
+        {comment_id for highlighted in hit_comments for comment_id in highlighted})
+
+    comment_type_id = ContentType.objects.get_for_model(Comment).id
+    for hit, highlighted in zip(hits, hit_comments):
+        s = hit['_source']
+        last_comment = None
+        last_text = None
+        for comment_id, value in highlighted.items():
+            c = comments.get(comment_id)
+            if c is None:
+                continue  # removed after indexing
             if last_comment is None or c.created > last_comment.created:
                 last_comment = c
                 last_text = value[0]
@@ -457,8 +488,11 @@ def set_last_comment(hits):
         replyto_username = None
         replyto_date_created = None
         replyto_date_modified = None
-        replyto = last_comment.target.referent
-        if isinstance(replyto, Comment):
+        replyto = None
+        target = last_comment.target
+        if target is not None and target.content_type_id == comment_type_id:
+            replyto = replyto_comments.get(target.object_id)
+        if replyto is not None:
             replyto_user_id = replyto.user._id
             replyto_username = replyto.user.fullname
             replyto_date_created = replyto.created.isoformat()
@@ -470,25 +504,101 @@ def set_last_comment(hits):
         s['comment'] = d
     return hits
 
+def load_by_guids(model, guid_ids):
+    """Return {guid: object} of the objects of ``model`` having one of ``guid_ids``"""
+    objects = {}
+    guid_ids = {guid_id for guid_id in guid_ids if guid_id}
+    if not guid_ids:
+        return objects
+    queryset = model.objects.filter(guids___id__in=guid_ids)
+    if not isinstance(queryset, GuidMixinQuerySet):
+        # only the GuidMixin querysets include the guids
+        queryset = queryset.prefetch_related('guids')
+    for obj in queryset:
+        for guid in obj.guids.all():
+            objects[guid._id] = obj
+    return objects
+
+
+class SearchResultObjects(object):
+    """The objects referred to by a page of search results, loaded with one
+    query per type instead of one query per result.
+    """
+
+    def __init__(self, results):
+        user_ids = set()
+        wiki_ids = set()
+        file_ids = set()
+        parent_ids = set()
+        for result in results:
+            category = result.get('category')
+            if category == 'user':
+                user_ids.add(result.get('id'))
+            elif category == 'wiki':
+                wiki_ids.add(result.get('id'))
+            elif category == 'file':
+                file_ids.add(result.get('id'))
+            if category in {'wiki', 'file', 'project', 'component', 'registration'}:
+                user_ids.add(result.get('creator_id'))
+                user_ids.add(result.get('modifier_id'))
+            if category in {'file', 'project', 'component', 'registration'}:
+                parent_ids.add(result.get('parent_id'))
+
+        self.users = load_by_guids(OSFUser, user_ids)
+        self.wikis = load_by_guids(WikiPage, wiki_ids)
+        self.parents = load_by_guids(AbstractNode, parent_ids)
+        self.file_paths = self.load_file_paths(file_ids)
+
+    @staticmethod
+    def load_file_paths(file_ids):
+        from addons.osfstorage.models import OsfStorageFileNode
+
+        file_ids = [file_id for file_id in file_ids if file_id]
+        if not file_ids:
+            return {}
+        file_nodes = list(BaseFileNode.objects.filter(_id__in=file_ids))
+        # the materialized paths of osfstorage are computed from the folders
+        osfstorage_paths = OsfStorageFileNode.get_materialized_paths(
+            file_node for file_node in file_nodes if isinstance(file_node, OsfStorageFileNode))
+        file_paths = {}
+        for file_node in file_nodes:
+            materialized_path = osfstorage_paths.get(file_node.pk, file_node._materialized_path)
+            file_paths[file_node._id] = format_file_path(file_node.provider, materialized_path)
+        return file_paths
+
+    def user_id_fullname(self, guid_id):
+        user = self.users.get(guid_id) if guid_id else None
+        if user:
+            return (guid_id, user.fullname)
+        return ('', '')
+
+    def parent_info(self, parent_id):
+        return serialize_parent(self.parents.get(parent_id) if parent_id else None)
+
+
+def format_file_path(provider, materialized_path):
+    app_config = settings.ADDONS_AVAILABLE_DICT.get(provider)
+    if app_config:
+        provider_name = app_config.full_name
+    else:
+        provider_name = provider
+    return u'{}{}'.format(provider_name, materialized_path)
+
 def get_file_path(file_id):
     file_node = BaseFileNode.load(file_id)
     if file_node is None:
         return None
-    app_config = settings.ADDONS_AVAILABLE_DICT.get(file_node.provider)
-    if app_config:
-        provider_name = app_config.full_name
-    else:
-        provider_name = file_node.provider
-    return u'{}{}'.format(provider_name, file_node.materialized_path)
+    return format_file_path(file_node.provider, file_node.materialized_path)
 
 def format_results(results):
+    objects = SearchResultObjects(results)
     ret = []
     for result in results:
         category = result.get('category')
         if category == 'user':
             result['url'] = '/profile/' + result['id']
             # unnormalized
-            user = OSFUser.load(result['id'])
+            user = objects.users.get(result['id'])
             if user:
                 job, school = user.get_ongoing_job_school()
                 if job is None:
@@ -503,12 +613,12 @@ def format_results(results):
                 result['ongoing_school_degree'] = school.get('degree', '')
         elif category == 'wiki':
             # get unnormalized names
-            wiki = WikiPage.load(result['id'])
+            wiki = objects.wikis.get(result['id'])
             if wiki:
                 result['name'] = wiki.page_name
-            creator_id, creator_name = user_id_fullname(
+            creator_id, creator_name = objects.user_id_fullname(
                 result.get('creator_id'))
-            modifier_id, modifier_name = user_id_fullname(
+            modifier_id, modifier_name = objects.user_id_fullname(
                 result.get('modifier_id'))
             result['creator_name'] = creator_name
             result['modifier_name'] = modifier_name
@@ -521,24 +631,24 @@ def format_results(results):
             else:
                 result['replyto_user_url'] = None
         elif category == 'file':
-            file_path = get_file_path(result.get('id'))
+            file_path = objects.file_paths.get(result.get('id'))
             if file_path:
                 folder_name = os.path.dirname(file_path)
             else:
                 folder_name = None
             result['folder_name'] = folder_name
-            parent_info = load_parent(result.get('parent_id'))
+            parent_info = objects.parent_info(result.get('parent_id'))
             result['parent_url'] = parent_info.get('url') if parent_info else None
             result['parent_title'] = parent_info.get('title') if parent_info else None
             # get unnormalized names
-            creator_id, creator_name = user_id_fullname(
+            creator_id, creator_name = objects.user_id_fullname(
                 result.get('creator_id'))
-            modifier_id, modifier_name = user_id_fullname(
+            modifier_id, modifier_name = objects.user_id_fullname(
                 result.get('modifier_id'))
             result['creator_name'] = creator_name
             result['modifier_name'] = modifier_name
         elif category in {'project', 'component', 'registration'}:
-            result = format_result(result, result.get('parent_id'))
+            result = format_result(result, result.get('parent_id'), objects=objects)
         elif category in {'preprint'}:
             result = format_preprint_result(result)
         elif category == 'collectionSubmission':
@@ -560,12 +670,14 @@ def user_id_fullname(guid_id):
 
 
 # for 'project', 'component', 'registration'
-def format_result(result, parent_id=None):
-    parent_info = load_parent(parent_id)
+def format_result(result, parent_id=None, objects=None):
+    if objects is None:
+        objects = SearchResultObjects([dict(result, parent_id=parent_id)])
+    parent_info = objects.parent_info(parent_id)
 
     # get unnormalized names
-    creator_id, creator_name = user_id_fullname(result.get('creator_id'))
-    modifier_id, modifier_name = user_id_fullname(result.get('modifier_id'))
+    creator_id, creator_name = objects.user_id_fullname(result.get('creator_id'))
+    modifier_id, modifier_name = objects.user_id_fullname(result.get('modifier_id'))
 
     formatted_result = {
         'contributors': result['contributors'],
@@ -637,7 +749,10 @@ def format_preprint_result(result):
 
 
 def load_parent(parent_id):
-    parent = AbstractNode.load(parent_id)
+    return serialize_parent(AbstractNode.load(parent_id))
+
+
+def serialize_parent(parent):
     if parent and parent.is_public:
         return {
             'title': parent.title,
@@ -725,19 +840,8 @@ def update_file_metadata_async(self, project_id, path, index=None, bulk=False):
     except Exception as exc:
         self.retry(exc=exc)
 
-def serialize_node(node, category):
-    elastic_document = {}
-    parent_id = node.parent_id
-
-    normalized_title = unicode_normalize(node.title)
-
-    tags = list(node.tags.filter(system=False).values_list('name', flat=True))
-    normalized_tags = [unicode_normalize(tag) for tag in tags]
-    latest_log = node.logs.order_by('date').last()
-    modifier = latest_log.user
-
-    elastic_document = {
-        'id': node._id,
+def serialize_node_contributors(node):
+    return {
         # Contributors for Access control
         'node_contributors': [
             {
@@ -756,6 +860,44 @@ def serialize_node(node, category):
             for x in node._contributors.filter(contributor__visible=True).order_by('contributor___order')
             .values('fullname', 'guids___id', 'is_active')
         ],
+    }
+
+def serialize_node_wikis(node):
+    wikis = {}
+    wiki_names = []
+    for wiki in WikiPage.objects.get_wiki_pages_latest(node):
+        # '.' is not allowed in field names in ES2
+        wiki_name = unicode_normalize(wiki.wiki_page.page_name.replace('.', ' '))
+        wikis[wiki_name] = unicode_normalize(wiki.raw_text(node))
+        wiki_names.append(wiki_name)
+    return {'wikis': wikis, 'wiki_names': wiki_names}
+
+def serialize_node(node, category):
+    elastic_document = {}
+    parent_id = node.parent_id
+
+    normalized_title = unicode_normalize(node.title)
+
+    # the parts rebuilt only after the changes of their models
+    builders = {
+        document_cache.PART_TAGS: lambda: list(node.tags.filter(system=False).values_list('name', flat=True)),
+        document_cache.PART_CONTRIBUTORS: lambda: serialize_node_contributors(node),
+        document_cache.PART_COMMENTS: lambda: comments_to_doc(node._id),
+    }
+    include_wikis = node_includes_wiki() and not node.is_retracted
+    if include_wikis:
+        builders[document_cache.PART_WIKIS] = lambda: serialize_node_wikis(node)
+    parts = document_cache.get_parts(node.id, builders)
+
+    tags = parts[document_cache.PART_TAGS]
+    normalized_tags = [unicode_normalize(tag) for tag in tags]
+    latest_log = node.logs.order_by('date').last()
+    modifier = latest_log.user
+
+    elastic_document = {
+        'id': node._id,
+        'node_contributors': parts[document_cache.PART_CONTRIBUTORS]['node_contributors'],
+        'contributors': parts[document_cache.PART_CONTRIBUTORS]['contributors'],
         'groups': [
             {
                 'name': x['name'],
@@ -792,21 +934,16 @@ def serialize_node(node, category):
         'affiliated_institutions': list(node.affiliated_institutions.values_list('name', flat=True)),
         'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
         'extra_search_terms': clean_splitters(node.title),
-        'comments': comments_to_doc(node._id),
+        'comments': parts[document_cache.PART_COMMENTS],
     }
     # for metadata addon: project metadata
     if category == 'registration':
         elastic_document.update({
             'metadata_url': AbstractNode.objects.get(registrations__guids___id__in=[node._id]).url + 'metadata',
         })
-    if node_includes_wiki() and not node.is_retracted:
-        wiki_names = []
-        for wiki in WikiPage.objects.get_wiki_pages_latest(node):
-            # '.' is not allowed in field names in ES2
-            wiki_name = unicode_normalize(wiki.wiki_page.page_name.replace('.', ' '))
-            elastic_document['wikis'][wiki_name] = unicode_normalize(wiki.raw_text(node))
-            wiki_names.append(wiki_name)
-        elastic_document['wiki_names'] = wiki_names
+    if include_wikis:
+        elastic_document['wikis'] = parts[document_cache.PART_WIKIS]['wikis']
+        elastic_document['wiki_names'] = parts[document_cache.PART_WIKIS]['wiki_names']
     return elastic_document
 
 def comments_to_doc(guid_id):
@@ -1276,15 +1413,65 @@ def serialize_contributors(node):
 bulk_update_contributors = functools.partial(bulk_update_nodes, serialize_contributors)
 
 
+def update_contributors_of_users(user_ids, index=None):
+    """Update the contributors of the nodes where the users are bibliographic contributors"""
+    nodes = AbstractNode.objects.filter(
+        is_deleted=False,
+        type__in=['osf.node', 'osf.registration'],
+        contributor__user_id__in=user_ids,
+        contributor__visible=True,
+    ).distinct().order_by('id')
+    # If search updated so group member names are displayed on project search results,
+    # then update nodes that the user has group membership as well
+    p = Paginator(nodes, settings.SEARCH_UPDATE_QUEUE_BATCH_SIZE)
+    for page_num in p.page_range:
+        nodes = list(p.page(page_num).object_list)
+        # the names of the contributors have changed
+        document_cache.invalidate([node.id for node in nodes], document_cache.PART_CONTRIBUTORS)
+        bulk_update_contributors(nodes, index=index)
+
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
 def update_contributors_async(self, user_id):
     OSFUser = apps.get_model('osf.OSFUser')
     user = OSFUser.objects.get(id=user_id)
-    # If search updated so group member names are displayed on project search results,
-    # then update nodes that the user has group membership as well
-    p = Paginator(user.visible_contributor_to.order_by('id'), 100)
-    for page_num in p.page_range:
-        bulk_update_contributors(p.page(page_num).object_list)
+    update_contributors_of_users([user.id])
+
+@requires_search
+def bulk_update_queued(node_ids, wiki_ids, user_ids, index=None):
+    """Update the documents of the nodes and of the wiki pages with one bulk request,
+    then the contributors of the nodes of the users.
+
+    :param node_ids: guids of the nodes
+    :param wiki_ids: guids of the wiki pages
+    :param user_ids: ids of the users whose contributor names have changed
+    :param str index: Index of the documents
+    """
+    actions = []
+    for node in AbstractNode.objects.filter(guids___id__in=node_ids):
+        # also updates or deletes the documents of the files and wikis of the node
+        elastic_document = update_node(node, index=index, bulk=True)
+        if elastic_document:
+            actions.append({
+                '_op_type': 'index',
+                '_index': es_index(index),
+                '_id': node._id,
+                '_type': get_doctype_from_node(node),
+                '_source': elastic_document,
+            })
+    for wiki_page in WikiPage.objects.filter(guids___id__in=wiki_ids):
+        elastic_document = update_wiki(wiki_page, index=index, bulk=True)
+        if elastic_document:
+            actions.append({
+                '_op_type': 'index',
+                '_index': es_index(index),
+                '_id': wiki_page._id,
+                '_type': 'wiki',
+                '_source': elastic_document,
+            })
+    if actions:
+        helpers.bulk(client(), actions, refresh=True)
+    if user_ids:
+        update_contributors_of_users(user_ids, index=index)
 
 @requires_search
 def update_user(user, index=None):
@@ -1868,21 +2055,29 @@ def search_contributor(query, page=0, size=10, exclude=None, current_user=None):
     pages = math.ceil(results['counts'].get('user', 0) / size)
     validate_page_num(page, pages)
 
+    # load the users and count their projects in common for the whole page at once
+    loaded_users = load_by_guids(OSFUser, [doc['id'] for doc in docs])
+    projects_in_common = {}
+    if current_user:
+        projects_in_common = current_user.n_projects_in_common_by_user(
+            user for user in loaded_users.values() if user.id != current_user.id)
+
     users = []
     for doc in docs:
         # TODO: use utils.serialize_user
-        user = OSFUser.load(doc['id'])
+        user = loaded_users.get(doc['id'])
+
+        if user is None:
+            logger.error('Could not load user {0}'.format(doc['id']))
+            continue
 
-        if current_user and current_user._id == user._id:
+        if current_user and current_user.id == user.id:
             n_projects_in_common = -1
         elif current_user:
-            n_projects_in_common = current_user.n_projects_in_common(user)
+            n_projects_in_common = projects_in_common.get(user.id, 0)
         else:
             n_projects_in_common = 0
 
-        if user is None:
-            logger.error('Could not load user {0}'.format(doc['id']))
-            continue
         if user.is_active:  # exclude merged, unregistered, etc.
             current_employment = None
             education = None
@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from addons.wiki.models import WikiPage, WikiVersion
+from osf.models import AbstractNode, Comment, Contributor, NodeLog
+from website.search import document_cache
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_search_comments(sender, instance, **kwargs):
+    document_cache.invalidate([instance.node_id], document_cache.PART_COMMENTS)
+
+
+@receiver(post_save, sender=WikiPage)
+def invalidate_search_wikis(sender, instance, **kwargs):
+    document_cache.invalidate([instance.node_id], document_cache.PART_WIKIS)
+
+
+@receiver(post_save, sender=WikiVersion)
+def invalidate_search_wiki_version(sender, instance, **kwargs):
+    node_id = WikiPage.objects.filter(id=instance.wiki_page_id).values_list('node_id', flat=True).first()
+    document_cache.invalidate([node_id], document_cache.PART_WIKIS)
+
+
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+def invalidate_search_contributors(sender, instance, **kwargs):
+    document_cache.invalidate([instance.node_id], document_cache.PART_CONTRIBUTORS)
+
+
+@receiver(post_save, sender=NodeLog)
+def invalidate_search_contributor_order(sender, instance, created, **kwargs):
+    # the contributors are reordered without saving them
+    if created and instance.action == NodeLog.CONTRIB_REORDERED:
+        document_cache.invalidate([instance.node_id], document_cache.PART_CONTRIBUTORS)
+
+
+@receiver(m2m_changed, sender=AbstractNode.tags.through)
+def invalidate_search_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    node_ids = (pk_set or []) if reverse else [instance.pk]
+    document_cache.invalidate(node_ids, document_cache.PART_TAGS)
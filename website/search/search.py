@@ -3,6 +3,7 @@ import logging
 from framework.celery_tasks.handlers import enqueue_task
 
 from website import settings
+from website.search import update_queue
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +38,11 @@ def update_node(node, index=None, bulk=False, async_update=True, saved_fields=No
         # For example, when updating a Node's privacy, is_public must be True in the
         # database in order for method that updates the Node's elastic search document
         # to run correctly.
-        if settings.USE_CELERY:
+        if settings.USE_CELERY and settings.ENABLE_SEARCH_UPDATE_QUEUE:
+            update_queue.enqueue(update_queue.CATEGORY_NODE, node_id, index=index)
+            if wiki_page:
+                update_queue.enqueue(update_queue.CATEGORY_WIKI, wiki_page._id, index=index)
+        elif settings.USE_CELERY:
             enqueue_task(search_engine.update_node_async.s(node_id=node_id, **kwargs))
         else:
             search_engine.update_node_async(node_id=node_id, **kwargs)
@@ -139,10 +144,16 @@ def delete_node(node, index=None):
         doc_type = 'registration'
     search_engine.delete_doc(node._id, node, index=index, category=doc_type)
 
+@requires_search
+def bulk_update_queued(node_ids, wiki_ids, user_ids, index=None):
+    search_engine.bulk_update_queued(node_ids, wiki_ids, user_ids, index=index)
+
 @requires_search
 def update_contributors_async(user_id):
     """Async version of update_contributors above"""
-    if settings.USE_CELERY:
+    if settings.USE_CELERY and settings.ENABLE_SEARCH_UPDATE_QUEUE:
+        update_queue.enqueue(update_queue.CATEGORY_CONTRIBUTORS, user_id)
+    elif settings.USE_CELERY:
         enqueue_task(search_engine.update_contributors_async.s(user_id))
     else:
         search_engine.update_contributors_async(user_id)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Queue of the search document updates.
+
+Saving a node several times in a request or in a burst of edits used to
+send one update task per save, each reindexing the same document. The
+updates are recorded instead in SearchUpdateQueue, one row per document, and
+flush_search_update_queue sends the documents changed since the last flush
+as one bulk request, so that the writes to the index follow the number of
+changed documents.
+"""
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from api.caching import settings as cache_settings
+from api.caching.utils import search_update_queue_cache
+from framework.celery_tasks import app as celery_app
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+# see osf.models.SearchUpdateQueue
+CATEGORY_NODE = 'node'
+CATEGORY_WIKI = 'wiki'
+CATEGORY_CONTRIBUTORS = 'contributors'
+
+# Repeated updates of a document only touch the waiting row. Updating it
+# locks it until the caller's transaction ends, so a flush running meanwhile
+# skips it instead of indexing the data before the change. The claim of a
+# flush already indexing the document is dropped, so that the row is kept
+# for the next flush.
+ENQUEUE_SQL = """
+    INSERT INTO {table} (category, target_id, "index", attempts, last_error, claimed, created, modified)
+    VALUES (%s, %s, %s, 0, '', NULL, %s, %s)
+    ON CONFLICT (category, target_id, "index") DO UPDATE SET
+        modified = EXCLUDED.modified,
+        claimed = NULL
+"""
+
+
+def _queue_model():
+    return apps.get_model('osf.SearchUpdateQueue')
+
+
+def enqueue(category, target_id, index=None):
+    """Record that a search document needs an update, in the caller's transaction.
+
+    :param str category: one of the SearchUpdateQueue categories
+    :param target_id: guid of the node or of the wiki page, id of the user
+    :param str index: Index of the document
+    """
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ENQUEUE_SQL.format(table=_queue_model()._meta.db_table),
+            [category, str(target_id), index or '', now, now])
+    transaction.on_commit(schedule_flush)
+
+
+def schedule_flush():
+    # a single flush for the updates queued within the window
+    if search_update_queue_cache.add(cache_settings.SEARCH_UPDATE_FLUSH_KEY, True,
+                                     timeout=settings.SEARCH_UPDATE_QUEUE_WINDOW):
+        flush_search_update_queue.apply_async(countdown=settings.SEARCH_UPDATE_QUEUE_WINDOW)
+
+
+def get_stats():
+    """Return the number of documents waiting and the age in seconds of the oldest update"""
+    stats = _queue_model().objects.aggregate(depth=Count('id'), oldest=Min('created'))
+    lag = (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0
+    return {'depth': stats['depth'], 'lag': lag}
+
+
+def claim_batch(started):
+    """Claim up to SEARCH_UPDATE_QUEUE_BATCH_SIZE rows updated before ``started``.
+
+    The rows stay in the queue until their documents are updated. The claims
+    older than SEARCH_UPDATE_QUEUE_CLAIM_TIMEOUT, left by a flush that did not
+    finish, are taken over.
+    Returns the time of the claim and the claimed rows.
+    """
+    SearchUpdateQueue = _queue_model()
+    claimed = timezone.now()
+    stale = claimed - timedelta(seconds=settings.SEARCH_UPDATE_QUEUE_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        entries = list(SearchUpdateQueue.objects.select_for_update(skip_locked=True).filter(
+            Q(claimed__isnull=True) | Q(claimed__lt=stale),
+            modified__lte=started,
+        ).order_by('created')[:settings.SEARCH_UPDATE_QUEUE_BATCH_SIZE])
+        SearchUpdateQueue.objects.filter(id__in=[entry.id for entry in entries]).update(claimed=claimed)
+    return claimed, entries
+
+
+def complete(entries, claimed):
+    """Remove the rows of the updated documents, unless they were queued again meanwhile"""
+    _queue_model().objects.filter(id__in=[entry.id for entry in entries], claimed=claimed).delete()
+
+
+def release(entries, claimed, error):
+    """Put back the rows of a failed flush for the next one, until SEARCH_UPDATE_QUEUE_MAX_ATTEMPTS"""
+    SearchUpdateQueue = _queue_model()
+    ids = [entry.id for entry in entries]
+    with transaction.atomic():
+        SearchUpdateQueue.objects.filter(id__in=ids, claimed=claimed).update(
+            attempts=F('attempts') + 1,
+            last_error=str(error),
+            claimed=None,
+            modified=timezone.now(),
+        )
+        given_up = SearchUpdateQueue.objects.filter(
+            id__in=ids,
+            claimed__isnull=True,
+            attempts__gte=settings.SEARCH_UPDATE_QUEUE_MAX_ATTEMPTS,
+        )
+        for entry in given_up:
+            logger.error('Search update given up: category={}, target_id={}, error={}'.format(
+                entry.category, entry.target_id, error))
+        given_up.delete()
+
+
+def flush_batch(started):
+    """Update the documents of a batch of queued rows.
+    Returns True if the queue may still hold more rows.
+    """
+    from website.search import search
+
+    claimed, entries = claim_batch(started)
+    if not entries:
+        return False
+    targets = defaultdict(lambda: defaultdict(set))
+    for entry in entries:
+        targets[entry.index][entry.category].add(entry.target_id)
+    for index, categories in targets.items():
+        index_entries = [entry for entry in entries if entry.index == index]
+        try:
+            search.bulk_update_queued(
+                categories[CATEGORY_NODE],
+                categories[CATEGORY_WIKI],
+                [int(user_id) for user_id in categories[CATEGORY_CONTRIBUTORS]],
+                index=index or None)
+        except Exception as err:
+            logger.exception(err)
+            release(index_entries, claimed, err)
+        else:
+            complete(index_entries, claimed)
+    now = timezone.now()
+    logger.info('Search update queue flushed: documents={}, lag={:.1f}s'.format(
+        len(entries), max((now - entry.created).total_seconds() for entry in entries)))
+    return len(entries) == settings.SEARCH_UPDATE_QUEUE_BATCH_SIZE
+
+
+@celery_app.task(ignore_result=True)
+def flush_search_update_queue():
+    # the rows queued or put back during the flush wait for the next one
+    started = timezone.now()
+    while flush_batch(started):
+        pass
+    stats = get_stats()
+    logger.info('Search update queue: depth={depth}, lag={lag:.1f}s'.format(**stats))
@@ -2,15 +2,19 @@
 # -*- coding: utf-8 -*-
 """Migration script for Search-enabled Models."""
 from __future__ import absolute_import
-from math import ceil
 import functools
+import json
 import logging
+import multiprocessing
+import os
+import time
 
-from django.db import connection
+from django.db import connection, connections
 from django.core.paginator import Paginator
 from elasticsearch2 import helpers
 
 import website.search.search as search
+from website.search import elastic_search
 from website.search.elastic_search import client
 from website.search_migration import (
     enable_private_search,
@@ -130,51 +134,150 @@ def fill_and_normalize(docs):
             node = AbstractNode.load(doc['_id'])
             d['comments'] = comments_to_doc(node._id)
 
-def sql_migrate(index, sql, max_id, increment, es_args=None, **kwargs):
+class MigrationCheckpoint(object):
+    """Progress of a migration, saved to a JSON file after each id range and each step
+    so that an interrupted migration resumes where it stopped.
+
+    Without a path the progress is only kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.index = None
+        self.steps = set()
+        self.ranges = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.index = data.get('index')
+            self.steps = set(data.get('steps', []))
+            self.ranges = {
+                step: {tuple(id_range) for id_range in id_ranges}
+                for step, id_ranges in data.get('ranges', {}).items()
+            }
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            'index': self.index,
+            'steps': sorted(self.steps),
+            'ranges': {step: sorted(id_ranges) for step, id_ranges in self.ranges.items()},
+        }
+        # replace the file at once, an interrupted write keeps the previous checkpoint
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def is_step_done(self, step):
+        return step in self.steps
+
+    def mark_step_done(self, step):
+        self.steps.add(step)
+        self.save()
+
+    def done_ranges(self, step):
+        return self.ranges.get(step, set())
+
+    def mark_range_done(self, step, id_range):
+        self.ranges.setdefault(step, set()).add(tuple(id_range))
+        self.save()
+
+
+def get_id_ranges(max_id, increment):
+    """Return the (start, end] id ranges covering the objects up to ``max_id``"""
+    # An extra range is included to cover the edge case where:
+    #       max_id == (total_pages * increment) - 1
+    # and two additional objects are created during runtime.
+    return [(page * increment, (page + 1) * increment) for page in range(max_id // increment + 2)]
+
+def init_migration_worker():
+    # each worker process opens its own elasticsearch connections
+    elastic_search.CLIENT = None
+
+def migrate_id_range(task):
+    """Run the SQL of an id range and send the documents to elastic.
+
+    :return: ((page_start, page_end), number of migrated objects)
+    """
+    sql, params, (page_start, page_end), es_args = task
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(page_start=page_start, page_end=page_end, **params))
+        ser_objs = cursor.fetchone()[0]
+    if not ser_objs:
+        return (page_start, page_end), 0
+    fill_and_normalize(ser_objs)
+    helpers.bulk(client(), ser_objs, **es_args)
+    return (page_start, page_end), len(ser_objs)
+
+def map_id_ranges(tasks, workers):
+    """Yield the results of migrate_id_range for ``tasks`` as they complete"""
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield migrate_id_range(task)
+        return
+    # the forked workers must not share the database connections of this process
+    connections.close_all()
+    pool = multiprocessing.Pool(processes=workers, initializer=init_migration_worker)
+    try:
+        for result in pool.imap_unordered(migrate_id_range, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def sql_migrate(index, sql, max_id, increment, es_args=None, workers=1, checkpoint=None, step=None, **kwargs):
     """ Run provided SQL and send output to elastic.
 
+    The ids are split into ranges of `increment`, migrated by `workers` processes
+    in parallel. With a `checkpoint`, the ranges already migrated by the `step`
+    are skipped and each completed range is recorded.
+
     :param str index: Elastic index to update (formatted into `sql`)
     :param str sql: SQL to format and run. See __init__.py in this module
     :param int max_id: Last known object id. Indicates when to stop paging
     :param int increment: Page size
     :param  dict es_args:  Dict or None, to pass to `helpers.bulk`
+    :param int workers: Number of worker processes
+    :param MigrationCheckpoint checkpoint: Progress of the migration, or None
+    :param str step: Name of the ranges in `checkpoint`
     :kwargs: Additional format arguments for `sql` arg
 
     :return int: Number of migrated objects
     """
     if es_args is None:
         es_args = {}
-    total_pages = int(ceil(max_id / float(increment)))
+    if checkpoint is None or step is None:
+        checkpoint = MigrationCheckpoint()
+        step = step or 'sql_migrate'
+    id_ranges = get_id_ranges(max_id, increment)
+    done = checkpoint.done_ranges(step)
+    pending = [id_range for id_range in id_ranges if id_range not in done]
+    if done:
+        logger.info('Resuming {}: {} / {} ranges already migrated'.format(step, len(id_ranges) - len(pending), len(id_ranges)))
+
+    params = dict(
+        kwargs,
+        index=index,
+        enable_private_search=enable_private_search(settings.ENABLE_PRIVATE_SEARCH))
+    tasks = [(sql, params, id_range, es_args) for id_range in pending]
     total_objs = 0
-    page_start = 0
-    page_end = 0
-    page = 0
-    while page_end <= (max_id + increment):
-        page += 1
-        page_end += increment
-        if page <= total_pages:
-            logger.info('Updating page {} / {}'.format(page_end / increment, total_pages))
-        else:
-            # An extra page is included to cover the edge case where:
-            #       max_id == (total_pages * increment) - 1
-            # and two additional objects are created during runtime.
-            logger.info('Cleaning up...')
-        with connection.cursor() as cursor:
-            cursor.execute(sql.format(
-                index=index,
-                page_start=page_start,
-                page_end=page_end,
-                enable_private_search=enable_private_search(settings.ENABLE_PRIVATE_SEARCH),
-                **kwargs))
-            ser_objs = cursor.fetchone()[0]
-            if ser_objs:
-                total_objs += len(ser_objs)
-                fill_and_normalize(ser_objs)
-                helpers.bulk(client(), ser_objs, **es_args)
-        page_start = page_end
+    start_time = time.time()
+    for n_done, (id_range, n_objs) in enumerate(map_id_ranges(tasks, workers), start=1):
+        total_objs += n_objs
+        checkpoint.mark_range_done(step, id_range)
+        elapsed = max(time.time() - start_time, 1e-6)
+        logger.info('Updated ids {} - {} ({} / {}), {:.1f} docs/sec'.format(
+            id_range[0] + 1, id_range[1], n_done, len(tasks), total_objs / elapsed))
     return total_objs
 
-def migrate_nodes(index, delete, increment=10000):
+def migrate_nodes(index, delete, increment=10000, workers=1, checkpoint=None):
     logger.info('Migrating nodes to index: {}'.format(index))
     last = AbstractNode.objects.last()
     if last is None:
@@ -186,6 +289,9 @@ def migrate_nodes(index, delete, increment=10000):
         JSON_UPDATE_NODES_SQL,
         max_nid,
         increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        step='nodes',
         spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
     logger.info('{} nodes migrated'.format(total_nodes))
     if delete:
@@ -197,6 +303,9 @@ def migrate_nodes(index, delete, increment=10000):
             max_nid,
             increment,
             es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            step='nodes_delete',
             spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
         logger.info('{} nodes marked deleted'.format(total_nodes))
 
@@ -248,7 +357,7 @@ def migrate_comments(index, delete):
         search.bulk_update_comments(paginator.page(page_number).object_list, index=index)
     logger.info('{} comments migrated'.format(comments.count()))
 
-def migrate_files(index, delete, increment=10000):
+def migrate_files(index, delete, increment=10000, workers=1, checkpoint=None):
     logger.info('Migrating files to index: {}'.format(index))
     last = BaseFileNode.objects.last()
     if last is None:
@@ -260,6 +369,9 @@ def migrate_files(index, delete, increment=10000):
         JSON_UPDATE_FILES_SQL,
         max_fid,
         increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        step='files',
         spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
     logger.info('{} files migrated'.format(total_files))
     if delete:
@@ -271,10 +383,13 @@ def migrate_files(index, delete, increment=10000):
             max_fid,
             increment,
             es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            step='files_delete',
             spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
         logger.info('{} files marked deleted'.format(total_files))
 
-def migrate_users(index, delete, increment=10000):
+def migrate_users(index, delete, increment=10000, workers=1, checkpoint=None):
     logger.info('Migrating users to index: {}'.format(index))
     last = OSFUser.objects.last()
     if last is None:
@@ -285,7 +400,10 @@ def migrate_users(index, delete, increment=10000):
         index,
         JSON_UPDATE_USERS_SQL,
         max_uid,
-        increment)
+        increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        step='users')
     logger.info('{} users migrated'.format(total_users))
     if delete:
         logger.info('Preparing to delete old user documents')
@@ -295,7 +413,10 @@ def migrate_users(index, delete, increment=10000):
             JSON_DELETE_USERS_SQL,
             max_uid,
             increment,
-            es_args={'raise_on_error': False})  # ignore 404s
+            es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            step='users_delete')
         logger.info('{} users marked deleted'.format(total_users))
 
 def migrate_collected_metadata(index, delete):
@@ -327,13 +448,16 @@ def migrate_institutions(index):
     for inst in Institution.objects.filter(is_deleted=False):
         update_institution(inst, index)
 
-def migrate(delete, remove=False, remove_all=False, index=None, app=None):
+def migrate(delete, remove=False, remove_all=False, index=None, app=None, workers=1, checkpoint=None):
     """Reindexes relevant documents in ES
 
     :param bool delete: Delete documents that should not be indexed
     :param bool remove: Removes old index after migrating
     :param str index: index alias to version and migrate
     :param App app: Flask app for context
+    :param int workers: Number of processes migrating the nodes, files and users
+    :param str checkpoint: Path of the file recording the progress. If it exists,
+        the migration resumes into the index it records, skipping the completed work
     """
     index = es_index(index)
     app = app or init_app('website.settings', set_backends=True, routes=True)
@@ -345,29 +469,50 @@ def migrate(delete, remove=False, remove_all=False, index=None, app=None):
     ctx = app.test_request_context()
     ctx.push()
 
-    new_index = set_up_index(index)
-
-    if settings.ENABLE_INSTITUTIONS:
-        migrate_institutions(new_index)
-    migrate_nodes(new_index, delete=delete)
-    migrate_files(new_index, delete=delete)
-    migrate_wikis(new_index, delete=delete)
-    migrate_comments(new_index, delete=delete)
-    migrate_users(new_index, delete=delete)
-    migrate_preprints(new_index, delete=delete)
-    migrate_preprint_files(new_index, delete=delete)
-    migrate_collected_metadata(new_index, delete=delete)
-    migrate_groups(new_index, delete=delete)
-    migrate_file_metadata(search, new_index, delete=delete)
-
-    set_up_alias(index, new_index)
-
-    if remove:
-        remove_old_index(new_index)
-    if remove_all:
-        remove_all_old_index(new_index)
-
-    ctx.pop()
+    try:
+        progress = MigrationCheckpoint(checkpoint)
+        if progress.index:
+            new_index = progress.index
+            logger.info('Resuming the migration to index: {}'.format(new_index))
+        else:
+            new_index = set_up_index(index)
+            progress.index = new_index
+            progress.save()
+
+        range_args = {'workers': workers, 'checkpoint': progress}
+        steps = []
+        if settings.ENABLE_INSTITUTIONS:
+            steps.append(('institutions', lambda: migrate_institutions(new_index)))
+        steps += [
+            ('nodes', lambda: migrate_nodes(new_index, delete=delete, **range_args)),
+            ('files', lambda: migrate_files(new_index, delete=delete, **range_args)),
+            ('wikis', lambda: migrate_wikis(new_index, delete=delete)),
+            ('comments', lambda: migrate_comments(new_index, delete=delete)),
+            ('users', lambda: migrate_users(new_index, delete=delete, **range_args)),
+            ('preprints', lambda: migrate_preprints(new_index, delete=delete)),
+            ('preprint_files', lambda: migrate_preprint_files(new_index, delete=delete)),
+            ('collected_metadata', lambda: migrate_collected_metadata(new_index, delete=delete)),
+            ('groups', lambda: migrate_groups(new_index, delete=delete)),
+            ('file_metadata', lambda: migrate_file_metadata(search, new_index, delete=delete)),
+        ]
+        for step, run in steps:
+            if progress.is_step_done(step):
+                logger.info('Skipping {}, already migrated'.format(step))
+                continue
+            start_time = time.time()
+            run()
+            logger.info('{} migrated in {:.1f} sec'.format(step, time.time() - start_time))
+            progress.mark_step_done(step)
+
+        set_up_alias(index, new_index)
+        progress.remove()
+
+        if remove:
+            remove_old_index(new_index)
+        if remove_all:
+            remove_all_old_index(new_index)
+    finally:
+        ctx.pop()
 
 def set_up_index(idx):
     try:
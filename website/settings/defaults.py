@@ -117,6 +117,18 @@ ELASTIC_KWARGS = {
     # 'client_cert': None,
     # 'client_key': None
 }
+# Cache the wiki texts, comments, contributors and tags of the node search documents
+ENABLE_SEARCH_DOCUMENT_CACHE = True
+# seconds a built part is kept after it was last rebuilt
+SEARCH_DOCUMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Merge the search updates of a node (or of the nodes of a contributor) queued
+# within SEARCH_UPDATE_QUEUE_WINDOW seconds and send them as one bulk request
+ENABLE_SEARCH_UPDATE_QUEUE = True
+SEARCH_UPDATE_QUEUE_WINDOW = 5
+SEARCH_UPDATE_QUEUE_BATCH_SIZE = 500
+SEARCH_UPDATE_QUEUE_MAX_ATTEMPTS = 5
+# seconds after which the rows claimed by a flush that did not finish are flushed again
+SEARCH_UPDATE_QUEUE_CLAIM_TIMEOUT = 10 * 60
 
 # Sessions
 COOKIE_NAME = 'osf'
@@ -443,6 +455,7 @@ class CeleryConfig:
         'website.preprints.tasks',
         'website.project.tasks',
         'admin.rdm_custom_storage_location.tasks',
+        'admin.quota_recalc.tasks',
     }
 
     high_pri_modules = {
@@ -497,6 +510,8 @@ class CeleryConfig:
         'website.notifications.tasks',
         'website.archiver.tasks',
         'website.search.search',
+        'website.search.update_queue',
+        'website.search.document_cache',
         'website.project.tasks',
         'scripts.populate_new_and_noteworthy_projects',
         'scripts.populate_popular_projects_and_registrations',
@@ -519,6 +534,10 @@ class CeleryConfig:
         'osf.management.commands.update_institution_project_counts',
         'nii.mapcore_refresh_tokens',
         'admin.rdm_custom_storage_location.tasks',
+        'admin.quota_recalc.tasks',
+        'website.util.timestamp',
+        'website.util.quota',
+        'api.caching.tasks',
     )
 
     # Modules that need metrics and release requirements
@@ -661,6 +680,26 @@ class CeleryConfig:
                 'task': 'management.commands.update_institution_project_counts',
                 'schedule': crontab(minute=0, hour=9), # Daily 05:00 a.m. EDT
             },
+            'search_update_queue': {
+                'task': 'website.search.update_queue.flush_search_update_queue',
+                'schedule': crontab(minute='*/1'),
+            },
+            'search_document_parts': {
+                'task': 'website.search.document_cache.sweep_search_document_parts',
+                'schedule': crontab(minute=30),  # Hourly
+            },
+            'timestamp_queue': {
+                'task': 'website.util.timestamp.celery_process_timestamp_queue',
+                'schedule': crontab(minute='*/1'),
+            },
+            'quota_ledger': {
+                'task': 'website.util.quota.celery_compact_quota_ledger',
+                'schedule': crontab(minute='*/1'),
+            },
+            'reconcile_storage_usage': {
+                'task': 'api.caching.tasks.reconcile_storage_usage',
+                'schedule': crontab(minute='*/5'),
+            },
             'mapcore_refresh_token': {
                 'task': 'nii.mapcore_refresh_tokens',
                 'schedule': crontab(minute=0, hour=10),  # Daily 5:00 a.m. EST (-5h)
@@ -701,6 +740,8 @@ assert (DRAFT_REGISTRATION_APPROVAL_PERIOD > EMBARGO_END_DATE_MIN), 'The draft r
 ENABLE_INSTITUTIONS = True
 
 ENABLE_STORAGE_USAGE_CACHE = True
+# Number of dirty storage usage counters recomputed by each reconcile_storage_usage run
+STORAGE_USAGE_RECONCILE_BATCH_SIZE = 500
 
 ENABLE_VARNISH = False
 ENABLE_ESI = False
@@ -97,6 +97,32 @@ var TIMESTAMP_LIST_OBJECT = new List('timestamp-form', {
     }
 });
 
+// set by initRemoteList, when the rows are loaded page by page from the server
+var remoteList = null;
+
+// Fields of the error list items, as returned by the server
+var ERROR_INFO_NAMES = [
+    'creator_name', 'creator_email', 'creator_id', 'file_path', 'file_id',
+    'file_create_date_on_upload', 'file_create_date_on_verify',
+    'file_modify_date_on_upload', 'file_modify_date_on_verify',
+    'file_size_on_upload', 'file_size_on_verify', 'file_version',
+    'project_id', 'organization_id', 'organization_name',
+    'verify_user_id', 'verify_user_name', 'verify_date', 'verify_result_title'
+];
+
+// Sort keys of the server for the sortable columns
+var REMOTE_SORT_KEYS = {
+    provider: 'provider',
+    file_path: 'path',
+    verify_user_name_id: 'verify_user',
+    verify_date: 'verify_date',
+    verify_result_title: 'status'
+};
+
+function listItems() {
+    return remoteList ? remoteList.items : TIMESTAMP_LIST_OBJECT.items;
+}
+
 TIMESTAMP_LIST_OBJECT.on('updated', function (list) {
     var isFirst = list.i === 1;
     var isLast = list.i > list.matchingItems.length - list.page;
@@ -127,6 +153,11 @@ $('.pagination-next').click(function () {
 });
 
 $('#pageLength').change(function () {
+    if (remoteList) {
+        remoteList.params.page_size = $(this).val();
+        loadErrorPage(1);
+        return;
+    }
     TIMESTAMP_LIST_OBJECT.page = $(this).val();
     TIMESTAMP_LIST_OBJECT.update();
     $('.listjs-pagination li').first().trigger('click');
@@ -134,7 +165,7 @@ $('#pageLength').change(function () {
 
 $('#addTimestampAllCheck').on('change', function () {
     var checkAll = this.checked;
-    TIMESTAMP_LIST_OBJECT.items.map(function (item) {
+    listItems().map(function (item) {
         $(item.elm).find('#addTimestampCheck').prop('checked', checkAll);
     });
 });
@@ -155,6 +186,7 @@ function loadingAnimation (activated) {
     $('#download-row').toggle(!activated);
 
     $('#btn-verify').attr('disabled', activated);
+    $('#btn-verify-delta').attr('disabled', activated);
     $('#btn-addtimestamp').attr('disabled', activated);
     $('#btn-cancel').attr('disabled', !activated);
 }
@@ -165,7 +197,7 @@ var verify = function (params) {
     // Get files list
     $.ajax({
         url: params.urlVerify,
-        data: {},
+        data: params.delta ? {delta: 'true'} : {},
         dataType: 'json',
         method: 'POST'
     }).done(function () {
@@ -177,7 +209,7 @@ var verify = function (params) {
 };
 
 var add = function (param) {
-    var fileList = TIMESTAMP_LIST_OBJECT.items.filter(function (item) {
+    var fileList = listItems().filter(function (item) {
         var checkbox = item.elm.querySelector('[type=checkbox]');
         if (checkbox) {
             return checkbox.checked;
@@ -237,7 +269,7 @@ var cancel = function (url) {
 
 var download = function (url) {
     var fileFormat = $('#fileFormat').val();
-    var fileList = TIMESTAMP_LIST_OBJECT.items.filter(function (item) {
+    var fileList = listItems().filter(function (item) {
         var checkbox = item.elm.querySelector('[type=checkbox]');
         if (checkbox) {
             return checkbox.checked;
@@ -683,29 +715,8 @@ function saveTextFile(filename, content) {
     }
 }
 
-function initList() {
-
-    // sort buttons code
-
-    // this is necessary because javascript doesn't provide the default compare function it uses
-    var defaultSort = function (a, b) {
-        if (a === b) {return 0;}
-        else {
-            var list = [a, b];
-            list.sort();
-            return list.indexOf(a) === 0 ? -1 : 1;
-        }
-    };
-
-    var sortFunction = function(a, b, options) {
-        if (a.values().provider !== b.values().provider) {
-            return defaultSort(a.values().provider, b.values().provider);
-        }
-        else {
-            return defaultSort(a.values()[options.valueName], b.values()[options.valueName]);
-        }
-    };
-
+// call onSort(propertyName, 'asc' or 'desc') when a sort button is clicked
+function bindSortButtons(onSort) {
     var propertyNames = ['provider', 'file_path', 'verify_user_name_id', 'verify_date', 'verify_result_title'];
     var clickSortUpElements = propertyNames.map(function(property_name) {
         return 'sort_up_' + property_name;
@@ -745,7 +756,7 @@ function initList() {
                     element.classList.add('tb-sort-inactive');
                 });
 
-                TIMESTAMP_LIST_OBJECT.sort(propertyName, {order: 'asc', sortFunction: sortFunction});
+                onSort(propertyName, 'asc');
 
                 event.target.classList.remove('tb-sort-inactive');
 
@@ -769,13 +780,41 @@ function initList() {
                     element.classList.add('tb-sort-inactive');
                 });
 
-                TIMESTAMP_LIST_OBJECT.sort(upPropertyName, {order: 'desc', sortFunction: sortFunction});
+                onSort(upPropertyName, 'desc');
 
                 event.target.classList.remove('tb-sort-inactive');
 
             };
         })(downPropertyName, clickSortDownElements));
     }
+}
+
+function initList() {
+
+    // sort buttons code
+
+    // this is necessary because javascript doesn't provide the default compare function it uses
+    var defaultSort = function (a, b) {
+        if (a === b) {return 0;}
+        else {
+            var list = [a, b];
+            list.sort();
+            return list.indexOf(a) === 0 ? -1 : 1;
+        }
+    };
+
+    var sortFunction = function(a, b, options) {
+        if (a.values().provider !== b.values().provider) {
+            return defaultSort(a.values().provider, b.values().provider);
+        }
+        else {
+            return defaultSort(a.values()[options.valueName], b.values()[options.valueName]);
+        }
+    };
+
+    bindSortButtons(function (propertyName, order) {
+        TIMESTAMP_LIST_OBJECT.sort(propertyName, {order: order, sortFunction: sortFunction});
+    });
 
     // filter by users and date code
 
@@ -851,6 +890,115 @@ function initList() {
 
 }
 
+function errorItem(provider, errorInfo) {
+    var values = {provider: provider};
+    ERROR_INFO_NAMES.forEach(function (name) {
+        var value = errorInfo[name];
+        values[name] = value === null || value === undefined ? '' : String(value);
+    });
+    values.verify_user_name_id = values.verify_user_id ? values.verify_user_name + ' (' + values.verify_user_id + ')' : 'Unknown';
+
+    var verifyDate = values.verify_date ? new $osf.FormattableDate(new Date(values.verify_date)).local : 'Unknown';
+    var $row = $('<tr class="addTimestamp">').append(
+        $('<td>').append('<input type="checkBox" id="addTimestampCheck" style="width: 15px; height: 15px;"/>'),
+        $('<td class="provider">').text(provider),
+        $('<td>').text(values.file_path),
+        $('<td class="verify_user_name_id">').text(values.verify_user_name_id),
+        $('<td class="verify_date">').text(verifyDate),
+        $('<td class="verify_result_title">').text(values.verify_result_title)
+    );
+    // same interface as the items of list.js
+    return {
+        elm: $row[0],
+        values: function () {
+            return values;
+        }
+    };
+}
+
+function renderErrorPagination(page, pages) {
+    var $pagination = $('.listjs-pagination').empty();
+    var gap = false;
+    for (var i = 1; i <= pages; i++) {
+        // same windows as the list.js pagination
+        if (i !== 1 && i !== pages && Math.abs(i - page) > 3) {
+            if (!gap) {
+                $pagination.append('<li class="disabled"><a class="page">...</a></li>');
+                gap = true;
+            }
+            continue;
+        }
+        gap = false;
+        var $item = $('<li>').toggleClass('active', i === page).append($('<a class="page">').text(i));
+        $item.on('click', (function (pageNumber) {
+            return function () {
+                loadErrorPage(pageNumber);
+                return false;
+            };
+        })(i));
+        $pagination.append($item);
+    }
+    $('.pagination-wrap').toggle(pages > 1);
+    $('.pagination-prev').toggleClass('disabled', page === 1);
+    $('.pagination-next').toggleClass('disabled', page === pages);
+    // for the pages showing their own page navigation
+    $(document).trigger('timestampErrorPageLoaded');
+}
+
+function loadErrorPage(page) {
+    $.ajax({
+        url: remoteList.url,
+        data: $.extend({page: page}, remoteList.params),
+        dataType: 'json',
+        method: 'GET'
+    }).done(function (result) {
+        var $tbody = $('#timestamp_error_list').empty();
+        remoteList.items = [];
+        result.provider_list.forEach(function (providerErrors) {
+            providerErrors.error_list.forEach(function (errorInfo) {
+                var item = errorItem(providerErrors.provider, errorInfo);
+                remoteList.items.push(item);
+                $tbody.append(item.elm);
+            });
+        });
+        $('#addTimestampAllCheck').prop('checked', false);
+        renderErrorPagination(result.page, Math.max(1, Math.ceil(result.total / result.page_size)));
+    }).fail(function () {
+        $osf.growl('Timestamp', _('Failed to get the timestamp error list.'), 'danger');
+    });
+}
+
+// The rows are loaded from url page by page, sorted and filtered by the server
+function initRemoteList(url) {
+    remoteList = {
+        url: url,
+        items: [],
+        params: {page_size: $('#pageLength').val(), sort: 'path'}
+    };
+
+    bindSortButtons(function (propertyName, order) {
+        remoteList.params.sort = (order === 'desc' ? '-' : '') + REMOTE_SORT_KEYS[propertyName];
+        loadErrorPage(1);
+    });
+
+    document.getElementById('applyFiltersButton').addEventListener('click', function () {
+        remoteList.params.verify_user = $('#userFilterSelect').val();
+        // .replace below gets rid of invisible characters IE inserts
+        remoteList.params.start_date = $('#startDateFilter').val().replace(/\u200E/g, '');
+        remoteList.params.end_date = $('#endDateFilter').val().replace(/\u200E/g, '');
+        loadErrorPage(1);
+    });
+
+    loadErrorPage(1);
+}
+
+// download all the errors matching the filters of the list, in 'csv' or 'json'
+var exportAll = function (url, exportFormat) {
+    var params = $.extend({format: exportFormat}, remoteList.params);
+    delete params.page_size;
+    window.location.href = url + '?' + $.param(params);
+};
+
 function initTinyDatePicker() {
 
     var datePickerIds = ['startDateFilter', 'endDateFilter'];
@@ -901,9 +1049,14 @@ function checkHasTaskRunning () {
     }
 }
 
-function init(url) {
+// errorListUrl: if given, the error list is loaded page by page from it
+function init(url, errorListUrl) {
     taskStatusUrl = url;
-    initList();
+    if (errorListUrl) {
+        initRemoteList(errorListUrl);
+    } else {
+        initList();
+    }
     initBootstrapDatePicker();
     checkHasTaskRunning();
 }
@@ -914,5 +1067,6 @@ module.exports = {
     cancel: cancel,
     init: init,
     download: download,
+    exportAll: exportAll,
     setWebOrAdmin: setWebOrAdmin
 };
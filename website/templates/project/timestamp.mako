@@ -53,6 +53,9 @@
                                     <div class="input-group-addon">${_("User")}</div>
                                     <select id="userFilterSelect" class="form-control">
                                         <option value=""></option>
+                                        % for user_id, user_label in verify_users:
+                                        <option value="${ user_id }">${ user_label }</option>
+                                        % endfor
                                     </select>
                                 </div>
                             </div>
@@ -67,6 +70,7 @@
                         <div class="col-sm-7">
                             <span>
                                 <button type="button" class="btn btn-success" id="btn-verify" ${ 'disabled=disabled' if not async_task['ready'] else '' }>${_("Verify")}</button>
+                                <button type="button" class="btn btn-success" id="btn-verify-delta" ${ 'disabled=disabled' if not async_task['ready'] else '' }>${_("Verify Changed Files")}</button>
                                 <button type="button" class="btn btn-success" id="btn-addtimestamp" ${ 'disabled=disabled' if not async_task['ready'] else '' }>${_("Request Trusted Timestamp")}</button>
                                 <button type="button" class="btn btn-default" id="btn-cancel" ${ 'disabled=disabled' if async_task['ready'] else '' }>${_("Cancel")}</button>
                             </span>
@@ -152,41 +156,7 @@
                             </tr>
                         </thead>
                         <tbody class="list" id="timestamp_error_list">
-                            % for provider_error_info in provider_list:
-                                % for error_info in provider_error_info['error_list']:
-                                <tr class="addTimestamp">
-                                    <td>
-                                        <input type="checkBox" id="addTimestampCheck" style="width: 15px; height: 15px;"/>
-                                    </td>
-                                    <td class="provider">${ provider_error_info['provider'] }</td>
-                                    <td>${ error_info['file_path'] }</td>
-
-                                    <input type="hidden" class="creator_name" value="${ error_info['creator_name'] }" />
-                                    <input type="hidden" class="creator_email" value="${ error_info['creator_email'] }" />
-                                    <input type="hidden" class="creator_id" value="${ error_info['creator_id'] }" />
-                                    <input type="hidden" class="file_path" value="${ error_info['file_path'] }" />
-                                    <input type="hidden" class="file_id" value="${ error_info['file_id'] }" />
-                                    <input type="hidden" class="file_create_date_on_upload" value="${ error_info['file_create_date_on_upload'] }" />
-                                    <input type="hidden" class="file_create_date_on_verify" value="${ error_info['file_create_date_on_verify'] }" />
-                                    <input type="hidden" class="file_modify_date_on_upload" value="${ error_info['file_modify_date_on_upload'] }" />
-                                    <input type="hidden" class="file_modify_date_on_verify" value="${ error_info['file_modify_date_on_verify'] }" />
-                                    <input type="hidden" class="file_size_on_upload" value="${ error_info['file_size_on_upload'] }" />
-                                    <input type="hidden" class="file_size_on_verify" value="${ error_info['file_size_on_verify'] }" />
-                                    <input type="hidden" class="file_version" value="${ error_info['file_version'] }" />
-                                    <input type="hidden" class="project_id" value="${ error_info['project_id'] }" />
-                                    <input type="hidden" class="organization_id" value="${ error_info['organization_id'] }" />
-                                    <input type="hidden" class="organization_name" value="${ error_info['organization_name'] }" />
-                                    <input type="hidden" class="verify_user_id" value="${ error_info['verify_user_id'] }" />
-                                    <input type="hidden" class="verify_user_name" value="${ error_info['verify_user_name'] }" />
-                                    <input type="hidden" class="verify_date" value="${ error_info['verify_date'] }" />
-                                    <input type="hidden" class="verify_result_title" value="${ error_info['verify_result_title'] }" />
-
-                                    <td class="verify_user_name_id">${ u'{} ({})'.format(error_info['verify_user_name'], error_info['verify_user_id']) if error_info['verify_user_id'] else 'Unknown' }</td>
-                                    <td class="verify_date" style="color: white;">${ error_info['verify_date'] if error_info['verify_date'] else 'Unknown' }</td>
-                                    <td class="verify_result_title">${ error_info['verify_result_title'] }</td>
-                                </tr>
-                                % endfor
-                            % endfor
+                            ## filled page by page by timestamp-common.js
                         </tbody>
                     </table>
                 </div>
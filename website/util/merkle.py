@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+'''Merkle tree over file digests, used to timestamp many files with a
+single TSA request.
+
+Leaves and inner nodes are hashed with distinct prefixes so that a leaf
+can never be mistaken for an inner node. A node without a sibling is
+promoted to the next level unchanged.
+'''
+from __future__ import absolute_import
+import hashlib
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# position of the sibling in a proof step
+SIBLING_LEFT = 'L'
+SIBLING_RIGHT = 'R'
+
+
+def leaf_hash(hash_type, digest):
+    return hashlib.new(hash_type, LEAF_PREFIX + digest).digest()
+
+def node_hash(hash_type, left, right):
+    return hashlib.new(hash_type, NODE_PREFIX + left + right).digest()
+
+def build_tree(digests, hash_type='sha512'):
+    '''Return (root, proofs) for a list of raw digests.
+
+    ``proofs[i]`` is the inclusion proof of ``digests[i]``: a list of
+    [side, sibling_hex] pairs from the leaf up to the root.
+    '''
+    if not digests:
+        raise ValueError('no digests')
+    level = [leaf_hash(hash_type, digest) for digest in digests]
+    proofs = [[] for _ in digests]
+    positions = list(range(len(digests)))
+    while len(level) > 1:
+        for leaf, position in enumerate(positions):
+            sibling = position ^ 1
+            if sibling < len(level):
+                side = SIBLING_LEFT if sibling < position else SIBLING_RIGHT
+                proofs[leaf].append([side, level[sibling].hex()])
+            positions[leaf] = position // 2
+        level = [
+            node_hash(hash_type, level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ]
+    return level[0], proofs
+
+def root_from_proof(digest, proof, hash_type='sha512'):
+    '''Recompute the root of the tree from a digest and its inclusion proof.
+    '''
+    current = leaf_hash(hash_type, digest)
+    for side, sibling in proof:
+        sibling = bytes.fromhex(sibling)
+        if side == SIBLING_LEFT:
+            current = node_hash(hash_type, sibling, current)
+        elif side == SIBLING_RIGHT:
+            current = node_hash(hash_type, current, sibling)
+        else:
+            raise ValueError('invalid proof step: {}'.format(side))
+    return current
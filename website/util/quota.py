@@ -5,18 +5,28 @@ from addons.base import signals as file_signals
 from addons.osfstorage.models import OsfStorageFileNode, Region
 from api.base import settings as api_settings
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
+from django.db import connection, transaction
+from django.db.models import (
+    BigIntegerField, Case, ExpressionWrapper, F, FloatField, Func, Max,
+    OuterRef, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce, Greatest
+from framework.celery_tasks import app as celery_app
 from osf.models import (
     AbstractNode, BaseFileNode, FileLog, FileInfo, Guid, OSFUser, UserQuota,
-    ProjectStorageType
+    UserQuotaLedger, ProjectStorageType
 )
 from django.utils import timezone
 from osf.utils.requests import check_select_for_update
+from psycopg2.extensions import AsIs
+from website.project import signals as project_signals
 
 
 PROVIDERS = ['s3compatinstitutions']
 
+# key of the advisory lock taken to create UserQuota records
+USER_QUOTA_CREATION_LOCK = 61010
+
 # import inspect
 logger = logging.getLogger(__name__)
 
@@ -50,6 +60,33 @@ def used_quota(user_id, storage_type=UserQuota.NII_STORAGE):
     return db_sum['filesize_sum'] if db_sum['filesize_sum'] is not None else 0
 
 
+def used_quota_by_users(user_ids, storage_type=UserQuota.NII_STORAGE):
+    """Set-based used_quota: return {user_id: used} for ``user_ids``.
+
+    Sizes are summed per project with one GROUP BY query and then per
+    creator, so the cost does not grow with the number of users queried.
+    """
+    projects = dict(AbstractNode.objects.filter(
+        projectstoragetype__storage_type=storage_type,
+        is_deleted=False,
+        creator_id__in=user_ids
+    ).values_list('id', 'creator_id'))
+    file_model = BaseFileNode if storage_type != UserQuota.NII_STORAGE else OsfStorageFileNode
+    project_sizes = file_model.objects.filter(
+        target_object_id__in=list(projects.keys()),
+        target_content_type_id=ContentType.objects.get_for_model(AbstractNode),
+        deleted_on=None,
+        deleted_by_id=None,
+    ).order_by().values('target_object_id').annotate(
+        size=Coalesce(Sum('fileinfo__file_size'), 0)
+    ).values_list('target_object_id', 'size')
+
+    used = {user_id: 0 for user_id in user_ids}
+    for project_id, size in project_sizes:
+        used[projects[project_id]] += size
+    return used
+
+
 def update_user_used_quota(user, storage_type=UserQuota.NII_STORAGE, is_recalculating_quota=False):
     """Update user's used quota
 
@@ -61,36 +98,133 @@ def update_user_used_quota(user, storage_type=UserQuota.NII_STORAGE, is_recalcul
     :param storage_type: storage type
     :param is_recalculating_quota: a boolean to know whether the function is used in recalculate quota process or not
     """
-    if is_recalculating_quota and storage_type == UserQuota.CUSTOM_STORAGE:
-        # If the function is called in recalculate quota process and storage_type parameter is 2 (for NII Storage),
-        # get total file size of projects with storage_type 1 and 2
-        used_quota_for_nii_default_storage = used_quota(user._id, UserQuota.NII_STORAGE)
-        used_quota_for_nii_custom_storage = used_quota(user._id, UserQuota.CUSTOM_STORAGE)
-        used = used_quota_for_nii_default_storage + used_quota_for_nii_custom_storage
-    else:
-        # Get total file size of projects with specified storage_type
-        used = used_quota(user._id, storage_type)
-
-    try:
-        if check_select_for_update():
-            user_quota = UserQuota.objects.filter(
-                user=user,
-                storage_type=storage_type,
-            ).select_for_update().get()
+    with transaction.atomic():
+        # the ledger rows recorded up to here are included in the usage read
+        # from the files, the later ones are left to compact_quota_ledger
+        last_id = UserQuotaLedger.objects.aggregate(last_id=Max('id'))['last_id']
+        if is_recalculating_quota and storage_type == UserQuota.CUSTOM_STORAGE:
+            # If the function is called in recalculate quota process and storage_type parameter is 2 (for NII Storage),
+            # get total file size of projects with storage_type 1 and 2
+            used_quota_for_nii_default_storage = used_quota(user._id, UserQuota.NII_STORAGE)
+            used_quota_for_nii_custom_storage = used_quota(user._id, UserQuota.CUSTOM_STORAGE)
+            used = used_quota_for_nii_default_storage + used_quota_for_nii_custom_storage
         else:
-            user_quota = UserQuota.objects.get(
+            # Get total file size of projects with specified storage_type
+            used = used_quota(user._id, storage_type)
+
+        # the ledger rows are locked before UserQuota, in the order of
+        # compact_quota_ledger, so that the two never deadlock
+        if last_id is not None:
+            UserQuotaLedger.objects.filter(
                 user=user,
                 storage_type=storage_type,
-            )
-        user_quota.used = used
-        user_quota.save()
-    except UserQuota.DoesNotExist:
-        UserQuota.objects.create(
-            user=user,
-            storage_type=storage_type,
-            max_quota=api_settings.DEFAULT_MAX_QUOTA,
-            used=used,
-        )
+                id__lte=last_id,
+            ).delete()
+        try:
+            if check_select_for_update():
+                user_quota = UserQuota.objects.filter(
+                    user=user,
+                    storage_type=storage_type,
+                ).select_for_update().get()
+            else:
+                user_quota = UserQuota.objects.get(
+                    user=user,
+                    storage_type=storage_type,
+                )
+            user_quota.used = used
+            user_quota.save()
+        except UserQuota.DoesNotExist:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [USER_QUOTA_CREATION_LOCK])
+            if not UserQuota.objects.filter(user=user, storage_type=storage_type).update(used=used):
+                UserQuota.objects.create(
+                    user=user,
+                    storage_type=storage_type,
+                    max_quota=api_settings.DEFAULT_MAX_QUOTA,
+                    used=used,
+                )
+
+
+def record_quota_delta(user, storage_type, delta, reason, file_node=None):
+    """Append a change of the used quota of a user to the ledger.
+
+    The change is folded into UserQuota.used by compact_quota_ledger, right
+    away when QUOTA_LEDGER_DEFERRED is off.
+    """
+    if not delta or user is None:
+        return
+    UserQuotaLedger.objects.create(
+        user=user,
+        storage_type=storage_type,
+        delta=delta,
+        reason=reason,
+        file=file_node,
+    )
+    if not api_settings.QUOTA_LEDGER_DEFERRED:
+        compact_quota_ledger(user=user, storage_type=storage_type)
+
+
+def pending_quota_delta(user, storage_type):
+    return UserQuotaLedger.objects.filter(
+        user=user,
+        storage_type=storage_type,
+    ).aggregate(delta=Coalesce(Sum('delta'), 0))['delta']
+
+
+def compact_quota_ledger(user=None, storage_type=None):
+    """Fold the ledger into UserQuota with one UPDATE per user and storage
+    type, and return the number of ledger rows consumed.
+
+    Used quota never goes below zero. A UserQuota is only created for a
+    positive total.
+
+    The consumed rows are locked and skipped by the compactions running at
+    the same time, so that a delta is never added twice.
+    """
+    entries = UserQuotaLedger.objects.all()
+    if user is not None:
+        entries = entries.filter(user=user)
+    if storage_type is not None:
+        entries = entries.filter(storage_type=storage_type)
+    count = 0
+    while True:
+        with transaction.atomic():
+            ids = list(entries.select_for_update(skip_locked=True).order_by('id').values_list(
+                'id', flat=True)[:api_settings.QUOTA_LEDGER_COMPACT_BATCH_SIZE])
+            if not ids:
+                return count
+            consumed = UserQuotaLedger.objects.filter(id__in=ids)
+            totals = consumed.order_by().values('user_id', 'storage_type').annotate(total=Sum('delta'))
+            for total in totals:
+                user_quotas = UserQuota.objects.filter(
+                    user_id=total['user_id'],
+                    storage_type=total['storage_type'],
+                )
+                add = Greatest(F('used') + total['total'], Value(0))
+                if user_quotas.update(used=add) or total['total'] <= 0:
+                    continue
+                # serialize the creation with update_user_used_quota and the
+                # other compactions, then check again
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)', [USER_QUOTA_CREATION_LOCK])
+                if not user_quotas.update(used=add):
+                    UserQuota.objects.create(
+                        user_id=total['user_id'],
+                        storage_type=total['storage_type'],
+                        max_quota=api_settings.DEFAULT_MAX_QUOTA,
+                        used=total['total'],
+                    )
+            consumed.delete()
+        count += len(ids)
+        if len(ids) < api_settings.QUOTA_LEDGER_COMPACT_BATCH_SIZE:
+            return count
+
+
+@celery_app.task
+def celery_compact_quota_ledger():
+    count = compact_quota_ledger()
+    if count:
+        logger.info('Quota ledger: {} entries compacted'.format(count))
 
 
 def abbreviate_size(size):
@@ -107,10 +241,70 @@ def abbreviate_size(size):
 def get_quota_info(user, storage_type=UserQuota.NII_STORAGE):
     try:
         user_quota = user.userquota_set.get(storage_type=storage_type)
-        return (user_quota.max_quota, user_quota.used)
+        # include the changes not yet compacted into UserQuota
+        used = user_quota.used + pending_quota_delta(user, storage_type)
+        return (user_quota.max_quota, max(used, 0))
     except UserQuota.DoesNotExist:
         return (api_settings.DEFAULT_MAX_QUOTA, used_quota(user._id, storage_type))
 
+def annotate_user_quota(queryset, storage_type=UserQuota.NII_STORAGE):
+    """Annotate an OSFUser queryset with the values of get_quota_info so
+    that user lists can be sorted and paginated by the database.
+
+    Adds quota_max (GB), quota_used, quota_remaining and quota_ratio (bytes
+    and percent). The usage of the users without a UserQuota record is
+    summed from their files, as used_quota does, without creating the record.
+    """
+    user_quotas = UserQuota.objects.filter(user=OuterRef('pk'), storage_type=storage_type)
+    pending = UserQuotaLedger.objects.filter(
+        user=OuterRef('pk'),
+        storage_type=storage_type,
+    ).order_by().values('user').annotate(total=Sum('delta')).values('total')
+    projects = AbstractNode.objects.filter(
+        projectstoragetype__storage_type=storage_type,
+        is_deleted=False,
+        creator_id=OuterRef(OuterRef('pk')),
+    ).values('id')
+    file_model = BaseFileNode if storage_type != UserQuota.NII_STORAGE else OsfStorageFileNode
+    files = file_model.objects.filter(
+        target_object_id__in=Subquery(projects),
+        target_content_type_id=ContentType.objects.get_for_model(AbstractNode),
+        deleted_on=None,
+        deleted_by_id=None,
+    ).values('id')
+    # SUM as a plain function, so that no GROUP BY is added to the subquery
+    files_used = FileInfo.objects.filter(
+        file_id__in=Subquery(files),
+    ).order_by().annotate(total=Func(F('file_size'), function='SUM')).values('total')
+    queryset = queryset.annotate(
+        quota_max=Coalesce(
+            Subquery(user_quotas.values('max_quota')[:1]),
+            Value(api_settings.DEFAULT_MAX_QUOTA)),
+        quota_used=Greatest(
+            Coalesce(
+                # NULL without a UserQuota record, like get_quota_info
+                Subquery(user_quotas.values('used')[:1]) +
+                Coalesce(Subquery(pending, output_field=BigIntegerField()), Value(0)),
+                Subquery(files_used, output_field=BigIntegerField()),
+                Value(0)),
+            Value(0),
+            output_field=BigIntegerField()),
+    )
+    max_quota_bytes = Cast(F('quota_max'), FloatField()) * Value(float(api_settings.SIZE_UNIT_GB))
+    return queryset.annotate(
+        quota_remaining=ExpressionWrapper(
+            # max_quota is an integer column, multiply as bigint to not overflow
+            Cast(F('quota_max'), BigIntegerField()) *
+            Value(api_settings.SIZE_UNIT_GB, output_field=BigIntegerField()) - F('quota_used'),
+            output_field=BigIntegerField()),
+        quota_ratio=Case(
+            When(quota_max=0, then=Value(100.0)),
+            default=ExpressionWrapper(
+                Cast(F('quota_used'), FloatField()) / max_quota_bytes * Value(100.0),
+                output_field=FloatField()),
+            output_field=FloatField()),
+    )
+
 def get_project_storage_type(node):
     try:
         return ProjectStorageType.objects.get(node=node).storage_type
@@ -176,6 +370,7 @@ def update_used_quota(self, target, user, event_type, payload):
                         deleted=None,
                         target_content_type_id=ContentType.objects.get_for_model(AbstractNode),
                     ).all()
+                    removed_file_ids = []
                     for file_node_remove in list_file_node:
                         file_node_remove.is_deleted = True
                         if file_node_remove.type == 'osf.{}file'.format(metadata_provider):
@@ -187,11 +382,17 @@ def update_used_quota(self, target, user, event_type, payload):
                         file_node_remove.deleted_by_id = user.id
                         file_node_remove.save()
                         if file_node_remove.type == 'osf.trashedfile':
-                            node_removed(target, user, payload, file_node_remove, storage_type)
+                            removed_file_ids.append(file_node_remove.id)
+                    if removed_file_ids:
+                        remove_subtree_quota(removed_file_ids)
             else:
                 node_removed(target, user, payload, file_node, storage_type)
         elif event_type == FileLog.FILE_UPDATED:
             file_modified(target, user, payload, file_node, storage_type)
+    elif event_type == FileLog.FILE_MOVED and \
+            payload.get('source', {}).get('provider') == 'osfstorage' and \
+            payload.get('destination', {}).get('provider') == 'osfstorage':
+        file_moved(target, payload)
     else:
         return
 
@@ -200,80 +401,97 @@ def file_added(target, payload, file_node, storage_type):
     file_size = int(payload['metadata']['size'])
     if file_size < 0:
         return
-    try:
-        if check_select_for_update():
-            user_quota = UserQuota.objects.filter(
-                user=target.creator,
-                storage_type=storage_type
-            ).select_for_update().get()
-        else:
-            user_quota = UserQuota.objects.get(
-                user=target.creator,
-                storage_type=storage_type
-            )
-        user_quota.used += file_size
-        user_quota.save()
-    except UserQuota.DoesNotExist:
-        UserQuota.objects.create(
-            user=target.creator,
-            storage_type=storage_type,
-            max_quota=api_settings.DEFAULT_MAX_QUOTA,
-            used=file_size
-        )
-
+    record_quota_delta(target.creator, storage_type, file_size, UserQuotaLedger.FILE_ADDED, file_node)
     FileInfo.objects.create(file=file_node, file_size=file_size)
 
-def node_removed(target, user, payload, file_node, storage_type):
-    if check_select_for_update():
-        user_quota = UserQuota.objects.filter(
-            user=target.creator,
-            storage_type=storage_type
-        ).select_for_update().first()
-    else:
-        user_quota = UserQuota.objects.filter(
-            user=target.creator,
-            storage_type=storage_type
-        ).first()
-    if user_quota is not None:
-        if 'osf.trashed' not in file_node.type:
-            logging.error('FileNode is not trashed, cannot update used quota!')
-            return
-
-        for removed_file in get_node_file_list(file_node):
-            try:
-                if check_select_for_update():
-                    file_info = FileInfo.objects.filter(file=removed_file).select_for_update().get()
-                else:
-                    file_info = FileInfo.objects.get(file=removed_file)
-            except FileInfo.DoesNotExist:
-                logging.error('FileInfo not found, cannot update used quota!')
+REMOVE_SUBTREE_SQL = """
+    WITH RECURSIVE subtree_cte(id, type, target_object_id, target_content_type_id) AS (
+      SELECT
+        T.id,
+        T.type,
+        T.target_object_id,
+        T.target_content_type_id
+      FROM %(file_table)s AS T
+      WHERE T.id = ANY(%(root_ids)s)
+      UNION ALL
+      SELECT
+        T.id,
+        T.type,
+        T.target_object_id,
+        T.target_content_type_id
+      FROM subtree_cte AS R
+        JOIN %(file_table)s AS T ON T.parent_id = R.id
+    ), files AS (
+      SELECT DISTINCT id, target_object_id, target_content_type_id
+      FROM subtree_cte
+      WHERE type LIKE '%%file'
+    ), removed AS (
+      UPDATE %(fileinfo_table)s AS FI
+      SET file_size = 0
+      FROM (
+        SELECT P.id, P.file_size
+        FROM %(fileinfo_table)s AS P
+          JOIN files AS F ON F.id = P.file_id
+      ) AS PREV
+      WHERE FI.id = PREV.id
+      RETURNING FI.file_id, PREV.file_size
+    )
+    SELECT
+      N.creator_id,
+      COALESCE(PST.storage_type, %(default_storage_type)s),
+      COALESCE(SUM(R.file_size), 0),
+      COUNT(*) - COUNT(R.file_id)
+    FROM files AS F
+      LEFT JOIN removed AS R ON R.file_id = F.id
+      LEFT JOIN %(node_table)s AS N
+        ON N.id = F.target_object_id AND F.target_content_type_id = %(node_content_type_id)s
+      LEFT JOIN %(storage_type_table)s AS PST ON PST.node_id = N.id
+    GROUP BY 1, 2;
+"""
+
+def remove_subtree_quota(root_ids, reason=UserQuotaLedger.FILE_REMOVED, file_node=None):
+    """Zero the FileInfo of every file under ``root_ids`` and take their
+    size off the used quota of the project creators.
+
+    The subtree is collected in one recursive CTE and the sizes come back
+    grouped by creator and storage type, so the quota is adjusted with one
+    ledger entry per group instead of one update per file.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(REMOVE_SUBTREE_SQL, {
+                'file_table': AsIs(BaseFileNode._meta.db_table),
+                'fileinfo_table': AsIs(FileInfo._meta.db_table),
+                'node_table': AsIs(AbstractNode._meta.db_table),
+                'storage_type_table': AsIs(ProjectStorageType._meta.db_table),
+                'root_ids': list(root_ids),
+                'default_storage_type': ProjectStorageType.NII_STORAGE,
+                'node_content_type_id': ContentType.objects.get_for_model(AbstractNode).id,
+            })
+            rows = cursor.fetchall()
+
+        creators = OSFUser.objects.in_bulk([row[0] for row in rows if row[0] is not None])
+        missing = 0
+        for creator_id, storage_type, removed_size, missing_count in rows:
+            missing += missing_count
+            if creator_id is None:
                 continue
+            record_quota_delta(creators[creator_id], storage_type, -removed_size, reason, file_node)
+    if missing:
+        logging.error('FileInfo not found, cannot update used quota!')
 
-            user_quota.used -= file_info.file_size
-            if user_quota.used < 0:
-                user_quota.used = 0
-            file_info.file_size = 0
-            file_info.save()
-        user_quota.save()
+def node_removed(target, user, payload, file_node, storage_type):
+    if 'osf.trashed' not in file_node.type:
+        logging.error('FileNode is not trashed, cannot update used quota!')
+        return
+
+    remove_subtree_quota([file_node.id], file_node=file_node)
 
 def file_modified(target, user, payload, file_node, storage_type):
     file_size = int(payload['metadata']['size'])
     if file_size < 0:
         return
 
-    if check_select_for_update():
-        user_quota, _ = UserQuota.objects.select_for_update().get_or_create(
-            user=target.creator,
-            storage_type=storage_type,
-            defaults={'max_quota': api_settings.DEFAULT_MAX_QUOTA}
-        )
-    else:
-        user_quota, _ = UserQuota.objects.get_or_create(
-            user=target.creator,
-            storage_type=storage_type,
-            defaults={'max_quota': api_settings.DEFAULT_MAX_QUOTA}
-        )
-
     try:
         if check_select_for_update():
             file_info = FileInfo.objects.filter(file=file_node).select_for_update().get()
@@ -282,14 +500,70 @@ def file_modified(target, user, payload, file_node, storage_type):
     except FileInfo.DoesNotExist:
         file_info = FileInfo(file=file_node, file_size=0)
 
-    user_quota.used += file_size - file_info.file_size
-    if user_quota.used < 0:
-        user_quota.used = 0
-    user_quota.save()
+    record_quota_delta(
+        target.creator, storage_type, file_size - file_info.file_size,
+        UserQuotaLedger.FILE_MODIFIED, file_node)
 
     file_info.file_size = file_size
     file_info.save()
 
+def file_moved(target, payload):
+    """Move the quota of files moved between osfstorage of two projects
+    whose creator or storage type differ.
+    """
+    source = payload['source']
+    destination = payload['destination']
+    source_node = AbstractNode.load(source.get('nid'))
+    if source_node is None or source_node.id == target.id:
+        return
+    source_storage_type = get_project_storage_type(source_node)
+    storage_type = get_project_storage_type(target)
+    if source_node.creator_id == target.creator_id and source_storage_type == storage_type:
+        return
+
+    file_node = BaseFileNode.objects.filter(
+        _id=destination.get('path', '').strip('/'),
+        target_object_id=target.id,
+        target_content_type_id=ContentType.objects.get_for_model(AbstractNode),
+    ).first()
+    if file_node is None:
+        logging.error('FileNode not found, cannot update used quota!')
+        return
+
+    moved_files = [f for f in get_node_file_list(file_node) if 'osf.trashed' not in f.type]
+    moved_size = FileInfo.objects.filter(file__in=moved_files).aggregate(
+        size=Coalesce(Sum('file_size'), 0))['size']
+    record_quota_delta(source_node.creator, source_storage_type, -moved_size, UserQuotaLedger.FILE_MOVED, file_node)
+    record_quota_delta(target.creator, storage_type, moved_size, UserQuotaLedger.FILE_MOVED, file_node)
+
+def node_used_quota(node, storage_type):
+    """Total size of the files of one node, counted as in used_quota.
+    """
+    file_model = BaseFileNode if storage_type != UserQuota.NII_STORAGE else OsfStorageFileNode
+    files_ids = file_model.objects.filter(
+        target_object_id=node.id,
+        target_content_type_id=ContentType.objects.get_for_model(AbstractNode),
+        deleted_on=None,
+        deleted_by_id=None,
+    ).values_list('id', flat=True)
+    return FileInfo.objects.filter(file_id__in=files_ids).aggregate(
+        filesize_sum=Coalesce(Sum('file_size'), 0))['filesize_sum']
+
+def update_node_used_quota(node, removed=True):
+    """Remove the files of a deleted node from the quota of its creator, or
+    add them back when the node is restored.
+    """
+    storage_type = get_project_storage_type(node)
+    size = node_used_quota(node, storage_type)
+    if removed:
+        record_quota_delta(node.creator, storage_type, -size, UserQuotaLedger.NODE_REMOVED)
+    else:
+        record_quota_delta(node.creator, storage_type, size, UserQuotaLedger.NODE_RESTORED)
+
+@project_signals.node_deleted.connect
+def node_deleted(node):
+    update_node_used_quota(node, removed=True)
+
 def update_default_storage(user):
     # logger.info('----{}::{}({})from:{}::{}({})'.format(inspect.getframeinfo(inspect.currentframe())[0], inspect.getframeinfo(inspect.currentframe())[2], inspect.getframeinfo(inspect.currentframe())[1], inspect.stack()[1][1], inspect.stack()[1][3], inspect.stack()[1][2]))
     # logger.info(user)
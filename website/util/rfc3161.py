@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''Minimal in-process encoder/decoder for RFC 3161 timestamp messages.
+
+Only the parts needed by the timestamp engine are implemented: building a
+TimeStampReq from a precomputed digest, reading the status and token of a
+TimeStampResp, and extracting the MessageImprint from a token.
+'''
+from __future__ import absolute_import
+import os
+
+HASH_TYPE_OIDS = {
+    'sha256': '2.16.840.1.101.3.4.2.1',
+    'sha512': '2.16.840.1.101.3.4.2.3',
+}
+OID_HASH_TYPES = {v: k for k, v in HASH_TYPE_OIDS.items()}
+
+# PKIStatus values meaning that a token was issued
+PKI_STATUS_GRANTED = 0
+PKI_STATUS_GRANTED_WITH_MODS = 1
+
+TAG_BOOLEAN = 0x01
+TAG_INTEGER = 0x02
+TAG_OCTET_STRING = 0x04
+TAG_NULL = 0x05
+TAG_OID = 0x06
+TAG_SEQUENCE = 0x30
+TAG_SET = 0x31
+TAG_CONTEXT_0 = 0xa0
+
+
+class RFC3161Error(Exception):
+    pass
+
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+def _tlv(tag, value):
+    return bytes([tag]) + _encode_length(len(value)) + value
+
+def encode_integer(value):
+    length = max(1, (value.bit_length() + 8) // 8)
+    return _tlv(TAG_INTEGER, value.to_bytes(length, 'big', signed=True))
+
+def encode_oid(oid):
+    arcs = [int(arc) for arc in oid.split('.')]
+    body = bytearray([40 * arcs[0] + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.insert(0, 0x80 | (arc & 0x7f))
+            arc >>= 7
+        body.extend(chunk)
+    return _tlv(TAG_OID, bytes(body))
+
+def encode_sequence(*items):
+    return _tlv(TAG_SEQUENCE, b''.join(items))
+
+def build_request(digest, hash_type='sha512', nonce=None, cert_req=True):
+    '''Build a DER encoded TimeStampReq for ``digest`` (raw bytes).
+    '''
+    if hash_type not in HASH_TYPE_OIDS:
+        raise RFC3161Error('unknown hash_type: {}'.format(hash_type))
+    if nonce is None:
+        nonce = int.from_bytes(os.urandom(8), 'big')
+    message_imprint = encode_sequence(
+        encode_sequence(encode_oid(HASH_TYPE_OIDS[hash_type]), _tlv(TAG_NULL, b'')),
+        _tlv(TAG_OCTET_STRING, digest),
+    )
+    items = [encode_integer(1), message_imprint, encode_integer(nonce)]
+    if cert_req:
+        items.append(_tlv(TAG_BOOLEAN, b'\xff'))
+    return encode_sequence(*items)
+
+
+def _read_tlv(data, offset):
+    '''Return (tag, value_start, value_end) of the element at ``offset``.
+    '''
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        start = offset + 2
+        if length & 0x80:
+            num = length & 0x7f
+            if num == 0:
+                raise RFC3161Error('indefinite length is not supported')
+            length = int.from_bytes(data[start:start + num], 'big')
+            start += num
+    except IndexError:
+        raise RFC3161Error('truncated DER data')
+    end = start + length
+    if end > len(data):
+        raise RFC3161Error('truncated DER data')
+    return tag, start, end
+
+def _children(data, start, end):
+    offset = start
+    while offset < end:
+        tag, value_start, value_end = _read_tlv(data, offset)
+        yield tag, value_start, value_end
+        offset = value_end
+
+def _expect(element, tag):
+    if element is None or element[0] != tag:
+        raise RFC3161Error('unexpected DER structure')
+    return element
+
+def decode_oid(value):
+    arcs = [value[0] // 40, value[0] % 40]
+    arc = 0
+    for byte in value[1:]:
+        arc = (arc << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return '.'.join(str(a) for a in arcs)
+
+def parse_response(data):
+    '''Return (status, token) of a DER encoded TimeStampResp.
+
+    ``token`` is the DER encoded TimeStampToken or None when not granted.
+    '''
+    data = bytes(data)
+    _, start, end = _expect(_read_tlv(data, 0), TAG_SEQUENCE)
+    elements = list(_children(data, start, end))
+    if not elements:
+        raise RFC3161Error('empty TimeStampResp')
+    _, status_start, status_end = _expect(elements[0], TAG_SEQUENCE)
+    _, int_start, int_end = _expect(next(_children(data, status_start, status_end), None), TAG_INTEGER)
+    status = int.from_bytes(data[int_start:int_end], 'big', signed=True)
+    token = None
+    if len(elements) > 1:
+        # elements are contiguous, so the token starts where the status ends
+        token = data[status_end:elements[1][2]]
+    return status, token
+
+def get_message_imprint(response):
+    '''Return (hash_type, digest) stored in the TSTInfo of a TimeStampResp.
+    '''
+    status, token = parse_response(response)
+    if token is None:
+        raise RFC3161Error('TimeStampResp has no token (status={})'.format(status))
+    # ContentInfo ::= SEQUENCE { contentType, [0] EXPLICIT SignedData }
+    _, start, end = _expect(_read_tlv(token, 0), TAG_SEQUENCE)
+    content_info = list(_children(token, start, end))
+    _, start, end = _expect(content_info[1] if len(content_info) > 1 else None, TAG_CONTEXT_0)
+    _, start, end = _expect(next(_children(token, start, end), None), TAG_SEQUENCE)
+    # SignedData ::= SEQUENCE { version, digestAlgorithms, encapContentInfo, ... }
+    signed_data = list(_children(token, start, end))
+    _, start, end = _expect(signed_data[2] if len(signed_data) > 2 else None, TAG_SEQUENCE)
+    encap = list(_children(token, start, end))
+    _, start, end = _expect(encap[1] if len(encap) > 1 else None, TAG_CONTEXT_0)
+    _, start, end = _expect(next(_children(token, start, end), None), TAG_OCTET_STRING)
+    # TSTInfo ::= SEQUENCE { version, policy, messageImprint, ... }
+    _, start, end = _expect(_read_tlv(token, start), TAG_SEQUENCE)
+    tst_info = list(_children(token, start, end))
+    _, start, end = _expect(tst_info[2] if len(tst_info) > 2 else None, TAG_SEQUENCE)
+    imprint = list(_children(token, start, end))
+    _, alg_start, alg_end = _expect(imprint[0], TAG_SEQUENCE)
+    _, oid_start, oid_end = _expect(next(_children(token, alg_start, alg_end), None), TAG_OID)
+    _, digest_start, digest_end = _expect(imprint[1] if len(imprint) > 1 else None, TAG_OCTET_STRING)
+    oid = decode_oid(token[oid_start:oid_end])
+    return OID_HASH_TYPES.get(oid, oid), token[digest_start:digest_end]
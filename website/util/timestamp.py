@@ -2,32 +2,45 @@
 '''Common functions for timestamp.
 '''
 from __future__ import absolute_import
+import csv
 import datetime
 import hashlib
+import io
+import json
 import logging
 import os
+import queue
 import re
 import shlex
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
 import traceback
+from concurrent import futures
 
-from urllib3.util.retry import Retry
+from psycopg2.extensions import AsIs
 import requests
 
 from api.base import settings as api_settings
-from api.base.utils import waterbutler_api_url_for
 from celery.contrib.abortable import AbortableTask, AbortableAsyncResult
+from dateutil.parser import parse as parse_date
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Exists, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from osf.models import (
-    AbstractNode, BaseFileNode, Guid, RdmFileTimestamptokenVerifyResult, RdmUserKey,
-    OSFUser, TimestampTask
+    AbstractNode, BaseFileNode, BaseFileVersionsThrough, FileVersion, Guid,
+    RdmFileTimestamptokenVerifyResult, RdmUserKey, OSFUser, TimestampTask, TimestampTokenBucket, TimestampQueue
 )
 from osf.models.nodelog import NodeLog
 from website import util
 from website import settings
+from website.util import merkle
+from website.util import rfc3161
+from website.util import tsa_client
 from website.util import waterbutler
 
 from django.contrib.contenttypes.models import ContentType
@@ -64,10 +77,18 @@ TIMESTAMP_MSG_MAP = {
         api_settings.TIME_STAMP_STORAGE_DISCONNECTED_MSG,
     api_settings.TIME_STAMP_STORAGE_NOT_ACCESSIBLE:
         api_settings.TIME_STAMP_STORAGE_NOT_ACCESSIBLE_MSG,
+    api_settings.TIME_STAMP_TOKEN_PENDING:
+        api_settings.TIME_STAMP_TOKEN_PENDING_MSG,
 }
 
 RESULT_MESSAGE = TIMESTAMP_MSG_MAP
 
+# results that can only change with the file, skipped by delta verification
+DELTA_SKIP_STATUS = [
+    api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS,
+    api_settings.TIME_STAMP_TOKEN_CHECK_NG,
+]
+
 STATUS_NO_ERROR = [
     api_settings.TIME_STAMP_TOKEN_UNCHECKED,  # or no error
     api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS,
@@ -117,117 +138,441 @@ def get_async_task_data(node):
             TimestampTask.objects.filter(node=node).delete()
     return task_data
 
-def get_error_list(pid):
+# Columns of the error list, in the order used by the CSV export
+ERROR_INFO_FIELDS = [
+    'provider', 'file_path', 'file_id', 'file_version', 'verify_result_title',
+    'creator_name', 'creator_email', 'creator_id',
+    'file_create_date_on_upload', 'file_create_date_on_verify',
+    'file_modify_date_on_upload', 'file_modify_date_on_verify',
+    'file_size_on_upload', 'file_size_on_verify',
+    'project_id', 'organization_id', 'organization_name',
+    'verify_user_id', 'verify_user_name', 'verify_date',
+]
+
+# Sort keys accepted by get_error_list; rows are always grouped by provider
+ERROR_LIST_ORDERING = {
+    'provider': 'provider',
+    '-provider': '-provider',
+    'path': 'path',
+    '-path': '-path',
+    'verify_user': 'verify_user_name',
+    '-verify_user': '-verify_user_name',
+    'verify_date': 'verify_date',
+    '-verify_date': '-verify_date',
+    'status': 'inspection_result_status',
+    '-status': '-inspection_result_status',
+}
+
+def _filter_errors(pid, provider=None, status=None, verify_user=None, start_date=None, end_date=None):
+    queryset = RdmFileTimestamptokenVerifyResult.objects.filter(
+        project_id=pid
+    ).exclude(
+        inspection_result_status=api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS
+    )
+    if provider:
+        queryset = queryset.filter(provider=provider)
+    if status is not None:
+        queryset = queryset.filter(inspection_result_status=status)
+    # the results never verified are kept by the user and date filters
+    if verify_user:
+        queryset = queryset.filter(
+            Q(verify_user__isnull=True) |
+            Q(verify_user__in=OSFUser.objects.filter(guids___id=verify_user.lower()).values('id'))
+        )
+    if start_date is not None:
+        queryset = queryset.filter(Q(verify_date__isnull=True) | Q(verify_date__date__gte=start_date))
+    if end_date is not None:
+        queryset = queryset.filter(Q(verify_date__isnull=True) | Q(verify_date__date__lte=end_date))
+    return queryset
+
+def get_error_filter_params(params):
+    '''Read the filters and the sort of the error list from request parameters.
+    Raises ValueError if a parameter is invalid.
+    '''
+    def to_date(value):
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+    status = params.get('status')
+    return {
+        'provider': params.get('provider') or None,
+        'status': int(status) if status not in (None, '') else None,
+        'verify_user': params.get('verify_user') or None,
+        'start_date': to_date(params.get('start_date')),
+        'end_date': to_date(params.get('end_date')),
+        'sort': params.get('sort') if params.get('sort') in ERROR_LIST_ORDERING else None,
+    }
+
+def get_error_verify_users(pid):
+    '''Return [(guid, 'name (GUID)')] of the users who verified the errors of a project.
+    '''
+    users = OSFUser.objects.filter(
+        id__in=_filter_errors(pid).values('verify_user')
+    ).prefetch_related('guids').order_by('fullname')
+    return [(user._id, u'{} ({})'.format(user.fullname, user._id.upper())) for user in users]
+
+def get_error_queryset(pid, sort=None, **filters):
+    '''Return the verify results of a project that are not successes,
+    annotated with what the error list needs from the file tables.
+    ``filters`` are the keyword arguments of _filter_errors.
+    '''
+    versions = BaseFileVersionsThrough.objects.filter(basefilenode___id=OuterRef('file_id'))
+    latest_version_creator = versions.order_by('-fileversion_id').values('fileversion__creator_id')[:1]
+    version_count = versions.order_by().values('basefilenode_id').annotate(
+        count=Count('id')
+    ).values('count')
+    queryset = _filter_errors(pid, **filters).annotate(
+        file_exists=Exists(BaseFileNode.objects.filter(_id=OuterRef('file_id'))),
+        file_version_count=Subquery(version_count, output_field=IntegerField()),
+        creator_user=Coalesce(
+            'upload_file_modified_user',
+            'upload_file_created_user',
+            Subquery(latest_version_creator, output_field=IntegerField()),
+        ),
+    )
+    ordering = ERROR_LIST_ORDERING.get(sort, 'path')
+    if ordering.lstrip('-') == 'verify_user_name':
+        queryset = queryset.annotate(verify_user_name=Subquery(
+            OSFUser.objects.filter(id=OuterRef('verify_user')).values('fullname')[:1]))
+    if ordering.lstrip('-') == 'provider':
+        return queryset.order_by(ordering, 'path', 'id')
+    return queryset.order_by('provider', ordering, 'id')
+
+def _get_error_users(rows):
+    user_ids = set()
+    for data in rows:
+        user_ids.update(uid for uid in (data.creator_user, data.verify_user) if uid is not None)
+    if not user_ids:
+        return {}
+    users = OSFUser.objects.filter(id__in=user_ids).prefetch_related('guids', 'affiliated_institutions')
+    return {user.id: user for user in users}
+
+def _format_error_info(data, users):
+    if data.inspection_result_status in RESULT_MESSAGE:
+        verify_result_title = RESULT_MESSAGE[data.inspection_result_status]
+    else:  # 'FILE missing(Unverify)'
+        verify_result_title = api_settings.FILE_NOT_FOUND_MSG
+
+    # User and date of the verification
+    if data.verify_date is not None:
+        verify_date = data.verify_date.strftime('%Y/%m/%d %H:%M:%S %Z')
+    else:
+        verify_date = ''
+
+    def or_empty(value):
+        return '' if value is None else value
+
+    error_info = {
+        'creator_name': '',
+        'creator_email': '',
+        'creator_id': '',
+        'file_path': or_empty(data.path),
+        'file_id': data.file_id,
+        'file_create_date_on_upload': or_empty(data.upload_file_created_at),
+        'file_create_date_on_verify': or_empty(data.verify_file_created_at),
+        'file_modify_date_on_upload': or_empty(data.upload_file_modified_at),
+        'file_modify_date_on_verify': or_empty(data.verify_file_modified_at),
+        'file_size_on_upload': or_empty(data.upload_file_size),
+        'file_size_on_verify': or_empty(data.verify_file_size),
+        'file_version': '',
+        'project_id': data.project_id,
+        'organization_id': '',
+        'organization_name': '',
+        'verify_user_id': '',
+        'verify_user_name': '',
+        'verify_date': verify_date,
+        'verify_result_title': verify_result_title,
+    }
+
+    verify_user = users.get(data.verify_user)
+    if verify_user is not None:
+        error_info['verify_user_id'] = verify_user._id.upper()
+        error_info['verify_user_name'] = verify_user.fullname
+    else:
+        logger.warning('Timestamp Control: verify_user not found.')
+
+    if data.file_exists and data.provider == 'osfstorage':
+        # same as OsfStorageFile.current_version_number
+        error_info['file_version'] = data.file_version_count or 1
+
+    creator = users.get(data.creator_user)
+    if creator is not None:
+        error_info['creator_name'] = creator.fullname
+        error_info['creator_email'] = creator.username
+        error_info['creator_id'] = creator._id
+
+        # same as affiliated_institutions.first(), from the prefetched rows
+        institutions = sorted(creator.affiliated_institutions.all(), key=lambda i: i.pk)
+        if institutions:
+            error_info['organization_id'] = institutions[0]._id
+            error_info['organization_name'] = institutions[0].name
+
+    return error_info
+
+def iter_error_info(queryset):
+    '''Yield (provider, error_info) for the rows of ``queryset``, loading the
+    related users once per chunk of TS_ERROR_LIST_CHUNK_SIZE rows.
+    '''
+    chunk_size = api_settings.TS_ERROR_LIST_CHUNK_SIZE
+    rows = []
+    for data in queryset.iterator():
+        rows.append(data)
+        if len(rows) >= chunk_size:
+            users = _get_error_users(rows)
+            for row in rows:
+                yield row.provider, _format_error_info(row, users)
+            rows = []
+    if rows:
+        users = _get_error_users(rows)
+        for row in rows:
+            yield row.provider, _format_error_info(row, users)
+
+def get_error_list(pid, page=None, page_size=None, sort=None, **filters):
     '''Retrieve from the database the list of all timestamps that has an error.
+
+    When ``page`` is given only that page (1-based, ``page_size`` rows) is
+    returned; filtering, sorting and slicing are all done by the database.
     '''
-    data_list = RdmFileTimestamptokenVerifyResult.objects.filter(project_id=pid).order_by('provider', 'path')
+    queryset = get_error_queryset(pid, sort=sort, **filters)
+    if page is not None:
+        page_size = page_size or api_settings.TS_ERROR_LIST_PAGE_SIZE
+        offset = (max(int(page), 1) - 1) * page_size
+        queryset = queryset[offset:offset + page_size]
+
     provider_error_list = []
-    provider = None
-    error_list = []
+    for file_provider, error_info in iter_error_info(queryset):
+        if not provider_error_list or provider_error_list[-1]['provider'] != file_provider:
+            provider_error_list.append({'provider': file_provider, 'error_list': []})
+        provider_error_list[-1]['error_list'].append(error_info)
+    return provider_error_list
 
-    for data in data_list:
-        if data.inspection_result_status == api_settings.TIME_STAMP_TOKEN_CHECK_SUCCESS:
-            continue
+def count_errors(pid, sort=None, **filters):
+    # sort is accepted so that the get_error_filter_params() result can be passed as is
+    return _filter_errors(pid, **filters).count()
 
-        if not provider:
-            provider = data.provider
-        elif provider != data.provider:
-            provider_error_list.append({'provider': provider, 'error_list': error_list})
-            provider = data.provider
-            error_list = []
-
-        if data.inspection_result_status in RESULT_MESSAGE:
-            verify_result_title = RESULT_MESSAGE[data.inspection_result_status]
-        else:  # 'FILE missing(Unverify)'
-            verify_result_title = api_settings.FILE_NOT_FOUND_MSG
-
-        # User and date of the verification
-        if data.verify_date is not None:
-            verify_date = data.verify_date.strftime('%Y/%m/%d %H:%M:%S %Z')
-        else:
-            verify_date = ''
-
-        # Get file info
-        base_file_data = BaseFileNode.objects.filter(_id=data.file_id)
-        base_file_data_exists = base_file_data.exists()
-        file_versions = None
-        if base_file_data_exists:
-            base_file_data = base_file_data.get()
-            file_versions = base_file_data.versions.all()
-
-        # Get creator info
-        creator = None
-        if data.upload_file_modified_user is not None:
-            creator = OSFUser.objects.get(id=data.upload_file_modified_user)
-        elif data.upload_file_created_user is not None:
-            creator = OSFUser.objects.get(id=data.upload_file_created_user)
-        elif file_versions is not None and file_versions.exists():
-            creator = file_versions.latest('id').creator
-
-        # Change None to '' (empty string)
-        data.path = '' if data.path is None else data.path
-        data.upload_file_created_at = '' if data.upload_file_created_at is None else \
-            data.upload_file_created_at
-        data.verify_file_created_at = '' if data.verify_file_created_at is None else \
-            data.verify_file_created_at
-        data.upload_file_modified_at = '' if data.upload_file_modified_at is None else \
-            data.upload_file_modified_at
-        data.verify_file_modified_at = '' if data.verify_file_modified_at is None else \
-            data.verify_file_modified_at
-        data.upload_file_size = '' if data.upload_file_size is None else \
-            data.upload_file_size
-        data.verify_file_size = '' if data.verify_file_size is None else \
-            data.verify_file_size
-
-        # Generate error_info dictionary
-        error_info = {
-            'creator_name': '',
-            'creator_email': '',
-            'creator_id': '',
-            'file_path': data.path,
-            'file_id': data.file_id,
-            'file_create_date_on_upload': data.upload_file_created_at,
-            'file_create_date_on_verify': data.verify_file_created_at,
-            'file_modify_date_on_upload': data.upload_file_modified_at,
-            'file_modify_date_on_verify': data.verify_file_modified_at,
-            'file_size_on_upload': data.upload_file_size,
-            'file_size_on_verify': data.verify_file_size,
-            'file_version': '',
-            'project_id': data.project_id,
-            'organization_id': '',
-            'organization_name': '',
-            'verify_user_id': '',
-            'verify_user_name': '',
-            'verify_date': verify_date,
-            'verify_result_title': verify_result_title,
+def stream_error_list(pid, export_format='csv', sort=None, **filters):
+    '''Yield the error list of a project as CSV lines or as a JSON array,
+    without building the whole list in memory.
+    '''
+    queryset = get_error_queryset(pid, sort=sort, **filters)
+    if export_format == 'json':
+        separator = '['
+        for file_provider, error_info in iter_error_info(queryset):
+            error_info['provider'] = file_provider
+            yield separator + json.dumps(error_info, cls=DjangoJSONEncoder)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+        return
+
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=ERROR_INFO_FIELDS)
+    writer.writeheader()
+    for file_provider, error_info in iter_error_info(queryset):
+        error_info['provider'] = file_provider
+        writer.writerow(error_info)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+OSFSTORAGE_FILE_LIST_SQL = """
+    WITH RECURSIVE file_tree_cte(id, path) AS (
+      SELECT
+        T.id,
+        '/' :: TEXT AS path
+      FROM %s AS T
+      WHERE T.id = %s
+      UNION ALL
+      SELECT
+        T.id,
+        (R.path || T.name || CASE WHEN T.type = %s THEN '/' ELSE '' END) AS path
+      FROM file_tree_cte AS R
+        JOIN %s AS T ON T.parent_id = R.id
+      WHERE T.type IN (%s, %s)
+    )
+    SELECT F._id, F.name, R.path, V.version_count, V.size, V.hash, V.first_created, V.last_created
+    FROM file_tree_cte AS R
+      JOIN %s AS F ON F.id = R.id
+      LEFT JOIN LATERAL (
+        SELECT
+          COUNT(*) AS version_count,
+          MIN(FV.created) AS first_created,
+          MAX(FV.created) AS last_created,
+          (ARRAY_AGG(FV.size ORDER BY FV.created DESC))[1] AS size,
+          (ARRAY_AGG(FV.metadata ->> 'sha256' ORDER BY FV.created DESC))[1] AS hash
+        FROM %s AS B
+          JOIN %s AS FV ON FV.id = B.fileversion_id
+        WHERE B.basefilenode_id = F.id
+      ) AS V ON TRUE
+    WHERE F.type = %s
+    ORDER BY R.path;
+"""
+
+def get_osfstorage_file_list(node):
+    '''List the files of the osfstorage of a node with one recursive query
+    instead of one WaterButler request per folder.
+    '''
+    addon = node.get_addon('osfstorage')
+    if addon is None or addon.root_node_id is None:
+        return []
+    file_cls = BaseFileNode.resolve_class('osfstorage', BaseFileNode.FILE)
+    folder_cls = BaseFileNode.resolve_class('osfstorage', BaseFileNode.FOLDER)
+    table = AsIs(BaseFileNode._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(OSFSTORAGE_FILE_LIST_SQL, [
+            table, addon.root_node_id,
+            folder_cls._typedmodels_type,
+            table, file_cls._typedmodels_type, folder_cls._typedmodels_type,
+            table,
+            AsIs(BaseFileVersionsThrough._meta.db_table),
+            AsIs(FileVersion._meta.db_table),
+            file_cls._typedmodels_type,
+        ])
+        rows = cursor.fetchall()
+    return [
+        {
+            'file_id': _id,
+            'file_name': name,
+            'file_path': path,
+            'size': size if version_count else None,
+            'created': first_created.isoformat() if first_created else None,
+            'modified': last_created.isoformat() if last_created else None,
+            'version': version_count,
+            'hash': file_hash,
         }
+        for _id, name, path, version_count, size, file_hash, first_created, last_created in rows
+    ]
 
-        try:
-            verify_user = OSFUser.objects.get(id=data.verify_user)
-            error_info['verify_user_id'] = verify_user._id.upper()
-            error_info['verify_user_name'] = verify_user.fullname
-        except OSFUser.DoesNotExist:
-            logger.warning('Timestamp Control: verify_user not found.')
+def get_metadata_hash(attributes):
+    '''Return the content hash of WaterButler file metadata, falling back
+    to the etag for providers that do not report one.
+    '''
+    hashes = (attributes.get('extra') or {}).get('hashes') or {}
+    return hashes.get('sha256') or hashes.get('md5') or attributes.get('etag') or None
 
-        if base_file_data_exists and provider == 'osfstorage':
-            error_info['file_version'] = base_file_data.current_version_number
+def is_unchanged_since_verify(file_info, verify_result):
+    '''Whether a file still has the hash, or else the size and modification
+    date, it was last verified against, so that verifying it again can not
+    change the result.
+    '''
+    if verify_result is None or verify_result.verify_date is None:
+        return False
+    if verify_result.inspection_result_status not in DELTA_SKIP_STATUS:
+        return False
+    file_hash = file_info.get('hash')
+    if file_hash and verify_result.verify_file_hash:
+        if file_hash != verify_result.verify_file_hash:
+            return False
+    elif not (file_info.get('modified') and verify_result.verify_file_modified_at):
+        return False
+    if (file_info.get('size') or None) != verify_result.verify_file_size:
+        return False
+    modified = file_info.get('modified')
+    if modified:
+        if isinstance(modified, str):
+            modified = parse_date(modified)
+        if verify_result.verify_file_modified_at != modified:
+            return False
+    return True
+
+def filter_changed_files(node, request_data):
+    '''Drop the files of ``request_data`` that did not change since they
+    were last verified.
+    '''
+    verify_results = {
+        verify_result.file_id: verify_result
+        for verify_result in RdmFileTimestamptokenVerifyResult.objects.filter(
+            project_id=node._id,
+            file_id__in=[data['file_id'] for data in request_data]
+        )
+    }
+    changed = [
+        data for data in request_data
+        if not is_unchanged_since_verify(data, verify_results.get(data['file_id']))
+    ]
+    logger.info('Timestamp delta verify: {} of {} files changed'.format(len(changed), len(request_data)))
+    return changed
+
+def _get_provider_file_info(node, provider, attributes):
+    basefile_node = BaseFileNode.resolve_class(
+        provider,
+        BaseFileNode.FILE
+    ).get_or_create(
+        node,
+        attributes['path']
+    )
+    basefile_node.materialized_path = attributes['materialized']
+    basefile_node.name = os.path.basename(attributes['materialized'])
+    basefile_node.save()
+    return {
+        'file_id': basefile_node._id,
+        'file_name': attributes.get('name'),
+        'file_path': attributes.get('materialized'),
+        'size': attributes.get('size'),
+        'created': attributes.get('created_utc'),
+        'modified': attributes.get('modified_utc'),
+        'version': '',
+        'hash': get_metadata_hash(attributes),
+    }
 
-        if creator is not None:
-            error_info['creator_name'] = creator.fullname
-            error_info['creator_email'] = creator.username
-            error_info['creator_id'] = creator._id
+def crawl_provider_file_lists(cookie, node, providers):
+    '''List the files of external providers by walking their folders
+    through WaterButler.
 
-            institution = creator.affiliated_institutions.first()
-            if institution is not None:
-                error_info['organization_id'] = institution._id
-                error_info['organization_name'] = institution.name
+    Folder listings run concurrently on a pool of TS_INVENTORY_WORKER_COUNT
+    threads, with at most TS_INVENTORY_PROVIDER_LIMITS[provider] (or
+    TS_INVENTORY_PROVIDER_DEFAULT_LIMIT) listings of one provider at a time.
+    Database access stays on the calling thread.
 
-        error_list.append(error_info)
+    Return {provider: file list}; a provider whose root can not be listed
+    maps to None.
+    '''
+    limits = {
+        provider: threading.BoundedSemaphore(api_settings.TS_INVENTORY_PROVIDER_LIMITS.get(
+            provider, api_settings.TS_INVENTORY_PROVIDER_DEFAULT_LIMIT))
+        for provider in providers
+    }
 
-    if error_list:
-        provider_error_list.append({'provider': provider, 'error_list': error_list})
+    def list_folder(provider, path):
+        with limits[provider]:
+            return waterbutler.get_node_info(cookie, node._id, provider, path)
 
-    return provider_error_list
+    file_lists = {provider: [] for provider in providers}
+    with futures.ThreadPoolExecutor(max_workers=max(1, api_settings.TS_INVENTORY_WORKER_COUNT)) as executor:
+        pending = {
+            executor.submit(list_folder, provider, '/'): (provider, '/')
+            for provider in providers
+        }
+        while pending:
+            done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                provider, path = pending.pop(future)
+                if file_lists[provider] is None:
+                    continue
+                try:
+                    res = future.result()
+                except Exception as err:
+                    logger.exception(err)
+                    res = None
+                if res is None:
+                    if path == '/':
+                        file_lists[provider] = None
+                    else:
+                        logger.warning(u'Timestamp Control: cannot list {}:{}'.format(provider, path))
+                    continue
+                for file_data in res['data']:
+                    attributes = file_data['attributes']
+                    if attributes['kind'] == 'folder':
+                        logger.info(u'Detected: folder={}'.format(attributes['materialized']))
+                        pending[executor.submit(list_folder, provider, attributes['path'])] = \
+                            (provider, attributes['path'])
+                    else:
+                        logger.info(u'Detected: file={}'.format(attributes['materialized']))
+                        file_lists[provider].append(_get_provider_file_info(node, provider, attributes))
+    for file_list in file_lists.values():
+        if file_list:
+            file_list.sort(key=lambda file_info: file_info['file_path'])
+    return file_lists
 
 def get_full_list(uid, pid, node):
     '''Get a full list of timestamps from all files uploaded to a storage.
@@ -242,77 +587,33 @@ def get_full_list(uid, pid, node):
     file_res = requests.get(api_url, headers=headers, cookies=cookies)
     provider_json_res = file_res.json()
     file_res.close()
-    provider_list = []
+    providers = [provider_data['attributes']['provider'] for provider_data in provider_json_res['data']]
 
-    for provider_data in provider_json_res['data']:
-        provider = provider_data['attributes']['provider']
-        waterbutler_json_res = waterbutler.get_node_info(cookie, pid, provider, '/')
+    file_lists = crawl_provider_file_lists(
+        cookie, node, [provider for provider in providers if provider != 'osfstorage'])
+    if 'osfstorage' in providers:
+        file_lists['osfstorage'] = get_osfstorage_file_list(node)
 
-        if waterbutler_json_res is None:
+    provider_list = []
+    for provider in providers:
+        file_list = file_lists[provider]
+        if file_list is None:
             provider_files = RdmFileTimestamptokenVerifyResult.objects.filter(
                 project_id=node._id,
                 provider=provider
             )
-            files_status = provider_files.first().inspection_result_status
-            if files_status != api_settings.TIME_STAMP_STORAGE_DISCONNECTED:
+            first_file = provider_files.first()
+            if first_file is not None and \
+                    first_file.inspection_result_status != api_settings.TIME_STAMP_STORAGE_DISCONNECTED:
                 not_accessible_status = api_settings.TIME_STAMP_STORAGE_NOT_ACCESSIBLE
                 provider_files.update(inspection_result_status=not_accessible_status)
             continue
-        else:
-            RdmFileTimestamptokenVerifyResult.objects.filter(
-                project_id=node._id,
-                provider=provider,
-                inspection_result_status=api_settings.FILE_NOT_EXISTS
-            ).update(inspection_result_status=api_settings.FILE_NOT_EXISTS)
-
-        file_list = []
-        child_file_list = []
-        for file_data in waterbutler_json_res['data']:
-            if file_data['attributes']['kind'] == 'folder':
-                logger.info(u'Detected: folder={}'.format(file_data['attributes']['materialized']))
-                child_file_list.extend(
-                    waterbutler_folder_file_info(
-                        pid,
-                        provider_data['attributes']['provider'],
-                        file_data['attributes']['path'],
-                        node, cookies, headers
-                    )
-                )
-            else:
-                logger.info(u'Detected: file={}'.format(file_data['attributes']['materialized']))
-                file_info = None
-                basefile_node = BaseFileNode.resolve_class(
-                    provider_data['attributes']['provider'],
-                    BaseFileNode.FILE
-                ).get_or_create(
-                    node,
-                    file_data['attributes']['path']
-                )
-                basefile_node.materialized_path = file_data['attributes']['materialized']
-                basefile_node.name = os.path.basename(file_data['attributes']['materialized'])
-                basefile_node.save()
-                file_info = {
-                    'file_id': basefile_node._id,
-                    'file_name': file_data['attributes'].get('name'),
-                    'file_path': file_data['attributes'].get('materialized'),
-                    'size': file_data['attributes'].get('size'),
-                    'created': file_data['attributes'].get('created_utc'),
-                    'modified': file_data['attributes'].get('modified_utc'),
-                    'file_version': ''
-                }
-                if provider_data['attributes']['provider'] == 'osfstorage':
-                    file_info['file_version'] = file_data['attributes']['extra'].get('version')
-                if file_info:
-                    file_list.append(file_info)
-
-        file_list.extend(child_file_list)
 
         if file_list:
-            provider_files = {
-                'provider': provider_data['attributes']['provider'],
+            provider_list.append({
+                'provider': provider,
                 'provider_file_list': file_list
-            }
-            provider_list.append(provider_files)
+            })
 
     return provider_list
 
@@ -322,6 +623,16 @@ def check_file_timestamp(uid, node, data, verify_external_only=False):
     if not userkey_generation_check(user._id):
         userkey_generation(user._id)
 
+    if RdmFileTimestamptokenVerifyResult.objects.filter(
+            file_id=data['file_id'], timestamp_proof__isnull=False).exists():
+        # timestamped in a batch, the token covers the root of a Merkle tree
+        stream_info = StreamedHashInfo.from_file_node(user.get_or_create_cookie().decode(), file_node)
+        if stream_info is None:
+            update_status_file_not_found(data['file_id'])
+            return None
+        return TimeStampTokenVerifyCheckMerkle.timestamp_check(
+            stream_info, user._id, data, node._id)
+
     ext_info = ExternalInfo(node, user, file_node, verify_external_only)
     if ext_info.hash_value:
         if ext_info.file_exists:
@@ -329,6 +640,14 @@ def check_file_timestamp(uid, node, data, verify_external_only=False):
                 ext_info, user._id, data, node._id)
 
     cookie = user.get_or_create_cookie().decode()
+    if get_timestamp_engine(node) == api_settings.TIMESTAMP_ENGINE_STREAM:
+        stream_info = StreamedHashInfo.from_file_node(cookie, file_node)
+        if stream_info is None:
+            update_status_file_not_found(data['file_id'])
+            return None
+        return TimeStampTokenVerifyCheckStream.timestamp_check(
+            stream_info, user._id, data, node._id)
+
     tmp_dir = None
     result = None
     try:
@@ -337,14 +656,7 @@ def check_file_timestamp(uid, node, data, verify_external_only=False):
             os.mkdir(tmp_dir)
         download_file_path = waterbutler.download_file(cookie, file_node, tmp_dir)
         if download_file_path is None:
-            intentional_remove_status = [
-                api_settings.FILE_NOT_EXISTS,
-                api_settings.TIME_STAMP_STORAGE_DISCONNECTED
-            ]
-            file_data = RdmFileTimestamptokenVerifyResult.objects.filter(file_id=data['file_id'])
-            if file_data.exists() and \
-                    file_data.get().inspection_result_status not in intentional_remove_status:
-                file_data.update(inspection_result_status=api_settings.FILE_NOT_FOUND)
+            update_status_file_not_found(data['file_id'])
             return None
         verify_check = TimeStampTokenVerifyCheck()
         result = verify_check.timestamp_check(
@@ -360,6 +672,32 @@ def check_file_timestamp(uid, node, data, verify_external_only=False):
         logger.exception(err)
         raise
 
+def update_status_file_not_found(file_id):
+    '''Mark the timestamp of a file that could not be read as gone, unless
+    it was removed intentionally.
+    '''
+    intentional_remove_status = [
+        api_settings.FILE_NOT_EXISTS,
+        api_settings.TIME_STAMP_STORAGE_DISCONNECTED
+    ]
+    RdmFileTimestamptokenVerifyResult.objects.filter(
+        file_id=file_id
+    ).exclude(
+        inspection_result_status__in=intentional_remove_status
+    ).update(inspection_result_status=api_settings.FILE_NOT_FOUND)
+
+def get_timestamp_engine(node):
+    '''Return the timestamp engine configured for the institution of the node.
+    '''
+    engines = api_settings.TIMESTAMP_ENGINE_BY_INSTITUTION
+    if engines:
+        institution = node.affiliated_institutions.first()
+        if institution is None and node.creator is not None:
+            institution = node.creator.affiliated_institutions.first()
+        if institution is not None and institution._id in engines:
+            return engines[institution._id]
+    return api_settings.TIMESTAMP_ENGINE
+
 def _get_user(uid, op_name, action):
     try:
         return OSFUser.objects.get(id=uid)
@@ -439,27 +777,109 @@ def add_log_download_errors(node, uid, data, save=True):
         save=save,
     )
 
-@celery_app.task(bind=True, base=AbortableTask)
-def celery_verify_timestamp_token(self, uid, node_id):
-    secs_to_wait = 60.0 / api_settings.TS_REQUESTS_PER_MIN
-    last_run = None
+def acquire_tsa_token():
+    '''Block until the rate limit shared by all workers allows a request.
 
+    Must be called outside of a transaction: the bucket row stays locked
+    until the transaction taking the token commits.
+    '''
+    if api_settings.TS_REQUESTS_PER_MIN <= 0:
+        return
+    rate = api_settings.TS_REQUESTS_PER_MIN / 60.0
+    capacity = max(1, api_settings.TS_WORKER_COUNT)
+    while True:
+        wait = TimestampTokenBucket.acquire(api_settings.TS_RATE_LIMIT_BUCKET, rate, capacity)
+        if not wait:
+            return
+        time.sleep(wait)
+
+def _call_with_retry(func, item, aborted, rate_limited):
+    for attempt in range(api_settings.TS_RETRY_COUNT + 1):
+        if aborted.is_set():
+            return None
+        if rate_limited:
+            acquire_tsa_token()
+        try:
+            return func(item)
+        except Exception as err:
+            if attempt == api_settings.TS_RETRY_COUNT:
+                logger.exception(err)
+                return None
+            logger.warning('Timestamp task failed, retrying({}): file_id={}: {}'.format(
+                attempt + 1, item.get('file_id'), err))
+            time.sleep(api_settings.TS_RETRY_BACKOFF * (2 ** attempt))
+
+def run_timestamp_pipeline(task, items, func, rate_limited=True):
+    '''Call func(item) for every item on TS_WORKER_COUNT threads.
+
+    With a single worker, the items are processed in order in the calling
+    thread, inside its database transaction if there is one.
+    Unless ``rate_limited`` is False, calls are throttled with the shared
+    token bucket. A failed item is retried with exponential backoff, and the
+    progress of ``task`` is updated until it finishes or is aborted.
+    Returns the number of processed items.
+    '''
+    total = len(items)
+    aborted = threading.Event()
+    workers = min(api_settings.TS_WORKER_COUNT, total)
+    if workers <= 1:
+        # run in the calling thread (and its database transaction)
+        done = 0
+        for item in items:
+            if task.is_aborted():
+                break
+            _call_with_retry(func, item, aborted, rate_limited)
+            done += 1
+            task.update_state(state='PROGRESS', meta={'progress': done * 100 // total})
+        return done
+
+    work = queue.Queue()
+    for item in items:
+        work.put(item)
+    lock = threading.Lock()
+    counter = {'done': 0}
+
+    def worker():
+        try:
+            while not aborted.is_set():
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    return
+                _call_with_retry(func, item, aborted, rate_limited)
+                with lock:
+                    counter['done'] += 1
+        finally:
+            # each thread has its own database connection
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+        if not aborted.is_set() and task.is_aborted():
+            aborted.set()
+        task.update_state(state='PROGRESS', meta={'progress': counter['done'] * 100 // max(total, 1)})
+    return counter['done']
+
+@celery_app.task(bind=True, base=AbortableTask)
+def celery_verify_timestamp_token(self, uid, node_id, delta=False):
+    '''Verify the timestamps of all files of a node, or with ``delta`` only
+    of the files that changed since their last verification.
+    '''
     celery_app.current_task.update_state(state='PROGRESS', meta={'progress': 0})
     node = AbstractNode.objects.get(id=node_id)
-    celery_app.current_task.update_state(state='PROGRESS', meta={'progress': 50})
-    logger.info('Running timestamp verification...: uid={}, node_guid={}'.format(uid, node._id))
+    logger.info('Running timestamp verification...: uid={}, node_guid={}, delta={}'.format(uid, node._id, delta))
+    request_data = []
     for provider_dict in get_full_list(uid, node._id, node):
         for p_item in provider_dict['provider_file_list']:
-            if self.is_aborted():
-                break
             p_item['provider'] = provider_dict['provider']
-            last_run = time.time()
-            result = check_file_timestamp(uid, node, p_item)
-            if result is None:
-                continue
-            # Do not let the task run too many requests
-            while time.time() < last_run + secs_to_wait:
-                time.sleep(0.1)
+            request_data.append(p_item)
+    if delta:
+        request_data = filter_changed_files(node, request_data)
+    run_timestamp_pipeline(self, request_data, lambda data: check_file_timestamp(uid, node, data))
     add_log_verify_all(node, uid)
     if self.is_aborted():
         logger.warning('Task from project ID {} was cancelled by user ID {}'.format(node_id, uid))
@@ -469,31 +889,70 @@ def celery_verify_timestamp_token(self, uid, node_id):
 def celery_add_timestamp_token(self, uid, node_id, request_data):
     """Celery Timestamptoken add method
     """
-    secs_to_wait = 60.0 / api_settings.TS_REQUESTS_PER_MIN
-    last_run = None
-
     node = AbstractNode.objects.get(id=node_id)
     logger.info('Running add timestamp token...: uid={}, node_guid={}'.format(uid, node._id))
-    for _, data in enumerate(request_data):
-        if self.is_aborted():
-            break
-        last_run = time.time()
-        result = add_token(uid, node, data)
-        if result is None:
-            continue
-        # success
-
-        ### log per a file
-        # add_log_a_file(NodeLog.TIMESTAMP_ADDED, node, uid,
-        #                data['provider'], data['file_id'])
-
-        # Do not let the task run too many requests
-        while time.time() < last_run + secs_to_wait:
-            time.sleep(0.1)
+    if api_settings.TS_BATCH_MODE:
+        add_tokens_batch(self, uid, node, request_data)
+    else:
+        run_timestamp_pipeline(
+            self, request_data, lambda data: add_token(uid, node, data, raise_errors=True))
+    logger.info('TSA metrics: {}'.format(tsa_client.get_client().metrics()))
     add_log_add_all(node, uid)
     if self.is_aborted():
         logger.warning('Task from project ID {} was cancelled by user ID {}'.format(node_id, uid))
 
+def add_tokens_batch(task, uid, node, request_data):
+    '''Hash the files on the worker pool, then timestamp them with one TSA
+    request per TS_BATCH_SIZE files.
+    '''
+    user = OSFUser.objects.get(id=uid)
+    if not userkey_generation_check(user._id):
+        userkey_generation(user._id)
+    cookie = user.get_or_create_cookie().decode()
+    entries = []
+
+    def get_entry(data):
+        file_node = BaseFileNode.objects.get(_id=data['file_id'])
+        stream_info = StreamedHashInfo.from_file_node(cookie, file_node)
+        if stream_info is None:
+            update_status_file_not_found(data['file_id'])
+            return
+        entries.append((user, node, data, stream_info))
+
+    run_timestamp_pipeline(task, request_data, get_entry, rate_limited=False)
+    for i in range(0, len(entries), api_settings.TS_BATCH_SIZE):
+        if task.is_aborted():
+            break
+        acquire_tsa_token()
+        add_timestamp_batch(entries[i:i + api_settings.TS_BATCH_SIZE])
+
+def add_timestamp_batch(entries, raise_errors=False):
+    '''Timestamp the files of ``entries``, a list of
+    (user, node, file_info, StreamedHashInfo), with a single TSA request
+    for the root of a Merkle tree over their digests.
+    Each verify result stores the shared token and its inclusion proof.
+    With ``raise_errors``, TSAError is raised if no token was received.
+    '''
+    hash_type = api_settings.TIMESTAMP_STREAM_HASH_TYPE
+    root, proofs = merkle.build_tree([entry[3].digest for entry in entries], hash_type)
+    tsa_response = AddTimestampStream._generate_timestamp(StreamedHashInfo(hash_type, root))
+    if not tsa_response and raise_errors:
+        raise tsa_client.TSAError('no timestamp token for a batch of {} files'.format(len(entries)))
+    # the root token is verified once for the whole batch
+    verified_roots = {}
+    results = []
+    for (user, node, file_info, stream_info), proof in zip(entries, proofs):
+        verify_data = get_timestamp_verify_result(
+            file_info['file_id'], node._id, file_info['provider'],
+            file_info['file_path'], api_settings.TIME_STAMP_TOKEN_UNCHECKED, user.id)
+        verify_data.timestamp_token = tsa_response
+        verify_data.timestamp_proof = {'hash_type': hash_type, 'path': proof}
+        verify_data.save()
+        stream_info.verified_roots = verified_roots
+        results.append(TimeStampTokenVerifyCheckMerkle.timestamp_check(
+            stream_info, user._id, file_info, node._id, verify_data))
+    return results
+
 def get_celery_task(node):
     task = None
     timestamp_task = TimestampTask.objects.filter(node=node).first()
@@ -524,7 +983,12 @@ def cancel_celery_task(node):
     TimestampTask.objects.filter(node=node).delete()
     return result
 
-def add_token(uid, node, data):
+def add_token(uid, node, data, raise_errors=False):
+    '''Add the timestamp of a file.
+    With ``raise_errors``, TSAError is raised if no token was received, so
+    that the caller can retry; otherwise the verify result is saved without
+    token.
+    '''
     try:
         user = OSFUser.objects.get(id=uid)
         file_node = BaseFileNode.objects.get(_id=data['file_id'])
@@ -539,7 +1003,7 @@ def add_token(uid, node, data):
     if ext_info.hash_value:
         if ext_info.file_exists:
             return AddTimestampHash.add_timestamp(
-                user._id, data, node._id, ext_info)
+                user._id, data, node._id, ext_info, raise_errors=raise_errors)
 
     cookie = user.get_or_create_cookie().decode()
     tmp_dir = None
@@ -549,27 +1013,26 @@ def add_token(uid, node, data):
     if root_file_nodes is None:
         return None
 
+    if get_timestamp_engine(node) == api_settings.TIMESTAMP_ENGINE_STREAM:
+        stream_info = StreamedHashInfo.from_file_node(cookie, file_node)
+        if stream_info is None:
+            update_status_file_not_found(data['file_id'])
+            return None
+        return AddTimestampStream.add_timestamp(
+            user._id, data, node._id, stream_info, raise_errors=raise_errors)
+
     try:
         # Request To Download File
         tmp_dir = tempfile.mkdtemp()
         download_file_path = waterbutler.download_file(cookie, file_node, tmp_dir)
         if download_file_path is None:
-            intentional_remove_status = [
-                api_settings.FILE_NOT_EXISTS,
-                api_settings.TIME_STAMP_STORAGE_DISCONNECTED
-            ]
-            try:
-                file_data = RdmFileTimestamptokenVerifyResult.objects.get(file_id=data['file_id'])
-                if file_data.inspection_result_status not in intentional_remove_status:
-                    file_data.inspection_result_status = api_settings.defaults.FILE_NOT_FOUND
-                    file_data.save()
-            except RdmFileTimestamptokenVerifyResult.DoesNotExist:
-                pass
+            update_status_file_not_found(data['file_id'])
             return None
 
         addTimestamp = AddTimestamp()
         result = addTimestamp.add_timestamp(
-            user._id, data, node._id, download_file_path, tmp_dir
+            user._id, data, node._id, download_file_path, tmp_dir,
+            raise_errors=raise_errors
         )
 
         shutil.rmtree(tmp_dir)
@@ -636,10 +1099,17 @@ def file_created_or_updated(node, metadata, user_id, created_flag):
         'version': version,
         'provider': metadata.get('provider')
     }
+    if api_settings.TS_QUEUE_ENABLED:
+        enqueue_timestamp(node, metadata, user_id, created_flag, file_info)
+        return
     add_token(user_id, node, file_info)
 
     # Update created/modified user in timestamp result
     verify_data = RdmFileTimestamptokenVerifyResult.objects.get(file_id=file_info['file_id'])
+    update_upload_file_info(verify_data, file_info, user_id, created_flag)
+    verify_data.save()
+
+def update_upload_file_info(verify_data, file_info, user_id, created_flag):
     if created_flag:
         verify_data.upload_file_created_user = user_id
     else:  # Updated
@@ -647,8 +1117,170 @@ def file_created_or_updated(node, metadata, user_id, created_flag):
     verify_data.upload_file_created_at = file_info['created']
     verify_data.upload_file_modified_at = file_info['modified']
     verify_data.upload_file_size = file_info['size']
+
+def enqueue_timestamp(node, metadata, user_id, created_flag, file_info):
+    '''Record a file version waiting for a timestamp in the callback's
+    transaction. The timestamp itself is added by celery_process_timestamp_queue.
+    '''
+    verify_data, created = RdmFileTimestamptokenVerifyResult.objects.get_or_create(
+        file_id=file_info['file_id'],
+        defaults={
+            'project_id': node._id,
+            'provider': file_info['provider'],
+            'path': file_info['file_path'],
+        }
+    )
+    verify_data.inspection_result_status = api_settings.TIME_STAMP_TOKEN_PENDING
+    update_upload_file_info(verify_data, file_info, user_id, created_flag)
     verify_data.save()
 
+    hashes = (metadata.get('extra') or {}).get('hashes') or {}
+    hash_type = next((h for h in (HASH_TYPE_SHA512, HASH_TYPE_SHA256) if hashes.get(h)), '')
+    TimestampQueue.objects.create(
+        node=node,
+        user_id=user_id,
+        file_id=file_info['file_id'],
+        provider=file_info['provider'],
+        version=file_info['version'] or '',
+        hash_type=hash_type,
+        hash_value=hashes.get(hash_type, ''),
+        file_info=file_info,
+    )
+    transaction.on_commit(lambda: celery_process_timestamp_queue.delay())
+
+def _claim_timestamp_queue(limit):
+    '''Claim up to ``limit`` queued file versions due for a timestamp, in
+    their own transaction. A claimed row is skipped by the other workers for
+    TS_QUEUE_CLAIM_TIMEOUT seconds, then taken again if it is still there.
+    The versions with a newer version of the file waiting are removed.
+    Returns the claimed rows and the number of rows taken from the queue.
+    '''
+    now = timezone.now()
+    with transaction.atomic():
+        items = list(TimestampQueue.objects.select_for_update(skip_locked=True).filter(
+            attempts__lt=api_settings.TS_QUEUE_MAX_ATTEMPTS,
+            next_attempt_at__lte=now,
+        ).order_by('id')[:limit])
+        if not items:
+            return [], 0
+        newest = dict(TimestampQueue.objects.filter(
+            file_id__in=set(item.file_id for item in items)
+        ).order_by().values('file_id').annotate(newest=Max('id')).values_list('file_id', 'newest'))
+        claimed = [item for item in items if item.id == newest[item.file_id]]
+        TimestampQueue.objects.filter(
+            id__in=[item.id for item in items if item.id != newest[item.file_id]]
+        ).delete()
+        TimestampQueue.objects.filter(id__in=[item.id for item in claimed]).update(
+            next_attempt_at=now + datetime.timedelta(seconds=api_settings.TS_QUEUE_CLAIM_TIMEOUT))
+    return claimed, len(items)
+
+def _retry_timestamp_queue(items, err):
+    '''Put back queued file versions that failed, for a retry after
+    TS_QUEUE_RETRY_DELAY seconds doubled at each attempt. After
+    TS_QUEUE_MAX_ATTEMPTS their files get the TIME_STAMP_TOKEN_NO_DATA status.
+    '''
+    now = timezone.now()
+    for attempts in set(item.attempts for item in items):
+        TimestampQueue.objects.filter(
+            id__in=[item.id for item in items if item.attempts == attempts]
+        ).update(
+            attempts=attempts + 1,
+            last_error=str(err),
+            next_attempt_at=now + datetime.timedelta(
+                seconds=api_settings.TS_QUEUE_RETRY_DELAY * (2 ** attempts)),
+        )
+    RdmFileTimestamptokenVerifyResult.objects.filter(
+        file_id__in=[item.file_id for item in items
+                     if item.attempts + 1 >= api_settings.TS_QUEUE_MAX_ATTEMPTS],
+        inspection_result_status=api_settings.TIME_STAMP_TOKEN_PENDING
+    ).update(inspection_result_status=api_settings.TIME_STAMP_TOKEN_NO_DATA)
+
+def add_queued_token(item):
+    '''Add the timestamp of a queued file version. The hash sent by
+    WaterButler is used when there is one, instead of downloading the file.
+    '''
+    file_node = BaseFileNode.objects.filter(_id=item.file_id).first()
+    if (item.hash_type != api_settings.TIMESTAMP_STREAM_HASH_TYPE or not item.hash_value or
+            file_node is None or hasattr(file_node, 'get_hash_for_timestamp')):
+        # the storages with their own hashes and timestamps use ExternalInfo
+        return add_token(item.user_id, item.node, item.file_info, raise_errors=True)
+    if not userkey_generation_check(item.user._id):
+        userkey_generation(item.user._id)
+    stream_info = StreamedHashInfo(item.hash_type, bytes.fromhex(item.hash_value))
+    return AddTimestampStream.add_timestamp(
+        item.user._id, item.file_info, item.node._id, stream_info, raise_errors=True)
+
+def process_timestamp_queue_item():
+    '''Add the timestamp of the oldest queued file version due.
+    Returns False if there is nothing left to process.
+    '''
+    items, taken = _claim_timestamp_queue(1)
+    if not items:
+        return taken > 0
+    item = items[0]
+    # take the token outside of a transaction, the bucket must not stay
+    # locked during the TSA request
+    acquire_tsa_token()
+    try:
+        with transaction.atomic():
+            add_queued_token(item)
+    except Exception as err:
+        logger.exception(err)
+        _retry_timestamp_queue([item], err)
+    else:
+        item.delete()
+    return True
+
+def process_timestamp_queue_batch():
+    '''Timestamp up to TS_BATCH_SIZE queued file versions with a single TSA
+    request. Returns True if the queue may still hold more files.
+    '''
+    items, taken = _claim_timestamp_queue(api_settings.TS_BATCH_SIZE)
+    done = []
+    entries = []
+    for item in items:
+        if not userkey_generation_check(item.user._id):
+            userkey_generation(item.user._id)
+        if item.hash_type == api_settings.TIMESTAMP_STREAM_HASH_TYPE and item.hash_value:
+            stream_info = StreamedHashInfo(item.hash_type, bytes.fromhex(item.hash_value))
+        else:
+            file_node = BaseFileNode.objects.filter(_id=item.file_id).first()
+            stream_info = file_node and StreamedHashInfo.from_file_node(
+                item.user.get_or_create_cookie().decode(), file_node)
+        if stream_info is None:
+            update_status_file_not_found(item.file_id)
+            done.append(item.id)
+            continue
+        entries.append((item, stream_info))
+
+    if entries:
+        # take the token outside of a transaction, the bucket must not stay
+        # locked during the TSA request
+        acquire_tsa_token()
+        try:
+            with transaction.atomic():
+                add_timestamp_batch([
+                    (item.user, item.node, item.file_info, stream_info)
+                    for item, stream_info in entries
+                ], raise_errors=True)
+        except Exception as err:
+            logger.exception(err)
+            _retry_timestamp_queue([item for item, _ in entries], err)
+        else:
+            done.extend(item.id for item, _ in entries)
+    TimestampQueue.objects.filter(id__in=done).delete()
+    return taken == api_settings.TS_BATCH_SIZE
+
+@celery_app.task(ignore_result=True)
+def celery_process_timestamp_queue():
+    if api_settings.TS_BATCH_MODE:
+        if process_timestamp_queue_batch():
+            celery_process_timestamp_queue.delay()
+        return
+    for _ in range(api_settings.TS_QUEUE_BATCH_SIZE):
+        if not process_timestamp_queue_item():
+            break
+
 def file_node_moved(uid, project_id, src_provider, dest_provider, src_path, dest_path, metadata, src_metadata=None):
     if not settings.ENABLE_TIMESTAMP:
         return
@@ -882,64 +1514,6 @@ def file_node_gone(project_id, addon_name, src_path):
         inspection_result_status=api_settings.FILE_NOT_EXISTS
     ).update(inspection_result_status=tst_status)
 
-def waterbutler_folder_file_info(pid, provider, path, node, cookies, headers):
-    # get waterbutler folder file
-    if provider == 'osfstorage':
-        waterbutler_meta_url = waterbutler_api_url_for(
-            pid, provider,
-            '/' + path,
-            meta=int(time.mktime(datetime.datetime.now().timetuple()))
-        )
-    else:
-        waterbutler_meta_url = waterbutler_api_url_for(
-            pid, provider,
-            path,
-            meta=int(time.mktime(datetime.datetime.now().timetuple()))
-        )
-
-    waterbutler_res = requests.get(waterbutler_meta_url, headers=headers, cookies=cookies)
-    waterbutler_json_res = waterbutler_res.json()
-    waterbutler_res.close()
-    file_list = []
-    child_file_list = []
-    for file_data in waterbutler_json_res['data']:
-        if file_data['attributes']['kind'] == 'folder':
-            child_file_list.extend(waterbutler_folder_file_info(
-                pid, provider, file_data['attributes']['path'],
-                node, cookies, headers))
-        else:
-            basefile_node = BaseFileNode.resolve_class(
-                provider,
-                BaseFileNode.FILE
-            ).get_or_create(
-                node,
-                file_data['attributes']['path']
-            )
-            basefile_node.materialized_path = file_data['attributes']['materialized']
-            basefile_node.name = os.path.basename(file_data['attributes']['materialized'])
-            basefile_node.save()
-            if provider == 'osfstorage':
-                file_info = {
-                    'file_name': file_data['attributes']['name'],
-                    'file_path': file_data['attributes']['materialized'],
-                    'file_kind': file_data['attributes']['kind'],
-                    'file_id': basefile_node._id,
-                    'version': file_data['attributes']['extra']['version']
-                }
-            else:
-                file_info = {
-                    'file_name': file_data['attributes']['name'],
-                    'file_path': file_data['attributes']['materialized'],
-                    'file_kind': file_data['attributes']['kind'],
-                    'file_id': basefile_node._id,
-                    'version': ''
-                }
-
-            file_list.append(file_info)
-
-    file_list.extend(child_file_list)
-    return file_list
-
 def user_guid_to_id(user_guid):
     return OSFUser.objects.get(guids___id=user_guid).id
 
@@ -1009,6 +1583,11 @@ def filename_formatter(file_name):
 def get_timestamp_verify_result(file_id, project_id, provider, path, inspection_result_status, user_id):
     res, created = RdmFileTimestamptokenVerifyResult.objects.get_or_create(
         file_id=file_id)
+    if not created and not res.key_file_name:
+        # created by enqueue_timestamp()
+        res.key_file_name = RdmUserKey.objects.get(
+            guid=user_id, key_kind=api_settings.PUBLIC_KEY_VALUE).key_name
+        res.save()
     if created:
         userKey = RdmUserKey.objects.get(
             guid=user_id, key_kind=api_settings.PUBLIC_KEY_VALUE)
@@ -1038,19 +1617,7 @@ class AddTimestamp:
     def get_timestamp_response(self, file_name, ts_request_file, key_file):
         res_content = None
         try:
-            retries = Retry(
-                total=api_settings.REQUEST_TIME_OUT, backoff_factor=1,
-                status_forcelist=api_settings.ERROR_HTTP_STATUS)
-            session = requests.Session()
-            session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
-            session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
-
-            res = requests.post(
-                api_settings.TIME_STAMP_AUTHORITY_URL, headers=api_settings.REQUEST_HEADER,
-                data=ts_request_file, stream=True)
-            res_content = res.content
-            res.close()
-
+            res_content = tsa_client.post(ts_request_file)
         except Exception as ex:
             logger.exception(ex)
             traceback.print_exc()
@@ -1075,7 +1642,7 @@ class AddTimestamp:
             logger.exception(err)
             raise err
 
-    def add_timestamp(self, guid, file_info, project_id, file_name, tmp_dir):
+    def add_timestamp(self, guid, file_info, project_id, file_name, tmp_dir, raise_errors=False):
         user_id = Guid.objects.get(_id=guid, content_type_id=ContentType.objects.get_for_model(OSFUser).id).object_id
         key_file_name = RdmUserKey.objects.get(
             guid=user_id, key_kind=api_settings.PUBLIC_KEY_VALUE
@@ -1091,6 +1658,8 @@ class AddTimestamp:
         except Exception as err:
             logger.exception(err)
             tsa_response = None
+        if not tsa_response and raise_errors:
+            raise tsa_client.TSAError('no timestamp token: file_id={}'.format(file_info['file_id']))
 
         try:
             verify_data = RdmFileTimestamptokenVerifyResult.objects.get(
@@ -1105,6 +1674,7 @@ class AddTimestamp:
 
         verify_data.key_file_name = key_file_name
         verify_data.timestamp_token = tsa_response
+        verify_data.timestamp_proof = None
         verify_data.save()
 
         return TimeStampTokenVerifyCheck().timestamp_check(
@@ -1361,6 +1931,7 @@ class TimeStampTokenVerifyCheck:
         verify_result.verify_file_created_at = file_created_at
         verify_result.verify_file_modified_at = file_modified_at
         verify_result.verify_file_size = file_size
+        verify_result.verify_file_hash = file_info.get('hash') or None
         verify_result.save()
 
         # RDMINFO: TimeStampVerify
@@ -1395,13 +1966,17 @@ class TimeStampTokenVerifyCheck:
 
 class AddTimestampHash:
     @classmethod
-    def add_timestamp(cls, user_guid, file_info, node_id, ext_info):
+    def add_timestamp(cls, user_guid, file_info, node_id, ext_info, raise_errors=False):
+        tsa_response = cls._generate_timestamp(ext_info)
+        if not tsa_response and raise_errors:
+            raise tsa_client.TSAError('no timestamp token: file_id={}'.format(file_info['file_id']))
         verify_data = get_timestamp_verify_result(
             file_info['file_id'], node_id, file_info['provider'],
             file_info['file_path'], api_settings.TIME_STAMP_TOKEN_UNCHECKED,
             user_guid_to_id(user_guid))
 
-        verify_data.timestamp_token = cls._generate_timestamp(ext_info)
+        verify_data.timestamp_token = tsa_response
+        verify_data.timestamp_proof = None
         # set new timestamp into ext_info
         ext_info.timestamp_data = verify_data.timestamp_token
         if ext_info.has_timestamp:
@@ -1412,7 +1987,7 @@ class AddTimestampHash:
         # update local timestamp
         verify_data.save()
 
-        result = TimeStampTokenVerifyCheckHash.timestamp_check(
+        result = cls._timestamp_check(
             ext_info, user_guid, file_info, node_id, verify_data)
 
         # update external timestamp
@@ -1421,6 +1996,11 @@ class AddTimestampHash:
 
         return result
 
+    @classmethod
+    def _timestamp_check(cls, ext_info, user_guid, file_info, node_id, verify_data):
+        return TimeStampTokenVerifyCheckHash.timestamp_check(
+            ext_info, user_guid, file_info, node_id, verify_data)
+
     @classmethod
     def _generate_timestamp(cls, ext_info):
         try:
@@ -1449,22 +2029,7 @@ class AddTimestampHash:
 
     @classmethod
     def _gen_timestamp_response(cls, ts_request):
-        res_content = None
-        retries = Retry(
-            total=api_settings.REQUEST_TIME_OUT, backoff_factor=1,
-            status_forcelist=api_settings.ERROR_HTTP_STATUS)
-        session = requests.Session()
-        session.mount('http://',
-                      requests.adapters.HTTPAdapter(max_retries=retries))
-        session.mount('https://',
-                      requests.adapters.HTTPAdapter(max_retries=retries))
-        res = session.post(
-            api_settings.TIME_STAMP_AUTHORITY_URL,
-            headers=api_settings.REQUEST_HEADER,
-            data=ts_request, stream=True)
-        res_content = res.content
-        res.close()
-        return res_content
+        return tsa_client.post(ts_request)
 
     @classmethod
     def _gen_timestamp_upki(cls, ext_info):
@@ -1584,6 +2149,83 @@ class TimeStampTokenVerifyCheckHash:
             use_hash, external_timestamp, ret)
 
 
+class AddTimestampStream(AddTimestampHash):
+    '''AddTimestampHash using a digest computed while streaming the file.
+    The TimeStampReq is built and the TimeStampResp is parsed in-process.
+    '''
+    @classmethod
+    def _timestamp_check(cls, ext_info, user_guid, file_info, node_id, verify_data):
+        return TimeStampTokenVerifyCheckStream.timestamp_check(
+            ext_info, user_guid, file_info, node_id, verify_data)
+
+    @classmethod
+    def _gen_timestamp_request(cls, ext_info):
+        return rfc3161.build_request(ext_info.digest, ext_info.hash_type)
+
+    @classmethod
+    def _gen_timestamp_response(cls, ts_request):
+        res_content = super(AddTimestampStream, cls)._gen_timestamp_response(ts_request)
+        status, _ = rfc3161.parse_response(res_content)
+        if status not in (rfc3161.PKI_STATUS_GRANTED, rfc3161.PKI_STATUS_GRANTED_WITH_MODS):
+            logger.error('timestamp request was rejected by TSA: status={}'.format(status))
+            return None
+        return res_content
+
+
+class TimeStampTokenVerifyCheckStream(TimeStampTokenVerifyCheckHash):
+    '''TimeStampTokenVerifyCheckHash comparing the message imprint of the
+    token in-process first, so a modified file needs no openssl call.
+    '''
+    @classmethod
+    def _verify(cls, tmp_dir, ext_info, user_guid, project_id, verify_result):
+        if not api_settings.USE_UPKI:
+            try:
+                hash_type, digest = rfc3161.get_message_imprint(
+                    select_timestamp_token(verify_result, ext_info))
+            except rfc3161.RFC3161Error as err:
+                logger.warning('cannot parse timestamp token({}): {}'.format(verify_result.provider, err))
+                hash_type, digest = None, None
+            if hash_type == ext_info.hash_type and digest != ext_info.digest:
+                ret = api_settings.TIME_STAMP_TOKEN_CHECK_NG
+                verify_result.inspection_result_status = ret
+                return verify_result, api_settings.TIME_STAMP_TOKEN_CHECK_NG_MSG, ret
+        return super(TimeStampTokenVerifyCheckStream, cls)._verify(
+            tmp_dir, ext_info, user_guid, project_id, verify_result)
+
+
+class TimeStampTokenVerifyCheckMerkle(TimeStampTokenVerifyCheckStream):
+    '''TimeStampTokenVerifyCheckStream for files timestamped in a batch.
+    The root recomputed from the digest of the file and its inclusion proof
+    is verified against the shared token.
+    '''
+    @classmethod
+    def _verify(cls, tmp_dir, ext_info, user_guid, project_id, verify_result):
+        proof = verify_result.timestamp_proof
+        if not proof:
+            return super(TimeStampTokenVerifyCheckMerkle, cls)._verify(
+                tmp_dir, ext_info, user_guid, project_id, verify_result)
+        try:
+            if proof['hash_type'] != ext_info.hash_type:
+                raise ValueError('hash_type mismatch: {}'.format(proof['hash_type']))
+            root = merkle.root_from_proof(ext_info.digest, proof['path'], proof['hash_type'])
+        except (KeyError, TypeError, ValueError) as err:
+            logger.error('invalid timestamp proof({}:{}): {}'.format(verify_result.provider, verify_result.path, err))
+            ret = api_settings.TIME_STAMP_VERIFICATION_ERR
+            verify_result.inspection_result_status = ret
+            return verify_result, api_settings.TIME_STAMP_VERIFICATION_ERR_MSG, ret
+
+        verified_roots = ext_info.verified_roots
+        if verified_roots is not None and root in verified_roots:
+            verify_result_title, ret = verified_roots[root]
+            verify_result.inspection_result_status = ret
+            return verify_result, verify_result_title, ret
+        verify_result, verify_result_title, ret = super(TimeStampTokenVerifyCheckMerkle, cls)._verify(
+            tmp_dir, StreamedHashInfo(proof['hash_type'], root), user_guid, project_id, verify_result)
+        if verified_roots is not None:
+            verified_roots[root] = (verify_result_title, ret)
+        return verify_result, verify_result_title, ret
+
+
 HASH_TYPE_SHA256 = 'sha256'
 HASH_TYPE_SHA512 = 'sha512'
 
@@ -1674,3 +2316,32 @@ class ExternalInfo():
         func = getattr(self.file_node, 'set_timestamp', None)
         if func:
             func(self.timestamp_data, self.timestamp_status, self.context)
+
+class StreamedHashInfo():
+    '''Digest of a file computed while streaming it from WaterButler.
+    Provides the interface of ExternalInfo used by the hash based flows.
+    '''
+    has_timestamp = False
+    file_exists = True
+    verify_external_only = False
+
+    def __init__(self, hash_type, digest):
+        self.hash_type = hash_type
+        self.digest = digest
+        self.hash_value = digest.hex()
+        self.timestamp_data = None
+        self.timestamp_status = None
+        # results of Merkle roots verified in the same batch
+        self.verified_roots = None
+
+    @classmethod
+    def from_file_node(cls, cookie, file_node):
+        hash_type = api_settings.TIMESTAMP_STREAM_HASH_TYPE
+        digest = waterbutler.get_file_digest(
+            cookie, file_node, hash_type, api_settings.TIMESTAMP_STREAM_CHUNK_SIZE)
+        if digest is None:
+            return None
+        return cls(hash_type, digest)
+
+    def update_timestamp(self):
+        pass
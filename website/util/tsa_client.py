@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+'''HTTP client for Time Stamping Authorities.
+
+One client is shared by the whole process so that connections to the TSA
+are kept alive between requests. Several TSA endpoints can be configured;
+they are tried in order, skipping endpoints whose circuit breaker is open
+because of repeated failures. Latency and errors are recorded per endpoint.
+'''
+from __future__ import absolute_import
+import bisect
+import logging
+import threading
+import time
+
+import requests
+from urllib3.util.retry import Retry
+
+from api.base import settings as api_settings
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+
+class TSAError(Exception):
+    pass
+
+
+class TSAUnavailable(TSAError):
+    '''No endpoint returned a response.
+    '''
+    pass
+
+
+class TSAEndpoint(object):
+    '''State of one TSA endpoint: circuit breaker and metrics.
+    '''
+    def __init__(self, url, threshold, reset_timeout, buckets):
+        self.url = url
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.buckets = list(buckets)
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.requests = 0
+        self.errors = {}
+        # the last bucket counts requests slower than every bound
+        self.latency = [0] * (len(self.buckets) + 1)
+        self.latency_sum = 0.0
+
+    def allow_request(self, now):
+        if self.state == BREAKER_CLOSED:
+            return True
+        if self.state == BREAKER_OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = BREAKER_HALF_OPEN
+        if self.state == BREAKER_HALF_OPEN and not self.trial_running:
+            # let a single request through to probe the endpoint
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self, elapsed):
+        self._record_latency(elapsed)
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, kind, elapsed, now):
+        self._record_latency(elapsed)
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN or self.failures >= self.threshold:
+            if self.state != BREAKER_OPEN:
+                logger.warning('TSA circuit breaker opened: url={}, failures={}'.format(self.url, self.failures))
+            self.state = BREAKER_OPEN
+            self.opened_at = now
+
+    def _record_latency(self, elapsed):
+        self.requests += 1
+        self.latency_sum += elapsed
+        self.latency[bisect.bisect_left(self.buckets, elapsed)] += 1
+
+    def snapshot(self):
+        return {
+            'url': self.url,
+            'state': self.state,
+            'requests': self.requests,
+            'errors': dict(self.errors),
+            'latency_buckets': self.buckets,
+            'latency_histogram': list(self.latency),
+            'latency_sum': self.latency_sum,
+        }
+
+
+class TSAClient(object):
+    def __init__(self, urls, pool_size=10, timeout=None, retries=0,
+                 breaker_threshold=5, breaker_reset=60, latency_buckets=(1,)):
+        if not urls:
+            raise ValueError('no TSA url')
+        self.timeout = timeout
+        self.endpoints = [
+            TSAEndpoint(url, breaker_threshold, breaker_reset, latency_buckets)
+            for url in urls
+        ]
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=len(urls), pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=0.5, raise_on_status=False))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _acquire(self, tried):
+        now = time.time()
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.url not in tried and endpoint.allow_request(now):
+                    return endpoint
+        return None
+
+    def post(self, ts_request):
+        '''Send a DER encoded TimeStampReq and return the body of the first
+        successful response.
+        '''
+        tried = set()
+        endpoint = self._acquire(tried)
+        while endpoint is not None:
+            tried.add(endpoint.url)
+            start = time.time()
+            try:
+                try:
+                    res = self.session.post(
+                        endpoint.url, headers=api_settings.REQUEST_HEADER,
+                        data=ts_request, timeout=self.timeout)
+                    content = res.content
+                    res.close()
+                except requests.exceptions.Timeout:
+                    kind = 'timeout'
+                except requests.exceptions.RequestException:
+                    kind = 'connection'
+                else:
+                    if res.status_code not in api_settings.ERROR_HTTP_STATUS:
+                        with self._lock:
+                            endpoint.record_success(time.time() - start)
+                        return content
+                    kind = 'http_{}'.format(res.status_code)
+                now = time.time()
+                with self._lock:
+                    endpoint.record_failure(kind, now - start, now)
+            finally:
+                # whatever happened, the next request may probe a half open endpoint
+                with self._lock:
+                    endpoint.trial_running = False
+            logger.warning('TSA request failed: url={}, error={}'.format(endpoint.url, kind))
+            endpoint = self._acquire(tried)
+        if not tried:
+            raise TSAUnavailable('all TSA circuit breakers are open')
+        raise TSAUnavailable('no TSA endpoint answered')
+
+    def metrics(self):
+        with self._lock:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_tsa_urls():
+    return [api_settings.TIME_STAMP_AUTHORITY_URL] + list(api_settings.TIME_STAMP_AUTHORITY_FALLBACK_URLS)
+
+def get_client():
+    '''Return the TSA client of this process, created from the settings.
+    '''
+    global _client
+    with _client_lock:
+        urls = get_tsa_urls()
+        if _client is None or [endpoint.url for endpoint in _client.endpoints] != urls:
+            _client = TSAClient(
+                urls,
+                pool_size=api_settings.TSA_POOL_SIZE,
+                timeout=api_settings.TSA_TIMEOUT,
+                retries=api_settings.TSA_ENDPOINT_RETRIES,
+                breaker_threshold=api_settings.TSA_BREAKER_THRESHOLD,
+                breaker_reset=api_settings.TSA_BREAKER_RESET,
+                latency_buckets=api_settings.TSA_LATENCY_BUCKETS,
+            )
+        return _client
+
+def post(ts_request):
+    return get_client().post(ts_request)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import requests
 import shutil
 import os
@@ -39,6 +40,35 @@ def download_file(osf_cookie, file_node, download_path, **kwargs):
     response.close()
     return full_path
 
+def get_file_digest(osf_cookie, file_node, hash_type, chunk_size, **kwargs):
+    """Hash a waterbutler file while streaming its contents, without
+    saving it anywhere. Returns the raw digest, or None if not accessible.
+    """
+    file_info = get_node_info(osf_cookie, file_node.target._id, file_node.provider, file_node.path)
+    if file_info is None:
+        return None
+
+    try:
+        response = requests.get(
+            file_node.generate_waterbutler_url(action='download', direct=None, _internal=True, **kwargs),
+            cookies={settings.COOKIE_NAME: osf_cookie},
+            stream=True
+        )
+    except Exception as err:
+        logger.error(err)
+        return None
+
+    try:
+        if response.status_code != 200:
+            logger.error('get_file_digest: status={}, path={}'.format(response.status_code, file_node.path))
+            return None
+        hasher = hashlib.new(hash_type)
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            hasher.update(chunk)
+    finally:
+        response.close()
+    return hasher.digest()
+
 def upload_folder_recursive(osf_cookie, pid, local_path, dest_path):
     """Upload all the content (files and folders) inside a folder.
     """